@@ -24,6 +24,10 @@ OIDS="$@"
 log "running object registry test for objects: $OIDS"
 log "code generator additional args: \"$CODEGEN_ARGS\""
 
+# download all definitions up front; the loop below then reads them from cache
+"$OBJECT_REGISTRY_SCRIPT" --prefetch $OIDS ||
+    log "could not prefetch all object definitions, continuing anyway"
+
 for OID in $OIDS; do
     OBJECT_DEFINITION_FILE="$TEMP_DIR/$OID-object-def.xml"
     OBJECT_REGISTRY_ERROR_FILE="$TEMP_DIR/$OID-object-err.log"
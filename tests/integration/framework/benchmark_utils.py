@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import collections
+import contextlib
+import csv
+import json
+import math
+import os
+import statistics
+import time
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+
+def benchmark_iterations(default):
+    """
+    Returns the number of iterations a benchmark should perform. The DEFAULT
+    may be overridden for all benchmarks with the BENCHMARK_ITERATIONS
+    environment variable.
+    """
+    value = os.environ.get('BENCHMARK_ITERATIONS')
+    if value:
+        return max(1, int(value))
+    return default
+
+
+def soak_duration(default):
+    """
+    Returns the duration, in seconds, for which a soak test should keep the
+    demo running. The DEFAULT may be overridden for all soak tests with the
+    SOAK_DURATION environment variable.
+    """
+    value = os.environ.get('SOAK_DURATION')
+    if value:
+        return max(0.0, float(value))
+    return default
+
+
+def percentile(sorted_samples, p):
+    """
+    Returns the P-th percentile (0 <= P <= 100) of SORTED_SAMPLES, linearly
+    interpolating between the two closest ranks.
+    """
+    if not sorted_samples:
+        raise ValueError('cannot calculate percentile of an empty sample set')
+    if not 0 <= p <= 100:
+        raise ValueError('invalid percentile: %r' % (p,))
+
+    rank = (len(sorted_samples) - 1) * p / 100.0
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return sorted_samples[int(rank)]
+    return (sorted_samples[lower] * (upper - rank)
+            + sorted_samples[upper] * (rank - lower))
+
+
+def process_cpu_time(pid):
+    """
+    Returns the total CPU time (user + system), in seconds, consumed so far by
+    the process PID, or None if it cannot be determined (e.g. if /proc is not
+    available).
+    """
+    try:
+        with open('/proc/%d/stat' % (pid,)) as f:
+            stat = f.read()
+    except OSError:
+        return None
+
+    # the process name may contain spaces; actual fields start after it,
+    # with the process state (field 3), so utime (field 14) is at index 11
+    fields = stat[stat.rfind(')') + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def process_memory_usage(pid):
+    """
+    Returns the resident set size, in bytes, of the process PID, or None if it
+    cannot be determined.
+    """
+    try:
+        with open('/proc/%d/status' % (pid,)) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    # e.g. "VmRSS:      1234 kB"
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def process_fd_count(pid):
+    """
+    Returns the number of file descriptors open in the process PID, or None if
+    it cannot be determined.
+    """
+    try:
+        return len(os.listdir('/proc/%d/fd' % (pid,)))
+    except OSError:
+        return None
+
+
+def linear_trend(points):
+    """
+    Returns the slope of a straight line fitted to POINTS, a sequence of
+    (x, y) pairs, using least squares.
+    """
+    points = list(points)
+    if len(points) < 2:
+        raise ValueError('at least two points are required')
+
+    mean_x = statistics.mean(x for x, _ in points)
+    mean_y = statistics.mean(y for _, y in points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        raise ValueError('all x values are equal')
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def scaling_exponent(points):
+    """
+    Returns k such that y ~ x**k best describes POINTS, a sequence of (x, y)
+    pairs with positive values, using a least-squares fit in log-log space.
+
+    An exponent close to 1 means linear growth; noticeably larger values
+    indicate superlinear growth. Fixed per-operation costs push the result
+    towards 0, so it is best calculated for large values of x only.
+    """
+    return linear_trend((math.log(x), math.log(y)) for x, y in points)
+
+
+class Samples:
+    """
+    A named series of measurements of a single quantity, e.g. latency of
+    a specific request.
+    """
+
+    def __init__(self, name, unit='s'):
+        self.name = name
+        self.unit = unit
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        self.values.append(value)
+
+    @contextlib.contextmanager
+    def measure(self):
+        """
+        Context manager that adds the wall-clock duration of its body, in
+        seconds, as a new sample.
+        """
+        start = time.perf_counter()
+        yield
+        self.add(time.perf_counter() - start)
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES):
+        result = collections.OrderedDict([('unit', self.unit),
+                                          ('count', len(self.values))])
+        if not self.values:
+            return result
+
+        sorted_values = sorted(self.values)
+        result['min'] = sorted_values[0]
+        result['max'] = sorted_values[-1]
+        result['mean'] = statistics.mean(sorted_values)
+        result['stdev'] = statistics.stdev(sorted_values) if len(sorted_values) > 1 else 0.0
+        for p in percentiles:
+            result['p%d' % (p,)] = percentile(sorted_values, p)
+        return result
+
+    def __str__(self):
+        summary = self.summary()
+        if not self.values:
+            return '%s: no samples' % (self.name,)
+
+        scale, unit = (1000.0, 'ms') if self.unit == 's' else (1.0, self.unit)
+        return '%s: n=%d, %s' % (
+            self.name, summary['count'],
+            ', '.join('%s=%.3f%s' % (k, summary[k] * scale, unit)
+                      for k in ['min'] + ['p%d' % p for p in DEFAULT_PERCENTILES] + ['max']))
+
+
+class TimeSeries:
+    """
+    Values of several quantities sampled at the same points in time, e.g.
+    resource usage of a long-running process.
+    """
+
+    def __init__(self, columns):
+        self.columns = ['time'] + list(columns)
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, time, **values):
+        row = collections.OrderedDict([('time', time)])
+        for column in self.columns[1:]:
+            row[column] = values.get(column)
+        self.rows.append(row)
+
+    def points(self, column, since=0.0):
+        """
+        Returns (time, value) pairs of COLUMN sampled at or after SINCE,
+        skipping samples for which the value is unknown.
+        """
+        return [(row['time'], row[column]) for row in self.rows
+                if row['time'] >= since and row[column] is not None]
+
+    def dump_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns)
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+
+class BenchmarkReport:
+    """
+    Collection of Samples gathered by a single benchmark, along with any
+    properties that describe the benchmarked configuration.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.properties = collections.OrderedDict()
+        self.metrics = collections.OrderedDict()
+
+    def metric(self, name, unit='s'):
+        """
+        Returns the Samples object called NAME, creating it if necessary.
+        """
+        if name not in self.metrics:
+            self.metrics[name] = Samples(name, unit)
+        return self.metrics[name]
+
+    def set_property(self, name, value):
+        self.properties[name] = value
+
+    def to_dict(self):
+        return collections.OrderedDict([
+            ('name', self.name),
+            ('properties', self.properties),
+            ('metrics', collections.OrderedDict(
+                (name, dict(samples.summary(), samples=samples.values))
+                for name, samples in self.metrics.items())),
+        ])
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write('\n')
+
+    def __str__(self):
+        return '\n'.join(['Benchmark %s:' % (self.name,)]
+                         + ['  %s = %s' % kv for kv in self.properties.items()]
+                         + ['  %s' % (samples,) for samples in self.metrics.values()])
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+Declarative Bootstrap configurations and a driver that provisions them over
+the Bootstrap Interface.
+
+A BootstrapConfig lists Security, Server and Access Control Object instances
+to be written. BootstrapDriver turns it into a sequence of Bootstrap-Delete
+and Bootstrap-Write requests followed by Bootstrap-Finish, keeping up to
+NSTART confirmable requests in flight at a time, and records how long every
+step took.
+"""
+
+import collections
+import time
+from typing import List, NamedTuple
+
+from .lwm2m import coap
+from .lwm2m.coap.server import SecurityMode
+from .lwm2m.messages import (Lwm2mBootstrapFinish, Lwm2mChanged, Lwm2mDelete, Lwm2mDeleted,
+                             Lwm2mWrite)
+from .lwm2m.senml_cbor import CBOR, SenmlLabel
+from .lwm2m.tlv import TLV
+from .test_utils import OID, RID, namedtuple
+
+
+class SecurityInstance(namedtuple('SecurityInstance',
+                                  ['iid', 'server_uri', 'ssid', 'bootstrap', 'mode', 'identity',
+                                   'secret_key'],
+                                  defaults=(None, False, SecurityMode.NoSec, b'', b''))):
+    OID = OID.Security
+
+    def resources(self):
+        result = [(RID.Security.ServerURI, self.server_uri),
+                  (RID.Security.Bootstrap, self.bootstrap),
+                  (RID.Security.Mode, self.mode.value),
+                  (RID.Security.PKOrIdentity, self.identity),
+                  (RID.Security.SecretKey, self.secret_key)]
+        if self.ssid is not None:
+            result.append((RID.Security.ShortServerID, self.ssid))
+        return result
+
+
+class ServerInstance(namedtuple('ServerInstance',
+                                ['iid', 'ssid', 'lifetime', 'binding', 'notification_storing',
+                                 'default_pmin', 'default_pmax'],
+                                defaults=(86400, 'U', True, None, None))):
+    OID = OID.Server
+
+    def resources(self):
+        result = [(RID.Server.ShortServerID, self.ssid),
+                  (RID.Server.Lifetime, self.lifetime),
+                  (RID.Server.NotificationStoring, self.notification_storing),
+                  (RID.Server.Binding, self.binding)]
+        if self.default_pmin is not None:
+            result.append((RID.Server.DefaultMinPeriod, self.default_pmin))
+        if self.default_pmax is not None:
+            result.append((RID.Server.DefaultMaxPeriod, self.default_pmax))
+        return result
+
+
+class AccessControlInstance(namedtuple('AccessControlInstance',
+                                       ['iid', 'target_oid', 'target_iid', 'acl', 'owner'])):
+    """
+    ACL is a mapping from Short Server IDs to access masks.
+    """
+    OID = OID.AccessControl
+
+    def resources(self):
+        return [(RID.AccessControl.TargetOID, self.target_oid),
+                (RID.AccessControl.TargetIID, self.target_iid),
+                (RID.AccessControl.ACL, sorted(self.acl.items())),
+                (RID.AccessControl.Owner, self.owner)]
+
+
+class BootstrapConfig:
+    """
+    Target configuration of the Security, Server and Access Control Objects.
+    If DELETE_ALL is True, everything except the Bootstrap Server Account is
+    deleted before writing the configuration.
+    """
+
+    def __init__(self, security=(), servers=(), access_control=(), delete_all=True):
+        self.security = list(security)
+        self.servers = list(servers)
+        self.access_control = list(access_control)
+        self.delete_all = delete_all
+
+    @classmethod
+    def with_servers(cls, server_uris, lifetime=86400, access_control=True):
+        """
+        Creates a configuration of LwM2M Servers with SERVER_URIS, with
+        consecutive Short Server IDs starting from 1. If ACCESS_CONTROL is
+        True, every server is granted full access to the Device Object
+        instance.
+        """
+        security = []
+        servers = []
+        acl = {}
+        for index, uri in enumerate(server_uris):
+            ssid = index + 1
+            security.append(SecurityInstance(iid=ssid, server_uri=uri, ssid=ssid))
+            servers.append(ServerInstance(iid=ssid, ssid=ssid, lifetime=lifetime))
+            acl[ssid] = 0b11111
+        access_control_instances = []
+        if access_control and acl:
+            access_control_instances.append(AccessControlInstance(
+                iid=0, target_oid=OID.Device, target_iid=0, acl=acl, owner=min(acl)))
+        return cls(security, servers, access_control_instances)
+
+    def objects(self):
+        """
+        Returns (OID, instances) pairs, in the order they shall be written.
+        """
+        return [(oid, instances)
+                for oid, instances in ((OID.Security, self.security),
+                                       (OID.Server, self.servers),
+                                       (OID.AccessControl, self.access_control))
+                if instances]
+
+
+def _tlv_encode_instance(instance):
+    resources = []
+    for rid, value in instance.resources():
+        if isinstance(value, list):
+            resources.append(TLV.make_multires(rid, value))
+        else:
+            resources.append(TLV.make_resource(rid, value))
+    return TLV.make_instance(instance.iid, resources).serialize()
+
+
+def _senml_value_label(value):
+    if isinstance(value, bool):
+        return SenmlLabel.BOOL
+    if isinstance(value, str):
+        return SenmlLabel.STRING
+    if isinstance(value, bytes):
+        return SenmlLabel.OPAQUE
+    return SenmlLabel.VALUE
+
+
+def _senml_cbor_records(instance):
+    records = []
+    for rid, value in instance.resources():
+        path = '/%d/%d/%d' % (instance.OID, instance.iid, rid)
+        entries = ([('%s/%d' % (path, riid), riid_value) for riid, riid_value in value]
+                   if isinstance(value, list) else [(path, value)])
+        for name, entry_value in entries:
+            records.append({SenmlLabel.NAME: name,
+                            _senml_value_label(entry_value): entry_value})
+    return records
+
+
+def encode_instances(instances, format=coap.ContentFormat.APPLICATION_LWM2M_TLV):
+    """
+    Encodes INSTANCES of a single Object as a Bootstrap-Write payload.
+    """
+    if format == coap.ContentFormat.APPLICATION_LWM2M_TLV:
+        return b''.join(_tlv_encode_instance(instance) for instance in instances)
+    elif format == coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR:
+        return CBOR.serialize([record for instance in instances
+                               for record in _senml_cbor_records(instance)])
+    raise ValueError('unsupported Bootstrap-Write format: %r' % (format,))
+
+
+BootstrapStep = NamedTuple('BootstrapStep', [('operation', str),
+                                             ('path', str),
+                                             ('request', coap.Packet),
+                                             ('expected_response_cls', type)])
+
+StepTiming = NamedTuple('StepTiming', [('operation', str),
+                                       ('path', str),
+                                       ('sent_at', float),
+                                       ('duration', float)])
+
+
+class BootstrapTiming:
+    """
+    Times of all steps of a single bootstrap sequence, in seconds. SENT_AT of
+    each step is relative to the start of the sequence.
+    """
+
+    def __init__(self, steps: List[StepTiming], total: float):
+        self.steps = steps
+        self.total = total
+
+    def step(self, operation, path=None):
+        return next(step for step in self.steps
+                    if step.operation == operation and step.path == path)
+
+    def __repr__(self):
+        return 'BootstrapTiming(total=%.6f, steps=%r)' % (self.total, self.steps)
+
+
+class BootstrapDriver:
+    """
+    Provisions a BootstrapConfig through SERVER, which shall be the
+    Bootstrap Server the demo sent its Bootstrap-Request to.
+
+    Up to NSTART requests are kept in flight at a time; NSTART=1 results in the
+    traditional, step-by-step bootstrap sequence. Bootstrap-Delete and
+    Bootstrap-Finish are always sent alone: no other request is sent until
+    they are acknowledged, and they are sent only after all previous requests
+    are acknowledged, so that the client cannot process a Bootstrap-Write
+    before a preceding Bootstrap-Delete even if packets are reordered.
+
+    Requests are never retransmitted, so the driver is not suitable for
+    lossy links.
+
+    If PER_OBJECT is True, all instances of an Object are written with
+    a single Bootstrap-Write on the Object path instead of one request per
+    instance.
+    """
+
+    def __init__(self, server, nstart=1, format=coap.ContentFormat.APPLICATION_LWM2M_TLV,
+                 per_object=False, timeout_s=5.0):
+        if nstart < 1:
+            raise ValueError('NSTART must be positive')
+        self.server = server
+        self.nstart = nstart
+        self.format = format
+        self.per_object = per_object
+        self.timeout_s = timeout_s
+
+    def steps(self, config):
+        """
+        Returns the list of BootstrapSteps (excluding Bootstrap-Finish) that
+        provision CONFIG.
+        """
+        result = []
+        if config.delete_all:
+            result.append(BootstrapStep('delete', '/', Lwm2mDelete('/'), Lwm2mDeleted))
+        for oid, instances in config.objects():
+            if self.per_object:
+                groups = [('/%d' % (oid,), instances)]
+            else:
+                groups = [('/%d/%d' % (oid, instance.iid), [instance]) for instance in instances]
+            for path, group in groups:
+                result.append(BootstrapStep(
+                    'write', path,
+                    Lwm2mWrite(path, encode_instances(group, self.format), format=self.format),
+                    Lwm2mChanged))
+        return result
+
+    def run(self, config, finish=True):
+        """
+        Provisions CONFIG and, if FINISH is True, sends Bootstrap-Finish.
+        Raises AssertionError if any request is not answered with the expected
+        success response, or socket.timeout if a response does not arrive in
+        time. Returns BootstrapTiming of the whole sequence.
+        """
+        steps = collections.deque(self.steps(config))
+        timings = []
+        in_flight = {}
+
+        start = time.perf_counter()
+        while steps or in_flight:
+            while (steps and len(in_flight) < self.nstart
+                   and not self._waiting_for_barrier(steps[0], in_flight)):
+                step = steps.popleft()
+                step.request.fill_placeholders()
+                in_flight[step.request.msg_id] = (step, time.perf_counter())
+                self.server.send(step.request)
+
+            res = self.server.recv(timeout_s=self.timeout_s)
+            if res.msg_id not in in_flight:
+                raise AssertionError('unexpected message during bootstrap: %r' % (res,))
+            step, sent_at = in_flight.pop(res.msg_id)
+            self._check_response(step, res)
+            timings.append(StepTiming(step.operation, step.path, sent_at - start,
+                                      time.perf_counter() - sent_at))
+
+        if finish:
+            req = Lwm2mBootstrapFinish()
+            sent_at = time.perf_counter()
+            self.server.send(req)
+            self._check_response(BootstrapStep('finish', None, req, Lwm2mChanged),
+                                 self.server.recv(timeout_s=self.timeout_s))
+            timings.append(StepTiming('finish', None, sent_at - start,
+                                      time.perf_counter() - sent_at))
+
+        return BootstrapTiming(timings, time.perf_counter() - start)
+
+    @staticmethod
+    def _waiting_for_barrier(next_step, in_flight):
+        """
+        Returns True if NEXT_STEP cannot be sent until requests currently
+        IN_FLIGHT are acknowledged, because either of them is a
+        Bootstrap-Delete.
+        """
+        if not in_flight:
+            return False
+        return (next_step.operation == 'delete'
+                or any(step.operation == 'delete' for step, _ in in_flight.values()))
+
+    @staticmethod
+    def _check_response(step, res):
+        if (not isinstance(res, step.expected_response_cls)
+                or res.token != step.request.token):
+            raise AssertionError('%s %s failed: expected %s, got %r'
+                                 % (step.operation, step.path or '',
+                                    step.expected_response_cls.__name__, res))
@@ -81,7 +81,8 @@ class CoapFileServer:
 
         # Confirmable GET request
         path = req.get_uri_path()
-        if path not in self._resources:
+        resource = self.get_resource(path)
+        if resource is None:
             self._server.send(Lwm2mErrorResponse.matching(req)(
                 code=coap.Code.RES_NOT_FOUND).fill_placeholders())
             return
@@ -94,17 +95,28 @@ class CoapFileServer:
             block2 = coap.Option.BLOCK2(
                 seq_num=0, has_more=False, block_size=1024)
 
-        resource = self._resources[path]
+        self.send_block(req, path, resource, block2)
+
+    def get_resource(self, path: CoapPath):
+        return self._resources.get(path)
+
+    def send_block(self, req, path, resource, block2):
+        """
+        Responds to REQ with a block of RESOURCE data requested with BLOCK2
+        option. Returns the content sent.
+        """
         data_offset = block2.seq_num() * block2.block_size()
         res_block2 = coap.Option.BLOCK2(seq_num=block2.seq_num(),
                                         has_more=data_offset + block2.block_size() < len(
                                             resource.data),
                                         block_size=block2.block_size())
-        content = resource.data[data_offset:data_offset + block2.block_size()]
+        content = bytes(resource.data[data_offset:data_offset + block2.block_size()])
 
-        self._server.send(Lwm2mContent.matching(req)(content=content,
-                                                     options=[res_block2,
-                                                              coap.Option.ETAG(resource.etag)]))
+        options = [res_block2]
+        if resource.etag:
+            options.append(coap.Option.ETAG(resource.etag))
+        self._server.send(Lwm2mContent.matching(req)(content=content, options=options))
+        return content
 
     def handle_request(self, timeout_s=5.0):
         self.handle_recvd_request(self._recv_request(timeout_s=timeout_s))
@@ -0,0 +1,542 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+Firmware origin server: serves firmware packages (or any other files) over
+HTTP(S) and, optionally, CoAP(s), from a single set of resources.
+
+Resources are kept as memoryviews over in-memory data or memory-mapped files,
+so that serving a byte range never copies the whole image. Unthrottled
+transfers of file-backed resources over plain HTTP use socket.sendfile().
+Byte ranges (Range, If-Range) and ETag preconditions (If-Match, If-None-Match)
+are supported, so that download resumption may be tested without hand-written
+handlers.
+"""
+
+import contextlib
+import http
+import http.server
+import mmap
+import queue
+import re
+import socket
+import ssl
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import NamedTuple, Optional
+
+from .coap_file_server import CoapFileServer
+from .lwm2m import coap
+
+ThrottleProfile = NamedTuple('ThrottleProfile', [('chunk_size', int), ('delay_s', float)])
+ThrottleProfile.__doc__ = """
+Limits transfer rate by sending at most CHUNK_SIZE bytes at once and sleeping
+DELAY_S seconds before each chunk. For CoAP, only DELAY_S is used, as block
+size is chosen by the client.
+"""
+
+UNTHROTTLED = ThrottleProfile(chunk_size=2 ** 63 - 1, delay_s=0.0)
+# ~6.5 MB/s
+BROADBAND = ThrottleProfile(chunk_size=64 * 1024, delay_s=0.01)
+# ~160 kB/s
+CELLULAR = ThrottleProfile(chunk_size=16 * 1024, delay_s=0.1)
+# ~2 kB/s, slow enough to reliably interrupt downloads of a few kilobytes
+SLOW = ThrottleProfile(chunk_size=1024, delay_s=0.5)
+
+TransferStats = NamedTuple('TransferStats', [('protocol', str),
+                                             ('path', str),
+                                             ('status', object),
+                                             ('offset', int),
+                                             ('length', int),
+                                             ('bytes_sent', int),
+                                             ('duration_s', float),
+                                             ('request_headers', dict)])
+TransferStats.__doc__ = """
+Statistics of a single request handled by FirmwareOrigin. STATUS is an HTTP
+status code or a coap.Code. LENGTH is the number of bytes that were supposed
+to be sent; BYTES_SENT is lower if the transfer was interrupted. For CoAP,
+each block is a separate request. REQUEST_HEADERS maps HTTP request header
+names to values, and is empty for CoAP.
+"""
+
+
+class FirmwareResource:
+    def __init__(self,
+                 data: Optional[bytes] = None,
+                 file_path: Optional[str] = None,
+                 etag: Optional[bytes] = None,
+                 weak_etag: bool = False):
+        """
+        Creates a resource from either DATA or contents of FILE_PATH, which is
+        memory-mapped instead of being read. If ETAG is None, it is calculated
+        from the contents; an empty ETAG disables sending ETags altogether.
+        """
+        if (data is None) == (file_path is None):
+            raise ValueError('exactly one of data and file_path must be specified')
+
+        self.file = None
+        self._mmap = None
+        if file_path is not None:
+            self.file = open(file_path, 'rb')
+            try:
+                self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                data = self._mmap
+            except ValueError:
+                # empty files cannot be mapped
+                data = b''
+
+        self.data = memoryview(data).cast('B')
+        if etag is None:
+            etag = struct.pack('>I', zlib.crc32(self.data))
+        self.etag = etag
+        self.weak_etag = weak_etag
+        self._lock = threading.Lock()
+        # number of transfers in progress
+        self._users = 0
+        self._closed = False
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def http_etag(self) -> Optional[str]:
+        if not self.etag:
+            return None
+        return '%s"%s"' % ('W/' if self.weak_etag else '', self.etag.hex())
+
+    def acquire(self) -> bool:
+        """
+        Marks the resource as being served. Returns False if it has already
+        been closed; otherwise, release() must be called after the transfer.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if not self._closed or self._users > 0:
+                return
+        self._release_data()
+
+    def close(self):
+        """
+        Releases the data and unmaps and closes the file, if any. If the
+        resource is being served, this is deferred until the last transfer in
+        progress ends. The resource cannot be acquired afterwards.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._users > 0:
+                return
+        self._release_data()
+
+    def _release_data(self):
+        self.data.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _etag_list_matches(header, etag, weak_comparison):
+    if header.strip() == '*':
+        return etag is not None
+    if etag is None:
+        return False
+
+    def opaque(tag):
+        if weak_comparison and tag.startswith('W/'):
+            return tag[2:]
+        return tag
+
+    if not weak_comparison and etag.startswith('W/'):
+        return False
+    return any(opaque(tag.strip()) == opaque(etag) for tag in header.split(','))
+
+
+def _parse_range(header, size):
+    """
+    Parses a single "bytes" range. Returns a (first, last) tuple of byte
+    indices, None if the header should be ignored, or () if the range is not
+    satisfiable.
+    """
+    match = re.fullmatch(r'\s*bytes\s*=\s*([0-9]*)\s*-\s*([0-9]*)\s*', header)
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+
+    if match.group(1) == '':
+        # suffix range: last N bytes
+        suffix = int(match.group(2))
+        if suffix == 0 or size == 0:
+            return ()
+        return (max(size - suffix, 0), size - 1)
+
+    first = int(match.group(1))
+    last = int(match.group(2)) if match.group(2) else size - 1
+    if last < first:
+        return None
+    if first >= size:
+        return ()
+    return (first, min(last, size - 1))
+
+
+class _HttpRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def log_message(self, *args, **kwargs):
+        # don't display logs
+        pass
+
+    def _serve(self, send_body):
+        origin = self.server.origin
+        start = time.perf_counter()
+        status, offset, length, bytes_sent = self._respond(origin, send_body)
+        origin.record_transfer(TransferStats(protocol=origin.http_scheme,
+                                             path=self.path,
+                                             status=status,
+                                             offset=offset,
+                                             length=length,
+                                             bytes_sent=bytes_sent,
+                                             duration_s=time.perf_counter() - start,
+                                             request_headers=dict(self.headers)))
+
+    def _respond_with_early_headers(self, origin, send_body):
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        # the body is delimited by closing the connection
+        self.close_connection = True
+
+        with origin._acquired_resource(self.path) as resource:
+            if resource is None or not send_body:
+                return http.HTTPStatus.OK, 0, 0, 0
+            return (http.HTTPStatus.OK, 0, len(resource),
+                    self._send_body(resource, 0, len(resource), origin.throttle))
+
+    def _respond(self, origin, send_body):
+        if origin.early_headers:
+            return self._respond_with_early_headers(origin, send_body)
+
+        with origin._acquired_resource(self.path) as resource:
+            return self._respond_with_resource(origin, resource, send_body)
+
+    def _respond_with_resource(self, origin, resource, send_body):
+        if resource is None:
+            self.send_error(http.HTTPStatus.NOT_FOUND)
+            return http.HTTPStatus.NOT_FOUND, 0, 0, 0
+
+        etag = resource.http_etag
+        if ('If-Match' in self.headers
+                and not _etag_list_matches(self.headers['If-Match'], etag, False)):
+            self.send_error(http.HTTPStatus.PRECONDITION_FAILED)
+            return http.HTTPStatus.PRECONDITION_FAILED, 0, 0, 0
+        if ('If-None-Match' in self.headers
+                and _etag_list_matches(self.headers['If-None-Match'], etag, True)):
+            self.send_response(http.HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return http.HTTPStatus.NOT_MODIFIED, 0, 0, 0
+
+        size = len(resource)
+        byte_range = None
+        if (origin.accept_ranges
+                and 'Range' in self.headers
+                and ('If-Range' not in self.headers
+                     or (etag is not None and not resource.weak_etag
+                         and self.headers['If-Range'].strip() == etag))):
+            byte_range = _parse_range(self.headers['Range'], size)
+
+        if byte_range == ():
+            self.send_response(http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', 'bytes */%d' % (size,))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, 0, 0, 0
+
+        if byte_range is None:
+            status = http.HTTPStatus.OK
+            first, last = 0, size - 1
+        else:
+            status = http.HTTPStatus.PARTIAL_CONTENT
+            first, last = byte_range
+        length = last - first + 1
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(length))
+        if origin.accept_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if status == http.HTTPStatus.PARTIAL_CONTENT:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (first, last, size))
+        self.end_headers()
+
+        bytes_sent = 0
+        if send_body:
+            bytes_sent = self._send_body(resource, first, length, origin.throttle)
+        return status, first, length, bytes_sent
+
+    def _send_body(self, resource, offset, length, throttle):
+        bytes_sent = 0
+        try:
+            if (resource.file is not None and throttle.delay_s <= 0
+                    and not isinstance(self.connection, ssl.SSLSocket)):
+                # TLS sockets would fall back to seeking and reading the file
+                # object shared by all transfers, so they use the mapping
+                return self.connection.sendfile(resource.file, offset, length)
+
+            while bytes_sent < length:
+                chunk_size = min(throttle.chunk_size, length - bytes_sent)
+                if throttle.delay_s > 0:
+                    time.sleep(throttle.delay_s)
+                start = offset + bytes_sent
+                self.wfile.write(resource.data[start:start + chunk_size])
+                bytes_sent += chunk_size
+        except (BrokenPipeError, ConnectionResetError, ssl.SSLError):
+            # the client went away; this is expected when testing
+            # interrupted downloads
+            self.close_connection = True
+        return bytes_sent
+
+
+class _HttpServer(http.server.ThreadingHTTPServer):
+    # server_close() waits for all handlers, so that resources are not closed
+    # while still being sent
+    daemon_threads = False
+
+    def __init__(self, origin, *args, **kwargs):
+        self.origin = origin
+        super().__init__(*args, **kwargs)
+
+    def handle_error(self, *args, **kwargs):
+        # don't log errors caused by clients disconnecting abruptly
+        if not isinstance(sys.exc_info()[1], (ConnectionError, ssl.SSLError)):
+            super().handle_error(*args, **kwargs)
+
+
+class _CoapOriginFileServer(CoapFileServer):
+    def __init__(self, origin, coap_server):
+        super().__init__(coap_server)
+        self._origin = origin
+
+    def get_resource(self, path):
+        # released by send_block(), which is always called for resources found
+        return self._origin._acquire_resource(path)
+
+    def send_block(self, req, path, resource, block2):
+        start = time.perf_counter()
+        try:
+            if self._origin.throttle.delay_s > 0:
+                time.sleep(self._origin.throttle.delay_s)
+            content = super().send_block(req, path, resource, block2)
+        finally:
+            resource.release()
+        self._origin.record_transfer(
+            TransferStats(protocol=self._origin.coap_scheme,
+                          path=path,
+                          status=coap.Code.RES_CONTENT,
+                          offset=block2.seq_num() * block2.block_size(),
+                          length=len(content),
+                          bytes_sent=len(content),
+                          duration_s=time.perf_counter() - start,
+                          request_headers={}))
+        return content
+
+
+class FirmwareOrigin:
+    """
+    Serves resources over HTTP (or HTTPS, if CERTFILE and KEYFILE are given)
+    and, if COAP_SERVER is given, over CoAP(s) as well. Each HTTP request is
+    handled in a separate thread.
+
+    get_resource() may be overridden to generate or defer responses; it is
+    called once for each HTTP request or CoAP block.
+
+    If EARLY_HEADERS is True, HTTP response headers are sent before calling
+    get_resource(), so that a client waiting for them is not blocked while
+    the response is deferred. Such responses carry no Content-Length, ETag or
+    range information, and the body is delimited by closing the connection.
+    """
+
+    def __init__(self,
+                 throttle: ThrottleProfile = UNTHROTTLED,
+                 accept_ranges: bool = True,
+                 certfile: Optional[str] = None,
+                 keyfile: Optional[str] = None,
+                 coap_server: Optional[coap.Server] = None,
+                 early_headers: bool = False):
+        self.throttle = throttle
+        self.accept_ranges = accept_ranges
+        self.early_headers = early_headers
+        self._resources = {}
+        self._stats = []
+        self._mutex = threading.Lock()
+
+        self.http_server = _HttpServer(self, ('', 0), _HttpRequestHandler)
+        self.http_scheme = 'http'
+        if certfile is not None:
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+            self.http_server.socket = ssl_context.wrap_socket(self.http_server.socket,
+                                                              server_side=True)
+            self.http_scheme = 'https'
+        self._http_thread = threading.Thread(target=self.http_server.serve_forever)
+
+        self.coap_file_server = None
+        self.coap_scheme = None
+        self._coap_thread = None
+        self._coap_reset_requests = queue.Queue()
+        self._shutdown = False
+        if coap_server is not None:
+            self.coap_scheme = 'coaps' if isinstance(coap_server, coap.TlsServer) else 'coap'
+            self.coap_file_server = _CoapOriginFileServer(self, coap_server)
+            self._coap_thread = threading.Thread(target=self._serve_coap)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _serve_coap(self):
+        # unlike CoapFileServerThread, this does not yield to other threads
+        # between requests, as nothing else uses the CoAP server meanwhile
+        while not self._shutdown:
+            try:
+                done = self._coap_reset_requests.get_nowait()
+                self.coap_file_server._server.reset()
+                done.set()
+            except queue.Empty:
+                pass
+
+            try:
+                self.coap_file_server.handle_request(timeout_s=0.1)
+            except socket.timeout:
+                pass
+
+    def reset_coap_peer(self):
+        """
+        Makes the CoAP server accept requests from a new client endpoint, e.g.
+        after a download finished. Blocks until the server is reset.
+        """
+        done = threading.Event()
+        self._coap_reset_requests.put(done)
+        done.wait()
+
+    def start(self):
+        self._http_thread.start()
+        if self._coap_thread is not None:
+            self._coap_thread.start()
+
+    def stop(self):
+        try:
+            if self._coap_thread is not None:
+                self._shutdown = True
+                self._coap_thread.join()
+                self.coap_file_server._server.close()
+        finally:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self._http_thread.join()
+            with self._mutex:
+                for resource in self._resources.values():
+                    resource.close()
+                self._resources.clear()
+
+    def set_resource(self, path: str, *args, **kwargs) -> FirmwareResource:
+        """
+        Makes a resource available at PATH. Arguments are passed to the
+        FirmwareResource constructor; a FirmwareResource instance may be
+        passed instead. Passing None removes the resource. The replaced resource
+        is closed once all transfers of it that are in progress end.
+        """
+        resource = None
+        if args and (args[0] is None or isinstance(args[0], FirmwareResource)):
+            resource = args[0]
+        else:
+            resource = FirmwareResource(*args, **kwargs)
+
+        with self._mutex:
+            old_resource = self._resources.pop(path, None)
+            if resource is not None:
+                self._resources[path] = resource
+        if old_resource is not None and old_resource is not resource:
+            old_resource.close()
+        return resource
+
+    def get_resource(self, path: str) -> Optional[FirmwareResource]:
+        with self._mutex:
+            return self._resources.get(path)
+
+    def _acquire_resource(self, path: str) -> Optional[FirmwareResource]:
+        """
+        Returns the resource at PATH, acquired so that replacing it with
+        set_resource() does not close it while it is being served.
+        """
+        closed = None
+        while True:
+            resource = self.get_resource(path)
+            if resource is None or resource is closed:
+                return None
+            if resource.acquire():
+                return resource
+            # replaced in the meantime; look up the new one
+            closed = resource
+
+    @contextlib.contextmanager
+    def _acquired_resource(self, path: str):
+        resource = self._acquire_resource(path)
+        try:
+            yield resource
+        finally:
+            if resource is not None:
+                resource.release()
+
+    @property
+    def http_port(self):
+        return self.http_server.server_address[1]
+
+    def get_http_uri(self, path: str):
+        return '%s://127.0.0.1:%d%s' % (self.http_scheme, self.http_port, path)
+
+    def get_coap_uri(self, path: str):
+        if self.coap_file_server is None:
+            raise ValueError('CoAP server not configured')
+        port = self.coap_file_server._server.get_listen_port()
+        return '%s://127.0.0.1:%d%s' % (self.coap_scheme, port, path)
+
+    def record_transfer(self, stats: TransferStats):
+        with self._mutex:
+            self._stats.append(stats)
+
+    @property
+    def stats(self):
+        with self._mutex:
+            return list(self._stats)
+
+    def reset_stats(self):
+        with self._mutex:
+            self._stats.clear()
@@ -7,10 +7,21 @@
 # Licensed under the AVSystem-5-clause License.
 # See the attached LICENSE file for details.
 
+import atexit
 import binascii
 import enum
+import hashlib
+import mmap
+import os
+import shutil
 import struct
-from typing import Optional
+import tempfile
+import threading
+from typing import BinaryIO, Optional
+
+# size of chunks in which input files are checksummed and copied; packaging
+# never holds more than that in memory, regardless of the image size
+CHUNK_SIZE = 1024 * 1024
 
 
 @enum.unique
@@ -26,18 +37,220 @@ class FirmwareUpdateForcedError(enum.IntEnum):
     Defer = 8
 
 
+def make_firmware_package_metadata(crc: int,
+                                   magic: bytes = b'ANJAY_FW',
+                                   force_error: FirmwareUpdateForcedError = FirmwareUpdateForcedError.NoError,
+                                   version: int = 1):
+    assert len(magic) == 8
+    return struct.pack('>8sHHI', magic, version, force_error, crc)
+
+
 def make_firmware_package(binary: bytes,
                           magic: bytes = b'ANJAY_FW',
                           crc: Optional[int] = None,
                           force_error: FirmwareUpdateForcedError = FirmwareUpdateForcedError.NoError,
                           version: int = 1):
-    assert len(magic) == 8
-
     if crc is None:
         crc = binascii.crc32(binary)
 
-    meta = struct.pack('>8sHHI', magic, version, force_error, crc)
-    return meta + binary
+    return make_firmware_package_metadata(crc, magic=magic, force_error=force_error,
+                                          version=version) + binary
+
+
+def file_crc32(in_file: BinaryIO, chunk_size: int = CHUNK_SIZE):
+    """
+    Calculates CRC32 of IN_FILE contents from the current position until EOF,
+    reading at most CHUNK_SIZE bytes at once.
+    """
+    crc = 0
+    while True:
+        chunk = in_file.read(chunk_size)
+        if not chunk:
+            return crc
+        crc = binascii.crc32(chunk, crc)
+
+
+def _copy_file_contents(in_file: BinaryIO, out_file: BinaryIO, offset: int):
+    """
+    Copies IN_FILE contents starting at OFFSET until EOF to the current
+    position of OUT_FILE, without passing the data through Python if possible.
+    """
+    out_file.flush()
+    in_fd = in_file.fileno()
+    out_fd = out_file.fileno()
+
+    copy_funcs = []
+    if hasattr(os, 'copy_file_range'):
+        copy_funcs.append(lambda offset: os.copy_file_range(in_fd, out_fd, CHUNK_SIZE, offset))
+    if hasattr(os, 'sendfile'):
+        copy_funcs.append(lambda offset: os.sendfile(out_fd, in_fd, offset, CHUNK_SIZE))
+
+    for copy in copy_funcs:
+        try:
+            while True:
+                copied = copy(offset)
+                if copied == 0:
+                    return
+                offset += copied
+        except OSError:
+            # not supported for this pair of files, e.g. if OUT_FILE is
+            # a pipe or the files are on different file systems; nothing
+            # has been copied by the failed call, so try the next method
+            pass
+
+    in_file.seek(offset)
+    shutil.copyfileobj(in_file, out_file, CHUNK_SIZE)
+
+
+def write_firmware_package(in_file: BinaryIO,
+                           out_file: BinaryIO,
+                           magic: bytes = b'ANJAY_FW',
+                           crc: Optional[int] = None,
+                           force_error: FirmwareUpdateForcedError = FirmwareUpdateForcedError.NoError,
+                           version: int = 1):
+    """
+    Streaming equivalent of make_firmware_package(): writes a package made of
+    IN_FILE contents (from the current position until EOF) to OUT_FILE, using
+    a constant amount of memory.
+
+    If IN_FILE is not seekable, e.g. it is a pipe, its contents are spooled
+    to a temporary file first, as they need to be read twice.
+    """
+    if not in_file.seekable():
+        with tempfile.TemporaryFile() as spool:
+            shutil.copyfileobj(in_file, spool, CHUNK_SIZE)
+            spool.seek(0)
+            return write_firmware_package(spool, out_file, magic=magic, crc=crc,
+                                          force_error=force_error, version=version)
+
+    start = in_file.tell()
+    if crc is None:
+        crc = file_crc32(in_file)
+
+    out_file.write(make_firmware_package_metadata(crc, magic=magic, force_error=force_error,
+                                                  version=version))
+    _copy_file_contents(in_file, out_file, start)
+    out_file.flush()
+
+
+class FirmwarePackageCache:
+    """
+    Stores packages built with write_firmware_package() in a directory, so that
+    identical packages are only built once. Packages are identified by the
+    digest of the input file and the package options, so modifying the input
+    file results in a new package being built.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Uses CACHE_DIR, created if it does not exist, or a temporary directory
+        removed by close() if CACHE_DIR is None.
+        """
+        self._owns_dir = cache_dir is None
+        if cache_dir is None:
+            cache_dir = tempfile.mkdtemp(prefix='anjay-fw-packages-')
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        # (path, device, inode, size, mtime) -> digest
+        self._digests = {}
+        # package path -> (memoryview, mmap) pair returned by get_view()
+        self._views = {}
+
+    def _input_digest(self, in_path: str):
+        st = os.stat(in_path)
+        file_id = (os.path.realpath(in_path), st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        if file_id not in self._digests:
+            digest = hashlib.sha256()
+            with open(in_path, 'rb') as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+            self._digests[file_id] = digest.hexdigest()
+        return self._digests[file_id]
+
+    def get_path(self,
+                 in_path: str,
+                 magic: bytes = b'ANJAY_FW',
+                 crc: Optional[int] = None,
+                 force_error: FirmwareUpdateForcedError = FirmwareUpdateForcedError.NoError,
+                 version: int = 1):
+        """
+        Returns the path to a package made of IN_PATH contents, building it if
+        necessary. The returned file must not be modified.
+        """
+        with self._lock:
+            options = repr((magic, crc, int(force_error), version)).encode()
+            key = hashlib.sha256(self._input_digest(in_path).encode() + options).hexdigest()
+            path = os.path.join(self.cache_dir, key + '.pkg')
+            if not os.path.exists(path):
+                with open(in_path, 'rb') as in_file, \
+                        tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False) as out_file:
+                    try:
+                        write_firmware_package(in_file, out_file, magic=magic, crc=crc,
+                                               force_error=force_error, version=version)
+                    except BaseException:
+                        os.unlink(out_file.name)
+                        raise
+                os.replace(out_file.name, path)
+            return path
+
+    def get_view(self, in_path: str, **kwargs):
+        """
+        Returns a read-only memoryview of a package made of IN_PATH contents,
+        backed by a memory-mapped cache file. KWARGS are passed to get_path().
+        Each package is mapped only once, so repeated calls for the same
+        package return the same view, which remains valid until close() is
+        called.
+        """
+        path = self.get_path(in_path, **kwargs)
+        with self._lock:
+            if path not in self._views:
+                with open(path, 'rb') as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._views[path] = (memoryview(mapping), mapping)
+            return self._views[path][0]
+
+    def close(self):
+        """
+        Releases all views returned by get_view() and removes the cache
+        directory, if it was created by the cache itself. Views derived from
+        them must have been released before.
+        """
+        with self._lock:
+            views, self._views = self._views, {}
+        for view, mapping in views.values():
+            view.release()
+            mapping.close()
+        if self._owns_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def firmware_package_cache():
+    """
+    Returns the cache shared by all tests run by this process, removed at exit.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FirmwarePackageCache()
+            atexit.register(_default_cache.close)
+        return _default_cache
+
+
+def build_firmware_package(in_path: str, **kwargs):
+    return firmware_package_cache().get_path(in_path, **kwargs)
+
+
+def map_firmware_package(in_path: str, **kwargs):
+    return firmware_package_cache().get_view(in_path, **kwargs)
 
 
 if __name__ == '__main__':
@@ -72,8 +285,8 @@ if __name__ == '__main__':
     args.force_error = FirmwareUpdateForcedError.__members__[args.force_error]
 
     with open(args.in_file, 'rb') as in_file, open(args.out_file, 'wb') as out_file:
-        out_file.write(make_firmware_package(in_file.read(),
-                                             magic=args.magic.encode('ascii'),
-                                             crc=args.crc,
-                                             force_error=args.force_error,
-                                             version=args.version))
+        write_firmware_package(in_file, out_file,
+                               magic=args.magic.encode('ascii'),
+                               crc=args.crc,
+                               force_error=args.force_error,
+                               version=args.version)
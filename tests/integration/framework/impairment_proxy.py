@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+UDP and TCP proxies that impair traffic between the demo and a test server,
+emulating constrained links (e.g. NB-IoT or LTE-M) on the loopback interface.
+
+Each direction of the link is described by a LinkProfile. All random
+decisions are taken using a seeded random.Random instance, so that a given
+sequence of packets is always impaired in the same way.
+"""
+
+import enum
+import heapq
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from typing import Callable, NamedTuple, Optional, Tuple
+
+LatencyDistribution = Callable[[random.Random], float]
+
+
+def constant_latency(delay_s: float) -> LatencyDistribution:
+    return lambda rng: delay_s
+
+
+def uniform_latency(min_s: float, max_s: float) -> LatencyDistribution:
+    return lambda rng: rng.uniform(min_s, max_s)
+
+
+def normal_latency(mean_s: float, stddev_s: float) -> LatencyDistribution:
+    return lambda rng: max(0.0, rng.gauss(mean_s, stddev_s))
+
+
+def pareto_latency(min_s: float, alpha: float, max_s: float = float('inf')) -> LatencyDistribution:
+    """
+    Heavy-tailed distribution, typical for links with MAC-layer retransmissions
+    and paging: most packets arrive after about MIN_S, but some take
+    significantly longer (up to MAX_S).
+    """
+    return lambda rng: min(max_s, min_s * rng.paretovariate(alpha))
+
+
+LinkProfile = NamedTuple('LinkProfile', [('latency', LatencyDistribution),
+                                         ('loss', float),
+                                         ('duplicate', float),
+                                         ('reorder', float),
+                                         ('bandwidth_bps', Optional[int])])
+LinkProfile.__doc__ = """
+Impairments applied to a single direction of a link:
+
+- LATENCY - one-way delay, sampled independently for each packet,
+- LOSS, DUPLICATE - probability of dropping or duplicating a datagram,
+- REORDER - probability of sending a datagram immediately, overtaking any
+  packets that are still delayed,
+- BANDWIDTH_BPS - link capacity in bits per second, or None if unlimited.
+  Packets are serialized one after another, so bursts queue up.
+
+For TCP, only LATENCY and BANDWIDTH_BPS are used, as the byte stream is
+always delivered reliably and in order.
+"""
+
+PERFECT = LinkProfile(latency=constant_latency(0.0), loss=0.0, duplicate=0.0, reorder=0.0,
+                      bandwidth_bps=None)
+# ~100-200 ms RTT, ~375 kbit/s
+LTE_M = LinkProfile(latency=normal_latency(0.075, 0.025), loss=0.005, duplicate=0.0,
+                    reorder=0.0, bandwidth_bps=375000)
+# multi-second RTT, ~25 kbit/s
+NB_IOT = LinkProfile(latency=pareto_latency(0.8, 2.5, max_s=5.0), loss=0.02, duplicate=0.005,
+                     reorder=0.01, bandwidth_bps=25000)
+
+
+class Direction(enum.Enum):
+    # demo -> server
+    UPLINK = 'uplink'
+    # server -> demo
+    DOWNLINK = 'downlink'
+
+
+LinkStats = NamedTuple('LinkStats', [('packets', int),
+                                     ('bytes', int),
+                                     ('dropped', int),
+                                     ('duplicated', int),
+                                     ('reordered', int),
+                                     ('delivered', int),
+                                     ('delivered_bytes', int)])
+LinkStats.__doc__ = """
+Counters of a single direction of the link. PACKETS and BYTES count what was
+received by the proxy; DELIVERED and DELIVERED_BYTES count what was actually
+forwarded, including duplicates. For TCP, "packets" are recv() results.
+"""
+
+
+class _Link:
+    """
+    Decides when (and whether) each packet sent in one direction is delivered.
+    """
+
+    def __init__(self, profile: LinkProfile, rng: random.Random):
+        self.profile = profile
+        self.rng = rng
+        self.busy_until = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = dict.fromkeys(LinkStats._fields, 0)
+
+    def schedule(self, now, size, datagram=True):
+        """
+        Returns a list of delivery times of a packet of SIZE bytes received at
+        NOW. The list is empty if the packet is dropped.
+        """
+        self.stats['packets'] += 1
+        self.stats['bytes'] += size
+        if datagram and self.rng.random() < self.profile.loss:
+            self.stats['dropped'] += 1
+            return []
+
+        copies = 1
+        if datagram and self.rng.random() < self.profile.duplicate:
+            self.stats['duplicated'] += 1
+            copies = 2
+
+        result = []
+        for _ in range(copies):
+            sent_at = now
+            if self.profile.bandwidth_bps:
+                sent_at = max(now, self.busy_until) + size * 8 / self.profile.bandwidth_bps
+                self.busy_until = sent_at
+
+            if datagram and self.rng.random() < self.profile.reorder:
+                self.stats['reordered'] += 1
+                result.append(sent_at)
+            else:
+                result.append(sent_at + self.profile.latency(self.rng))
+        return result
+
+    def delivered(self, size):
+        self.stats['delivered'] += 1
+        self.stats['delivered_bytes'] += size
+
+
+class _ImpairmentProxy:
+    def __init__(self, target: Tuple[str, int], uplink: LinkProfile, downlink: Optional[LinkProfile],
+                 seed: int, rebind_interval_s: Optional[float], listen_port: int, use_ipv6: bool):
+        self.target = target
+        self.family = socket.AF_INET6 if use_ipv6 else socket.AF_INET
+        self.listen_addr = ('::1' if use_ipv6 else '127.0.0.1', listen_port)
+        self.rebind_interval_s = rebind_interval_s
+        self.rebinds = 0
+
+        rng = random.Random(seed)
+        self._links = {Direction.UPLINK: _Link(uplink, rng),
+                       Direction.DOWNLINK: _Link(downlink if downlink is not None else uplink, rng)}
+        self._queue = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._rebind_requests = []
+        self._stop_requested = False
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        assert self._thread is None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_requested = True
+            self._wake_up()
+            self._thread.join()
+            self._thread = None
+        self._close_sockets()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def get_listen_port(self) -> int:
+        raise NotImplementedError
+
+    def rebind(self):
+        """
+        Emulates NAT rebinding: traffic towards the server is sent from a new
+        source port from now on. Packets already delayed on the link are not
+        affected. Returns after the new port is in use.
+        """
+        if self._thread is None:
+            self._rebind()
+            self.rebinds += 1
+            return
+
+        done = threading.Event()
+        with self._lock:
+            self._rebind_requests.append(done)
+        self._wake_up()
+        done.wait()
+
+    def stats(self, direction: Direction) -> LinkStats:
+        with self._lock:
+            return LinkStats(**self._links[direction].stats)
+
+    def reset_stats(self):
+        with self._lock:
+            for link in self._links.values():
+                link.reset_stats()
+
+    def _wake_up(self):
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass
+
+    def _schedule(self, direction, data, key, datagram):
+        now = time.monotonic()
+        with self._lock:
+            deliver_at = self._links[direction].schedule(now, len(data), datagram=datagram)
+        for when in deliver_at:
+            when = self._adjust_delivery_time(direction, key, when)
+            heapq.heappush(self._queue, (when, self._seq, direction, key, data))
+            self._seq += 1
+
+    def _adjust_delivery_time(self, direction, key, when):
+        return when
+
+    def _run(self):
+        next_rebind = (time.monotonic() + self.rebind_interval_s
+                       if self.rebind_interval_s else None)
+        while not self._stop_requested:
+            now = time.monotonic()
+            with self._lock:
+                requests, self._rebind_requests = self._rebind_requests, []
+            if next_rebind is not None and now >= next_rebind:
+                requests.append(None)
+                next_rebind = now + self.rebind_interval_s
+            if requests:
+                self._rebind()
+                self.rebinds += 1
+                for done in requests:
+                    if done is not None:
+                        done.set()
+
+            while self._queue and self._queue[0][0] <= now:
+                _, _, direction, key, data = heapq.heappop(self._queue)
+                if self._deliver(direction, key, data):
+                    with self._lock:
+                        self._links[direction].delivered(len(data or b''))
+
+            deadlines = [t for t in (self._queue[0][0] if self._queue else None, next_rebind)
+                         if t is not None]
+            timeout_s = max(0.0, min(deadlines) - now) if deadlines else None
+            readable, _, _ = select.select(self._sockets() + [self._wakeup_r], [], [], timeout_s)
+            for sock in readable:
+                if sock is self._wakeup_r:
+                    self._wakeup_r.recv(4096)
+                else:
+                    self._on_readable(sock)
+
+    def _sockets(self):
+        raise NotImplementedError
+
+    def _on_readable(self, sock):
+        raise NotImplementedError
+
+    def _deliver(self, direction, key, data) -> bool:
+        raise NotImplementedError
+
+    def _rebind(self):
+        raise NotImplementedError
+
+    def _close_sockets(self):
+        raise NotImplementedError
+
+
+class UdpImpairmentProxy(_ImpairmentProxy):
+    """
+    Forwards datagrams between the demo, which should be configured to send them
+    to get_listen_port(), and a server listening at TARGET.
+
+    The proxy talks to the server from a single socket; if the demo changes its
+    source port, replies are sent to the most recent one.
+    """
+
+    def __init__(self, target: Tuple[str, int], uplink: LinkProfile = PERFECT,
+                 downlink: Optional[LinkProfile] = None, seed: int = 0,
+                 rebind_interval_s: Optional[float] = None, listen_port: int = 0,
+                 use_ipv6: bool = False):
+        super().__init__(target, uplink, downlink, seed, rebind_interval_s, listen_port, use_ipv6)
+        self._client_addr = None
+        self._downstream = socket.socket(self.family, socket.SOCK_DGRAM)
+        self._downstream.bind(self.listen_addr)
+        self._upstream = self._make_upstream_socket()
+
+    def get_listen_port(self) -> int:
+        return self._downstream.getsockname()[1]
+
+    def get_upstream_addr(self) -> Tuple[str, int]:
+        """
+        Returns the address the server sees the demo at.
+        """
+        return self._upstream.getsockname()
+
+    def _make_upstream_socket(self):
+        sock = socket.socket(self.family, socket.SOCK_DGRAM)
+        sock.connect(self.target)
+        return sock
+
+    def _sockets(self):
+        return [self._downstream, self._upstream]
+
+    def _on_readable(self, sock):
+        try:
+            if sock is self._downstream:
+                data, self._client_addr = sock.recvfrom(65536)
+                direction = Direction.UPLINK
+            else:
+                data = sock.recv(65536)
+                direction = Direction.DOWNLINK
+        except OSError:
+            # e.g. ECONNREFUSED caused by an ICMP Port Unreachable
+            return
+        self._schedule(direction, data, None, datagram=True)
+
+    def _deliver(self, direction, key, data):
+        try:
+            if direction == Direction.UPLINK:
+                self._upstream.send(data)
+            elif self._client_addr is not None:
+                self._downstream.sendto(data, self._client_addr)
+            else:
+                return False
+            return True
+        except OSError:
+            return False
+
+    def _rebind(self):
+        new_upstream = self._make_upstream_socket()
+        self._upstream.close()
+        self._upstream = new_upstream
+
+    def _close_sockets(self):
+        self._downstream.close()
+        self._upstream.close()
+
+
+class TcpImpairmentProxy(_ImpairmentProxy):
+    """
+    Accepts connections from the demo at get_listen_port() and opens
+    a corresponding connection to a server listening at TARGET for each of
+    them. Data and connection shutdowns are delayed according to the link
+    profiles; rebind() resets all connections, as a NAT would after losing
+    its mapping.
+    """
+
+    def __init__(self, target: Tuple[str, int], uplink: LinkProfile = PERFECT,
+                 downlink: Optional[LinkProfile] = None, seed: int = 0,
+                 rebind_interval_s: Optional[float] = None, listen_port: int = 0,
+                 use_ipv6: bool = False):
+        super().__init__(target, uplink, downlink, seed, rebind_interval_s, listen_port, use_ipv6)
+        self._listen_socket = socket.socket(self.family, socket.SOCK_STREAM)
+        self._listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen_socket.bind(self.listen_addr)
+        self._listen_socket.listen()
+        # socket -> (peer socket, direction of data read from socket)
+        self._peers = {}
+        # (direction, peer socket) -> time of the most recent scheduled delivery
+        self._last_delivery = {}
+        # sockets that already had their write side shut down
+        self._shut_down = set()
+
+    def get_listen_port(self) -> int:
+        return self._listen_socket.getsockname()[1]
+
+    def _sockets(self):
+        return [self._listen_socket] + list(self._peers)
+
+    def _on_readable(self, sock):
+        if sock is self._listen_socket:
+            client, _ = sock.accept()
+            try:
+                upstream = socket.create_connection(self.target)
+            except OSError:
+                client.close()
+                return
+            self._peers[client] = (upstream, Direction.UPLINK)
+            self._peers[upstream] = (client, Direction.DOWNLINK)
+            return
+
+        peer, direction = self._peers[sock]
+        try:
+            data = sock.recv(65536)
+        except OSError:
+            data = b''
+        # empty data means EOF, which is forwarded as a delayed shutdown
+        self._schedule(direction, data, peer, datagram=False)
+        if not data:
+            del self._peers[sock]
+            self._close_if_finished(sock)
+
+    def _close_if_finished(self, sock):
+        if sock not in self._peers and sock in self._shut_down:
+            self._shut_down.remove(sock)
+            sock.close()
+
+    def _adjust_delivery_time(self, direction, key, when):
+        # the byte stream must not be reordered
+        when = max(when, self._last_delivery.get((direction, key), 0.0))
+        self._last_delivery[(direction, key)] = when
+        return when
+
+    def _deliver(self, direction, key, data):
+        try:
+            if data:
+                key.sendall(data)
+            else:
+                key.shutdown(socket.SHUT_WR)
+                self._shut_down.add(key)
+                self._close_if_finished(key)
+            return True
+        except OSError:
+            return False
+
+    def _rebind(self):
+        for sock in set(self._peers) | self._shut_down:
+            # send RST instead of FIN
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            sock.close()
+        self._peers.clear()
+        self._shut_down.clear()
+        self._last_delivery.clear()
+        self._queue.clear()
+
+    def _close_sockets(self):
+        for sock in set(self._peers) | self._shut_down:
+            sock.close()
+        self._peers.clear()
+        self._shut_down.clear()
+        self._listen_socket.close()
+
+
+def make_impairment_proxy(transport, target: Tuple[str, int], *args, **kwargs):
+    """
+    Creates an impairment proxy suitable for a server using TRANSPORT, which may
+    be either a string or a coap.Transport value.
+    """
+    if str(transport) == 'tcp':
+        return TcpImpairmentProxy(target, *args, **kwargs)
+    return UdpImpairmentProxy(target, *args, **kwargs)
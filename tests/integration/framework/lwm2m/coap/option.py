@@ -16,12 +16,16 @@ from .utils import hexlify_nonprintable
 
 
 class OptionLike(object):
+    __slots__ = ()
+
     def __init__(self, cls, number):
         self.cls = cls
         self.number = number
 
 
 class Option(OptionLike):
+    __slots__ = ('number', 'content')
+
     @staticmethod
     def powercmd_complete(text):
         from powercmd.utils import match_instance, get_available_instance_names
@@ -67,9 +71,13 @@ class Option(OptionLike):
         return opt
 
     def __init__(self, number, content=b''):
-        OptionLike.__init__(self, type(self), number)
+        self.number = number
         self.content = content
 
+    @property
+    def cls(self):
+        return type(self)
+
     @staticmethod
     def parse_ext_value(short_value, data):
         if short_value < 13:
@@ -170,6 +178,8 @@ class Option(OptionLike):
 
 
 class IntOption(Option):
+    __slots__ = ()
+
     @staticmethod
     def _pad_to_power_of_2_size(val):
         def _min_power_of_2_greater_or_equal(x):
@@ -209,18 +219,24 @@ class IntOption(Option):
 
 
 class StringOption(Option):
+    __slots__ = ()
+
     def __repr__(self):
         opt_name = Option.get_name_by_number(self.number)
         return 'coap.Option.%s(%s)' % (opt_name, repr(self.content_to_str()))
 
 
 class OpaqueOption(Option):
+    __slots__ = ()
+
     def __repr__(self):
         opt_name = Option.get_name_by_number(self.number)
         return 'coap.Option.%s(%s)' % (opt_name, repr(self.content_to_str()))
 
 
 class ContentFormatOption(IntOption):
+    __slots__ = ()
+
     @staticmethod
     def powercmd_complete(text):
         from powercmd.utils import get_available_instance_names
@@ -252,6 +268,8 @@ class ContentFormatOption(IntOption):
 
 
 class AcceptOption(ContentFormatOption):
+    __slots__ = ()
+
     @staticmethod
     def powercmd_parse(text):
         from powercmd.utils import match_instance
@@ -272,6 +290,8 @@ class OptionConstructor(OptionLike):
 
 
 class BlockOption(IntOption):
+    __slots__ = ()
+
     def seq_num(self):
         content = self.content_to_int()
         return content >> 4
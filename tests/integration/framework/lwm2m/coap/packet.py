@@ -118,18 +118,37 @@ def _parse_udp_header(packet):
     return Header(code, version, type, msg_id, token_length), at
 
 class Packet(object):
+    # Test scripts and nsh sessions may keep a lot of packets alive, so
+    # instances do not have a __dict__. Subclasses (see lwm2m.messages) are
+    # expected to declare __slots__ as well.
+    __slots__ = ('version', 'type', 'code', 'msg_id', 'token', '_options', 'content')
+
     def __init__(self, type=None, code=1, msg_id=0, token=b'', options=None, content=b'', version=1):
         self.version = version
         self.type = type
         self.code = code
         self.msg_id = msg_id
         self.token = token
-        self.options = sorted(options or [], key=operator.attrgetter('number')) if options is not ANY else ANY
+        self.options = options
         if content is ANY or content is None:
             self.content = content
         else:
             self.content = bytes(content)
 
+    @property
+    def options(self):
+        """
+        Tuple of options sorted by option number, or ANY.
+        """
+        return self._options
+
+    @options.setter
+    def options(self, options):
+        if options is ANY:
+            self._options = ANY
+        else:
+            self._options = tuple(sorted(options or (), key=operator.attrgetter('number')))
+
     def __repr__(self):
         return ('coap.Packet(type=%s,\n'
                 '            code=%s,\n'
@@ -192,7 +211,7 @@ class Packet(object):
         if header.token_length > 8:
             raise ValueError("invalid CoAP token length: %d, expected <= 8" % header.token_length)
 
-        token = packet[offset:offset+header.token_length]
+        token = bytes(packet[offset:offset+header.token_length])
         offset += header.token_length
 
         options = []
@@ -224,7 +243,7 @@ class Packet(object):
         if self.token is ANY:
             self.token = next(_TOKEN_GENERATOR)
         if self.options is ANY:
-            self.options = []
+            self.options = ()
         if self.content is ANY:
             self.content = b''
 
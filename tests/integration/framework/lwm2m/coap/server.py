@@ -278,7 +278,8 @@ class Server(object):
 class TlsServer(Server):
     def __init__(self, psk_identity=None, psk_key=None, ca_path=None, ca_file=None,
                  crt_file=None, key_file=None, listen_port=0, debug=False, use_ipv6=False,
-                 reuse_port=False, connection_id='', ciphersuites=None, transport=Transport.TCP):
+                 reuse_port=False, connection_id='', ciphersuites=None, transport=Transport.TCP,
+                 native_io=False):
         use_psk = (psk_identity and psk_key)
         use_certs = any((ca_path, ca_file, crt_file, key_file))
         if use_psk and use_certs:
@@ -304,7 +305,8 @@ class TlsServer(Server):
         if ciphersuites is not None:
             security.set_ciphersuites(ciphersuites)
 
-        self._pymbedtls_context = Context(security, debug, connection_id)
+        self._pymbedtls_context_args = (security, debug, connection_id, native_io)
+        self._pymbedtls_context = Context(*self._pymbedtls_context_args)
         self._security_mode = security.name()
 
         super().__init__(listen_port, use_ipv6, reuse_port=reuse_port, transport=transport)
@@ -313,6 +315,15 @@ class TlsServer(Server):
         raise NotImplementedError(
             'connect_to_client() not supported for DTLS servers')
 
+    def reset_session_cache(self) -> None:
+        """
+        Discards all (D)TLS sessions cached so far, so that the next handshake
+        cannot be a session resumption. Takes effect for connections accepted
+        after the next reset().
+        """
+        from pymbedtls import Context
+        self._pymbedtls_context = Context(*self._pymbedtls_context_args)
+
     @property
     def _raw_udp_socket(self) -> None:
         return self.socket.py_socket
@@ -7,7 +7,6 @@
 # Licensed under the AVSystem-5-clause License.
 # See the attached LICENSE file for details.
 
-import copy
 import functools
 import sys
 from typing import List, Optional, T
@@ -41,7 +40,8 @@ def concat_if_not_any(*lists: List[T]):
     if all(list is ANY for list in lists):
         return ANY
 
-    return sum((([] if list is ANY else list) for list in lists), [])
+    # option lists of existing packets are tuples, so sum(..., []) won't do
+    return [opt for list in lists if list is not ANY for opt in list]
 
 
 class Lwm2mMsg(coap.Packet):
@@ -49,18 +49,20 @@ class Lwm2mMsg(coap.Packet):
     Base class of all LWM2M messages.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_packet(cls, pkt: coap.Packet):
         if not cls._pkt_matches(pkt):
             raise TypeError('packet does not match %s' % (cls.__name__,))
 
-        msg = copy.copy(pkt)
-        # It's an awful hack that may explode if any Lwm2mMsg subclass
-        # introduces any fields not present in the coap.Packet class.
-        # Since all Lwm2mMsg subclasses are meant to be thin wrappers
-        # facilitating message creation/recognition, it should never be
-        # a problem.
-        msg.__class__ = cls
+        # Lwm2mMsg subclasses are thin wrappers facilitating message
+        # creation/recognition, so the new message just shares all (immutable
+        # or placeholder) field values of PKT instead of copying it. Any
+        # extra slots a subclass may introduce are left unset.
+        msg = object.__new__(cls)
+        for name in coap.Packet.__slots__:
+            setattr(msg, name, getattr(pkt, name))
         return msg
 
     @staticmethod
@@ -163,6 +165,8 @@ class Lwm2mResponse(Lwm2mMsg):
     Base class for all LWM2M responses.
     """
 
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(_pkt: coap.Packet):
         return False
@@ -204,6 +208,8 @@ def shorten(text):
 
 
 class Lwm2mRequestBootstrap(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         """Checks if the PKT is a LWM2M Request Bootstrap message."""
@@ -242,6 +248,8 @@ class Lwm2mRequestBootstrap(Lwm2mMsg):
 
 
 class Lwm2mBootstrapFinish(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         """Checks if the PKT is a LWM2M Bootstrap Finish message."""
@@ -292,6 +300,8 @@ def _split_string_path(path: str,
 
 
 class Lwm2mRegister(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         """Checks if the PKT is a LWM2M Register message."""
@@ -326,6 +336,8 @@ class Lwm2mRegister(Lwm2mMsg):
 
 
 class Lwm2mUpdate(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         """Checks if the PKT is a LWM2M Update message."""
@@ -365,6 +377,8 @@ class Lwm2mUpdate(Lwm2mMsg):
 
 
 class Lwm2mDeregister(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.CONFIRMABLE)
@@ -420,6 +434,8 @@ def add_attributes_to_query(query,
     return query
 
 class Lwm2mSend(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         """Checks if the PKT is a LWM2M Send message."""
@@ -455,6 +471,8 @@ class Lwm2mSend(Lwm2mMsg):
 
 
 class Lwm2mReadComposite(Lwm2mMsg):
+    __slots__ = ('_requested_paths',)
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.CONFIRMABLE)
@@ -500,6 +518,8 @@ class Lwm2mReadComposite(Lwm2mMsg):
 
 
 class Lwm2mObserveComposite(Lwm2mReadComposite):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (Lwm2mReadComposite._pkt_matches(pkt)
@@ -532,6 +552,8 @@ class Lwm2mObserveComposite(Lwm2mReadComposite):
 
 
 class CoapGet(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.CONFIRMABLE)
@@ -572,6 +594,8 @@ class CoapGet(Lwm2mMsg):
 
 
 class Lwm2mRead(CoapGet):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (CoapGet._pkt_matches(pkt)
@@ -603,6 +627,8 @@ class Lwm2mRead(CoapGet):
 
 
 class Lwm2mObserve(Lwm2mRead):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (Lwm2mRead._pkt_matches(pkt)
@@ -655,6 +681,8 @@ class Lwm2mObserve(Lwm2mRead):
 
 
 class Lwm2mDiscover(CoapGet):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (CoapGet._pkt_matches(pkt)
@@ -679,6 +707,8 @@ class Lwm2mDiscover(CoapGet):
 
 
 class Lwm2mWrite(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.CONFIRMABLE)
@@ -724,6 +754,8 @@ class Lwm2mWrite(Lwm2mMsg):
 
 
 class Lwm2mWriteComposite(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.CONFIRMABLE)
@@ -762,6 +794,8 @@ class Lwm2mWriteComposite(Lwm2mMsg):
 
 
 class Lwm2mWriteAttributes(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.CONFIRMABLE)
@@ -803,6 +837,8 @@ class Lwm2mWriteAttributes(Lwm2mMsg):
 
 
 class Lwm2mExecute(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.CONFIRMABLE)
@@ -833,6 +869,8 @@ class Lwm2mExecute(Lwm2mMsg):
 
 
 class Lwm2mCreate(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.CONFIRMABLE)
@@ -868,6 +906,8 @@ class Lwm2mCreate(Lwm2mMsg):
 
 
 class Lwm2mDelete(Lwm2mMsg):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         # TODO: this should be done by checking the packet source/target
@@ -904,6 +944,8 @@ class Lwm2mDelete(Lwm2mMsg):
 # Therefeore, msg_id and token in the constructor are mandatory.
 
 class Lwm2mContent(Lwm2mResponse):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return pkt.code == coap.Code.RES_CONTENT
@@ -946,6 +988,8 @@ class Lwm2mContent(Lwm2mResponse):
 
 
 class Lwm2mNotify(Lwm2mContent):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (Lwm2mContent._pkt_matches(pkt)
@@ -975,6 +1019,8 @@ class Lwm2mNotify(Lwm2mContent):
 
 
 class Lwm2mCreated(Lwm2mResponse):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return pkt.code == coap.Code.RES_CREATED
@@ -1002,6 +1048,8 @@ class Lwm2mCreated(Lwm2mResponse):
 
 
 class Lwm2mDeleted(Lwm2mResponse):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return pkt.code == coap.Code.RES_DELETED
@@ -1029,6 +1077,8 @@ class Lwm2mDeleted(Lwm2mResponse):
 
 
 class Lwm2mChanged(Lwm2mResponse):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return pkt.code == coap.Code.RES_CHANGED
@@ -1058,6 +1108,8 @@ class Lwm2mChanged(Lwm2mResponse):
 
 
 class Lwm2mErrorResponse(Lwm2mResponse):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.type in (None, coap.Type.ACKNOWLEDGEMENT)
@@ -1084,11 +1136,13 @@ class Lwm2mErrorResponse(Lwm2mResponse):
 
 
 class Lwm2mEmpty(Lwm2mResponse):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (pkt.code == coap.Code.EMPTY
                 and pkt.token == b''
-                and pkt.options == []
+                and not pkt.options
                 and pkt.content == b'')
 
     def __init__(self,
@@ -1105,6 +1159,8 @@ class Lwm2mEmpty(Lwm2mResponse):
 
 
 class Lwm2mReset(Lwm2mEmpty):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return (Lwm2mEmpty._pkt_matches(pkt)
@@ -1118,6 +1174,8 @@ class Lwm2mReset(Lwm2mEmpty):
 
 
 class Lwm2mContinue(Lwm2mResponse):
+    __slots__ = ()
+
     @staticmethod
     def _pkt_matches(pkt: coap.Packet):
         return pkt.code == coap.Code.RES_CONTINUE
@@ -1138,6 +1196,7 @@ class Lwm2mContinue(Lwm2mResponse):
             % (self.msg_id if self.msg_id is not None else 'None', self.token)
 
 
+@functools.lru_cache(maxsize=None)
 def _get_ordered_types_list():
     def _sequence_preserving_uniq(seq):
         seen = set()
@@ -1167,11 +1226,9 @@ def _get_ordered_types_list():
     return ordered_types
 
 
-TYPES = _get_ordered_types_list()
-
-
 def get_lwm2m_msg(pkt: coap.Packet):
-    for t in TYPES:
+    # the list is built on first use, so that importing this module stays cheap
+    for t in _get_ordered_types_list():
         try:
             return t.from_packet(pkt)
         except TypeError:
@@ -7,7 +7,6 @@
 # Licensed under the AVSystem-5-clause License.
 # See the attached LICENSE file for details.
 
-import cbor2
 import collections
 import enum
 import textwrap
@@ -72,10 +71,12 @@ class CborResource(dict):
 class CBOR:
     @staticmethod
     def parse(data) -> CborResourceList:
+        import cbor2
         return CborResourceList(CborResource(r) for r in cbor2.loads(data))
 
     @staticmethod
     def serialize(entries) -> bytes:
+        import cbor2
         entry_list = []
         for e in entries:
             entry = {}
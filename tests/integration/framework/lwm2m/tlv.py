@@ -13,6 +13,8 @@ from textwrap import indent
 
 
 class TLVType:
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -38,6 +40,10 @@ TLVType.RESOURCE_INSTANCE = TLVType(1)
 TLVType.MULTIPLE_RESOURCE = TLVType(2)
 TLVType.RESOURCE = TLVType(3)
 
+# indexed by the 2-bit type field, so that parsed TLVs share TLVType objects
+_TLV_TYPES = (TLVType.INSTANCE, TLVType.RESOURCE_INSTANCE, TLVType.MULTIPLE_RESOURCE,
+              TLVType.RESOURCE)
+
 
 class TLVList(list):
     def __str__(self):
@@ -49,6 +55,8 @@ class TLVList(list):
 
 
 class TLV:
+    __slots__ = ('tlv_type', 'identifier', 'value')
+
     class BytesDispenser:
         def __init__(self, data):
             self.data = data
@@ -139,7 +147,7 @@ class TLV:
     def _parse_internal(data):
         type_byte, = struct.unpack('!B', data.take(1))
 
-        tlv_type = TLVType((type_byte >> 6) & 0b11)
+        tlv_type = _TLV_TYPES[(type_byte >> 6) & 0b11]
         id_field_size = (type_byte >> 5) & 0b1
         length_field_size = (type_byte >> 3) & 0b11
 
@@ -0,0 +1,296 @@
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+Bounded message history and payload buffer used by nsh-lwm2m, designed so
+that the shell can stay attached to a chatty client for a long time without
+its memory usage or per-message cost growing.
+"""
+
+import binascii
+import collections
+import json
+import os
+import struct
+import time
+
+from lwm2m.coap.transport import Transport
+
+Send = collections.namedtuple('Send', ['msg'])
+Recv = collections.namedtuple('Recv', ['msg'])
+
+DEFAULT_HISTORY_SIZE = 10000
+
+# Actual client and server addresses are not tracked by the history, so all
+# messages are logged as CoAP/UDP datagrams exchanged between these ports on
+# the loopback interface.
+PCAP_SERVER_PORT = 5683
+PCAP_CLIENT_PORT = 56830
+
+_LINKTYPE_IPV4 = 228
+
+
+def _serialize(msg):
+    # messages received over CoAP/TCP have no CoAP type and cannot be
+    # serialized in the UDP format
+    transport = Transport.TCP if msg.type is None else Transport.UDP
+    return transport, msg.serialize(transport)
+
+
+class JsonlHistoryLog:
+    """
+    Writes one JSON object per line for each message: timestamp, direction,
+    message type, summary, transport and the hex-encoded serialized message.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a')
+
+    def write(self, entry, timestamp):
+        transport, data = _serialize(entry.msg)
+        record = {
+            'time': timestamp,
+            'direction': type(entry).__name__.lower(),
+            'type': type(entry.msg).__name__,
+            'summary': entry.msg.summary(),
+            'transport': transport.name,
+            'data': binascii.hexlify(data).decode('ascii'),
+        }
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class PcapHistoryLog:
+    """
+    Writes messages as a pcap capture (raw IPv4 link type) that can be opened
+    with Wireshark. Only CoAP/UDP messages are supported; messages received
+    over CoAP/TCP are skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, _LINKTYPE_IPV4))
+        self._file.flush()
+
+    @staticmethod
+    def _ipv4_checksum(header):
+        total = sum(struct.unpack('!10H', header))
+        total = (total & 0xffff) + (total >> 16)
+        total = (total & 0xffff) + (total >> 16)
+        return ~total & 0xffff
+
+    @staticmethod
+    def _make_datagram(payload, src_port, dst_port):
+        loopback = bytes([127, 0, 0, 1])
+        udp = struct.pack('!HHHH', src_port, dst_port, 8 + len(payload), 0) + payload
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0,
+                         loopback, loopback)
+        ip = ip[:10] + struct.pack('!H', PcapHistoryLog._ipv4_checksum(ip)) + ip[12:]
+        return ip + udp
+
+    def write(self, entry, timestamp):
+        if isinstance(entry, Send):
+            ports = (PCAP_SERVER_PORT, PCAP_CLIENT_PORT)
+        else:
+            ports = (PCAP_CLIENT_PORT, PCAP_SERVER_PORT)
+
+        transport, payload = _serialize(entry.msg)
+        if transport != Transport.UDP:
+            return
+
+        data = self._make_datagram(payload, *ports)
+        self._file.write(struct.pack('<IIII', int(timestamp), int(timestamp % 1 * 1000000),
+                                     len(data), len(data)) + data)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def open_history_log(path):
+    """
+    Opens a history log at PATH. The format is chosen based on the file
+    extension: pcap for *.pcap, JSON Lines otherwise.
+    """
+    if os.path.splitext(path)[1].lower() == '.pcap':
+        return PcapHistoryLog(path)
+    return JsonlHistoryLog(path)
+
+
+class MessageHistory:
+    """
+    Ring buffer of up to MAX_SIZE most recent Send/Recv entries, indexed by
+    token and message ID so that looking messages up does not require
+    scanning the history. If LOG is set, every appended entry is also written
+    to it, so that entries evicted from memory are not lost.
+    """
+
+    def __init__(self, max_size=DEFAULT_HISTORY_SIZE, log=None):
+        if max_size < 1:
+            raise ValueError('history size must be positive, got %d' % (max_size,))
+
+        self.max_size = max_size
+        self.log = log
+        self.clear()
+
+    def clear(self):
+        # entry with sequence number SEQ is stored in self._ring[SEQ % max_size]
+        self._ring = [None] * self.max_size
+        self._next_seq = 0
+        self._by_token = {}
+        self._by_msg_id = {}
+        self._last_request_seq = None
+
+    def __len__(self):
+        return min(self._next_seq, self.max_size)
+
+    def _first_seq(self):
+        return self._next_seq - len(self)
+
+    def _get(self, seq):
+        if seq is None or not self._first_seq() <= seq < self._next_seq:
+            return None
+        return self._ring[seq % self.max_size]
+
+    def __iter__(self):
+        """
+        Iterates over entries from the oldest to the most recent one.
+        """
+        for seq in range(self._first_seq(), self._next_seq):
+            yield self._ring[seq % self.max_size]
+
+    def _evict(self, seq):
+        entry = self._ring[seq % self.max_size]
+        self._ring[seq % self.max_size] = None
+        for index, key in ((self._by_token, entry.msg.token),
+                           (self._by_msg_id, entry.msg.msg_id)):
+            if index.get(key) == seq:
+                del index[key]
+
+    def append(self, entry):
+        if self.log is not None:
+            self.log.write(entry, time.time())
+
+        seq = self._next_seq
+        if len(self) == self.max_size:
+            self._evict(seq - self.max_size)
+
+        self._ring[seq % self.max_size] = entry
+        self._next_seq += 1
+
+        msg = entry.msg
+        if msg.token:
+            self._by_token[msg.token] = seq
+        if msg.msg_id is not None:
+            self._by_msg_id[msg.msg_id] = seq
+        if isinstance(entry, Recv) and msg.code.is_request():
+            self._last_request_seq = seq
+
+    def resize(self, max_size):
+        """
+        Changes the maximum number of entries, keeping the most recent ones.
+        """
+        if max_size < 1:
+            raise ValueError('history size must be positive, got %d' % (max_size,))
+
+        entries = list(self)[-max_size:]
+        log = self.log
+        self.log = None
+        self.max_size = max_size
+        self.clear()
+        try:
+            for entry in entries:
+                self.append(entry)
+        finally:
+            self.log = log
+
+    def last(self, n=1):
+        """
+        Returns the N-th most recent entry (N=1 is the last one), or None.
+        """
+        if n < 1:
+            return None
+        return self._get(self._next_seq - n)
+
+    def last_request(self):
+        """
+        Returns the most recently received request message, or None.
+        """
+        entry = self._get(self._last_request_seq)
+        return entry.msg if entry is not None else None
+
+    def find_by_token(self, token):
+        """
+        Returns the most recent entry with given TOKEN, or None.
+        """
+        return self._get(self._by_token.get(token))
+
+    def find_by_msg_id(self, msg_id):
+        """
+        Returns the most recent entry with given MSG_ID, or None.
+        """
+        return self._get(self._by_msg_id.get(msg_id))
+
+
+class PayloadBuffer:
+    """
+    Accumulates contents of received messages. Data is either kept in memory,
+    or, if a sink file is set, streamed directly to that file.
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+        self._sink = None
+
+    @property
+    def sink_path(self):
+        return self._sink.name if self._sink is not None else None
+
+    def __len__(self):
+        if self._sink is not None:
+            return self._sink.tell()
+        return len(self._data)
+
+    def append(self, data):
+        if self._sink is not None:
+            self._sink.write(data)
+        else:
+            self._data += data
+
+    def clear(self):
+        self._data = bytearray()
+        if self._sink is not None:
+            self._sink.seek(0)
+            self._sink.truncate()
+
+    def getvalue(self):
+        if self._sink is None:
+            return bytes(self._data)
+
+        self._sink.flush()
+        with open(self._sink.name, 'rb') as f:
+            return f.read()
+
+    def set_sink(self, path):
+        """
+        Starts streaming the buffer to a file at PATH, moving any data
+        currently held in memory there. If PATH is None, stops streaming and
+        empties the buffer; data already written to the file is left there.
+        """
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+        if path is not None:
+            self._sink = open(path, 'wb')
+            self._sink.write(self._data)
+        self._data = bytearray()
@@ -22,6 +22,8 @@ from lwm2m.messages import *
 from lwm2m.tlv import TLV
 from lwm2m import coap
 from cbor_shell import CBORBuilderShell
+from message_history import (DEFAULT_HISTORY_SIZE, MessageHistory, PayloadBuffer, Recv, Send,
+                             open_history_log)
 from tlv_shell import TLVBuilderShell
 import powercmd
 from prompt_toolkit.history import FileHistory
@@ -32,7 +34,6 @@ import enum
 import socket
 import re
 import glob
-import collections
 import binascii
 import argparse
 
@@ -327,9 +328,6 @@ class CoapFileServer:
                     pass
 
 
-Send = collections.namedtuple('Send', ['msg'])
-Recv = collections.namedtuple('Recv', ['msg'])
-
 NSH_HISTORY_FILE = os.path.join(os.path.expanduser('~'), '.nsh_history')
 
 
@@ -343,18 +341,17 @@ class Lwm2mCmd(powercmd.Cmd):
 
         self.cmdline_args = cmdline_args
         self.serv = None
-        self.payload_buffer = b''
+        self.payload_buffer = PayloadBuffer()
         self.expected_message = ANY
         self.set_prompt()
-        self.history = []
+        self.history = MessageHistory(cmdline_args.history_size)
+        if cmdline_args.history_log is not None:
+            self.do_history_log(cmdline_args.history_log)
 
         self.auto_reregister = True
         self.auto_update = True
         self.auto_ack = True
 
-
-        self.history = []
-
         if cmdline_args.listen is not None:
             port = self.cmdline_args.listen
             if port is None or port < 0:
@@ -367,36 +364,65 @@ class Lwm2mCmd(powercmd.Cmd):
                 print('use "listen" command to start the server')
 
     def _get_last_request(self):
-        for entry in reversed(self.history):
-            if isinstance(entry, Recv) and entry.msg.code.is_request():
-                return entry.msg
-
-        return None
+        return self.history.last_request()
 
     def do_reset_history(self):
         "Clears command history."
-        self.history = []
+        self.history.clear()
+
+    def do_history_size(self,
+                        size: int = None):
+        """
+        Displays or changes the maximum number of messages kept in history.
+        When the limit is reached, the oldest messages are discarded.
+        """
+        if size is not None:
+            self.history.resize(size)
+        print('history: %d/%d messages' % (len(self.history), self.history.max_size))
+
+    def do_history_log(self,
+                       path: str = None):
+        """
+        Starts logging all sent and received messages to a file at PATH, in
+        pcap format if PATH ends with .pcap, or as JSON Lines otherwise (in
+        which case records are appended to an existing file). Stops logging if
+        PATH is not given.
+        """
+        if self.history.log is not None:
+            print('stopped logging messages to %s' % (self.history.log.path,))
+            self.history.log.close()
+            self.history.log = None
+
+        if path is not None:
+            self.history.log = open_history_log(path)
+            print('logging messages to %s' % (path,))
 
     def do_details(self,
-                   idx: int = 1):
+                   idx: int = 1,
+                   token: EscapedBytes = None,
+                   msg_id: int = None):
         """
         Displays details of a recent message.
 
         Examples:
-            /details     - display last message
-            /details NUM - display NUM-th last message
+            /details                - display last message
+            /details NUM            - display NUM-th last message
+            /details token=TOKEN    - display last message with given TOKEN
+            /details msg_id=MSG_ID  - display last message with given MSG_ID
         """
+        if token is not None:
+            entry = self.history.find_by_token(token)
+        elif msg_id is not None:
+            entry = self.history.find_by_msg_id(msg_id)
+        else:
+            entry = self.history.last(idx)
 
-        for entry in reversed(self.history):
-            if (isinstance(entry, Recv)
-                    or isinstance(entry, Send)):
-                idx -= 1
-                if idx <= 0:
-                    print('\n*** %s ***' % (entry.__class__.__name__))
-                    print(entry.msg.details())
-                    return
+        if entry is None:
+            print('message not found')
+            return
 
-        print('message not found')
+        print('\n*** %s ***' % (entry.__class__.__name__))
+        print(entry.msg.details())
 
     def do_connect(self,
                    host: str = None,
@@ -475,7 +501,7 @@ class Lwm2mCmd(powercmd.Cmd):
             elif isinstance(msg, Lwm2mRequestBootstrap):
                 self._send(Lwm2mChanged.matching(msg)())
 
-            self.payload_buffer = b''
+            self.payload_buffer.clear()
         except KeyboardInterrupt:
             pass
         except Exception as e:
@@ -483,16 +509,30 @@ class Lwm2mCmd(powercmd.Cmd):
             raise e
 
     def do_payload_buffer_clear(self):
-        self.payload_buffer = b''
+        self.payload_buffer.clear()
 
     def do_payload_buffer_show(self):
-        print(repr(self.payload_buffer))
+        print(repr(self.payload_buffer.getvalue()))
 
     def do_payload_buffer_show_hex(self):
-        print(coap.utils.hexlify(self.payload_buffer))
+        print(coap.utils.hexlify(self.payload_buffer.getvalue()))
 
     def do_payload_buffer_show_tlv(self):
-        print(TLV.parse(self.payload_buffer))
+        print(TLV.parse(self.payload_buffer.getvalue()))
+
+    def do_payload_buffer_stream(self,
+                                 path: str = None):
+        """
+        Streams the payload buffer to a file at PATH instead of keeping it in
+        memory. Data already in the buffer is moved to the file. If PATH is not
+        given, stops streaming and clears the buffer, leaving the file intact.
+        """
+        old_path = self.payload_buffer.sink_path
+        self.payload_buffer.set_sink(path)
+        if old_path is not None:
+            print('stopped streaming payload buffer to %s' % (old_path,))
+        if path is not None:
+            print('streaming payload buffer to %s' % (path,))
 
     def _msg_verbose_compare(self, expected, actual):
         log = ''
@@ -542,7 +582,7 @@ class Lwm2mCmd(powercmd.Cmd):
             print('<- %s' % (msg.summary(),))
             self.history.append(Recv(msg))
 
-            self.payload_buffer += pkt.content
+            self.payload_buffer.append(pkt.content)
         finally:
             if self.expected_message is not ANY:
                 self._msg_verbose_compare(self.expected_message, msg)
@@ -997,6 +1037,12 @@ if __name__ == '__main__':
                         help='PSK key to use for DTLS connection (literal string).')
     parser.add_argument('--debug', action='store_true',
                         help='Enable mbed TLS debug output')
+    parser.add_argument('--history-size', type=int, default=DEFAULT_HISTORY_SIZE, metavar='N',
+                        help='Maximum number of messages kept in history (default: %d).'
+                             % (DEFAULT_HISTORY_SIZE,))
+    parser.add_argument('--history-log', type=str, metavar='PATH',
+                        help=('Log all messages to PATH, in pcap format if PATH ends with .pcap, '
+                              'or as JSON Lines otherwise.'))
 
     cmdline_args = parser.parse_args()
 
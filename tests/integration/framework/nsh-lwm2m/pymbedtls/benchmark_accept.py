@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+Measures how many DTLS-PSK handshakes per second a pymbedtls ServerSocket is
+able to accept, along with client-side handshake latency percentiles.
+
+Servers run as threads of this process; clients are spawned as separate
+processes, each performing its share of handshakes sequentially against one
+of the servers. With --native-io, servers release the GIL during handshakes,
+so that multiple servers may actually run in parallel. Requires pymbedtls to
+be built and importable.
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+
+import pymbedtls
+from benchmark_utils import BenchmarkReport
+
+PSK_IDENTITY = b'benchmark'
+PSK_KEY = b'benchmark-key'
+PAYLOAD = b'hello'
+
+
+def make_context(native_io=False):
+    return pymbedtls.Context(pymbedtls.PskSecurity(PSK_KEY, PSK_IDENTITY),
+                             native_io=native_io)
+
+
+def run_client(server_addr, handshakes, results):
+    context = make_context()
+    latencies = []
+    for _ in range(handshakes):
+        sock = pymbedtls.Socket(context, socket.socket(socket.AF_INET, socket.SOCK_DGRAM),
+                                pymbedtls.Socket.Client)
+        start = time.perf_counter()
+        sock.connect(server_addr)
+        latencies.append(time.perf_counter() - start)
+        sock.send(PAYLOAD)
+        sock.close()
+    results.put(latencies)
+
+
+def serve(server, handshakes, accept_time):
+    for _ in range(handshakes):
+        with accept_time.measure():
+            conn = server.accept()
+        conn.recv(len(PAYLOAD))
+        conn.close()
+
+
+def split(total, parts):
+    return [total // parts + (i < total % parts) for i in range(parts)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=4,
+                        help='number of concurrent client processes')
+    parser.add_argument('--servers', type=int, default=1,
+                        help='number of server threads')
+    parser.add_argument('--native-io', action='store_true',
+                        help='use the GIL-releasing native I/O path on the server side')
+    parser.add_argument('--handshakes', type=int, default=1000,
+                        help='total number of handshakes to perform')
+    parser.add_argument('--output', help='path to save the JSON report at')
+    args = parser.parse_args()
+
+    report = BenchmarkReport('pymbedtls_accept')
+    report.set_property('clients', args.clients)
+    report.set_property('servers', args.servers)
+    report.set_property('handshakes', args.handshakes)
+    report.set_property('native_io', args.native_io)
+
+    servers = []
+    for _ in range(args.servers):
+        server = pymbedtls.ServerSocket(make_context(args.native_io),
+                                        socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+        server.bind(('127.0.0.1', 0))
+        servers.append(server)
+
+    # clients are assigned to servers round-robin
+    per_client = split(args.handshakes, args.clients)
+    per_server = [0] * args.servers
+    results = multiprocessing.Queue()
+    clients = []
+    for i, handshakes in enumerate(per_client):
+        if handshakes > 0:
+            server = i % args.servers
+            per_server[server] += handshakes
+            clients.append(multiprocessing.Process(
+                target=run_client,
+                args=(servers[server].getsockname(), handshakes, results)))
+
+    accept_time = report.metric('accept_time')
+    server_threads = [threading.Thread(target=serve, args=(server, handshakes, accept_time))
+                      for server, handshakes in zip(servers, per_server)]
+
+    start = time.perf_counter()
+    for thread in server_threads:
+        thread.start()
+    for client in clients:
+        client.start()
+    for thread in server_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    handshake_time = report.metric('client_handshake_time')
+    for _ in clients:
+        for latency in results.get():
+            handshake_time.add(latency)
+    for client in clients:
+        client.join()
+
+    report.metric('accepts_per_second', '1/s').add(sum(per_server) / elapsed)
+    print(report)
+    if args.output:
+        report.dump(args.output)
+
+
+if __name__ == '__main__':
+    main()
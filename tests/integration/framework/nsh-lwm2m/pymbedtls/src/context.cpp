@@ -7,38 +7,151 @@
  * See the attached LICENSE file for details.
  */
 
+#include <cstdio>
 #include <cstring>
 #include <stdexcept>
 
+#include "common.hpp"
 #include "context.hpp"
+#include "security.hpp"
 
 using namespace std;
 
+namespace {
+
+void debug_mbedtls(void * /*ctx*/,
+                   int /*level*/,
+                   const char *file,
+                   int line,
+                   const char *str) {
+    fprintf(stderr, "%s:%04d: %s", file, line, str);
+}
+
+} // namespace
+
 namespace ssl {
 
 Context::Context(std::shared_ptr<SecurityInfo> security,
                  bool debug,
-                 std::string connection_id)
-        : security_(security), debug_(debug), connection_id_(connection_id) {
+                 std::string connection_id,
+                 bool native_io)
+        : locked_rng_{ &mutex_, &rng_ },
+          locked_cookie_{ &mutex_, &cookie_ },
+          locked_session_cache_{ &mutex_, &session_cache_ },
+          security_(security),
+          debug_(debug),
+          connection_id_(connection_id),
+          native_io_(native_io) {
 #ifdef MBEDTLS_USE_PSA_CRYPTO
     if (psa_crypto_init() != PSA_SUCCESS) {
         throw runtime_error("psa_crypto_init() failed");
     }
 #endif // MBEDTLS_USE_PSA_CRYPTO
 
-    memset(&session_cache_, 0, sizeof(session_cache_));
-    mbedtls_ssl_cache_init(&session_cache_);
-
 #if !defined(MBEDTLS_SSL_DTLS_CONNECTION_ID)
     if (connection_id.size() > 0) {
         throw runtime_error(
                 "connection_id is not supported in this version of pymbedtls");
     }
 #endif // !MBEDTLS_SSL_DTLS_CONNECTION_ID
+
+    mbedtls_entropy_init(&entropy_);
+    mbedtls_ctr_drbg_init(&rng_);
+    // Zeroize cookie context. This prevents issue
+    // https://github.com/ARMmbed/mbedtls/issues/843.
+    memset(&cookie_, 0, sizeof(cookie_));
+    mbedtls_ssl_cookie_init(&cookie_);
+    memset(&session_cache_, 0, sizeof(session_cache_));
+    mbedtls_ssl_cache_init(&session_cache_);
+
+    int result;
+    if ((result = mbedtls_ctr_drbg_seed(&rng_, mbedtls_entropy_func, &entropy_,
+                                        NULL, 0))
+            || (result = mbedtls_ssl_cookie_setup(
+                        &cookie_, mbedtls_ctr_drbg_random, &rng_))) {
+        // the destructor is not called if the constructor throws
+        mbedtls_ssl_cache_free(&session_cache_);
+        mbedtls_ssl_cookie_free(&cookie_);
+        mbedtls_ctr_drbg_free(&rng_);
+        mbedtls_entropy_free(&entropy_);
+        throw mbedtls_error("could not initialize RNG", result);
+    }
 }
 
 Context::~Context() {
+    // configs refer to all other members, so they need to be freed first
+    configs_.clear();
     mbedtls_ssl_cache_free(&session_cache_);
+    mbedtls_ssl_cookie_free(&cookie_);
+    mbedtls_ctr_drbg_free(&rng_);
+    mbedtls_entropy_free(&entropy_);
+}
+
+unique_ptr<SslConfig> Context::make_config(const ConfigKey &key) {
+    unique_ptr<SslConfig> config(new SslConfig());
+    mbedtls_ssl_config *conf = &config->config;
+
+    int result = mbedtls_ssl_config_defaults(
+            conf,
+            get<0>(key) == SocketType::Client ? MBEDTLS_SSL_IS_CLIENT
+                                              : MBEDTLS_SSL_IS_SERVER,
+            get<1>(key), MBEDTLS_SSL_PRESET_DEFAULT);
+    if (result) {
+        throw mbedtls_error("mbedtls_ssl_config_defaults failed", result);
+    }
+
+    if (debug_) {
+        mbedtls_ssl_conf_dbg(conf, debug_mbedtls, NULL);
+    }
+
+    // TODO
+    mbedtls_ssl_conf_min_version(conf, MBEDTLS_SSL_MAJOR_VERSION_3,
+                                 MBEDTLS_SSL_MINOR_VERSION_3);
+    mbedtls_ssl_conf_rng(
+            conf,
+            Locked<decltype(mbedtls_ctr_drbg_random)>::call<
+                    mbedtls_ctr_drbg_random>,
+            &locked_rng_);
+    mbedtls_ssl_conf_handshake_timeout(conf, get<2>(key), get<3>(key));
+
+#if defined(MBEDTLS_SSL_DTLS_CONNECTION_ID)
+    if (connection_id_.size() > 0
+            && (result = mbedtls_ssl_conf_cid(
+                        conf, connection_id_.size(),
+                        MBEDTLS_SSL_UNEXPECTED_CID_IGNORE))) {
+        throw mbedtls_error("mbedtls_ssl_conf_cid failed", result);
+    }
+#endif // MBEDTLS_SSL_DTLS_CONNECTION_ID
+
+    security_->configure(*config);
+
+    mbedtls_ssl_conf_dtls_cookies(
+            conf,
+            Locked<decltype(mbedtls_ssl_cookie_write)>::call<
+                    mbedtls_ssl_cookie_write>,
+            Locked<decltype(mbedtls_ssl_cookie_check)>::call<
+                    mbedtls_ssl_cookie_check>,
+            &locked_cookie_);
+    mbedtls_ssl_conf_session_cache(
+            conf, &locked_session_cache_,
+            Locked<decltype(mbedtls_ssl_cache_get)>::call<mbedtls_ssl_cache_get>,
+            Locked<decltype(mbedtls_ssl_cache_set)>::call<
+                    mbedtls_ssl_cache_set>);
+    return config;
+}
+
+const mbedtls_ssl_config *
+Context::ssl_config(SocketType type,
+                    int transport,
+                    uint32_t handshake_timeout_min_ms,
+                    uint32_t handshake_timeout_max_ms) {
+    ConfigKey key{ type, transport, handshake_timeout_min_ms,
+                   handshake_timeout_max_ms };
+    auto it = configs_.find(key);
+    if (it == configs_.end()) {
+        it = configs_.emplace(key, make_config(key)).first;
+    }
+    return &it->second->config;
 }
 
 } // namespace ssl
@@ -10,27 +10,118 @@
 #ifndef PYMBEDTLS_CONTEXT_HPP
 #define PYMBEDTLS_CONTEXT_HPP
 
+#include <cstdint>
+#include <map>
 #include <memory>
+#include <mutex>
 #include <string>
+#include <tuple>
+#include <vector>
 
+#include <mbedtls/ctr_drbg.h>
+#include <mbedtls/entropy.h>
+#include <mbedtls/ssl.h>
 #include <mbedtls/ssl_cache.h>
+#include <mbedtls/ssl_cookie.h>
 
 namespace ssl {
 
 class SecurityInfo;
 
+enum class SocketType { Client, Server };
+
+/**
+ * mbedtls_ssl_config along with data it refers to, that is not owned by any
+ * other object.
+ */
+struct SslConfig {
+    mbedtls_ssl_config config;
+    // zero-terminated, as required by mbedtls_ssl_conf_ciphersuites()
+    std::vector<int> ciphersuites;
+
+    SslConfig() {
+        mbedtls_ssl_config_init(&config);
+    }
+
+    ~SslConfig() {
+        mbedtls_ssl_config_free(&config);
+    }
+
+    SslConfig(const SslConfig &) = delete;
+    SslConfig &operator=(const SslConfig &) = delete;
+};
+
+/**
+ * Wraps an mbedtls callback taking a context pointer as its first argument,
+ * so that it is called with DATA->mutex locked. Used for state that is shared
+ * between sockets, as those may perform handshakes in parallel when the GIL
+ * is released (see Context::native_io()).
+ */
+struct LockedCallbackData {
+    std::mutex *mutex;
+    void *data;
+};
+
+template <typename Signature>
+struct Locked;
+
+template <typename... Args>
+struct Locked<int(void *, Args...)> {
+    template <int (*Func)(void *, Args...)>
+    static int call(void *data, Args... args) {
+        LockedCallbackData *locked = static_cast<LockedCallbackData *>(data);
+        std::lock_guard<std::mutex> lock(*locked->mutex);
+        return Func(locked->data, args...);
+    }
+};
+
+/**
+ * State shared by all sockets created with the same Context: seeded RNG,
+ * DTLS cookie key, session cache and SSL configurations. Only
+ * mbedtls_ssl_context is created separately for each connection.
+ */
 class Context {
+    // (socket type, transport, handshake timeout min, handshake timeout max)
+    typedef std::tuple<SocketType, int, uint32_t, uint32_t> ConfigKey;
+
+    mbedtls_entropy_context entropy_;
+    mbedtls_ctr_drbg_context rng_;
+    mbedtls_ssl_cookie_ctx cookie_;
     mbedtls_ssl_cache_context session_cache_;
+    std::mutex mutex_;
+    LockedCallbackData locked_rng_;
+    LockedCallbackData locked_cookie_;
+    LockedCallbackData locked_session_cache_;
+    std::map<ConfigKey, std::unique_ptr<SslConfig>> configs_;
     std::shared_ptr<SecurityInfo> security_;
     bool debug_;
     std::string connection_id_;
+    bool native_io_;
+
+    std::unique_ptr<SslConfig> make_config(const ConfigKey &key);
 
 public:
     Context(std::shared_ptr<SecurityInfo> security,
             bool debug,
-            std::string connection_id);
+            std::string connection_id,
+            bool native_io);
     ~Context();
 
+    Context(const Context &) = delete;
+    Context &operator=(const Context &) = delete;
+
+    /**
+     * Returns SSL configuration for sockets of given TYPE, using given
+     * TRANSPORT (MBEDTLS_SSL_TRANSPORT_*) and handshake timeouts. It is
+     * created on first use, and valid as long as the Context exists.
+     *
+     * Must be called with the GIL held.
+     */
+    const mbedtls_ssl_config *ssl_config(SocketType type,
+                                         int transport,
+                                         uint32_t handshake_timeout_min_ms,
+                                         uint32_t handshake_timeout_max_ms);
+
     mbedtls_ssl_cache_context *session_cache() {
         return &session_cache_;
     }
@@ -39,13 +130,22 @@ public:
         return security_;
     }
 
-    std::string connection_id() const {
+    const std::string &connection_id() const {
         return connection_id_;
     }
 
     bool debug() const {
         return debug_;
     }
+
+    /**
+     * If true, sockets perform I/O directly on the file descriptor of the
+     * underlying Python socket and release the GIL during handshakes and
+     * record I/O, instead of calling Python socket methods.
+     */
+    bool native_io() const {
+        return native_io_;
+    }
 };
 
 } // namespace ssl
@@ -10,8 +10,8 @@
 #include <stdexcept>
 
 #include "common.hpp"
+#include "context.hpp"
 #include "security.hpp"
-#include "socket.hpp"
 
 #include "pybind11_interop.hpp"
 
@@ -19,24 +19,24 @@ using namespace std;
 
 namespace ssl {
 
-void SecurityInfo::configure(Socket &socket) {
+void SecurityInfo::configure(SslConfig &config) {
     if (!ciphersuites_.empty()) {
-        socket.ciphersuites_ = ciphersuites_;
-        socket.ciphersuites_.push_back(0);
-        mbedtls_ssl_conf_ciphersuites(&socket.config_,
-                                      socket.ciphersuites_.data());
+        config.ciphersuites = ciphersuites_;
+        config.ciphersuites.push_back(0);
+        mbedtls_ssl_conf_ciphersuites(&config.config,
+                                      config.ciphersuites.data());
     }
 }
 
-void PskSecurity::configure(Socket &socket) {
-    mbedtls_ssl_conf_psk(&socket.config_,
+void PskSecurity::configure(SslConfig &config) {
+    mbedtls_ssl_conf_psk(&config.config,
                          reinterpret_cast<const unsigned char *>(key_.data()),
                          key_.size(),
                          reinterpret_cast<const unsigned char *>(
                                  identity_.data()),
                          identity_.size());
 
-    SecurityInfo::configure(socket);
+    SecurityInfo::configure(config);
 }
 
 string PskSecurity::name() const {
@@ -97,17 +97,17 @@ CertSecurity::~CertSecurity() {
     mbedtls_pk_free(&pk_ctx_);
 }
 
-void CertSecurity::configure(Socket &socket) {
-    SecurityInfo::configure(socket);
-    mbedtls_ssl_conf_authmode(&socket.config_, MBEDTLS_SSL_VERIFY_NONE);
+void CertSecurity::configure(SslConfig &config) {
+    SecurityInfo::configure(config);
+    mbedtls_ssl_conf_authmode(&config.config, MBEDTLS_SSL_VERIFY_NONE);
 
     if (configure_ca_) {
-        mbedtls_ssl_conf_authmode(&socket.config_, MBEDTLS_SSL_VERIFY_REQUIRED);
-        mbedtls_ssl_conf_ca_chain(&socket.config_, &ca_certs_, nullptr);
+        mbedtls_ssl_conf_authmode(&config.config, MBEDTLS_SSL_VERIFY_REQUIRED);
+        mbedtls_ssl_conf_ca_chain(&config.config, &ca_certs_, nullptr);
     }
     if (configure_crt_) {
         int result =
-                mbedtls_ssl_conf_own_cert(&socket.config_, &crt_, &pk_ctx_);
+                mbedtls_ssl_conf_own_cert(&config.config, &crt_, &pk_ctx_);
         if (result) {
             throw mbedtls_error("Could not set own certificate", result);
         }
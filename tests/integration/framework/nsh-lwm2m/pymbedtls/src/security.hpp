@@ -16,7 +16,7 @@
 #include <vector>
 
 namespace ssl {
-class Socket;
+struct SslConfig;
 
 class SecurityInfo {
 protected:
@@ -27,7 +27,7 @@ protected:
 
 public:
     virtual ~SecurityInfo() = default;
-    virtual void configure(Socket &socket);
+    virtual void configure(SslConfig &config);
     virtual std::string name() const = 0;
     void set_ciphersuites(const std::vector<int> &ciphersuites) {
         ciphersuites_ = ciphersuites;
@@ -46,7 +46,7 @@ public:
 
     PskSecurity() = default;
     PskSecurity(const PskSecurity &) = default;
-    virtual void configure(Socket &socket);
+    virtual void configure(SslConfig &config);
     virtual std::string name() const;
 };
 
@@ -74,7 +74,7 @@ public:
 
     CertSecurity() = default;
     CertSecurity(const CertSecurity &) = default;
-    virtual void configure(Socket &socket);
+    virtual void configure(SslConfig &config);
     virtual std::string name() const;
 };
 
@@ -7,11 +7,17 @@
  * See the attached LICENSE file for details.
  */
 
+#include <cerrno>
 #include <chrono>
+#include <climits>
+#include <cstring>
 #include <sstream>
 #include <stdexcept>
 
 #include <arpa/inet.h>
+#include <netinet/in.h>
+#include <poll.h>
+#include <unistd.h>
 
 #include <sys/socket.h>
 #include <sys/types.h>
@@ -53,12 +59,72 @@ int get_socket_type(const py::object &py_socket) {
     return result;
 }
 
+int get_transport(const py::object &py_socket) {
+    return get_socket_type(py_socket) == SOCK_DGRAM
+                   ? MBEDTLS_SSL_TRANSPORT_DATAGRAM
+                   : MBEDTLS_SSL_TRANSPORT_STREAM;
+}
+
+// Releases the GIL for the lifetime of the object, if RELEASE is true.
+class OptionalGilRelease {
+    std::unique_ptr<py::gil_scoped_release> release_;
+
+public:
+    explicit OptionalGilRelease(bool release)
+            : release_(release ? new py::gil_scoped_release() : nullptr) {}
+};
+
+[[noreturn]] void throw_errno(int errno_value) {
+    errno = errno_value;
+    PyErr_SetFromErrno(PyExc_OSError);
+    throw py::error_already_set();
+}
+
+// Waits until FD is ready for EVENTS. TIMEOUT_MS equal to -1 means no timeout.
+// Returns 1 if the FD is ready, 0 on timeout or -1 on error.
+int poll_fd(int fd, short events, int timeout_ms) {
+    int result;
+    do {
+        struct pollfd pfd;
+        pfd.fd = fd;
+        pfd.events = events;
+        pfd.revents = 0;
+        result = poll(&pfd, 1, timeout_ms);
+    } while (result < 0 && errno == EINTR);
+    return result;
+}
+
 } // namespace
 
 namespace ssl {
 
+bool SockAddr::operator==(const SockAddr &other) const {
+    if (storage.ss_family != other.storage.ss_family) {
+        return false;
+    }
+    switch (storage.ss_family) {
+    case AF_INET: {
+        auto *a = reinterpret_cast<const sockaddr_in *>(&storage);
+        auto *b = reinterpret_cast<const sockaddr_in *>(&other.storage);
+        return a->sin_port == b->sin_port
+               && a->sin_addr.s_addr == b->sin_addr.s_addr;
+    }
+    case AF_INET6: {
+        auto *a = reinterpret_cast<const sockaddr_in6 *>(&storage);
+        auto *b = reinterpret_cast<const sockaddr_in6 *>(&other.storage);
+        return a->sin6_port == b->sin6_port
+               && !memcmp(&a->sin6_addr, &b->sin6_addr, sizeof(a->sin6_addr));
+    }
+    default:
+        return len == other.len && !memcmp(&storage, &other.storage, len);
+    }
+}
+
 int Socket::_send(void *self, const unsigned char *buf, size_t len) try {
     Socket *socket = reinterpret_cast<Socket *>(self);
+    if (socket->context_->native_io()) {
+        return socket->native_send(buf, len);
+    }
 
     call_method<void>(
             socket->py_socket_, "sendall",
@@ -82,6 +148,15 @@ int Socket::_recv(void *self,
                   uint32_t timeout_ms) {
     Socket *socket = reinterpret_cast<Socket *>(self);
 
+    // Read timeout is set per socket, not in the shared SSL config, so mbedtls
+    // always requests reads without timeout outside of handshake retransmission
+    if (timeout_ms == 0) {
+        timeout_ms = socket->read_timeout_ms_;
+    }
+    if (socket->context_->native_io()) {
+        return socket->native_recv(buf, len, timeout_ms);
+    }
+
     py::object py_buf = py::reinterpret_borrow<py::object>(
             PyMemoryView_FromMemory((char *) buf, len, PyBUF_WRITE));
 
@@ -196,6 +271,119 @@ int Socket::_recv(void *self,
     return bytes_received;
 }
 
+void Socket::prepare_native_io() {
+    if (!context_->native_io()) {
+        return;
+    }
+
+    native_.fd = call_method<int>(py_socket_, "fileno");
+    native_.socket_type = get_socket_type(py_socket_);
+    py::object timeout_s = call_method<py::object>(py_socket_, "gettimeout");
+    native_.timeout_ms = timeout_s.is_none()
+                                 ? -1
+                                 : int(py::cast<double>(timeout_s) * 1000.0);
+    native_.recv_errno = 0;
+}
+
+void Socket::raise_native_recv_error(int result) {
+    if (result == MBEDTLS_ERR_SSL_TIMEOUT) {
+        py::object timeout = py::module::import("socket").attr("timeout");
+        PyErr_SetString(timeout.ptr(), "timed out");
+    } else {
+        errno = native_.recv_errno ? native_.recv_errno : EIO;
+        PyErr_SetFromErrno(PyExc_OSError);
+    }
+}
+
+int Socket::native_send(const unsigned char *buf, size_t len) {
+    size_t total_sent = 0;
+    while (total_sent < len) {
+        ssize_t sent = ::send(native_.fd, buf + total_sent, len - total_sent,
+                              MSG_DONTWAIT | MSG_NOSIGNAL);
+        if (sent >= 0) {
+            total_sent += (size_t) sent;
+        } else if (errno == EAGAIN || errno == EWOULDBLOCK) {
+            int result = poll_fd(native_.fd, POLLOUT, native_.timeout_ms);
+            if (result == 0) {
+                return MBEDTLS_ERR_SSL_TIMEOUT;
+            } else if (result < 0) {
+                return MBEDTLS_ERR_NET_SEND_FAILED;
+            }
+        } else if (errno != EINTR) {
+            return MBEDTLS_ERR_NET_SEND_FAILED;
+        }
+    }
+    return (int) len;
+}
+
+int Socket::native_recv(unsigned char *buf, size_t len, uint32_t timeout_ms) {
+    // Same semantics as in the Python path: explicit timeout requested by
+    // mbedtls or set with settimeout() takes precedence over the timeout of
+    // the Python socket.
+    int poll_timeout_ms = native_.timeout_ms;
+    if (timeout_ms != 0) {
+        poll_timeout_ms = int(min<uint32_t>(timeout_ms, INT_MAX));
+    }
+    const auto deadline = steady_clock::now() + milliseconds(poll_timeout_ms);
+
+    for (;;) {
+        int remaining_ms = poll_timeout_ms;
+        if (poll_timeout_ms > 0) {
+            remaining_ms = int(max<int64_t>(
+                    0, duration_cast<milliseconds>(deadline
+                                                   - steady_clock::now())
+                               .count()));
+        }
+
+        int result = poll_fd(native_.fd, POLLIN, remaining_ms);
+        if (result < 0) {
+            native_.recv_errno = errno;
+            return MBEDTLS_ERR_NET_RECV_FAILED;
+        } else if (result == 0) {
+            if (poll_timeout_ms == 0) {
+                // non-blocking Python socket
+                native_.recv_errno = EAGAIN;
+                return MBEDTLS_ERR_NET_RECV_FAILED;
+            }
+            return MBEDTLS_ERR_SSL_TIMEOUT;
+        }
+
+        SockAddr peer;
+        peer.len = sizeof(peer.storage);
+        ssize_t received =
+                recvfrom(native_.fd, buf, len, MSG_DONTWAIT,
+                         reinterpret_cast<sockaddr *>(&peer.storage),
+                         &peer.len);
+        if (received < 0) {
+            if (errno == EAGAIN || errno == EWOULDBLOCK || errno == EINTR) {
+                continue;
+            }
+            native_.recv_errno = errno;
+            return MBEDTLS_ERR_NET_RECV_FAILED;
+        }
+
+        if (native_.socket_type == SOCK_DGRAM) {
+            if (peer != client_addr_) {
+                if (!in_handshake_ && context_->connection_id().size()) {
+                    // See the comment in the Python path in _recv().
+                    last_recv_addr_ = peer;
+                } else {
+                    continue;
+                }
+            }
+
+            if (::connect(native_.fd,
+                          reinterpret_cast<const sockaddr *>(
+                                  &client_addr_.storage),
+                          client_addr_.len)) {
+                native_.recv_errno = errno;
+                return MBEDTLS_ERR_NET_RECV_FAILED;
+            }
+        }
+        return (int) received;
+    }
+}
+
 Socket::HandshakeResult Socket::do_handshake() {
     class HandshakeRaii {
         Socket &self_;
@@ -210,6 +398,7 @@ Socket::HandshakeResult Socket::do_handshake() {
         }
     } handshake_raii_(*this);
 
+    OptionalGilRelease gil_release(context_->native_io());
     for (;;) {
         int result = mbedtls_ssl_handshake(&mbedtls_context_);
         if (result == 0) {
@@ -227,113 +416,63 @@ Socket::HandshakeResult Socket::do_handshake() {
     return HandshakeResult::Finished;
 }
 
-namespace {
-
-void debug_mbedtls(void * /*ctx*/,
-                   int /*level*/,
-                   const char *file,
-                   int line,
-                   const char *str) {
-    fprintf(stderr, "%s:%04d: %s", file, line, str);
-}
-
-} // namespace
-
-Socket::Socket(std::shared_ptr<Context> context,
-               py::object py_socket,
-               SocketType type)
-        : context_(context),
-          type_(type),
-          py_socket_(py_socket),
-          in_handshake_(false),
-          client_host_and_port_(),
-          last_recv_host_and_port_() {
-    mbedtls_ssl_init(&mbedtls_context_);
-    // Zeroize cookie context. This prevents issue
-    // https://github.com/ARMmbed/mbedtls/issues/843.
-    memset(&cookie_, 0, sizeof(cookie_));
-    mbedtls_ssl_cookie_init(&cookie_);
-    mbedtls_ssl_config_init(&config_);
-    mbedtls_entropy_init(&entropy_);
-    mbedtls_ctr_drbg_init(&rng_);
-
-    int result = mbedtls_ctr_drbg_seed(&rng_, mbedtls_entropy_func, &entropy_,
-                                       NULL, 0);
-    if (result) {
-        throw mbedtls_error("mbedtls_ctr_drbg_seed failed", result);
-    }
-
-    int socket_type = get_socket_type(py_socket_);
-    result = mbedtls_ssl_config_defaults(
-            &config_,
-            type == SocketType::Client ? MBEDTLS_SSL_IS_CLIENT
-                                       : MBEDTLS_SSL_IS_SERVER,
-            socket_type == SOCK_DGRAM ? MBEDTLS_SSL_TRANSPORT_DATAGRAM
-                                      : MBEDTLS_SSL_TRANSPORT_STREAM,
-            MBEDTLS_SSL_PRESET_DEFAULT);
-    if (result) {
-        throw mbedtls_error("mbedtls_ssl_config_defaults failed", result);
-    }
-
-    if (context_->debug()) {
-        mbedtls_ssl_conf_dbg(&config_, debug_mbedtls, NULL);
-    }
-
-    // TODO
-    mbedtls_ssl_conf_min_version(&config_, MBEDTLS_SSL_MAJOR_VERSION_3,
-                                 MBEDTLS_SSL_MINOR_VERSION_3);
-    mbedtls_ssl_conf_rng(&config_, mbedtls_ctr_drbg_random, &rng_);
-
-#if defined(MBEDTLS_SSL_DTLS_CONNECTION_ID)
-    if (context->connection_id().size() > 0
-            && (result = mbedtls_ssl_conf_cid(
-                        &config_, context->connection_id().size(),
-                        MBEDTLS_SSL_UNEXPECTED_CID_IGNORE))) {
-        throw mbedtls_error("mbedtls_ssl_conf_cid failed", result);
-    }
-#endif // MBEDTLS_SSL_DTLS_CONNECTION_ID
-
-    context_->security()->configure(*this);
-
-    if ((result = mbedtls_ssl_cookie_setup(&cookie_, mbedtls_ctr_drbg_random,
-                                           &rng_))) {
-        throw mbedtls_error("mbedtls_ssl_cookie_setup failed", result);
+void Socket::setup(const mbedtls_ssl_config *config) {
+    if (config_) {
+        mbedtls_ssl_free(&mbedtls_context_);
+        mbedtls_ssl_init(&mbedtls_context_);
     }
+    config_ = config;
 
-    mbedtls_ssl_conf_dtls_cookies(&config_,
-                                  mbedtls_ssl_cookie_write,
-                                  mbedtls_ssl_cookie_check,
-                                  &cookie_);
-
-    mbedtls_ssl_conf_session_cache(&config_, context_->session_cache(),
-                                   mbedtls_ssl_cache_get,
-                                   mbedtls_ssl_cache_set);
     mbedtls_ssl_set_bio(&mbedtls_context_, this, &Socket::_send, NULL,
                         &Socket::_recv);
     mbedtls_ssl_set_timer_cb(&mbedtls_context_, &timer_,
                              mbedtls_timing_set_delay,
                              mbedtls_timing_get_delay);
 
-    if ((result = mbedtls_ssl_setup(&mbedtls_context_, &config_))) {
+    int result;
+    if ((result = mbedtls_ssl_setup(&mbedtls_context_, config_))) {
         throw mbedtls_error("mbedtls_ssl_setup failed", result);
     }
 #if defined(MBEDTLS_SSL_DTLS_CONNECTION_ID)
-    if (context->connection_id().size() > 0
+    const string &connection_id = context_->connection_id();
+    if (connection_id.size() > 0
             && (result = mbedtls_ssl_set_cid(
                         &mbedtls_context_,
                         MBEDTLS_SSL_CID_ENABLED,
                         reinterpret_cast<const unsigned char *>(
-                                context->connection_id().data()),
-                        context->connection_id().size()))) {
+                                connection_id.data()),
+                        connection_id.size()))) {
         throw mbedtls_error("mbedtls_ssl_set_cid failed", result);
     }
 #endif // MBEDTLS_SSL_DTLS_CONNECTION_ID
 }
 
+Socket::Socket(std::shared_ptr<Context> context,
+               py::object py_socket,
+               SocketType type)
+        : context_(context),
+          config_(nullptr),
+          read_timeout_ms_(0),
+          type_(type),
+          py_socket_(py_socket),
+          in_handshake_(false),
+          client_host_and_port_(),
+          last_recv_host_and_port_(),
+          native_(),
+          client_addr_(),
+          last_recv_addr_() {
+    mbedtls_ssl_init(&mbedtls_context_);
+    try {
+        setup(context_->ssl_config(type_, get_transport(py_socket_),
+                                   MBEDTLS_SSL_DTLS_TIMEOUT_DFL_MIN,
+                                   MBEDTLS_SSL_DTLS_TIMEOUT_DFL_MAX));
+    } catch (...) {
+        mbedtls_ssl_free(&mbedtls_context_);
+        throw;
+    }
+}
+
 Socket::~Socket() {
-    mbedtls_entropy_free(&entropy_);
-    mbedtls_ssl_config_free(&config_);
-    mbedtls_ssl_cookie_free(&cookie_);
     mbedtls_ssl_free(&mbedtls_context_);
 }
 
@@ -343,12 +482,22 @@ void Socket::perform_handshake(py::tuple host_port,
     client_host_and_port_ = host_port_to_std_tuple(host_port);
     last_recv_host_and_port_ = host_port_to_std_tuple(host_port);
 
+    uint32_t handshake_timeout_min_ms = MBEDTLS_SSL_DTLS_TIMEOUT_DFL_MIN;
+    uint32_t handshake_timeout_max_ms = MBEDTLS_SSL_DTLS_TIMEOUT_DFL_MAX;
     if (!handshake_timeouts_s_.is_none()) {
         auto handshake_timeouts_s = py::cast<py::tuple>(handshake_timeouts_s_);
         auto min = py::cast<double>(handshake_timeouts_s[0]);
         auto max = py::cast<double>(handshake_timeouts_s[1]);
-        mbedtls_ssl_conf_handshake_timeout(&config_, uint32_t(min * 1000.0),
-                                           uint32_t(max * 1000.0));
+        handshake_timeout_min_ms = uint32_t(min * 1000.0);
+        handshake_timeout_max_ms = uint32_t(max * 1000.0);
+    }
+
+    const mbedtls_ssl_config *config =
+            context_->ssl_config(type_, get_transport(py_socket_),
+                                 handshake_timeout_min_ms,
+                                 handshake_timeout_max_ms);
+    if (config != config_) {
+        setup(config);
     }
 
     HandshakeResult hs_result;
@@ -370,11 +519,25 @@ void Socket::perform_handshake(py::tuple host_port,
         if (py_connect) {
             call_method<void>(py_socket_, "connect", client_host_and_port_);
         }
+        if (context_->native_io()) {
+            prepare_native_io();
+            client_addr_.len = sizeof(client_addr_.storage);
+            if (getpeername(native_.fd,
+                            reinterpret_cast<sockaddr *>(
+                                    &client_addr_.storage),
+                            &client_addr_.len)) {
+                throw_errno(errno);
+            }
+            last_recv_addr_ = client_addr_;
+        }
         hs_result = do_handshake();
     } while (hs_result == HandshakeResult::HelloVerifyRequired);
 }
 
 void Socket::send(const string &data) {
+    prepare_native_io();
+    OptionalGilRelease gil_release(context_->native_io());
+
     size_t total_sent = 0;
 
     while (total_sent < data.size()) {
@@ -398,15 +561,23 @@ void Socket::send(const string &data) {
 py::bytes Socket::recv(int) {
     unsigned char buffer[65536];
 
+    prepare_native_io();
     int result = 0;
-    do {
-        result = mbedtls_ssl_read(&mbedtls_context_, buffer, sizeof(buffer));
-    } while (result == MBEDTLS_ERR_SSL_WANT_READ
-             || result == MBEDTLS_ERR_SSL_WANT_WRITE);
+    {
+        OptionalGilRelease gil_release(context_->native_io());
+        do {
+            result = mbedtls_ssl_read(&mbedtls_context_, buffer,
+                                      sizeof(buffer));
+        } while (result == MBEDTLS_ERR_SSL_WANT_READ
+                 || result == MBEDTLS_ERR_SSL_WANT_WRITE);
+    }
 
     if (result < 0) {
         if (result == MBEDTLS_ERR_SSL_TIMEOUT
                 || result == MBEDTLS_ERR_NET_RECV_FAILED) {
+            if (context_->native_io()) {
+                raise_native_recv_error(result);
+            }
             throw py::error_already_set();
         } else if (result == MBEDTLS_ERR_SSL_CLIENT_RECONNECT) {
             try {
@@ -419,7 +590,18 @@ py::bytes Socket::recv(int) {
         throw mbedtls_error("mbedtls_ssl_read failed", result);
     }
 
-    if (last_recv_host_and_port_ != client_host_and_port_) {
+    if (context_->native_io()) {
+        if (last_recv_addr_ != client_addr_) {
+            // Same as below, for the native I/O path.
+            client_addr_ = last_recv_addr_;
+            if (::connect(native_.fd,
+                          reinterpret_cast<const sockaddr *>(
+                                  &client_addr_.storage),
+                          client_addr_.len)) {
+                throw_errno(errno);
+            }
+        }
+    } else if (last_recv_host_and_port_ != client_host_and_port_) {
         // During Socket::_recv(), there had to be a message from a (host, port)
         // we weren't sure about, but enabled connection_id verified it is the
         // same client but from the different address. Let's adjust.
@@ -438,7 +620,7 @@ void Socket::settimeout(py::object timeout_s_or_none) {
     }
 
     call_method<void>(py_socket_, "settimeout", timeout_s_or_none);
-    mbedtls_ssl_conf_read_timeout(&config_, timeout_ms);
+    read_timeout_ms_ = timeout_ms;
 }
 
 py::bytes Socket::peer_cert() {
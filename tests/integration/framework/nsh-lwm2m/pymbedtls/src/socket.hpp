@@ -9,9 +9,7 @@
 
 #ifndef PYMBEDTLS_SOCKET_HPP
 #define PYMBEDTLS_SOCKET_HPP
-#include <mbedtls/ctr_drbg.h>
 #include <mbedtls/debug.h>
-#include <mbedtls/entropy.h>
 #include <mbedtls/error.h>
 #include <mbedtls/version.h>
 #if MBEDTLS_VERSION_NUMBER >= 0x02040000 // mbed TLS 2.4 deprecated net.h
@@ -20,34 +18,37 @@
 #    include <mbedtls/net.h>
 #endif
 #include <mbedtls/ssl.h>
-#include <mbedtls/ssl_cache.h>
-#include <mbedtls/ssl_cookie.h>
 #include <mbedtls/timing.h>
 
 #include <memory>
 
+#include <sys/socket.h>
+
+#include "context.hpp"
 #include "pybind11_interop.hpp"
 
 namespace ssl {
-class Context;
 
-enum class SocketType { Client, Server };
+struct SockAddr {
+    sockaddr_storage storage;
+    socklen_t len;
 
-class Socket {
-    friend class SecurityInfo;
-    friend class PskSecurity;
-    friend class CertSecurity;
+    bool operator==(const SockAddr &other) const;
+    bool operator!=(const SockAddr &other) const {
+        return !(*this == other);
+    }
+};
 
+class Socket {
     enum class HandshakeResult { Finished, HelloVerifyRequired };
 
     std::shared_ptr<Context> context_;
     mbedtls_ssl_context mbedtls_context_;
-    mbedtls_ssl_cookie_ctx cookie_;
-    mbedtls_ssl_config config_;
-    mbedtls_entropy_context entropy_;
-    mbedtls_ctr_drbg_context rng_;
+    // owned by context_
+    const mbedtls_ssl_config *config_;
     mbedtls_timing_delay_context timer_;
-    std::vector<int> ciphersuites_;
+    // 0 means no timeout
+    uint32_t read_timeout_ms_;
 
     SocketType type_;
     py::object py_socket_;
@@ -64,11 +65,33 @@ class Socket {
     // (if any) to see if the packet is indeed valid and should be handled.
     std::tuple<std::string, int> last_recv_host_and_port_;
 
+    // State of the native I/O path (see Context::native_io()). It is refreshed
+    // from py_socket_ at the beginning of each operation, as the Python socket
+    // may be replaced or reconfigured in between.
+    struct NativeIo {
+        int fd;
+        int socket_type;
+        // timeout of the Python socket; -1 means no timeout
+        int timeout_ms;
+        // errno of the last failed read, 0 if unknown
+        int recv_errno;
+    } native_;
+    // Native counterparts of client_host_and_port_ and
+    // last_recv_host_and_port_.
+    SockAddr client_addr_;
+    SockAddr last_recv_addr_;
+
     static int _send(void *self, const unsigned char *buf, size_t len);
     static int
     _recv(void *self, unsigned char *buf, size_t len, uint32_t timeout_ms);
 
+    int native_send(const unsigned char *buf, size_t len);
+    int native_recv(unsigned char *buf, size_t len, uint32_t timeout_ms);
+    void prepare_native_io();
+    void raise_native_recv_error(int result);
+
     HandshakeResult do_handshake();
+    void setup(const mbedtls_ssl_config *config);
 
 public:
     Socket(std::shared_ptr<Context> context,
@@ -14,7 +14,7 @@ import time
 import traceback
 import unittest
 
-from .test_suite import get_test_name, get_suite_name, LogType
+from .test_suite import get_test_name, get_full_test_name, get_suite_name, LogType
 
 COLOR_DEFAULT = '\033[0m'
 COLOR_YELLOW = '\033[0;33m'
@@ -106,6 +106,8 @@ class PrettyTestResult(unittest.TestResult):
         self.logfile = logfile_stream
         self.times = {}
         self.successes = []
+        # full test name -> heap usage, for tests run under massif
+        self.heap_usage = {}
 
     def startTest(self, test):
         self.logfile.write_test_name(get_test_name(test))
@@ -114,6 +116,12 @@ class PrettyTestResult(unittest.TestResult):
         self.testsRun += 1
         self.times[test] = time.time()
 
+    def stopTest(self, test):
+        unittest.TestResult.stopTest(self, test)
+        heap_usage = getattr(test, 'heap_usage', None)
+        if heap_usage is not None:
+            self.heap_usage[get_full_test_name(test)] = heap_usage
+
     def addSuccess(self, test):
         seconds_elapsed = time.time() - self.times[test]
 
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+Helpers for profiling the demo client with `perf record` or Valgrind's
+callgrind tool, and for measuring its heap usage with Valgrind's massif tool.
+
+Raw profiler output is converted into the "collapsed stacks" format, as used
+by flamegraph.pl (https://github.com/brendangregg/FlameGraph): one line per
+unique stack, with frames separated by semicolons (outermost first), followed
+by a space and the sample count (or instruction count, for callgrind).
+"""
+
+import collections
+import os
+import re
+import subprocess
+
+PROFILERS = ('perf', 'callgrind')
+
+
+def profiler_args(profiler, output_path):
+    """
+    Returns a list of arguments that, when prepended to the demo command line,
+    make it run under PROFILER with raw results stored in OUTPUT_PATH.
+    """
+    if profiler == 'perf':
+        return ['perf', 'record', '-g', '-o', output_path, '--']
+    elif profiler == 'callgrind':
+        return ['valgrind', '--tool=callgrind', '--callgrind-out-file=' + output_path]
+    raise ValueError('unsupported profiler: %r (expected one of: %s)'
+                     % (profiler, ', '.join(PROFILERS)))
+
+
+def collapse_perf_script(lines):
+    """
+    Collapses the textual output of `perf script` into a stack -> samples
+    Counter. Each sample in `perf script` output is a header line, followed by
+    one indented line per frame (innermost first) and an empty line.
+    """
+    stacks = collections.Counter()
+    frames = None
+
+    def flush():
+        if frames:
+            stacks[';'.join(reversed(frames))] += 1
+
+    for line in lines:
+        if not line.strip():
+            flush()
+            frames = None
+        elif line[0].isspace():
+            if frames is not None:
+                # "    7f1234 anjay_serve+0x12 (/path/to/demo)"
+                parts = line.split(None, 1)
+                symbol = parts[1] if len(parts) > 1 else parts[0]
+                symbol = re.sub(r' \(.*\)$', '', symbol)
+                symbol = re.sub(r'\+0x[0-9a-f]+$', '', symbol)
+                frames.append(symbol)
+        else:
+            flush()
+            frames = []
+    flush()
+    return stacks
+
+
+def collapse_callgrind(lines):
+    """
+    Converts callgrind output into a stack -> cost Counter. Callgrind does not
+    record full call stacks, so each function is reported as a single-frame
+    stack with its exclusive (self) cost of the first recorded event (usually
+    Ir - instructions executed).
+    """
+    stacks = collections.Counter()
+    names = {}
+    current_fn = None
+    skip_next_cost = False
+
+    def resolve(spec):
+        # compressed names: "(id) name" defines an id, "(id)" refers to it
+        match = re.match(r'\((\d+)\)(?: (.*))?$', spec)
+        if not match:
+            return spec
+        if match.group(2) is not None:
+            names[match.group(1)] = match.group(2)
+        return names.get(match.group(1), spec)
+
+    for line in lines:
+        line = line.rstrip('\n')
+        if line.startswith('fn='):
+            current_fn = resolve(line[3:])
+        elif line.startswith(('cfn=', 'cfi=', 'cfl=', 'fl=', 'fi=', 'fe=', 'ob=', 'cob=')):
+            if line.startswith('cfn='):
+                resolve(line[4:])
+        elif line.startswith('calls='):
+            # the cost line after calls= is the inclusive cost of the call
+            skip_next_cost = True
+        elif line[:1].isdigit() or line[:1] in ('+', '-', '*'):
+            if skip_next_cost:
+                skip_next_cost = False
+                continue
+            fields = line.split()
+            if current_fn is not None and len(fields) >= 2:
+                stacks[current_fn] += int(fields[1])
+    return stacks
+
+
+def collapse_profile(profiler, raw_path):
+    """
+    Converts raw output of PROFILER stored in RAW_PATH into collapsed stacks.
+    """
+    if profiler == 'perf':
+        output = subprocess.run(['perf', 'script', '-i', raw_path],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                check=True, universal_newlines=True).stdout
+        return collapse_perf_script(output.splitlines())
+    elif profiler == 'callgrind':
+        with open(raw_path) as f:
+            return collapse_callgrind(f)
+    raise ValueError('unsupported profiler: %r' % (profiler,))
+
+
+def read_collapsed(path):
+    stacks = collections.Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def write_collapsed(path, stacks):
+    with open(path, 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write('%s %d\n' % (stack, count))
+
+
+def merge_collapsed(path, stacks):
+    """
+    Adds STACKS to the collapsed stacks file at PATH, creating it if needed.
+    """
+    if os.path.exists(path):
+        stacks = read_collapsed(path) + stacks
+    write_collapsed(path, stacks)
+
+
+def hot_functions(stacks):
+    """
+    Returns a Counter of exclusive (self) cost per function, i.e. the cost
+    attributed to the innermost frame of each stack.
+    """
+    result = collections.Counter()
+    for stack, count in stacks.items():
+        result[stack.rsplit(';', 1)[-1]] += count
+    return result
+
+
+def format_hot_functions(stacks, limit=20):
+    functions = hot_functions(stacks)
+    total = sum(functions.values())
+    if not total:
+        return 'no profile samples collected'
+
+    return '\n'.join(['%8.2f%%  %12d  %s' % (100.0 * count / total, count, name)
+                      for name, count in functions.most_common(limit)])
+
+
+def massif_args(output_path):
+    """
+    Returns a list of arguments that, when prepended to the demo command line,
+    make it run under Valgrind's massif heap profiler.
+    """
+    return ['valgrind', '--tool=massif', '--massif-out-file=' + output_path]
+
+
+# Allocation wrappers that are not interesting as allocation sites on their
+# own; their callers are reported instead.
+MASSIF_ALLOC_WRAPPER_RE = re.compile(
+    r'^(avs_(malloc|calloc|realloc)|mbedtls_calloc|_anjay_\w*alloc\w*|strdup|avs_strdup)\b')
+
+_MASSIF_NODE_RE = re.compile(r'^( *)n(\d+): (\d+) (.*)$')
+
+
+def _massif_site_name(desc):
+    # "0x4C2DB8F: malloc (vg_replace_malloc.c:299)" -> "malloc (vg_replace_malloc.c:299)"
+    return re.sub(r'^0x[0-9A-Fa-f]+: ', '', desc)
+
+
+def _massif_sites(node):
+    for child in node['children']:
+        name = _massif_site_name(child['desc'])
+        if child['children'] and MASSIF_ALLOC_WRAPPER_RE.match(name):
+            yield from _massif_sites(child)
+        else:
+            yield name, child['bytes']
+
+
+def parse_massif(lines, top_sites=10):
+    """
+    Parses massif output into a dict with the following keys:
+
+    - peak_heap_B - peak heap usage, including allocator overhead,
+    - peak_useful_heap_B - requested bytes at the moment of the peak,
+    - peak_extra_heap_B - allocator overhead at the moment of the peak,
+    - peak_stacks_B - stack usage at the moment of the peak (0 unless
+      massif was run with --stacks=yes),
+    - top_sites - list of up to TOP_SITES (site, bytes) pairs, describing
+      functions responsible for most of the peak heap usage.
+    """
+    snapshots = []
+    current = None
+    tree_stack = None
+
+    for line in lines:
+        line = line.rstrip('\n')
+        if line.startswith('snapshot='):
+            current = {'heap': 0, 'extra': 0, 'stacks': 0, 'peak': False, 'tree': None}
+            snapshots.append(current)
+            tree_stack = None
+        elif current is None:
+            continue
+        elif line.startswith('mem_heap_B='):
+            current['heap'] = int(line.split('=', 1)[1])
+        elif line.startswith('mem_heap_extra_B='):
+            current['extra'] = int(line.split('=', 1)[1])
+        elif line.startswith('mem_stacks_B='):
+            current['stacks'] = int(line.split('=', 1)[1])
+        elif line.startswith('heap_tree='):
+            current['peak'] = (line.split('=', 1)[1] == 'peak')
+            tree_stack = []
+        elif tree_stack is not None:
+            match = _MASSIF_NODE_RE.match(line)
+            if not match:
+                continue
+            depth = len(match.group(1))
+            node = {'bytes': int(match.group(3)), 'desc': match.group(4), 'children': []}
+            del tree_stack[depth:]
+            if tree_stack:
+                tree_stack[-1]['children'].append(node)
+            else:
+                current['tree'] = node
+            tree_stack.append(node)
+
+    if not snapshots:
+        raise ValueError('no snapshots found in massif output')
+
+    peak = ([s for s in snapshots if s['peak']]
+            or [max(snapshots, key=lambda s: s['heap'] + s['extra'])])[0]
+
+    sites = collections.Counter()
+    if peak['tree'] is not None:
+        for name, size in _massif_sites(peak['tree']):
+            if not name.startswith('in '):
+                # skip "in N places, all below massif's threshold"
+                sites[name] += size
+
+    return {
+        'peak_heap_B': peak['heap'] + peak['extra'],
+        'peak_useful_heap_B': peak['heap'],
+        'peak_extra_heap_B': peak['extra'],
+        'peak_stacks_B': peak['stacks'],
+        'top_sites': sites.most_common(top_sites),
+    }
+
+
+def format_heap_usage(heap_usage):
+    return '\n'.join(['peak heap: %d B (%d B requested + %d B overhead)'
+                      % (heap_usage['peak_heap_B'], heap_usage['peak_useful_heap_B'],
+                         heap_usage['peak_extra_heap_B'])]
+                     + ['%12d B  %s' % (size, site) for site, size in heap_usage['top_sites']])
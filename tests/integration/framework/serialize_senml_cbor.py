@@ -56,8 +56,20 @@ def extract_config(config):
     ]
 
 
-def serialize_config(config):
-    serialized = extract_config(config_to_dict(config))
+def serialize_config(config, compact=False):
+    """
+    Serializes CONFIG - a dict of the {oid: {iid: {rid: value}}} form, or its
+    textual representation - into a SenML CBOR factory provisioning blob.
+
+    If COMPACT is True, records are encoded with SenML Base Names instead of
+    absolute paths; see serialize_config_compact().
+    """
+    if isinstance(config, str):
+        config = config_to_dict(config)
+    if compact:
+        return serialize_config_compact(config)
+
+    serialized = extract_config(config)
     out = []
 
     for path, value in serialized:
@@ -75,3 +87,140 @@ def serialize_config(config):
             raise TypeError('Unsupported data type')
 
     return CBOR.serialize(out)
+
+
+CBOR_MAJOR_UINT = 0
+CBOR_MAJOR_NEGATIVE_INT = 1
+CBOR_MAJOR_BYTES = 2
+CBOR_MAJOR_TEXT = 3
+CBOR_MAJOR_ARRAY = 4
+CBOR_MAJOR_MAP = 5
+
+CBOR_FALSE = 0xF4
+CBOR_TRUE = 0xF5
+
+
+def _write_cbor_head(out, major_type, value):
+    if value < 24:
+        out.append(major_type << 5 | value)
+    elif value < 0x100:
+        out.append(major_type << 5 | 24)
+        out.append(value)
+    elif value < 0x10000:
+        out.append(major_type << 5 | 25)
+        out += value.to_bytes(2, 'big')
+    elif value < 0x100000000:
+        out.append(major_type << 5 | 26)
+        out += value.to_bytes(4, 'big')
+    elif value < 0x10000000000000000:
+        out.append(major_type << 5 | 27)
+        out += value.to_bytes(8, 'big')
+    else:
+        raise OverflowError('value does not fit in 64 bits: %d' % (value,))
+
+
+def _write_cbor_int(out, value):
+    if value >= 0:
+        _write_cbor_head(out, CBOR_MAJOR_UINT, value)
+    else:
+        _write_cbor_head(out, CBOR_MAJOR_NEGATIVE_INT, -1 - value)
+
+
+def _write_cbor_text(out, value):
+    encoded = value.encode('utf-8')
+    _write_cbor_head(out, CBOR_MAJOR_TEXT, len(encoded))
+    out += encoded
+
+
+def _write_cbor_label(out, label):
+    if isinstance(label.value, int):
+        _write_cbor_int(out, label.value)
+    else:
+        _write_cbor_text(out, label.value)
+
+
+def _write_senml_value(out, value):
+    if isinstance(value, bool):  # bool is treated as int, so check bool first
+        _write_cbor_label(out, SenmlLabel.BOOL)
+        out.append(CBOR_TRUE if value else CBOR_FALSE)
+    elif isinstance(value, int):
+        _write_cbor_label(out, SenmlLabel.VALUE)
+        _write_cbor_int(out, value)
+    elif isinstance(value, str):
+        _write_cbor_label(out, SenmlLabel.STRING)
+        _write_cbor_text(out, value)
+    elif isinstance(value, bytes):
+        _write_cbor_label(out, SenmlLabel.OPAQUE)
+        _write_cbor_head(out, CBOR_MAJOR_BYTES, len(value))
+        out += value
+    elif isinstance(value, Objlink):
+        _write_cbor_label(out, SenmlLabel.OBJLNK)
+        _write_cbor_text(out, str(value))
+    else:
+        raise TypeError('Unsupported data type')
+
+
+def _instance_records(instance):
+    for rid, value in instance.items():
+        if isinstance(value, dict):
+            for riid, riid_value in value.items():
+                yield f'{rid}/{riid}', riid_value
+        else:
+            yield str(rid), value
+
+
+def _count_instance_records(instance):
+    return sum(len(value) if isinstance(value, dict) else 1 for value in instance.values())
+
+
+def serialize_config_compact(config):
+    """
+    Serializes CONFIG dict into a SenML CBOR blob equivalent to the one
+    produced by serialize_config(), but smaller:
+
+    - records are grouped by Object Instance, and the first record of each
+      group sets the SenML Base Name to "/oid/iid/", so that the remaining
+      records only carry the relative "rid" or "rid/riid" Name,
+    - the Base Name is omitted if it would not make the payload smaller, i.e.
+      for single-record instances while no Base Name is set yet.
+
+    Records are encoded directly into a single output buffer, without building
+    intermediate lists of paths or dicts.
+    """
+    out = bytearray()
+    _write_cbor_head(out, CBOR_MAJOR_ARRAY,
+                     sum(_count_instance_records(instance)
+                         for object in config.values()
+                         for instance in object.values()))
+
+    basename = ''
+    for oid, object in config.items():
+        for iid, instance in object.items():
+            prefix = f'/{oid}/{iid}/'
+            set_basename = (prefix != basename
+                            and (basename or _count_instance_records(instance) > 1))
+
+            for name, value in _instance_records(instance):
+                if set_basename:
+                    _write_cbor_head(out, CBOR_MAJOR_MAP, 3)
+                    _write_cbor_label(out, SenmlLabel.BASE_NAME)
+                    _write_cbor_text(out, prefix)
+                    basename = prefix
+                    set_basename = False
+                else:
+                    _write_cbor_head(out, CBOR_MAJOR_MAP, 2)
+                _write_cbor_label(out, SenmlLabel.NAME)
+                _write_cbor_text(out, name if basename else prefix + name)
+                _write_senml_value(out, value)
+
+    return bytes(out)
+
+
+def compare_serialized_size(config):
+    """
+    Returns a (plain_size, compact_size) tuple of sizes, in bytes, of CONFIG
+    serialized with and without SenML Base Names.
+    """
+    if isinstance(config, str):
+        config = config_to_dict(config)
+    return (len(serialize_config(config)), len(serialize_config_compact(config)))
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+Cached list of test cases defined in integration test suites.
+
+Importing all suite modules (and, transitively, the whole framework) just to
+learn test names is slow, so runtest.py keeps a JSON manifest listing tests
+found in each suite module. An entry is reused as long as modification times
+and sizes of the module file, and of all files that define its test classes,
+did not change. Listing and filtering tests by regex is then performed on the
+manifest alone, and only modules containing selected tests are imported.
+
+This module must not import any part of the test framework.
+"""
+
+import json
+import os
+import re
+import tempfile
+
+MANIFEST_VERSION = 2
+
+
+def matches_query_regex(query_regex, suite_name, test_name=None, full_test_name=None):
+    """
+    Test or test suite matches regex query when at least one of following
+    matches the regex:
+
+    * test name,
+    * suite name,
+    * "suite_name.test_name" string.
+
+    Substring matches are allowed unless the regex is anchored using ^ or $.
+    """
+    if test_name is None:
+        return bool(re.search(query_regex, suite_name))
+    if full_test_name is None:
+        full_test_name = suite_name + '.' + test_name
+    return bool(re.search(query_regex, test_name) or re.search(query_regex, full_test_name))
+
+
+def find_suite_modules(suite_root):
+    """
+    Returns a list of (module_name, path) pairs of all test modules in
+    SUITE_ROOT, in the same order as unittest discovery imports them.
+    """
+    def walk(directory, prefix):
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                if os.path.isfile(os.path.join(path, '__init__.py')):
+                    yield from walk(path, prefix + name + '.')
+            elif re.match(r'[_a-z]\w*\.py$', name, re.IGNORECASE) and name != '__init__.py':
+                yield prefix + name[:-len('.py')], path
+
+    return list(walk(suite_root, ''))
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _entry_is_fresh(entry, path):
+    if entry.get('path') != path:
+        return False
+    return all(_file_stamp(dep) == stamp for dep, stamp in entry['files'].items())
+
+
+def load_manifest(cache_path, suite_root):
+    """
+    Loads the manifest stored in CACHE_PATH. Returns an empty one if the file
+    does not exist, is corrupted, or was generated for a different SUITE_ROOT.
+    """
+    empty = {'version': MANIFEST_VERSION, 'suite_root': suite_root, 'modules': {}}
+    try:
+        with open(cache_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty
+
+    if (not isinstance(manifest, dict)
+            or manifest.get('version') != MANIFEST_VERSION
+            or manifest.get('suite_root') != suite_root
+            or not isinstance(manifest.get('modules'), dict)):
+        return empty
+    return manifest
+
+
+def save_manifest(cache_path, manifest):
+    # several runtest.py instances may be started in parallel by CTest, so the
+    # file is replaced atomically
+    cache_dir = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', dir=cache_dir, suffix='.tmp', delete=False) as f:
+        json.dump(manifest, f, indent=1)
+        f.write('\n')
+    os.replace(f.name, cache_path)
+
+
+def refresh_manifest(manifest, describe_module):
+    """
+    Brings MANIFEST up to date with suite modules currently present on disk.
+
+    DESCRIBE_MODULE is called with a module name for each new or modified
+    module. It shall import the module and return a list of
+    (suite_name, test_name, full_test_name, source_path, is_lwm2m_test)
+    tuples, one for each test case it contains, in discovery order.
+
+    Returns the number of modules that were (re)described.
+    """
+    modules = {}
+    described = 0
+    for module_name, path in find_suite_modules(manifest['suite_root']):
+        entry = manifest['modules'].get(module_name)
+        if entry is None or not _entry_is_fresh(entry, path):
+            tests = describe_module(module_name)
+            files = {path} | set(source for _, _, _, source, _ in tests)
+            entry = {
+                'path': path,
+                'files': {f: _file_stamp(f) for f in sorted(files)},
+                'tests': [[suite, name, full_name, is_lwm2m_test]
+                          for suite, name, full_name, _, is_lwm2m_test in tests],
+            }
+            described += 1
+        modules[module_name] = entry
+
+    described += len(set(manifest['modules']) - set(modules))
+    manifest['modules'] = modules
+    return described
+
+
+def select_tests(manifest, query_regex=None, lwm2m_only=False):
+    """
+    Returns a list of (module_name, [full_test_name, ...]) pairs for modules
+    containing tests that match QUERY_REGEX, in discovery order. If
+    LWM2M_ONLY is True, test cases that are not Lwm2mTest instances are
+    omitted.
+    """
+    selected = []
+    for module_name, entry in manifest['modules'].items():
+        tests = [full_name for suite, name, full_name, is_lwm2m_test in entry['tests']
+                 if (is_lwm2m_test or not lwm2m_only)
+                 and (not query_regex
+                      or matches_query_regex(query_regex, suite)
+                      or matches_query_regex(query_regex, suite, name, full_name))]
+        if tests:
+            selected.append((module_name, tests))
+    return selected
@@ -7,11 +7,15 @@
 # Licensed under the AVSystem-5-clause License.
 # See the attached LICENSE file for details.
 
+import contextlib
+import importlib.util
 import inspect
 import logging
 import os
 import re
 import shutil
+import socket
+import statistics
 import subprocess
 import threading
 import unittest
@@ -19,14 +23,15 @@ from typing import TypeVar
 
 from framework.lwm2m.coap.transport import Transport
 from .asserts import Lwm2mAsserts
+from .benchmark_utils import (BenchmarkReport, TimeSeries, linear_trend, process_cpu_time,
+                              process_fd_count, process_memory_usage, soak_duration)
+from .impairment_proxy import LinkProfile, make_impairment_proxy
+from . import profiling
 from .lwm2m_test import *
+from .test_manifest import matches_query_regex
 
-try:
-    import dpkt
-
-    _DPKT_AVAILABLE = True
-except ImportError:
-    _DPKT_AVAILABLE = False
+# dpkt is only needed by tests that inspect PCAP files; it is imported lazily
+_DPKT_AVAILABLE = importlib.util.find_spec('dpkt') is not None
 
 T = TypeVar('T')
 
@@ -35,10 +40,26 @@ class LogType(enum.Enum):
     Console = 'console'
     Valgrind = 'valgrind'
     Pcap = 'pcap'
+    Benchmark = 'benchmark'
+    Profile = 'profile'
+    ProfileStacks = 'profile_stacks'
+    Massif = 'massif'
+    TimeSeries = 'time_series'
+    BenchmarkTable = 'benchmark_table'
 
     def extension(self):
         if self == LogType.Pcap:
             return '.pcapng'
+        elif self == LogType.Benchmark:
+            return '.json'
+        elif self == LogType.Profile:
+            return '.prof'
+        elif self == LogType.ProfileStacks:
+            return '.folded'
+        elif self == LogType.Massif:
+            return '.massif'
+        elif self in (LogType.TimeSeries, LogType.BenchmarkTable):
+            return '.csv'
         else:
             return '.log'
 
@@ -313,6 +334,11 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
 
         self.servers = []
         self.bootstrap_server = None
+        # server -> impairment proxy the demo talks to it through, see link_profile
+        # in setup_demo_with_servers()
+        self.link_proxies = {}
+        # set if the demo was run under massif, see MASSIF in runtest.py
+        self.heap_usage = None
 
     def setUp(self, extra_cmdline_args=None, psk_identity=None, psk_key=None, client_ca_path=None,
               client_ca_file=None, server_crt_file=None, server_key_file=None,
@@ -322,6 +348,8 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
         tls_server_kwargs = {'transport': transport}
         if 'ciphersuites' in kwargs:
             tls_server_kwargs['ciphersuites'] = kwargs['ciphersuites']
+        if 'native_io' in kwargs:
+            tls_server_kwargs['native_io'] = kwargs.pop('native_io')
         if psk_identity:
             extra_args += ['--identity', str(binascii.hexlify(psk_identity), 'ascii'),
                            '--key', str(binascii.hexlify(psk_key), 'ascii')]
@@ -419,7 +447,7 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
             if serv.transport == Transport.TCP:
                 protocol += '+' + str(Transport.TCP)
             args += ['--server-uri', '%s://127.0.0.1:%d' %
-                     (protocol, serv.get_listen_port(),)]
+                     (protocol, self.get_server_port_for_demo(serv),)]
 
         return args
 
@@ -467,6 +495,59 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
 
         return valgrind_list
 
+    def _get_profiler(self):
+        """
+        Returns the name of the profiler the demo should be run under, as set
+        in the PROFILE environment variable, or None if profiling is disabled
+        for this test (also when the test does not match PROFILE_REGEX).
+        """
+        profiler = os.environ.get('PROFILE')
+        if not profiler:
+            return None
+        if ('PROFILE_REGEX' in os.environ
+                and not test_or_suite_matches_query_regex(self, os.environ['PROFILE_REGEX'])):
+            return None
+        return profiler
+
+    def _collect_demo_profile(self):
+        """
+        Converts raw profiler output of the most recently terminated demo into
+        collapsed stacks and merges them into the per-test stacks file.
+        """
+        profiler = getattr(self.demo_process, 'profiler', None)
+        if profiler is None:
+            return
+        elif profiler == 'massif':
+            return self._collect_demo_heap_usage()
+
+        try:
+            stacks = profiling.collapse_profile(profiler, self.logs_path(LogType.Profile))
+            profiling.merge_collapsed(self.logs_path(LogType.ProfileStacks), stacks)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.warning('could not collect %s profile: %s', profiler, e)
+            return
+
+        logging.info('hot functions (%s):\n%s', profiler,
+                     profiling.format_hot_functions(stacks, limit=10))
+
+    def _collect_demo_heap_usage(self):
+        """
+        Parses massif output of the most recently terminated demo. If the demo
+        was started multiple times during the test, the run with the highest
+        peak heap usage is retained in self.heap_usage.
+        """
+        try:
+            with open(self.logs_path(LogType.Massif)) as f:
+                heap_usage = profiling.parse_massif(f)
+        except (OSError, ValueError) as e:
+            logging.warning('could not collect massif heap usage: %s', e)
+            return
+
+        logging.info('%s', profiling.format_heap_usage(heap_usage))
+        if (self.heap_usage is None
+                or heap_usage['peak_heap_B'] > self.heap_usage['peak_heap_B']):
+            self.heap_usage = heap_usage
+
     def _get_demo_executable(self):
         demo_executable = os.path.join(
             self.config.demo_path, self.config.demo_cmd)
@@ -491,8 +572,21 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
             logging.info('*** rr-recording enabled ***')
             # ignore valgrind if rr was requested
             args_prefix = ['rr', 'record']
+            profiler = None
         else:
-            args_prefix = self._get_valgrind_args()
+            profiler = self._get_profiler()
+            if profiler:
+                logging.info('*** %s profiling enabled ***', profiler)
+                # ignore valgrind and massif if profiling was requested
+                args_prefix = profiling.profiler_args(profiler,
+                                                      self.logs_path(LogType.Profile))
+            elif (os.environ.get('MASSIF')
+                  and test_or_suite_matches_query_regex(self, os.environ['MASSIF'])):
+                logging.info('*** massif heap profiling enabled ***')
+                profiler = 'massif'
+                args_prefix = profiling.massif_args(self.logs_path(LogType.Massif))
+            else:
+                args_prefix = self._get_valgrind_args()
 
         demo_args = (prepend_args or []) + args_prefix + [demo_executable] + cmdline_args
 
@@ -513,6 +607,7 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
                                              stderr=console,
                                              bufsize=0)
         self.demo_process.log_file_write = console
+        self.demo_process.profiler = profiler
         self.demo_process.log_file_path = console_log_path
         self.demo_process.log_file = open(
             console_log_path, mode='rb', buffering=0)
@@ -628,6 +723,8 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
                                 binding=None,
                                 lwm2m11_queue_mode=False,
                                 fw_updated_marker_path=None,
+                                link_profile=None,
+                                link_seed=0,
                                 **kwargs):
         """
         Starts the demo process and creates any required auxiliary objects (such as Lwm2mServer objects) or processes.
@@ -663,6 +760,14 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
         :param binding:
         Passed down to self.assertDemoRegisters() if auto_register is true
 
+        :param link_profile:
+        If set, the demo talks to each server (including the Bootstrap Server) through an impairment proxy, see
+        framework/impairment_proxy.py. May be either a LinkProfile applied to both directions, or an (uplink, downlink)
+        tuple of them. The proxies are accessible through self.link_proxies.
+
+        :param link_seed:
+        Seed for random decisions taken by the impairment proxies.
+
         :return: None
         """
         demo_args = []
@@ -696,6 +801,12 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
             fw_updated_marker_path = generate_temp_filename(
                 dir='/tmp', prefix='anjay-fw-updated-')
 
+        if link_profile is not None:
+            uplink, downlink = (link_profile if not isinstance(link_profile, LinkProfile)
+                                else (link_profile, link_profile))
+            for index, serv in enumerate(all_servers):
+                self.impair_link(serv, uplink, downlink, seed=link_seed + index)
+
         demo_args += self.make_demo_args(
             endpoint_name, all_servers_passed,
             minimum_version, maximum_version,
@@ -788,8 +899,39 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
             if self.bootstrap_server:
                 cleanup_funcs.append(self.bootstrap_server.close)
 
+            for proxy in self.link_proxies.values():
+                cleanup_funcs.append(proxy.stop)
+            cleanup_funcs.append(self.link_proxies.clear)
+
             cleanup_funcs.append(self._terminate_dumpcap)
 
+    def impair_link(self, server, uplink, downlink=None, **kwargs):
+        """
+        Starts an impairment proxy between the demo and SERVER. It only affects
+        the demo if it is started (or reconfigured to use SERVER) afterwards, as
+        the demo is given the port returned by get_server_port_for_demo().
+        """
+        assert server not in self.link_proxies
+        proxy = make_impairment_proxy(server.transport, ('127.0.0.1', server.get_listen_port()),
+                                      uplink, downlink, **kwargs)
+        proxy.start()
+        self.link_proxies[server] = proxy
+        return proxy
+
+    def get_server_port_for_demo(self, server):
+        proxy = self.link_proxies.get(server)
+        return proxy.get_listen_port() if proxy is not None else server.get_listen_port()
+
+    def rebind_link(self, server=None):
+        """
+        Emulates NAT rebinding on the link to SERVER (the only one, by default):
+        the server will see the demo's traffic coming from a new address, and
+        follows it after the next packet it receives.
+        """
+        server = server or self.serv
+        self.link_proxies[server].rebind()
+        server.reset()
+
     def seek_demo_log_to_end(self):
         self.demo_process.log_file.seek(
             os.fstat(self.demo_process.log_file.fileno()).st_size)
@@ -852,6 +994,7 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
         finally:
             self.demo_process.log_file.close()
             self.demo_process.log_file_write.close()
+            self._collect_demo_profile()
 
     def _terminate_dumpcap(self):
         if self.dumpcap_process is None:
@@ -927,6 +1070,109 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
                 raise TimeoutError('Desired socket count not reached')
             time.sleep(0.1)
 
+    def wait_for_resource(self, path, predicate, timeout_s=20, server=None,
+                          poll_interval_s=0.5):
+        """
+        Waits until PREDICATE returns True for the value of the resource at
+        PATH, as seen by SERVER (the first server by default), and returns
+        that value as raw bytes.
+
+        The resource is observed with pmin=0, so that every change is
+        reported by the client as soon as it happens. If the client refuses
+        to establish the observation, the resource is polled with Read
+        requests every POLL_INTERVAL_S seconds instead. Update and Send
+        requests received while waiting are acknowledged with 2.04 Changed;
+        any other unexpected message is treated as an error. The observation
+        and the pmin attribute are removed afterwards, even if waiting fails.
+
+        Raises TimeoutError if the predicate is not satisfied within
+        TIMEOUT_S seconds.
+        """
+        serv = server or self.servers[0]
+        deadline = time.time() + timeout_s
+
+        def remaining_s():
+            return max(deadline - time.time(), 0)
+
+        req = Lwm2mWriteAttributes(path, pmin=0)
+        serv.send(req)
+        self.assertMsgEqual(Lwm2mChanged.matching(req)(), self._recv_skipping_unrelated(serv))
+
+        token = None
+        try:
+            observe_req = Lwm2mObserve(path)
+            serv.send(observe_req)
+            res = self._recv_skipping_unrelated(serv)
+            if isinstance(res, Lwm2mErrorResponse):
+                self.assertMsgEqual(Lwm2mErrorResponse.matching(observe_req)(res.code), res)
+            else:
+                self.assertMsgEqual(Lwm2mContent.matching(observe_req)(), res)
+                if res.get_options(coap.Option.OBSERVE):
+                    token = observe_req.token
+
+            value = res.content if token is not None else None
+            while value is None or not predicate(value):
+                if token is not None:
+                    try:
+                        pkt = self._recv_skipping_unrelated(serv, deadline=deadline)
+                    except socket.timeout:
+                        raise TimeoutError('%s did not reach the desired value, last value = %r'
+                                           % (path, value))
+                    self.assertMsgEqual(Lwm2mNotify(token), pkt)
+                    if pkt.type == coap.Type.CONFIRMABLE:
+                        serv.send(Lwm2mEmpty.matching(pkt)())
+                    value = pkt.content
+                else:
+                    if value is not None:
+                        if time.time() >= deadline:
+                            raise TimeoutError(
+                                '%s did not reach the desired value, last value = %r'
+                                % (path, value))
+                        time.sleep(min(poll_interval_s, remaining_s()))
+                    req = Lwm2mRead(path)
+                    serv.send(req)
+                    res = self._recv_skipping_unrelated(serv)
+                    self.assertMsgEqual(Lwm2mContent.matching(req)(), res)
+                    value = res.content
+            return value
+        finally:
+            self._stop_waiting_for_resource(serv, path, token)
+
+    def _recv_skipping_unrelated(self, serv, deadline=None):
+        """
+        Receives a message from SERV, acknowledging any Update and Send
+        requests received before it. If DEADLINE is given, socket.timeout is
+        raised if no other message arrives until then.
+        """
+        while True:
+            timeout_s = -1 if deadline is None else max(deadline - time.time(), 0)
+            pkt = serv.recv(timeout_s=timeout_s)
+            if not isinstance(pkt, (Lwm2mUpdate, Lwm2mSend)):
+                return pkt
+            serv.send(Lwm2mChanged.matching(pkt)())
+
+    def _stop_waiting_for_resource(self, serv, path, token):
+        if token is not None:
+            self._cancel_observation(serv, path, token)
+        req = Lwm2mWriteAttributes(path, query=['pmin'])
+        serv.send(req)
+        self.assertMsgEqual(Lwm2mChanged.matching(req)(), self._recv_skipping_unrelated(serv))
+
+    def _cancel_observation(self, serv, path, token):
+        req = Lwm2mObserve(path, observe=1, token=token)
+        serv.send(req)
+        while True:
+            pkt = self._recv_skipping_unrelated(serv)
+            # a notification may already be in flight when the cancellation
+            # is sent
+            if pkt.msg_id != req.msg_id:
+                self.assertMsgEqual(Lwm2mNotify(token), pkt)
+                if pkt.type == coap.Type.CONFIRMABLE:
+                    serv.send(Lwm2mEmpty.matching(pkt)())
+                continue
+            self.assertMsgEqual(Lwm2mContent.matching(req)(), pkt)
+            return
+
     def get_non_lwm2m_socket_count(self):
         return int(self.communicate('non-lwm2m-socket-count',
                                     match_regex='NON_LWM2M_SOCKET_COUNT==([0-9]+)\n').group(1))
@@ -949,6 +1195,17 @@ class Lwm2mTest(unittest.TestCase, Lwm2mAsserts):
     def advance_demo_time(self, duration_s=0.0):
         self.communicate('advance-time %s' % duration_s)
 
+    def _get_demo_time(self, cmd, name):
+        result = self.communicate(cmd, match_regex='%s=(TIME_INVALID|[0-9]+\\.[0-9]+)\n'
+                                                   % (name,)).group(1)
+        return None if result == 'TIME_INVALID' else float(result)
+
+    def get_next_planned_notify_time(self):
+        return self._get_demo_time('next-planned-notify', 'NEXT_PLANNED_NOTIFY')
+
+    def get_next_planned_pmax_notify_time(self):
+        return self._get_demo_time('next-planned-pmax-notify', 'NEXT_PLANNED_PMAX_NOTIFY')
+
     def ongoing_registration_exists(self):
         result = self.communicate('ongoing-registration-exists',
                                   match_regex='ONGOING_REGISTRATION==(true|false)\n').group(1)
@@ -1039,6 +1296,8 @@ class PcapEnabledTest(Lwm2mTest):
         return super().setUp(*args, **kwargs)
 
     def read_pcap(self):
+        import dpkt
+
         def decode_packet(data):
             # dumpcap captures contain Ethernet frames on Linux and
             # loopback ones on BSD
@@ -1075,12 +1334,14 @@ class PcapEnabledTest(Lwm2mTest):
 
     @staticmethod
     def is_icmp_unreachable(pkt):
+        import dpkt
         return isinstance(pkt, dpkt.ip.IP) \
                and isinstance(pkt.data, dpkt.icmp.ICMP) \
                and isinstance(pkt.data.data, dpkt.icmp.ICMP.Unreach)
 
     @staticmethod
     def is_dtls_client_hello(pkt):
+        import dpkt
         header = b'\x16'  # Content Type: Handshake
         header += b'\xfe\xfd'  # Version: DTLS 1.2
         header += b'\x00\x00'  # Epoch: 0
@@ -1118,6 +1379,143 @@ class PcapEnabledTest(Lwm2mTest):
             raise TimeoutError('ICMP Unreachable packet not generated')
 
 
+# Like PcapEnabledTest, this class **MUST** be specified before any other Lwm2mTest subclass in the
+# superclass list, so that tearDown() is able to store the results regardless of what the other
+# classes do.
+class BenchmarkTest(Lwm2mTest):
+    """
+    Base class for tests that measure performance of the demo client rather
+    than (only) its correctness.
+
+    Measurements are gathered into self.benchmark_report. After the test, they
+    are logged and stored as JSON in the LogType.Benchmark log file.
+    """
+
+    def __init__(self, test_method_name):
+        super().__init__(test_method_name)
+        self.benchmark_report = BenchmarkReport(self.test_name())
+
+    def benchmark_metric(self, name, unit='s'):
+        return self.benchmark_report.metric(name, unit)
+
+    def demo_cpu_time(self):
+        return process_cpu_time(self.demo_process.pid)
+
+    @contextlib.contextmanager
+    def measure_demo_cpu_time(self, metric_name='demo_cpu_time'):
+        """
+        Context manager that adds the CPU time consumed by the demo process
+        during its body as a new sample of METRIC_NAME. Does nothing if the CPU
+        time cannot be determined on the current platform.
+        """
+        start = self.demo_cpu_time()
+        yield
+        end = self.demo_cpu_time()
+        if start is not None and end is not None:
+            self.benchmark_metric(metric_name).add(end - start)
+
+    def tearDown(self, *args, **kwargs):
+        try:
+            return super().tearDown(*args, **kwargs)
+        finally:
+            if self.benchmark_report.metrics:
+                logging.info('%s', self.benchmark_report)
+                self.benchmark_report.dump(self.logs_path(LogType.Benchmark))
+
+
+class SoakTest(BenchmarkTest):
+    """
+    Base class for tests that keep the demo running for a long time and watch
+    its resource usage for gradual growth, e.g. caused by leaks.
+
+    Subclasses shall call soak_sample() every SAMPLE_INTERVAL_S seconds until
+    self.soak_duration passes, and check_growth() at the end. Samples are
+    stored as CSV in the LogType.TimeSeries log file only; the benchmark report
+    carries the metrics and the "growing" property.
+    """
+    DURATION_S = 300.0
+    SAMPLE_INTERVAL_S = 10.0
+    # additional quantities sampled by subclasses
+    EXTRA_COLUMNS = ()
+    # samples taken at the beginning of the test are not taken into account
+    # by check_growth(), as caches and buffers are still being filled then
+    WARMUP_FRACTION = 0.2
+    MIN_TREND_SAMPLES = 5
+    # maximum growth of each quantity over the test, as an (absolute, relative
+    # to its median value) pair; the larger of the two applies
+    GROWTH_TOLERANCES = {
+        'socket_count': (0.5, 0.0),
+        'non_lwm2m_socket_count': (0.5, 0.0),
+        'fd_count': (0.5, 0.0),
+        'rss_bytes': (256 * 1024, 0.1),
+    }
+
+    def __init__(self, test_method_name):
+        super().__init__(test_method_name)
+        self.time_series = TimeSeries(['socket_count', 'non_lwm2m_socket_count', 'fd_count',
+                                       'rss_bytes'] + list(self.EXTRA_COLUMNS))
+        self.soak_duration = soak_duration(self.DURATION_S)
+        self.soak_start = None
+
+    def setUp(self, *args, **kwargs):
+        super().setUp(*args, **kwargs)
+        self.benchmark_report.set_property('duration', self.soak_duration)
+        self.soak_start = time.monotonic()
+
+    def soak_elapsed(self):
+        return time.monotonic() - self.soak_start
+
+    def sample_demo_resources(self):
+        return {
+            'socket_count': self.get_socket_count(),
+            'non_lwm2m_socket_count': self.get_non_lwm2m_socket_count(),
+            'fd_count': process_fd_count(self.demo_process.pid),
+            'rss_bytes': process_memory_usage(self.demo_process.pid),
+        }
+
+    def soak_sample(self, **values):
+        """
+        Records current resource usage of the demo, along with VALUES of
+        EXTRA_COLUMNS, as a new sample.
+        """
+        values.update(self.sample_demo_resources())
+        self.time_series.add(self.soak_elapsed(), **values)
+
+    def check_growth(self):
+        """
+        Fits a line to samples of each quantity listed in GROWTH_TOLERANCES
+        taken after the warm-up period, and fails the test if the growth it
+        predicts over that period exceeds the tolerance. Fitted slopes are
+        stored in the "<quantity>_per_hour" properties of the benchmark report.
+        """
+        since = self.soak_duration * self.WARMUP_FRACTION
+        growing = []
+        for column, (absolute, relative) in self.GROWTH_TOLERANCES.items():
+            points = self.time_series.points(column, since)
+            if len(points) < self.MIN_TREND_SAMPLES:
+                logging.warning('too few samples of %s to detect its growth', column)
+                continue
+
+            slope = linear_trend(points)
+            self.benchmark_report.set_property('%s_per_hour' % (column,), slope * 3600)
+            growth = slope * (points[-1][0] - points[0][0])
+            tolerance = max(absolute, relative * statistics.median(v for _, v in points))
+            if growth > tolerance:
+                logging.warning('%s grows over time: by %g over %.0f s (tolerance: %g)',
+                                column, growth, points[-1][0] - points[0][0], tolerance)
+                growing.append(column)
+
+        self.benchmark_report.set_property('growing', growing)
+        self.assertEqual([], growing, 'resource usage of the demo grows over time')
+
+    def tearDown(self, *args, **kwargs):
+        try:
+            return super().tearDown(*args, **kwargs)
+        finally:
+            if len(self.time_series):
+                self.time_series.dump_csv(self.logs_path(LogType.TimeSeries))
+
+
 def get_test_name(test):
     if isinstance(test, Lwm2mTest):
         return test.test_name()
@@ -1148,19 +1546,12 @@ def get_suite_name(suite):
 
 def test_or_suite_matches_query_regex(test_or_suite, query_regex):
     """
-    Test or test suite matches regex query when at least one of following
-    matches the regex:
-
-    * test name,
-    * suite name,
-    * "suite_name.test_name" string.
-
-    Substring matches are allowed unless the regex is anchored using ^ or $.
+    See framework.test_manifest.matches_query_regex() for matching rules.
     """
     if isinstance(test_or_suite, unittest.TestCase):
-        return (re.search(query_regex, get_test_name(test_or_suite))
-                or re.search(query_regex, get_full_test_name(test_or_suite)))
+        return matches_query_regex(query_regex, None, get_test_name(test_or_suite),
+                                   get_full_test_name(test_or_suite))
     elif isinstance(test_or_suite, unittest.TestSuite):
-        return re.search(query_regex, get_suite_name(test_or_suite))
+        return matches_query_regex(query_regex, get_suite_name(test_or_suite))
     else:
         raise TypeError('Neither a test nor suite: %r' % test_or_suite)
@@ -18,7 +18,8 @@ import socket
 from typing import Optional
 
 from .lwm2m import coap
-from .firmware_package import FirmwareUpdateForcedError, make_firmware_package
+from .firmware_package import (FirmwareUpdateForcedError, make_firmware_package,
+                               build_firmware_package, map_firmware_package)
 
 if sys.version_info[0] == 3 and sys.version_info[1] < 7:
     # based on https://stackoverflow.com/a/18348004/2339636
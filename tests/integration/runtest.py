@@ -14,18 +14,23 @@ assert sys.version_info >= (3, 5), "Python < 3.5 is unsupported"
 
 import unittest
 import os
+import collections
 import collections.abc
 import argparse
+import importlib
+import inspect
+import json
 import time
 import tempfile
 import textwrap
 import shutil
 import logging
+import traceback
 
-from framework.pretty_test_runner import PrettyTestRunner
-from framework.pretty_test_runner import COLOR_DEFAULT, COLOR_YELLOW, COLOR_GREEN, COLOR_RED
-from framework.test_suite import Lwm2mTest, ensure_dir, get_full_test_name, get_suite_name, \
-    test_or_suite_matches_query_regex, LogType
+# Only lightweight parts of the framework are imported here; the test suite
+# machinery (and its optional dependencies) is imported when tests are run.
+from framework import profiling
+from framework import test_manifest
 
 if sys.version_info[0] >= 3:
     sys.stderr = os.fdopen(2, 'w', 1)  # force line buffering
@@ -45,29 +50,82 @@ def traverse(tree, cls=None):
                 yield sub_elem
 
 
-def discover_test_suites(test_config):
-    loader = unittest.TestLoader()
-    loader.testMethodPrefix = 'runTest'
-    suite = loader.discover(UNITTEST_PATH, pattern='*.py', top_level_dir=UNITTEST_PATH)
+def load_suite_module(module_name, test_config):
+    """
+    Imports a single suite module, e.g. "default.register", and returns
+    a unittest.TestSuite of all tests it contains.
+    """
+    from framework.test_suite import Lwm2mTest
+
+    # same as unittest discovery with top_level_dir=UNITTEST_PATH
+    if UNITTEST_PATH not in sys.path:
+        sys.path.insert(0, UNITTEST_PATH)
 
-    for error in loader.errors:
-        print(error)
-    if len(loader.errors):
+    try:
+        module = importlib.import_module(module_name)
+    except Exception:
+        print('Failed to import test module %s:' % (module_name,))
+        traceback.print_exc(file=sys.stdout)
         sys.exit(-1)
 
+    loader = unittest.TestLoader()
+    loader.testMethodPrefix = 'runTest'
+    suite = loader.loadTestsFromModule(module)
+
     for test in traverse(suite, cls=Lwm2mTest):
         test.set_config(test_config)
     return suite
 
 
-def list_tests(suite, header='Available tests:'):
+def describe_suite_module(module_name, test_config):
+    from framework.test_suite import (Lwm2mTest, get_test_name, get_full_test_name,
+                                      get_suite_name)
+
+    return [(get_suite_name([test]), get_test_name(test), get_full_test_name(test),
+             os.path.abspath(inspect.getfile(type(test))), isinstance(test, Lwm2mTest))
+            for test in traverse(load_suite_module(module_name, test_config),
+                                 cls=unittest.TestCase)]
+
+
+def load_test_manifest(test_config, manifest_path, refresh=False):
+    """
+    Returns the manifest of all available tests, updating the one cached in
+    MANIFEST_PATH if any suite modules were added, removed or modified.
+    """
+    if refresh:
+        manifest = test_manifest.load_manifest(os.devnull, UNITTEST_PATH)
+    else:
+        manifest = test_manifest.load_manifest(manifest_path, UNITTEST_PATH)
+
+    described = test_manifest.refresh_manifest(
+        manifest, lambda module_name: describe_suite_module(module_name, test_config))
+    if described:
+        sys.stderr.write('Test manifest updated (%d suite modules scanned): %s\n'
+                         % (described, manifest_path))
+        try:
+            test_manifest.save_manifest(manifest_path, manifest)
+        except OSError as e:
+            sys.stderr.write('Could not save test manifest: %s\n' % (e,))
+    return manifest
+
+
+def discover_test_suites(test_config, module_names):
+    return unittest.TestSuite(load_suite_module(module_name, test_config)
+                              for module_name in module_names)
+
+
+def list_tests(test_names, header='Available tests:'):
     print(header)
-    for test in traverse(suite, cls=Lwm2mTest):
-        print('* %s' % get_full_test_name(test))
+    for name in test_names:
+        print('* %s' % (name,))
     print('')
 
 
 def run_tests(suites, config):
+    from framework.pretty_test_runner import PrettyTestRunner
+    from framework.pretty_test_runner import COLOR_DEFAULT, COLOR_YELLOW, COLOR_GREEN, COLOR_RED
+    from framework.test_suite import ensure_dir, get_suite_name
+
     test_runner = PrettyTestRunner(config)
 
     start_time = time.time()
@@ -99,6 +157,8 @@ def run_tests(suites, config):
 
 
 def filter_tests(suite, query_regex):
+    from framework.test_suite import test_or_suite_matches_query_regex
+
     matching_tests = []
 
     for test in suite:
@@ -130,19 +190,110 @@ def merge_directory(src, dst):
         if os.path.isdir(src_item):
             merge_directory(src_item, dst_item)
         else:
-            ensure_dir(os.path.dirname(dst_item))
+            os.makedirs(os.path.dirname(dst_item), exist_ok=True)
             shutil.move(src_item, dst_item)
 
 
 def remove_tests_logs(tests):
+    from framework.test_suite import LogType
+
     for test in tests:
         for log_type in LogType:
+            if log_type in (LogType.Benchmark, LogType.Profile, LogType.ProfileStacks,
+                            LogType.Massif, LogType.TimeSeries, LogType.BenchmarkTable):
+                # benchmark and profiling results are the whole point of
+                # a successful run
+                continue
             try:
                 os.remove(test.logs_path(log_type))
             except FileNotFoundError:
                 pass
 
 
+def print_profile_report(logs_path, limit):
+    """
+    Aggregates collapsed stacks of all profiled tests into a single
+    all.folded file and prints LIMIT functions with the highest self cost.
+    """
+    from framework.test_suite import LogType
+
+    stacks_dir = os.path.join(logs_path, LogType.ProfileStacks.value)
+    aggregate_path = os.path.join(stacks_dir, 'all' + LogType.ProfileStacks.extension())
+
+    stacks = collections.Counter()
+    for root, _, files in os.walk(stacks_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if path != aggregate_path and name.endswith(LogType.ProfileStacks.extension()):
+                stacks += profiling.read_collapsed(path)
+
+    if not stacks:
+        print('No profile data collected; is the PROFILE environment variable set?')
+        return
+
+    profiling.write_collapsed(aggregate_path, stacks)
+    print('Hot functions across all profiled tests:')
+    print(profiling.format_hot_functions(stacks, limit=limit))
+
+
+def print_heap_report(results, limit, baseline_path=None, tolerance_percent=0.0,
+                      update_baseline=False):
+    """
+    Prints a table of LIMIT tests with the highest peak heap usage, as measured
+    with MASSIF. If BASELINE_PATH is given, peak heap usage of each test is
+    compared against the value stored there, and increases larger than
+    TOLERANCE_PERCENT are flagged.
+
+    Returns a list of names of tests whose peak heap usage increased.
+    """
+    from framework.pretty_test_runner import COLOR_DEFAULT, COLOR_RED
+
+    heap_usage = {}
+    for r in results:
+        heap_usage.update(r.heap_usage)
+    if not heap_usage:
+        return []
+
+    baseline = {}
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    regressions = []
+    rows = sorted(heap_usage.items(), key=lambda kv: kv[1]['peak_heap_B'], reverse=True)
+    name_width = max(len('Test'), max(len(name) for name, _ in rows))
+
+    print('Peak heap usage (top %d of %d tests):' % (min(limit, len(rows)), len(rows)))
+    print('%-*s %12s %12s %9s' % (name_width, 'Test', 'Peak [B]', 'Baseline [B]', 'Change'))
+    for index, (name, usage) in enumerate(rows):
+        peak = usage['peak_heap_B']
+        reference = baseline.get(name)
+        change = ''
+        regressed = False
+        if reference:
+            change_percent = 100.0 * (peak - reference) / reference
+            change = '%+.1f%%' % (change_percent,)
+            regressed = change_percent > tolerance_percent
+            if regressed:
+                regressions.append(name)
+
+        if index < limit or regressed:
+            line = '%-*s %12d %12s %9s' % (name_width, name, peak,
+                                           reference if reference is not None else '-', change)
+            if regressed:
+                line = '%s%s  <-- INCREASED%s' % (COLOR_RED, line, COLOR_DEFAULT)
+            print(line)
+
+    if update_baseline and baseline_path:
+        baseline.update((name, usage['peak_heap_B']) for name, usage in heap_usage.items())
+        with open(baseline_path, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Heap usage baseline updated: %s' % (baseline_path,))
+
+    return regressions
+
+
 if __name__ == "__main__":
     LOG_LEVEL = os.getenv('LOGLEVEL', 'info').upper()
     try:
@@ -173,12 +324,39 @@ if __name__ == "__main__":
                 tests/suites, demo client execution command is prefixed with `rr record`
                 to allow post-mortem debugging with `rr replay`.
 
+          BENCHMARK_ITERATIONS - if set, overrides the number of iterations performed
+                                 by each benchmark, e.g. in the "perf" suite. Benchmark
+                                 results are stored as JSON next to the other logs, and
+                                 are kept even for tests that passed.
+
+          SOAK_DURATION - if set, overrides the time, in seconds, for which each test in
+                          the "soak" suite keeps the demo running. Resource usage of the
+                          demo sampled during that time is stored as CSV in the
+                          "time_series" log directory.
+
+          PROFILE - if set to "perf" or "callgrind", demo client execution command is
+                    prefixed with `perf record -g` or `valgrind --tool=callgrind`,
+                    respectively. Takes precedence over VALGRIND, but not over RR/RRR.
+                    Raw profiler output is stored in the "profile" log directory,
+                    and collapsed stacks (usable with flamegraph.pl) in "profile_stacks".
+                    See also --profile-report.
+
+          PROFILE_REGEX - if set, PROFILE applies only to tests or test suites
+                          matching this regex. See REGEX MATCH RULES below.
+
+          MASSIF - if set and not empty, its value is used for regex-matching applicable
+                   tests or test suites. See REGEX MATCH RULES below. For matching
+                   tests/suites, demo client is run under `valgrind --tool=massif`
+                   and its peak heap usage and top allocation sites are reported.
+                   PROFILE, RR and RRR take precedence over MASSIF; MASSIF takes
+                   precedence over VALGRIND. See also --heap-baseline.
+
         REGEX MATCH RULES
         =================
         {regex_match_rules_help}
     '''.format(regex_match_rules_help=textwrap.indent(
         textwrap.dedent(
-            test_or_suite_matches_query_regex.__doc__),
+            test_manifest.matches_query_regex.__doc__),
         prefix=' ' * 8))),
         formatter_class=argparse.RawDescriptionHelpFormatter)
 
@@ -193,6 +371,27 @@ if __name__ == "__main__":
                         help='keep logs from all tests, including ones that passed')
     parser.add_argument('--target-logs-path', type=str,
                         help='path where to leave the logs stored')
+    parser.add_argument('--profile-report', type=int, metavar='N', nargs='?', const=30,
+                        help='after running the tests, print N (default: 30) functions '
+                             'with the highest self cost across all tests profiled '
+                             'using PROFILE')
+    parser.add_argument('--heap-report-limit', type=int, metavar='N', default=20,
+                        help='number of tests listed in the peak heap usage table printed '
+                             'after running tests with MASSIF (default: %(default)s)')
+    parser.add_argument('--heap-baseline', type=str, metavar='PATH',
+                        help='JSON file with reference peak heap usage of tests run with '
+                             'MASSIF; tests that use more memory are reported as failures')
+    parser.add_argument('--heap-tolerance', type=float, metavar='PERCENT', default=5.0,
+                        help='allowed increase of peak heap usage over --heap-baseline, '
+                             'in percent (default: %(default)s)')
+    parser.add_argument('--update-heap-baseline', action='store_true',
+                        help='store peak heap usage measured in this run in --heap-baseline')
+    parser.add_argument('--test-manifest', type=str, metavar='PATH',
+                        help='file used to cache the list of available tests, so that listing '
+                             'and filtering tests does not require importing all test suites '
+                             '(default: test_manifest.json next to the target logs path)')
+    parser.add_argument('--refresh-test-manifest', action='store_true',
+                        help='rebuild the test manifest even if no suite files changed')
     parser.add_argument('query_regex',
                         type=str, default=DEFAULT_SUITE_REGEX, nargs='?',
                         help='regex used to filter test cases. See REGEX MATCH RULES for details.')
@@ -220,20 +419,35 @@ if __name__ == "__main__":
                 ['Test config:'] + ['%%-%ds = %%s' % max_key_len % kv for kv in config])
 
 
-        test_suites = discover_test_suites(TestConfig)
-        header = '%d tests:' % test_suites.countTestCases()
+        manifest_path = os.path.abspath(
+            cmdline_args.test_manifest
+            or os.path.join(os.path.dirname(TestConfig.target_logs_path), 'test_manifest.json'))
+        manifest = load_test_manifest(TestConfig, manifest_path,
+                                      refresh=cmdline_args.refresh_test_manifest)
+        selected = test_manifest.select_tests(manifest, cmdline_args.query_regex)
+        # other test cases are run, but not listed
+        test_names = [name
+                      for _, names in test_manifest.select_tests(manifest,
+                                                                 cmdline_args.query_regex,
+                                                                 lwm2m_only=True)
+                      for name in names]
+        header = '%d tests:' % len(test_names)
 
         if cmdline_args.query_regex:
-            test_suites = filter_tests(test_suites, cmdline_args.query_regex)
-            header = '%d tests match pattern %s:' % (
-                test_suites.countTestCases(), cmdline_args.query_regex)
+            header = '%d tests match pattern %s:' % (len(test_names), cmdline_args.query_regex)
 
-        list_tests(test_suites, header=header)
+        list_tests(test_names, header=header)
 
         result = None
         if not cmdline_args.list:
             sys.stderr.write('%s\n\n' % config_to_string(TestConfig))
 
+            # only modules containing selected tests are imported
+            test_suites = discover_test_suites(TestConfig,
+                                               [module_name for module_name, _ in selected])
+            if cmdline_args.query_regex:
+                test_suites = filter_tests(test_suites, cmdline_args.query_regex)
+
             try:
                 results = run_tests(test_suites, TestConfig)
                 for r in results:
@@ -242,10 +456,21 @@ if __name__ == "__main__":
                     if not cmdline_args.keep_success_logs:
                         remove_tests_logs(r.successes)
 
+                heap_regressions = print_heap_report(
+                    results, cmdline_args.heap_report_limit,
+                    baseline_path=cmdline_args.heap_baseline,
+                    tolerance_percent=cmdline_args.heap_tolerance,
+                    update_baseline=cmdline_args.update_heap_baseline)
+
                 if any(r.errors or r.failures for r in results):
                     raise SystemError("Some tests failed, inspect log for details")
+                if heap_regressions and not cmdline_args.update_heap_baseline:
+                    raise SystemError("Peak heap usage increased in %d tests: %s"
+                                      % (len(heap_regressions), ', '.join(heap_regressions)))
             finally:
+                if cmdline_args.profile_report is not None:
+                    print_profile_report(TestConfig.logs_path, cmdline_args.profile_report)
                 # calculate logs path based on executable path to prevent it
                 # from creating files in source directory if building out of source
-                ensure_dir(os.path.dirname(TestConfig.target_logs_path))
+                os.makedirs(os.path.dirname(TestConfig.target_logs_path), exist_ok=True)
                 merge_directory(TestConfig.logs_path, TestConfig.target_logs_path)
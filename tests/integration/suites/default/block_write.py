@@ -92,7 +92,7 @@ class Block:
                 self.assertEqual(coap.Code.RES_CHANGED, response.code)
 
             self.assertEqual(request.get_options(coap.Option.BLOCK1),
-                             response.options)
+                             list(response.options))
 
         def setUp(self, *args, **kwargs):
             super().setUp(*args, **kwargs)
@@ -7,6 +7,7 @@
 # Licensed under the AVSystem-5-clause License.
 # See the attached LICENSE file for details.
 
+from framework.bootstrap_driver import BootstrapConfig, BootstrapDriver
 from framework.lwm2m.coap.code import Code
 from framework.lwm2m.coap.server import SecurityMode
 from framework.lwm2m_test import *
@@ -996,3 +997,41 @@ class BootstrapCuriousServerDisabling(BootstrapTest.Test):
         # Registration
         self.assertDemoRegisters(version='1.1', lwm2m11_queue_mode=True)
         self.wait_until_socket_count(expected=1, timeout_s=5)
+
+
+class BootstrapDriverTest:
+    class Test(BootstrapTest.Test):
+        NSTART = 1
+        FORMAT = coap.ContentFormat.APPLICATION_LWM2M_TLV
+        PER_OBJECT = False
+
+        def setUp(self):
+            super().setUp(minimum_version='1.1', maximum_version='1.1',
+                          extra_cmdline_args=['--nstart', str(self.NSTART)])
+
+        def runTest(self):
+            self.assertDemoRequestsBootstrap(
+                preferred_content_format=coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR)
+            config = BootstrapConfig.with_servers(
+                ['coap://127.0.0.1:%d' % (self.serv.get_listen_port(),)], lifetime=60)
+            timing = BootstrapDriver(self.bootstrap_server, nstart=self.NSTART,
+                                     format=self.FORMAT, per_object=self.PER_OBJECT).run(config)
+            self.assertEqual('finish', timing.steps[-1].operation)
+            # nothing is sent before Bootstrap-Delete is acknowledged
+            delete = timing.step('delete', '/')
+            for step in timing.steps:
+                if step is not delete:
+                    self.assertGreaterEqual(step.sent_at, delete.sent_at + delete.duration)
+
+            self.assertDemoRegisters(self.serv, version='1.1', lifetime=60)
+            self.assertEqual(b'1', self.read_resource(self.serv, oid=OID.AccessControl, iid=0,
+                                                      rid=RID.AccessControl.Owner).content)
+
+
+class BootstrapPipelinedTest(BootstrapDriverTest.Test):
+    NSTART = 4
+
+
+class BootstrapPerObjectSenmlCborTest(BootstrapDriverTest.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+    PER_OBJECT = True
@@ -7,6 +7,8 @@
 # Licensed under the AVSystem-5-clause License.
 # See the attached LICENSE file for details.
 
+import cbor2
+
 from framework.lwm2m_test import *
 from framework.test_utils import *
 
@@ -7,10 +7,22 @@
 # Licensed under the AVSystem-5-clause License.
 # See the attached LICENSE file for details.
 
+import http
+import http.server
+import json
+import os
+import sys
+import threading
+
 from framework.lwm2m.senml_cbor import *
+from framework.serialize_senml_cbor import serialize_config
 from framework.test_utils import *
 from framework.lwm2m_test import *
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', '..', '..', 'tools', 'provisioning-tool'))
+from factory_prov import batch
+
 
 class ConnectToServerTest(test_suite.Lwm2mSingleServerTest, test_suite.Lwm2mDmOperations):
     def setUp(self):
@@ -66,3 +78,239 @@ class WriteMultiInstanceResourceTest(test_suite.Lwm2mSingleServerTest, test_suit
         response = self.read_path(self.serv, ResPath.Test[1].IntArray + '/0')
         self.assertEqual(response.get_content_format(), coap.ContentFormat.TEXT_PLAIN)
         self.assertEqual(response.content, b'50')
+
+
+class CompactConfigTest(test_suite.Lwm2mSingleServerTest, test_suite.Lwm2mDmOperations):
+    def setUp(self):
+        server = Lwm2mServer()
+        self.provisioning_config = {
+            OID.Security: {
+                1: {
+                    RID.Security.ServerURI: 'coap://127.0.0.1:%d' % (server.get_listen_port()),
+                    RID.Security.Bootstrap: False,
+                    RID.Security.Mode: 3,
+                    RID.Security.ShortServerID: 1,
+                },
+            },
+            OID.Server: {
+                1: {
+                    RID.Server.ShortServerID: 1,
+                    RID.Server.Lifetime: 86400,
+                    RID.Server.NotificationStoring: False,
+                    RID.Server.Binding: 'U',
+                },
+            },
+            OID.Test: {
+                1: {
+                    RID.Test.IntArray: {0: 50, 1: 99},
+                },
+                21: {
+                    RID.Test.ResInt: 64,
+                },
+            },
+        }
+        self.blob = serialize_config(self.provisioning_config, compact=True)
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(self.blob)
+            f.flush()
+            super().setUp(servers=[server], num_servers_passed=0,
+                          extra_cmdline_args=['--factory-provisioning-file', f.name])
+        self.assertDemoRegisters()
+
+    def runTest(self):
+        self.assertLess(len(self.blob), len(serialize_config(self.provisioning_config)))
+        CBOR.parse(self.blob).verify_values(self, {
+            '/0/1/0': 'coap://127.0.0.1:%d' % (self.serv.get_listen_port()),
+            ResPath.Test[1].IntArray + '/0': 50,
+            ResPath.Test[1].IntArray + '/1': 99,
+            ResPath.Test[21].ResInt: 64,
+        })
+
+        response = self.read_path(self.serv, ResPath.Test[1].IntArray + '/1')
+        self.assertEqual(response.get_content_format(), coap.ContentFormat.TEXT_PLAIN)
+        self.assertEqual(response.content, b'99')
+
+        response = self.read_path(self.serv, ResPath.Test[21].ResInt)
+        self.assertEqual(response.content, b'64')
+
+
+class BatchProvisioningTest(test_suite.Lwm2mSingleServerTest, test_suite.Lwm2mDmOperations):
+    """
+    Provisions several endpoints at once with the provisioning tool's batch
+    mode, registering them in a stub Coiote DM API server, and checks that
+    per-endpoint results and failures are reported. One of the resulting
+    blobs is then used to start the demo.
+    """
+
+    DUPLICATE_URN = 'urn:dev:os:batch-duplicate'
+
+    class CoioteStub(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+
+        def __init__(self):
+            self.registrations = []
+            self.mutex = threading.Lock()
+            super().__init__(('127.0.0.1', 0), BatchProvisioningTest.CoioteStubHandler)
+
+    class CoioteStubHandler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            with self.server.mutex:
+                self.server.registrations.append((self.path, self.headers['Authorization'], body))
+
+            if body['properties']['endpointName'] == BatchProvisioningTest.DUPLICATE_URN:
+                status, response = http.HTTPStatus.CONFLICT, {'error': 'Device already exists'}
+            else:
+                status, response = http.HTTPStatus.CREATED, {}
+            payload = json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args, **kwargs):
+            # don't display logs
+            pass
+
+    def setUp(self):
+        server = Lwm2mServer()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.stub = self.CoioteStub()
+        self.stub_thread = threading.Thread(target=self.stub.serve_forever)
+        self.stub_thread.start()
+
+        with open(os.path.join(self.tmp_dir.name, 'endpoint_cfg'), 'w') as f:
+            f.write(repr({
+                OID.Security: {
+                    1: {
+                        RID.Security.ServerURI: 'coap://127.0.0.1:%d' % (server.get_listen_port()),
+                        RID.Security.Bootstrap: False,
+                        RID.Security.Mode: 3,
+                        RID.Security.ShortServerID: 1,
+                    },
+                },
+                OID.Server: {
+                    1: {
+                        RID.Server.ShortServerID: 1,
+                        RID.Server.Lifetime: 86400,
+                        RID.Server.NotificationStoring: False,
+                        RID.Server.Binding: 'U',
+                    },
+                },
+            }))
+        # evaluates fine, but makes the provisioning tool fail with AttributeError
+        with open(os.path.join(self.tmp_dir.name, 'malformed_cfg'), 'w') as f:
+            f.write(repr({OID.Security: [1]}))
+        self.server_info = os.path.join(self.tmp_dir.name, 'server.json')
+        with open(self.server_info, 'w') as f:
+            json.dump({'url': 'http://127.0.0.1',
+                       'port': self.stub.server_address[1],
+                       'domain': '/batch-test/'}, f)
+
+        self.manifest = os.path.join(self.tmp_dir.name, 'manifest.json')
+        with open(self.manifest, 'w') as f:
+            json.dump({
+                'defaults': {'endpoint_cfg': 'endpoint_cfg'},
+                'endpoints': [
+                    {'URN': 'urn:dev:os:batch-0'},
+                    {'URN': 'urn:dev:os:batch-1'},
+                    {'URN': self.DUPLICATE_URN},
+                    {'URN': 'urn:dev:os:batch-2'},
+                    {'URN': 'urn:dev:os:batch-missing-cfg', 'endpoint_cfg': 'nonexistent_cfg'},
+                    {'URN': 'urn:dev:os:batch-malformed-cfg', 'endpoint_cfg': 'malformed_cfg'},
+                ],
+            }, f)
+
+        self.output_dir = os.path.join(self.tmp_dir.name, 'output')
+        self.index = batch.provision_batch(self.manifest, self.output_dir,
+                                           server=self.server_info, token='batch-test-token',
+                                           jobs=2, registration_concurrency=2)
+
+        super().setUp(servers=[server], num_servers_passed=0,
+                      extra_cmdline_args=['--factory-provisioning-file',
+                                          os.path.join(self.output_dir,
+                                                       self.index['results'][0]['output'])])
+        self.assertDemoRegisters()
+
+    def tearDown(self):
+        try:
+            super().tearDown()
+        finally:
+            self.stub.shutdown()
+            self.stub.server_close()
+            self.stub_thread.join()
+            self.tmp_dir.cleanup()
+
+    def runTest(self):
+        self.assertEqual(6, self.index['endpoints'])
+        self.assertEqual(3, self.index['succeeded'])
+        self.assertEqual(3, self.index['failed'])
+
+        results = {result['URN']: result for result in self.index['results']}
+        self.assertEqual(list(range(6)), [result['index'] for result in self.index['results']])
+        for urn in ('urn:dev:os:batch-0', 'urn:dev:os:batch-1', 'urn:dev:os:batch-2'):
+            result = results[urn]
+            self.assertTrue(result['ok'])
+            self.assertTrue(result['registered'])
+            self.assertNotIn('error', result)
+            self.assertIn('register', result['timings'])
+            with open(os.path.join(self.output_dir, result['output']), 'rb') as f:
+                blob = f.read()
+            self.assertEqual(result['size'], len(blob))
+            CBOR.parse(blob).verify_values(self, {
+                '/0/1/0': 'coap://127.0.0.1:%d' % (self.serv.get_listen_port()),
+                '/1/1/1': 86400,
+            })
+
+        # serialized successfully, but rejected by the server
+        duplicate = results[self.DUPLICATE_URN]
+        self.assertFalse(duplicate['ok'])
+        self.assertFalse(duplicate['registered'])
+        self.assertEqual('ConnectionError: 409 Device already exists', duplicate['error'])
+        self.assertTrue(os.path.isfile(os.path.join(self.output_dir, duplicate['output'])))
+
+        # failed before reaching the server
+        missing_cfg = results['urn:dev:os:batch-missing-cfg']
+        self.assertFalse(missing_cfg['ok'])
+        self.assertNotIn('registered', missing_cfg)
+        self.assertNotIn('output', missing_cfg)
+        self.assertTrue(missing_cfg['error'].startswith('FileNotFoundError: '))
+        self.assertIn('nonexistent_cfg', missing_cfg['error'])
+
+        # unexpected errors are reported per endpoint as well
+        malformed_cfg = results['urn:dev:os:batch-malformed-cfg']
+        self.assertFalse(malformed_cfg['ok'])
+        self.assertNotIn('output', malformed_cfg)
+        self.assertTrue(malformed_cfg['error'].startswith('AttributeError: '))
+
+        with self.stub.mutex:
+            registrations = sorted(self.stub.registrations,
+                                   key=lambda r: r[2]['properties']['endpointName'])
+        self.assertEqual(['urn:dev:os:batch-0', 'urn:dev:os:batch-1', 'urn:dev:os:batch-2',
+                          self.DUPLICATE_URN],
+                         [body['properties']['endpointName'] for _, _, body in registrations])
+        for path, authorization, body in registrations:
+            self.assertEqual('/api/coiotedm/v3/devices', path)
+            self.assertEqual('Bearer batch-test-token', authorization)
+            self.assertEqual('/batch-test/', body['domain'])
+            self.assertEqual('nosec', body['securityMode'])
+
+        with open(os.path.join(self.output_dir, 'index.json'), 'r') as f:
+            written_index = json.load(f)
+        self.assertEqual(self.index['results'], written_index['results'])
+        for result in written_index['results']:
+            self.assertNotIn('registration_info', result)
+
+        summary = batch.format_summary(self.index).splitlines()
+        self.assertTrue(summary[0].startswith('Provisioned 3/6 endpoints'))
+        self.assertEqual(sorted(['  FAILED #2 (%s): %s' % (self.DUPLICATE_URN, duplicate['error']),
+                                 '  FAILED #4 (urn:dev:os:batch-missing-cfg): %s'
+                                 % (missing_cfg['error'],),
+                                 '  FAILED #5 (urn:dev:os:batch-malformed-cfg): %s'
+                                 % (malformed_cfg['error'],)]),
+                         sorted(line for line in summary if line.startswith('  FAILED')))
+
+        response = self.read_path(self.serv, ResPath.Server[1].Lifetime)
+        self.assertEqual(b'86400', response.content)
@@ -9,15 +9,15 @@
 
 import asyncio
 import http
-import http.server
 import os
 import re
 import ssl
 import threading
 import unittest
-import zlib
 
+from framework import firmware_origin
 from framework.coap_file_server import CoapFileServerThread, CoapFileServer
+from framework.firmware_origin import FirmwareOrigin, FirmwareResource
 from framework.lwm2m_test import *
 from .access_control import AccessMask
 from .block_write import Block, equal_chunk_splitter
@@ -130,6 +130,10 @@ class FirmwareUpdate:
             self.assertMsgEqual(Lwm2mContent.matching(req)(), res)
             return int(res.content)
 
+        def wait_for_state(self, state, timeout_s=20):
+            self.wait_for_resource(ResPath.FirmwareUpdate.State,
+                                   lambda value: int(value) == state, timeout_s=timeout_s)
+
         def write_firmware_and_wait_for_download(self, firmware_uri: str,
                                                  download_timeout_s=20):
             # Write /5/0/1 (Firmware URI)
@@ -139,74 +143,70 @@ class FirmwareUpdate:
                                 self.serv.recv())
 
             # wait until client downloads the firmware
-            deadline = time.time() + download_timeout_s
-            while time.time() < deadline:
-                time.sleep(0.5)
-
-                if self.read_state() == UpdateState.DOWNLOADED:
-                    return
-
-            self.fail('firmware still not downloaded')
+            try:
+                self.wait_for_state(UpdateState.DOWNLOADED, timeout_s=download_timeout_s)
+            except TimeoutError:
+                self.fail('firmware still not downloaded')
 
     class TestWithHttpServer(Test):
-        RESPONSE_DELAY = 0
-        CHUNK_SIZE = sys.maxsize
+        THROTTLE = firmware_origin.UNTHROTTLED
         ETAGS = False
+        # if False, Range headers are ignored and the whole package is always sent
+        ACCEPT_RANGES = False
+        # if True, response headers are sent before provide_response() is called;
+        # the demo does not handle LwM2M traffic while waiting for them
+        EARLY_HEADERS = False
         FW_PKG_OPTS = {}
 
         def get_firmware_uri(self):
-            return 'http://127.0.0.1:%d%s' % (
-                self.http_server.server_address[1], FIRMWARE_PATH)
+            return self.firmware_origin.get_http_uri(FIRMWARE_PATH)
+
+        def provide_response(self, use_real_app=False, num_requests=1, **kwargs):
+            """
+            Makes the firmware package available for the next NUM_REQUESTS
+            download requests. KWARGS are passed to the FirmwareResource
+            constructor.
+            """
+            if use_real_app:
+                kwargs['file_path'] = build_firmware_package(
+                    os.path.join(self.config.demo_path, self.config.demo_cmd), **self.FW_PKG_OPTS)
+            else:
+                kwargs['data'] = make_firmware_package(self.FIRMWARE_SCRIPT_CONTENT,
+                                                       **self.FW_PKG_OPTS)
+            if not self.ETAGS:
+                kwargs.setdefault('etag', b'')
 
-        def provide_response(self, use_real_app=False):
             with self._response_cv:
-                self.assertIsNone(self._response_content)
-                if use_real_app:
-                    with open(os.path.join(self.config.demo_path, self.config.demo_cmd), 'rb') as f:
-                        firmware = f.read()
-                        self._response_content = make_firmware_package(
-                            firmware, **self.FW_PKG_OPTS)
-                else:
-                    self._response_content = make_firmware_package(
-                        self.FIRMWARE_SCRIPT_CONTENT, **self.FW_PKG_OPTS)
-                self._response_cv.notify()
+                self.assertIsNone(self._response)
+                self._response = FirmwareResource(**kwargs)
+                self._response_requests_left = num_requests
+                self._provided_responses.append(self._response)
+                self._response_cv.notify_all()
 
-        def _create_server(self):
+        def _create_server(self, **kwargs):
             test_case = self
 
-            class FirmwareRequestHandler(http.server.BaseHTTPRequestHandler):
-                def do_GET(self):
-                    self.send_response(http.HTTPStatus.OK)
-                    self.send_header('Content-type', 'text/plain')
-                    if test_case.ETAGS:
-                        self.send_header('ETag', '"some_etag"')
-                    self.end_headers()
+            class DeferredFirmwareOrigin(FirmwareOrigin):
+                def get_resource(self, path):
+                    test_case.requests.append(path)
 
                     # This condition variable makes it possible to defer sending the response.
                     # FirmwareUpdateStateChangeTest uses it to ensure demo has enough time
                     # to send the interim "Downloading" state notification.
                     with test_case._response_cv:
-                        while test_case._response_content is None:
-                            test_case._response_cv.wait()
-                        response_content = test_case._response_content
-                        test_case.requests.append(self.path)
-                        test_case._response_content = None
-
-                    def chunks(data):
-                        for i in range(0, len(response_content),
-                                       test_case.CHUNK_SIZE):
-                            yield response_content[i:i + test_case.CHUNK_SIZE]
-
-                    for chunk in chunks(response_content):
-                        time.sleep(test_case.RESPONSE_DELAY)
-                        self.wfile.write(chunk)
-                        self.wfile.flush()
-
-                def log_request(self, code='-', size='-'):
-                    # don't display logs on successful request
-                    pass
-
-            return http.server.HTTPServer(('', 0), FirmwareRequestHandler)
+                        test_case._response_cv.wait_for(
+                            lambda: test_case._response is not None or test_case._shutdown)
+                        response = test_case._response
+                        if response is not None:
+                            test_case._response_requests_left -= 1
+                            if test_case._response_requests_left == 0:
+                                test_case._response = None
+                        return response
+
+            return DeferredFirmwareOrigin(throttle=self.THROTTLE,
+                                          accept_ranges=self.ACCEPT_RANGES,
+                                          early_headers=self.EARLY_HEADERS,
+                                          **kwargs)
 
         def write_firmware_and_wait_for_download(self, *args, **kwargs):
             requests = list(self.requests)
@@ -215,23 +215,28 @@ class FirmwareUpdate:
 
         def setUp(self, *args, **kwargs):
             self.requests = []
-            self._response_content = None
+            self._response = None
+            self._response_requests_left = 0
+            self._provided_responses = []
             self._response_cv = threading.Condition()
+            self._shutdown = False
 
-            self.http_server = self._create_server()
+            self.firmware_origin = self._create_server()
 
             super().setUp(*args, **kwargs)
 
-            self.server_thread = threading.Thread(
-                target=lambda: self.http_server.serve_forever())
-            self.server_thread.start()
+            self.firmware_origin.start()
 
         def tearDown(self):
             try:
                 super().tearDown()
             finally:
-                self.http_server.shutdown()
-                self.server_thread.join()
+                with self._response_cv:
+                    self._shutdown = True
+                    self._response_cv.notify_all()
+                self.firmware_origin.stop()
+                for response in self._provided_responses:
+                    response.close()
 
     class TestWithTlsServer(Test):
         @staticmethod
@@ -335,17 +340,8 @@ class FirmwareUpdate:
                 unlink_without_err(self._key_file)
 
     class TestWithHttpsServer(TestWithTlsServer, TestWithHttpServer):
-        def get_firmware_uri(self):
-            http_uri = super().get_firmware_uri()
-            assert http_uri[:5] == 'http:'
-            return 'https:' + http_uri[5:]
-
         def _create_server(self):
-            http_server = super()._create_server()
-            http_server.socket = ssl.wrap_socket(http_server.socket, certfile=self._cert_file,
-                                                 keyfile=self._key_file,
-                                                 server_side=True)
-            return http_server
+            return super()._create_server(certfile=self._cert_file, keyfile=self._key_file)
 
     class TestWithCoapServer(Test):
         def setUp(self, coap_server=None, *args, **kwargs):
@@ -404,9 +400,11 @@ class FirmwareUpdate:
     class TestWithPartialDownloadAndRestart(
         TestWithPartialDownload, DemoArgsExtractorMixin):
         def tearDown(self):
-            with open(self.fw_file_name, "rb") as f:
-                self.assertEqual(f.read(), self.FIRMWARE_SCRIPT_CONTENT)
-            super().tearDown()
+            try:
+                with open(self.fw_file_name, "rb") as f:
+                    self.assertEqual(f.read(), self.FIRMWARE_SCRIPT_CONTENT)
+            finally:
+                super().tearDown()
 
     class TestWithPartialCoapDownloadAndRestart(TestWithPartialDownloadAndRestart,
                                                 TestWithCoapServer):
@@ -427,71 +425,25 @@ class FirmwareUpdate:
 
     class TestWithPartialHttpDownloadAndRestart(TestWithPartialDownloadAndRestart,
                                                 TestWithHttpServer):
-        def get_etag(self, response_content):
-            return '"%d"' % zlib.crc32(response_content)
-
-        def check_success(self, handler, response_content, response_etag):
-            pass
-
-        def send_headers(self, handler, response_content, response_etag):
-            pass
-
-        def _create_server(self):
-            test_case = self
-
-            class FirmwareRequestHandler(http.server.BaseHTTPRequestHandler):
-                def send_response(self, *args, **kwargs):
-                    self._response_sent = True
-                    return super().send_response(*args, **kwargs)
-
-                def do_GET(self):
-                    self._response_sent = False
-                    test_case.requests.append(self.path)
-
-                    # This condition variable makes it possible to defer sending the response.
-                    # FirmwareUpdateStateChangeTest uses it to ensure demo has enough time
-                    # to send the interim "Downloading" state notification.
-                    with test_case._response_cv:
-                        while test_case._response_content is None:
-                            test_case._response_cv.wait()
-                        response_content = test_case._response_content
-                        response_etag = test_case.get_etag(response_content)
-
-                        test_case.check_success(
-                            self, response_content, response_etag)
-                        if self._response_sent:
-                            return
-
-                        test_case._response_content = None
-
-                    self.send_response(http.HTTPStatus.OK)
-                    self.send_header('Content-type', 'text/plain')
-                    if response_etag is not None:
-                        self.send_header('ETag', response_etag)
-                    offset = test_case.send_headers(
-                        self, response_content, response_etag)
-                    if offset is None:
-                        offset = 0
-
-                    self.end_headers()
-
-                    while offset < len(response_content):
-                        chunk = response_content[offset:offset + 1024]
-                        self.wfile.write(chunk)
-                        offset += len(chunk)
-                        time.sleep(0.5)
-
-                def log_message(self, *args, **kwargs):
-                    # don't display logs
-                    pass
-
-            class SilentServer(http.server.HTTPServer):
-                def handle_error(self, *args, **kwargs):
-                    # don't log BrokenPipeErrors
-                    if not isinstance(sys.exc_info()[1], BrokenPipeError):
-                        super().handle_error(*args, **kwargs)
-
-            return SilentServer(('', 0), FirmwareRequestHandler)
+        THROTTLE = firmware_origin.SLOW
+        ETAGS = True
+
+        def assertDownloadResumed(self):
+            # the second request is expected to be a conditional Range request
+            # matching the ETag sent in response to the first one
+            # transfers are recorded when they end, so the interrupted one may
+            # be recorded after the resumption request has been received
+            stats = sorted(self.firmware_origin.stats, key=lambda transfer: transfer.status)
+            self.assertEqual([http.HTTPStatus.OK, http.HTTPStatus.PARTIAL_CONTENT],
+                             [transfer.status for transfer in stats])
+            first, resumed = stats
+            self.assertNotIn('If-Match', first.request_headers)
+            self.assertEqual(self._provided_responses[0].http_etag,
+                             resumed.request_headers.get('If-Match'))
+            match = re.fullmatch(r'bytes=([0-9]+)-', resumed.request_headers.get('Range', ''))
+            self.assertIsNotNone(match)
+            self.assertGreater(int(match.group(1)), 0)
+            self.assertEqual(int(match.group(1)), resumed.offset)
 
 
 class FirmwareUpdatePackageTest(FirmwareUpdate.Test):
@@ -536,6 +488,8 @@ class FirmwareUpdateUriTest(FirmwareUpdate.TestWithHttpServer):
 
 
 class FirmwareUpdateStateChangeTest(FirmwareUpdate.TestWithHttpServer):
+    EARLY_HEADERS = True
+
     def setUp(self):
         super().setUp()
         self.set_check_marker(True)
@@ -590,6 +544,8 @@ class FirmwareUpdateStateChangeTest(FirmwareUpdate.TestWithHttpServer):
 
 
 class FirmwareUpdateSendStateChangeTest(FirmwareUpdate.TestWithHttpServer):
+    EARLY_HEADERS = True
+
     def setUp(self):
         super().setUp(minimum_version='1.1', maximum_version='1.1',
                       extra_cmdline_args=['--fw-update-use-send'])
@@ -800,8 +756,7 @@ class FirmwareUpdateReplacingPkg(FirmwareUpdate.TestWithHttpServer):
 
 class FirmwareUpdateHttpsResumptionTest(FirmwareUpdate.TestWithPartialDownloadAndRestart,
                                         FirmwareUpdate.TestWithHttpsServer):
-    RESPONSE_DELAY = 0.5
-    CHUNK_SIZE = 1000
+    THROTTLE = firmware_origin.SLOW
     ETAGS = True
 
     def setUp(self):
@@ -829,14 +784,7 @@ class FirmwareUpdateHttpsResumptionTest(FirmwareUpdate.TestWithPartialDownloadAn
         self._start_demo(self.cmdline_args)
         self.assertDemoRegisters(self.serv)
 
-        deadline = time.time() + 20
-        while time.time() < deadline:
-            time.sleep(0.5)
-
-            if self.read_state() == UpdateState.DOWNLOADED:
-                break
-        else:
-            raise
+        self.wait_for_state(UpdateState.DOWNLOADED)
 
         # Execute /5/0/2 (Update)
         req = Lwm2mExecute(ResPath.FirmwareUpdate.Update)
@@ -847,8 +795,7 @@ class FirmwareUpdateHttpsResumptionTest(FirmwareUpdate.TestWithPartialDownloadAn
 
 class FirmwareUpdateHttpsCancelPackageTest(FirmwareUpdate.TestWithPartialDownload,
                                            FirmwareUpdate.TestWithHttpServer):
-    RESPONSE_DELAY = 0.5
-    CHUNK_SIZE = 1000
+    THROTTLE = firmware_origin.SLOW
     ETAGS = True
 
     def runTest(self):
@@ -877,8 +824,7 @@ class FirmwareUpdateHttpsCancelPackageTest(FirmwareUpdate.TestWithPartialDownloa
 
 class FirmwareUpdateHttpsCancelPackageUriTest(FirmwareUpdate.TestWithPartialDownload,
                                               FirmwareUpdate.TestWithHttpServer):
-    RESPONSE_DELAY = 0.5
-    CHUNK_SIZE = 1000
+    THROTTLE = firmware_origin.SLOW
     ETAGS = True
 
     def runTest(self):
@@ -936,8 +882,7 @@ class FirmwareUpdateCoapCancelPackageUriTest(FirmwareUpdate.TestWithPartialDownl
 
 class FirmwareUpdateHttpsOfflineTest(FirmwareUpdate.TestWithPartialDownloadAndRestart,
                                      FirmwareUpdate.TestWithHttpServer):
-    RESPONSE_DELAY = 0.5
-    CHUNK_SIZE = 1000
+    THROTTLE = firmware_origin.SLOW
     ETAGS = True
 
     def setUp(self):
@@ -963,14 +908,7 @@ class FirmwareUpdateHttpsOfflineTest(FirmwareUpdate.TestWithPartialDownloadAndRe
         self.provide_response()
         self.communicate('exit-offline tcp')
 
-        deadline = time.time() + 20
-        while time.time() < deadline:
-            time.sleep(0.5)
-
-            if self.read_state() == UpdateState.DOWNLOADED:
-                break
-        else:
-            raise
+        self.wait_for_state(UpdateState.DOWNLOADED)
 
         # Execute /5/0/2 (Update)
         req = Lwm2mExecute(ResPath.FirmwareUpdate.Update)
@@ -1256,8 +1194,7 @@ class FirmwareUpdateRestartWithDownloadingETagChange(
 
 class FirmwareUpdateRestartWithDownloadingOverHttp(
     FirmwareUpdate.TestWithPartialHttpDownloadAndRestart):
-    def get_etag(self, response_content):
-        return None
+    ETAGS = False
 
     def runTest(self):
         self.provide_response()
@@ -1309,15 +1246,7 @@ class FirmwareUpdateRestartWithDownloadingOverHttp(
 
 class FirmwareUpdateResumeDownloadingOverHttp(
     FirmwareUpdate.TestWithPartialHttpDownloadAndRestart):
-    def send_headers(self, handler, response_content, response_etag):
-        if 'Range' in handler.headers:
-            self.assertEqual(handler.headers['If-Match'], response_etag)
-            match = re.fullmatch(r'bytes=([0-9]+)-', handler.headers['Range'])
-            self.assertIsNotNone(match)
-            offset = int(match.group(1))
-            handler.send_header('Content-range',
-                                'bytes %d-%d/*' % (offset, len(response_content) - 1))
-            return offset
+    ACCEPT_RANGES = True
 
     def runTest(self):
         self.provide_response()
@@ -1355,24 +1284,17 @@ class FirmwareUpdateResumeDownloadingOverHttp(
         self.assertEqual(state, UpdateState.DOWNLOADED)
 
         self.assertEqual(len(self.requests), 2)
+        self.assertDownloadResumed()
 
 
 class FirmwareUpdateResumeDownloadingOverHttpWithReconnect(
     FirmwareUpdate.TestWithPartialHttpDownloadAndRestart):
+    ACCEPT_RANGES = True
+
     def _get_valgrind_args(self):
         # we don't kill the process here, so we want Valgrind
         return FirmwareUpdate.TestWithHttpServer._get_valgrind_args(self)
 
-    def send_headers(self, handler, response_content, response_etag):
-        if 'Range' in handler.headers:
-            self.assertEqual(handler.headers['If-Match'], response_etag)
-            match = re.fullmatch(r'bytes=([0-9]+)-', handler.headers['Range'])
-            self.assertIsNotNone(match)
-            offset = int(match.group(1))
-            handler.send_header('Content-range',
-                                'bytes %d-%d/*' % (offset, len(response_content) - 1))
-            return offset
-
     def runTest(self):
         self.provide_response()
         # Write /5/0/1 (Firmware URI)
@@ -1406,6 +1328,7 @@ class FirmwareUpdateResumeDownloadingOverHttpWithReconnect(
         self.assertEqual(state, UpdateState.DOWNLOADED)
 
         self.assertEqual(len(self.requests), 2)
+        self.assertDownloadResumed()
 
 
 class FirmwareUpdateResumeFromStartWithDownloadingOverHttp(
@@ -1450,10 +1373,7 @@ class FirmwareUpdateResumeFromStartWithDownloadingOverHttp(
 
 class FirmwareUpdateRestartAfter412WithDownloadingOverHttp(
     FirmwareUpdate.TestWithPartialHttpDownloadAndRestart):
-    def check_success(self, handler, response_content, response_etag):
-        if 'If-Match' in handler.headers:
-            self.assertEqual(handler.headers['If-Match'], response_etag)
-            handler.send_error(http.HTTPStatus.PRECONDITION_FAILED)
+    ACCEPT_RANGES = True
 
     def runTest(self):
         self.provide_response()
@@ -1470,7 +1390,9 @@ class FirmwareUpdateRestartAfter412WithDownloadingOverHttp(
         # restart demo app
         self.serv.reset()
 
-        self.provide_response()
+        # changing the ETag makes the resumption request fail with 412; the
+        # same response is then used to download the package from scratch
+        self.provide_response(etag=b'changed', num_requests=2)
         self._start_demo(self.cmdline_args)
         self.assertDemoRegisters(self.serv)
 
@@ -1497,6 +1419,14 @@ class FirmwareUpdateRestartAfter412WithDownloadingOverHttp(
         self.assertTrue(file_truncated)
 
         self.assertEqual(len(self.requests), 3)
+        stats = sorted(self.firmware_origin.stats, key=lambda transfer: transfer.status)
+        self.assertEqual([http.HTTPStatus.OK, http.HTTPStatus.OK,
+                          http.HTTPStatus.PRECONDITION_FAILED],
+                         [transfer.status for transfer in stats])
+        self.assertEqual(self._provided_responses[0].http_etag,
+                         stats[2].request_headers.get('If-Match'))
+        self.assertEqual([False, False],
+                         ['If-Match' in transfer.request_headers for transfer in stats[:2]])
 
 
 class FirmwareUpdateWithDelayedResultTest:
@@ -1555,19 +1485,14 @@ class FirmwareUpdateWithSetSuccessInPerformUpgrade(Block.Test):
         # perform_upgrade handler is called via scheduler, so there is a small
         # window during which reading the Firmware Update State still returns
         # Updating. Wait for a while for State to actually change.
-        observed_states = []
-        deadline = time.time() + 5  # arbitrary limit
-        while not observed_states or observed_states[-1] == str(
-                UpdateState.UPDATING):
-            if time.time() > deadline:
-                self.fail('Firmware Update did not finish on time, last state = %s' % (
-                    observed_states[-1] if observed_states else 'NONE'))
-            observed_states.append(
-                self.read_path(self.serv, ResPath.FirmwareUpdate.State).content.decode())
-            time.sleep(0.5)
+        try:
+            state = self.wait_for_resource(ResPath.FirmwareUpdate.State,
+                                           lambda value: int(value) != UpdateState.UPDATING,
+                                           timeout_s=5)  # arbitrary limit
+        except TimeoutError as e:
+            self.fail('Firmware Update did not finish on time: %s' % (e,))
 
-        self.assertNotEqual([], observed_states)
-        self.assertEqual(observed_states[-1], str(UpdateState.IDLE))
+        self.assertEqual(state, str(UpdateState.IDLE).encode())
         self.assertEqual(self.read_path(self.serv, ResPath.FirmwareUpdate.UpdateResult).content,
                          str(UpdateResult.SUCCESS).encode())
 
@@ -1591,19 +1516,14 @@ class FirmwareUpdateWithSetFailureInPerformUpgrade(Block.Test):
         # perform_upgrade handler is called via scheduler, so there is a small
         # window during which reading the Firmware Update State still returns
         # Updating. Wait for a while for State to actually change.
-        observed_states = []
-        deadline = time.time() + 5  # arbitrary limit
-        while not observed_states or observed_states[-1] == str(
-                UpdateState.UPDATING):
-            if time.time() > deadline:
-                self.fail('Firmware Update did not finish on time, last state = %s' % (
-                    observed_states[-1] if observed_states else 'NONE'))
-            observed_states.append(
-                self.read_path(self.serv, ResPath.FirmwareUpdate.State).content.decode())
-            time.sleep(0.5)
+        try:
+            state = self.wait_for_resource(ResPath.FirmwareUpdate.State,
+                                           lambda value: int(value) != UpdateState.UPDATING,
+                                           timeout_s=5)  # arbitrary limit
+        except TimeoutError as e:
+            self.fail('Firmware Update did not finish on time: %s' % (e,))
 
-        self.assertNotEqual([], observed_states)
-        self.assertEqual(observed_states[-1], str(UpdateState.IDLE))
+        self.assertEqual(state, str(UpdateState.IDLE).encode())
         self.assertEqual(self.read_path(self.serv, ResPath.FirmwareUpdate.UpdateResult).content,
                          str(UpdateResult.FAILED).encode())
 
@@ -1699,22 +1619,14 @@ class FirmwareUpdateWeakEtagTest(FirmwareUpdate.TestWithHttpServer):
         self.set_auto_deregister(False)
         self.set_reset_machine(False)
 
-        orig_end_headers = self.http_server.RequestHandlerClass.end_headers
-
-        def updated_end_headers(request_handler):
-            request_handler.send_header('ETag', 'W/"weaketag"')
-            orig_end_headers(request_handler)
-
-        self.http_server.RequestHandlerClass.end_headers = updated_end_headers
-
     def runTest(self):
-        self.provide_response()
+        self.provide_response(etag=b'weaketag', weak_etag=True)
         self.write_firmware_and_wait_for_download(self.get_firmware_uri())
 
         with open(self.ANJAY_MARKER_FILE, 'rb') as f:
             marker_data = f.read()
 
-        self.assertNotIn(b'weaketag', marker_data)
+        self.assertNotIn(b'weaketag'.hex().encode(), marker_data)
 
         # Execute /5/0/2 (Update)
         req = Lwm2mExecute(ResPath.FirmwareUpdate.Update)
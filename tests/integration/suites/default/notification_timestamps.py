@@ -7,6 +7,7 @@
 # Licensed under the AVSystem-5-clause License.
 # See the attached LICENSE file for details.
 
+import cbor2
 import json
 import time
 
@@ -543,6 +543,19 @@ class RegisterWithPskExternal(test_suite.Lwm2mDtlsSingleServerTest):
         super().setUp(extra_cmdline_args=extra_cmdline_args, **kwargs)
 
 
+class RegisterWithPskNativeIo(test_suite.Lwm2mDtlsSingleServerTest,
+                              test_suite.Lwm2mDmOperations):
+    def setUp(self):
+        # the server sends and receives records without holding the GIL
+        super().setUp(native_io=True)
+
+    def runTest(self):
+        # every exchange goes through the native send and recv paths
+        for _ in range(10):
+            res = self.read_instance(self.serv, OID.Device, 0)
+            self.assertIn(b'0023C7', res.content)
+
+
 class RegisterSni(test_suite.PcapEnabledTest,
                   test_suite.Lwm2mDtlsSingleServerTest):
     SNI = 'SomeServerHost'
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import socket
+
+from framework.benchmark_utils import benchmark_iterations
+from framework.bootstrap_driver import BootstrapConfig, BootstrapDriver
+from framework.lwm2m_test import *
+
+
+class BootstrapProvisioning:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mTest):
+        """
+        Bootstraps a freshly started demo with SERVER_COUNTS LwM2M Server
+        Accounts using BootstrapDriver and measures how long each step and the
+        whole sequence take.
+
+        Bootstrapped servers point to a socket that is never read from, so
+        that the demo's Register attempts do not interfere with the benchmark.
+        """
+        NSTART = 1
+        FORMAT = coap.ContentFormat.APPLICATION_LWM2M_TLV
+        PER_OBJECT = False
+        SERVER_COUNTS = (1, 8, 32)
+        ITERATIONS = 5
+
+        def setUp(self, *args, **kwargs):
+            self.sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sink.bind(('127.0.0.1', 0))
+            super().setUp(servers=0, bootstrap_server=True, minimum_version='1.1',
+                          maximum_version='1.1', extra_cmdline_args=['--nstart', str(self.NSTART)],
+                          *args, **kwargs)
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+            self.benchmark_report.set_property('nstart', self.NSTART)
+            self.benchmark_report.set_property('format', coap.ContentFormat.to_str(self.FORMAT))
+            self.benchmark_report.set_property('per_object', self.PER_OBJECT)
+
+        def tearDown(self, *args, **kwargs):
+            try:
+                # bootstrapped servers are unreachable, so there is nothing to
+                # deregister from and no point in waiting for a clean shutdown
+                super().tearDown(auto_deregister=False, force_kill=True, *args, **kwargs)
+            finally:
+                self.sink.close()
+
+        def restart_demo(self):
+            self._terminate_demo(force_kill=True)
+            self.bootstrap_server.reset()
+            self._start_demo(['--bootstrap', '--nstart', str(self.NSTART)]
+                             + self.make_demo_args(DEMO_ENDPOINT_NAME, [self.bootstrap_server],
+                                                   '1.1', '1.1', None))
+
+        def runTest(self):
+            driver = BootstrapDriver(self.bootstrap_server, nstart=self.NSTART, format=self.FORMAT,
+                                     per_object=self.PER_OBJECT)
+            server_uri = 'coap://127.0.0.1:%d' % (self.sink.getsockname()[1],)
+
+            for count in self.SERVER_COUNTS:
+                config = BootstrapConfig.with_servers([server_uri] * count)
+                total = self.benchmark_metric('bootstrap_%d' % (count,))
+                self.benchmark_report.set_property('requests_%d' % (count,),
+                                                   len(driver.steps(config)) + 1)
+
+                for iteration in range(self.iterations):
+                    if iteration or count != self.SERVER_COUNTS[0]:
+                        self.restart_demo()
+                    self.assertDemoRequestsBootstrap(
+                        preferred_content_format=coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR)
+
+                    timing = driver.run(config)
+                    total.add(timing.total)
+                    for step in timing.steps:
+                        # Bootstrap-Writes are grouped by Object
+                        name = step.operation
+                        if step.operation == 'write':
+                            name += '_%d' % (Lwm2mPath(step.path).object_id,)
+                        self.benchmark_metric('%s_%d' % (name, count)).add(step.duration)
+
+
+class SequentialBootstrapBenchmark(BootstrapProvisioning.Test):
+    NSTART = 1
+
+
+class PipelinedBootstrapBenchmark(BootstrapProvisioning.Test):
+    NSTART = 4
+
+
+class PerObjectSenmlCborBootstrapBenchmark(BootstrapProvisioning.Test):
+    NSTART = 1
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+    PER_OBJECT = True
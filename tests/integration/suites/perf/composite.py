@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import json
+import logging
+import statistics
+
+from framework.benchmark_utils import benchmark_iterations, scaling_exponent
+from framework.lwm2m_test import *
+
+# writable Test object resources used to build composite requests, along with
+# SenML labels of their values
+RESOURCES = (
+    (RID.Test.ResInt, SenmlLabel.VALUE, 'v'),
+    (RID.Test.ResBool, SenmlLabel.BOOL, 'vb'),
+    (RID.Test.ResString, SenmlLabel.STRING, 'vs'),
+    (RID.Test.ResUnsignedInt, SenmlLabel.VALUE, 'v'),
+)
+
+
+class CompositeScaling:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest,
+               test_suite.Lwm2mDmOperations):
+        """
+        Measures how the cost of Read-Composite, Write-Composite and
+        Observe-Composite operations grows with the number of paths they
+        refer to. Latency that grows superlinearly with the number of paths is
+        reported in the "superlinear" property.
+        """
+        FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+        PATH_COUNTS = (4, 16, 64, 256)
+        ITERATIONS = 10
+        # buffers large enough not to require block-wise transfers
+        BUFFER_SIZE = 32768
+        # scaling exponent above which the growth is considered superlinear
+        SUPERLINEAR_EXPONENT = 1.3
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(maximum_version='1.1',
+                          extra_cmdline_args=['-I', str(self.BUFFER_SIZE),
+                                              '-O', str(self.BUFFER_SIZE)],
+                          *args, **kwargs)
+            self.serv.set_timeout(timeout_s=5)
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+            self.benchmark_report.set_property('format', coap.ContentFormat.to_str(self.FORMAT))
+
+            self.instances = max(self.PATH_COUNTS) // len(RESOURCES)
+            for iid in range(self.instances):
+                self.create_instance(self.serv, oid=OID.Test, iid=iid)
+            # notify about every change, without waiting for pmin
+            self.write_resource(self.serv, oid=OID.Server, iid=1, rid=RID.Server.DefaultMinPeriod,
+                                content='0')
+
+        def paths(self, count):
+            """
+            Returns COUNT paths, spread across as many Test object instances as
+            possible, along with the SenML labels of their values.
+            """
+            result = []
+            for i in range(count):
+                rid, cbor_label, json_label = RESOURCES[i // self.instances]
+                path = '/%d/%d/%d' % (OID.Test, i % self.instances, rid)
+                result.append((path, cbor_label, json_label))
+            return result
+
+        def value(self, cbor_label, seed):
+            if cbor_label == SenmlLabel.BOOL:
+                return bool(seed % 2)
+            if cbor_label == SenmlLabel.STRING:
+                return 'value-%d' % (seed,)
+            return seed
+
+        def encode(self, records):
+            if self.FORMAT == coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON:
+                return json.dumps(records).encode()
+            return CBOR.serialize(records)
+
+        def decode(self, content):
+            if self.FORMAT == coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON:
+                return json.loads(content.decode())
+            return CBOR.parse(content)
+
+        def write_payload(self, paths, seed):
+            json_format = (self.FORMAT == coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON)
+            name = 'n' if json_format else SenmlLabel.NAME
+            return self.encode([{name: path,
+                                 (json_label if json_format else cbor_label):
+                                     self.value(cbor_label, seed)}
+                                for path, cbor_label, json_label in paths])
+
+        def recv_blocks(self, pkt, paths):
+            """
+            Retrieves all remaining blocks of a response or notification whose
+            first block is PKT, by repeating the Read-Composite of PATHS with
+            subsequent BLOCK2 options. Returns the list of all received blocks.
+            """
+            blocks = [pkt]
+            while True:
+                block2 = pkt.get_options(coap.Option.BLOCK2)
+                if not block2 or not block2[0].has_more():
+                    return blocks
+
+                req = Lwm2mReadComposite(paths=paths, accept=self.FORMAT, options=[
+                    coap.Option.BLOCK2(seq_num=block2[0].seq_num() + 1, has_more=False,
+                                       block_size=block2[0].block_size())])
+                self.serv.send(req)
+                pkt = self.serv.recv()
+                self.assertMsgEqual(Lwm2mContent.matching(req)(), pkt)
+                blocks.append(pkt)
+
+        def runTest(self):
+            for count in self.PATH_COUNTS:
+                paths = self.paths(count)
+                self.benchmark_read(count, paths)
+                self.benchmark_write(count, paths)
+                self.benchmark_observe(count, paths)
+
+            self.report_scaling()
+
+        def benchmark_read(self, count, paths):
+            latency = self.benchmark_metric('read_composite_%d' % (count,))
+            response_size = self.benchmark_metric('read_composite_response_size_%d' % (count,),
+                                                  'B')
+            blocks = self.benchmark_metric('read_composite_blocks_%d' % (count,), '')
+            for _ in range(self.iterations):
+                with latency.measure():
+                    read_paths = [path for path, _, _ in paths]
+                    res = self.read_composite(self.serv, read_paths, accept=self.FORMAT)
+                    res_blocks = self.recv_blocks(res, read_paths)
+                content = b''.join(pkt.content for pkt in res_blocks)
+                response_size.add(len(content))
+                blocks.add(len(res_blocks))
+            self.assertEqual(count, len(self.decode(content)))
+
+        def benchmark_write(self, count, paths):
+            latency = self.benchmark_metric('write_composite_%d' % (count,))
+            request_size = self.benchmark_metric('write_composite_request_size_%d' % (count,),
+                                                 'B')
+            for i in range(self.iterations):
+                content = self.write_payload(paths, i)
+                request_size.add(len(content))
+                with latency.measure():
+                    self.write_composite(self.serv, content=content, format=self.FORMAT)
+
+        def benchmark_observe(self, count, paths):
+            # the demo does not notify the server about its own Writes, so the
+            # observation includes the Counter incremented with Execute instead
+            observed_paths = [ResPath.Test[0].Counter] + [path for path, _, _ in paths[1:]]
+            req = Lwm2mObserveComposite(paths=observed_paths, accept=self.FORMAT)
+            with self.benchmark_metric('observe_composite_%d' % (count,)).measure():
+                self.serv.send(req)
+                res = self.serv.recv()
+                self.assertMsgEqual(Lwm2mContent.matching(req)(), res)
+                self.recv_blocks(res, observed_paths)
+
+            # every notification carries values of all observed paths
+            execute_to_notify = self.benchmark_metric('execute_to_notify_%d' % (count,))
+            notification_size = self.benchmark_metric('notification_size_%d' % (count,), 'B')
+            with self.measure_demo_cpu_time('notify_demo_cpu_time_%d' % (count,)):
+                for _ in range(self.iterations):
+                    with execute_to_notify.measure():
+                        self.execute_resource(self.serv, oid=OID.Test, iid=0,
+                                              rid=RID.Test.IncrementCounter)
+                        pkt = self.serv.recv()
+                        self.assertMsgEqual(Lwm2mNotify(req.token), pkt)
+                        content = b''.join(block.content for block
+                                           in self.recv_blocks(pkt, observed_paths))
+                    notification_size.add(len(content))
+            self.assertEqual(count, len(self.decode(content)))
+
+            cancel = Lwm2mObserveComposite(paths=observed_paths, observe=1, accept=self.FORMAT,
+                                           token=req.token)
+            self.serv.send(cancel)
+            res = self.serv.recv()
+            self.assertMsgEqual(Lwm2mContent.matching(cancel)(), res)
+            self.recv_blocks(res, observed_paths)
+
+        def report_scaling(self):
+            # fixed per-request costs dominate for small path counts, so only
+            # the larger half of them is taken into account
+            counts = self.PATH_COUNTS[len(self.PATH_COUNTS) // 2:]
+            superlinear = []
+            for operation in ('read_composite', 'write_composite', 'observe_composite',
+                              'execute_to_notify'):
+                exponent = scaling_exponent(
+                    [(count, statistics.mean(
+                        self.benchmark_report.metrics['%s_%d' % (operation, count)].values))
+                     for count in counts])
+                self.benchmark_report.set_property('%s_scaling_exponent' % (operation,),
+                                                   exponent)
+                if exponent > self.SUPERLINEAR_EXPONENT:
+                    logging.warning('%s latency grows superlinearly with the number of paths: '
+                                    'exponent %.2f', operation, exponent)
+                    superlinear.append(operation)
+            self.benchmark_report.set_property('superlinear', superlinear)
+
+
+class CompositeScalingSenmlCborBenchmark(CompositeScaling.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+
+
+class CompositeScalingSenmlJsonBenchmark(CompositeScaling.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import collections
+import socket
+import time
+
+from framework import impairment_proxy
+from framework.benchmark_utils import benchmark_iterations
+from framework.impairment_proxy import Direction
+from framework.lwm2m_test import *
+
+
+class ConstrainedLink:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest):
+        """
+        Runs the demo over an impaired link to the server. As packets may be
+        lost or duplicated in both directions, the test server retransmits its
+        requests and answers retransmitted requests with cached responses, as
+        a real CoAP endpoint would.
+        """
+        LINK_PROFILE = impairment_proxy.LTE_M
+        ITERATIONS = 10
+        TX_PARAMS = TxParams()
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(link_profile=self.LINK_PROFILE, auto_register=False, *args, **kwargs)
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+            self.benchmark_report.set_property('link', {
+                'loss': self.LINK_PROFILE.loss,
+                'duplicate': self.LINK_PROFILE.duplicate,
+                'reorder': self.LINK_PROFILE.reorder,
+                'bandwidth_bps': self.LINK_PROFILE.bandwidth_bps,
+            })
+            self.reset_exchanges()
+            self.register()
+
+        def tearDown(self, *args, **kwargs):
+            proxy = self.link_proxies.get(self.serv)
+            if proxy is not None:
+                for direction in Direction:
+                    self.benchmark_report.set_property('%s_stats' % (direction.value,),
+                                                       proxy.stats(direction)._asdict())
+            try:
+                self.shutdown_demo()
+            finally:
+                super().tearDown(auto_deregister=False, *args, **kwargs)
+
+        def shutdown_demo(self):
+            """
+            Closes the demo's standard input and handles the De-Register over
+            the impaired link, until the demo exits.
+            """
+            self.request_demo_shutdown()
+            pkt = self.recv_request(Lwm2mDeregister)
+            self.respond(pkt, Lwm2mDeleted.matching(pkt)())
+            # the response may be lost, answer any retransmissions
+            deadline = time.monotonic() + self.TX_PARAMS.max_transmit_wait()
+            while self.demo_process.poll() is None and time.monotonic() < deadline:
+                try:
+                    self.recv(timeout_s=0.1)
+                except socket.timeout:
+                    pass
+
+        def reset_exchanges(self):
+            self.seen = set()
+            self.responses = {}
+            # packets received while waiting for a response in exchange()
+            self.pending = collections.deque()
+
+        def recv(self, timeout_s=None):
+            """
+            Returns the next packet that is not a duplicate. Retransmitted
+            requests are answered with the cached response.
+            """
+            if self.pending:
+                return self.pending.popleft()
+
+            timeout_s = timeout_s or self.TX_PARAMS.max_transmit_wait()
+            deadline = time.monotonic() + timeout_s
+            while True:
+                pkt = self.serv.recv(timeout_s=max(0.0, deadline - time.monotonic()))
+                key = (pkt.type in (coap.Type.ACKNOWLEDGEMENT, coap.Type.RESET), pkt.msg_id)
+                if key in self.seen:
+                    if key in self.responses:
+                        self.serv.send(self.responses[key])
+                    continue
+                self.seen.add(key)
+                return pkt
+
+        def respond(self, pkt, res):
+            self.responses[(False, pkt.msg_id)] = res
+            self.serv.send(res)
+
+        def recv_request(self, expected_cls, timeout_s=None):
+            """
+            Waits for a request of EXPECTED_CLS, acknowledging confirmable
+            notifications received in the meantime.
+            """
+            while True:
+                pkt = self.recv(timeout_s)
+                if isinstance(pkt, expected_cls):
+                    return pkt
+                if isinstance(pkt, Lwm2mNotify) and pkt.type == coap.Type.CONFIRMABLE:
+                    self.respond(pkt, Lwm2mEmpty.matching(pkt)())
+
+        def exchange(self, req, expected_response_cls=None):
+            """
+            Sends a confirmable REQ and waits for the matching response,
+            retransmitting REQ according to TX_PARAMS. Other packets received in
+            the meantime are returned by subsequent recv() calls.
+            """
+            self.serv.send(req)
+            timeout_s = self.TX_PARAMS.first_retransmission_timeout()
+            unrelated = []
+            for retransmission in range(int(self.TX_PARAMS.max_retransmit) + 1):
+                deadline = time.monotonic() + timeout_s
+                try:
+                    while True:
+                        pkt = self.recv(timeout_s=max(0.0, deadline - time.monotonic()))
+                        if pkt.msg_id == req.msg_id and pkt.type in (coap.Type.ACKNOWLEDGEMENT,
+                                                                     coap.Type.RESET):
+                            self.pending.extend(unrelated)
+                            if expected_response_cls is not None:
+                                self.assertMsgEqual(expected_response_cls.matching(req)(), pkt)
+                            return pkt
+                        unrelated.append(pkt)
+                except socket.timeout:
+                    timeout_s *= 2
+                    self.serv.send(req)
+            raise socket.timeout('no response to %r' % (req,))
+
+        def ping(self):
+            self.exchange(Lwm2mEmpty(type=coap.Type.CONFIRMABLE), Lwm2mReset)
+
+        def register(self):
+            pkt = self.recv_request(Lwm2mRegister)
+            self.respond(pkt, Lwm2mCreated.matching(pkt)(location=self.DEFAULT_REGISTER_ENDPOINT))
+            # the ping is answered only after the Created response is processed
+            self.ping()
+
+
+class ConstrainedLinkRegister:
+    class Test(ConstrainedLink.Test):
+        ITERATIONS = 5
+
+        def runTest(self):
+            start_to_register = self.benchmark_metric('start_to_register')
+            start_to_registered = self.benchmark_metric('start_to_registered')
+
+            for _ in range(self.iterations):
+                self._terminate_demo(force_kill=True)
+                self.link_proxies[self.serv].reset_stats()
+                self.reset_exchanges()
+
+                start = time.perf_counter()
+                self._start_demo(self.make_demo_args(DEMO_ENDPOINT_NAME, [self.serv],
+                                                     '1.0', '1.0', None))
+                pkt = self.recv_request(Lwm2mRegister)
+                start_to_register.add(time.perf_counter() - start)
+                self.respond(pkt, Lwm2mCreated.matching(pkt)(
+                    location=self.DEFAULT_REGISTER_ENDPOINT))
+                self.ping()
+                start_to_registered.add(time.perf_counter() - start)
+
+                self.benchmark_metric('uplink_packets', '').add(
+                    self.link_proxies[self.serv].stats(Direction.UPLINK).packets)
+
+
+class ConstrainedLinkUpdate:
+    class Test(ConstrainedLink.Test):
+        def runTest(self):
+            trigger_to_update = self.benchmark_metric('send_update_to_update')
+            round_trip = self.benchmark_metric('update_round_trip')
+
+            for _ in range(self.iterations):
+                start = time.perf_counter()
+                self.communicate('send-update')
+                pkt = self.recv_request(Lwm2mUpdate)
+                trigger_to_update.add(time.perf_counter() - start)
+                self.assertMsgEqual(Lwm2mUpdate(self.DEFAULT_REGISTER_ENDPOINT, content=b''), pkt)
+                self.respond(pkt, Lwm2mChanged.matching(pkt)())
+                self.ping()
+                round_trip.add(time.perf_counter() - start)
+
+
+class ConstrainedLinkNotification:
+    class Test(ConstrainedLink.Test):
+        CONFIRMABLE = False
+        NOTIFY_TIMEOUT_S = 15
+
+        def setUp(self, *args, **kwargs):
+            extra_cmdline_args = ['--confirmable-notifications'] if self.CONFIRMABLE else []
+            super().setUp(extra_cmdline_args=extra_cmdline_args, *args, **kwargs)
+            self.benchmark_report.set_property('confirmable', self.CONFIRMABLE)
+
+            self.exchange(Lwm2mCreate('/%d' % (OID.Test,), TLV.make_instance(instance_id=0).serialize()),
+                          Lwm2mCreated)
+            self.exchange(Lwm2mWriteAttributes(ResPath.Test[0].Counter, pmin=0, pmax=3600),
+                          Lwm2mChanged)
+            self.observe_req = Lwm2mObserve(ResPath.Test[0].Counter)
+            self.exchange(self.observe_req, Lwm2mContent)
+
+        def tearDown(self, *args, **kwargs):
+            try:
+                self.exchange(Lwm2mObserve(ResPath.Test[0].Counter, observe=1,
+                                           token=self.observe_req.token))
+            finally:
+                super().tearDown(*args, **kwargs)
+
+        def runTest(self):
+            execute_to_notify = self.benchmark_metric('execute_to_notify')
+            lost = 0
+
+            for _ in range(self.iterations):
+                # the demo does not notify about unchanged values, so the
+                # counter is incremented by the server
+                start = time.perf_counter()
+                self.exchange(Lwm2mExecute(ResPath.Test[0].IncrementCounter), Lwm2mChanged)
+                try:
+                    while True:
+                        pkt = self.recv_request(Lwm2mNotify, timeout_s=self.NOTIFY_TIMEOUT_S)
+                        if pkt.type == coap.Type.CONFIRMABLE:
+                            self.respond(pkt, Lwm2mEmpty.matching(pkt)())
+                        if pkt.token == self.observe_req.token:
+                            break
+                except socket.timeout:
+                    # non-confirmable notifications are not retransmitted
+                    self.assertFalse(self.CONFIRMABLE)
+                    lost += 1
+                    continue
+                execute_to_notify.add(time.perf_counter() - start)
+
+            self.benchmark_report.set_property('lost_notifications', lost)
+
+
+class LteMRegisterBenchmark(ConstrainedLinkRegister.Test):
+    LINK_PROFILE = impairment_proxy.LTE_M
+
+
+class NbIotRegisterBenchmark(ConstrainedLinkRegister.Test):
+    LINK_PROFILE = impairment_proxy.NB_IOT
+    ITERATIONS = 3
+
+
+class LteMUpdateBenchmark(ConstrainedLinkUpdate.Test):
+    LINK_PROFILE = impairment_proxy.LTE_M
+
+
+class NbIotUpdateBenchmark(ConstrainedLinkUpdate.Test):
+    LINK_PROFILE = impairment_proxy.NB_IOT
+    ITERATIONS = 5
+
+
+class LteMNonNotificationBenchmark(ConstrainedLinkNotification.Test):
+    LINK_PROFILE = impairment_proxy.LTE_M
+
+
+class NbIotConNotificationBenchmark(ConstrainedLinkNotification.Test):
+    LINK_PROFILE = impairment_proxy.NB_IOT
+    CONFIRMABLE = True
+    ITERATIONS = 5
+
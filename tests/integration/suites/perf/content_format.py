@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import collections
+import csv
+import json
+import statistics
+import time
+
+from framework.benchmark_utils import benchmark_iterations
+from framework.lwm2m_test import *
+
+
+def _decode_lwm2m_cbor(content):
+    import cbor2
+    return cbor2.loads(content)
+
+
+# formats the demo is asked for, along with functions that decode them
+DECODERS = collections.OrderedDict([
+    (coap.ContentFormat.APPLICATION_LWM2M_TLV, TLV.parse),
+    (coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON, lambda content: json.loads(content.decode())),
+    (coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR, CBOR.parse),
+    (coap.ContentFormat.APPLICATION_LWM2M_CBOR, _decode_lwm2m_cbor),
+    (coap.ContentFormat.TEXT_PLAIN, lambda content: content.decode()),
+    (coap.ContentFormat.APPLICATION_OCTET_STREAM, bytes),
+])
+
+LEVELS = ('object', 'instance', 'resource')
+
+# Security Object is not readable by LwM2M Servers
+SKIPPED_OIDS = (OID.Security,)
+
+
+def format_name(fmt):
+    return coap.ContentFormat.to_str(fmt).replace('APPLICATION_', '').replace('LWM2M_', '')
+
+
+def parse_links(content):
+    """
+    Returns paths of all numeric (i.e. data model) links in a CoRE Link
+    Format CONTENT.
+    """
+    paths = []
+    for link in content.decode().split(','):
+        path = link.split(';')[0].strip().lstrip('<').rstrip('>')
+        ids = path.strip('/').split('/')
+        if path.startswith('/') and all(id.isdigit() for id in ids):
+            paths.append(tuple(int(id) for id in ids))
+    return paths
+
+
+class ContentFormatComparison:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest,
+               test_suite.Lwm2mDmOperations):
+        """
+        Reads every Object, Object Instance and Resource the demo exposes in
+        each of DECODERS formats and compares the cost of each format: bytes
+        sent over the air, number of Block2 fragments, response time and time
+        needed to decode the payload.
+
+        All results are stored in the "reads" property of the benchmark
+        report. For every Object and granularity, the format that needs the
+        fewest bytes over the air is stored in "recommended_formats".
+        """
+        ITERATIONS = 3
+        DECODE_ITERATIONS = 10
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(minimum_version='1.1', maximum_version='1.1', auto_register=False,
+                          *args, **kwargs)
+            self.serv.set_timeout(timeout_s=5)
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+            self.register_pkt = self.assertDemoRegisters(self.serv, version='1.1')
+
+        def data_model(self):
+            """
+            Returns a dict mapping each readable Object ID to a list of paths
+            of its Object, Object Instances and Resources, as reported by
+            Discover.
+            """
+            result = collections.OrderedDict()
+            for path in parse_links(self.register_pkt.content):
+                oid = path[0]
+                if oid in SKIPPED_OIDS or oid in result:
+                    continue
+                discovered = parse_links(self.discover(self.serv, oid=oid).content)
+                result[oid] = [path for path in discovered if len(path) <= len(LEVELS)]
+            return result
+
+        def read_all_blocks(self, path, fmt):
+            """
+            Reads PATH in FMT, following Block2 transfers. Returns the list of
+            received packets; the last one may be an error response.
+            """
+            req = Lwm2mRead(path, accept=fmt)
+            self.serv.send(req)
+            packets = [self.serv.recv()]
+            while packets[-1].code == coap.Code.RES_CONTENT:
+                block2 = packets[-1].get_options(coap.Option.BLOCK2)
+                if not block2 or not block2[0].has_more():
+                    break
+                self.serv.send(Lwm2mRead(path, accept=fmt, options=[
+                    coap.Option.BLOCK2(seq_num=block2[0].seq_num() + 1, has_more=False,
+                                       block_size=block2[0].block_size())]))
+                packets.append(self.serv.recv())
+            return packets
+
+        def measure_read(self, path, fmt):
+            response_times = []
+            for _ in range(self.iterations):
+                start = time.perf_counter()
+                packets = self.read_all_blocks(path, fmt)
+                response_times.append(time.perf_counter() - start)
+                if packets[-1].code != coap.Code.RES_CONTENT:
+                    return {'error': str(packets[-1].code)}
+
+            content = b''.join(pkt.content for pkt in packets)
+            decode_times = []
+            for _ in range(self.DECODE_ITERATIONS):
+                start = time.perf_counter()
+                DECODERS[fmt](content)
+                decode_times.append(time.perf_counter() - start)
+
+            return {
+                'payload_bytes': len(content),
+                'wire_bytes': sum(len(pkt.serialize()) for pkt in packets),
+                'blocks': len(packets),
+                'response_time': statistics.median(response_times),
+                'decode_time': statistics.median(decode_times),
+            }
+
+        def runTest(self):
+            reads = []
+            # (oid, level) -> format -> wire bytes of all reads at that level
+            totals = collections.defaultdict(lambda: collections.defaultdict(int))
+            unsupported = collections.defaultdict(set)
+
+            for oid, paths in self.data_model().items():
+                for path in paths:
+                    level = LEVELS[len(path) - 1]
+                    path_str = '/' + '/'.join(map(str, path))
+                    rows = []
+                    for fmt in DECODERS:
+                        row = self.measure_read(path_str, fmt)
+                        row.update(path=path_str, level=level, format=format_name(fmt))
+                        rows.append((fmt, row))
+                    reads.extend(row for _, row in rows)
+                    if all('error' in row for _, row in rows):
+                        # e.g. executable or write-only Resource
+                        continue
+
+                    for fmt, row in rows:
+                        if 'error' in row:
+                            unsupported[(oid, level)].add(fmt)
+                            continue
+
+                        totals[(oid, level)][fmt] += row['wire_bytes']
+                        for metric, unit in (('payload_bytes', 'B'), ('wire_bytes', 'B'),
+                                             ('blocks', ''), ('response_time', 's'),
+                                             ('decode_time', 's')):
+                            self.benchmark_metric('%s_%s_%s' % (metric, level, format_name(fmt)),
+                                                  unit).add(row[metric])
+
+            recommended = collections.OrderedDict()
+            for (oid, level), by_format in totals.items():
+                # only formats that could encode every path at this level
+                candidates = {fmt: size for fmt, size in by_format.items()
+                              if fmt not in unsupported[(oid, level)]}
+                if candidates:
+                    best = min(candidates, key=candidates.get)
+                    recommended.setdefault(str(oid), collections.OrderedDict())[level] = \
+                        format_name(best)
+
+            self.benchmark_report.set_property('recommended_formats', recommended)
+            self.dump_reads(reads)
+
+        def dump_reads(self, reads):
+            """
+            Stores results of all READS as CSV in the LogType.BenchmarkTable log
+            file, as there are too many of them for the benchmark report.
+            """
+            path = self.logs_path(test_suite.LogType.BenchmarkTable)
+            columns = ('path', 'level', 'format', 'payload_bytes', 'wire_bytes', 'blocks',
+                       'response_time', 'decode_time', 'error')
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(reads)
+
+
+class ContentFormatComparisonBenchmark(ContentFormatComparison.Test):
+    pass
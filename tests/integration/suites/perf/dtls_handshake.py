@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import concurrent.futures
+import socket
+import time
+import unittest
+
+from framework.benchmark_utils import benchmark_iterations
+from framework.lwm2m_test import *
+from suites.default.register import CertificatesTest
+
+
+def wait_until_offline(test, timeout_s=5):
+    deadline = time.time() + timeout_s
+    while test.get_socket_count() > 0:
+        if time.time() > deadline:
+            test.fail('Socket not closed')
+        time.sleep(0.1)
+
+
+class DtlsHandshake:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest):
+        ITERATIONS = 20
+        # if not None, limits ciphersuites available on both the client and the server
+        CIPHERSUITES = None
+        # if True, the server sends and receives records without holding the GIL
+        NATIVE_IO = False
+
+        def setUp(self, *args, **kwargs):
+            if self.CIPHERSUITES is not None:
+                kwargs['ciphersuites'] = self.CIPHERSUITES
+            if self.NATIVE_IO:
+                kwargs['native_io'] = True
+            super().setUp(*args, **kwargs)
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+            self.benchmark_report.set_property('security_mode', self.serv.security_mode())
+            self.benchmark_report.set_property('native_io', self.NATIVE_IO)
+            if self.CIPHERSUITES is not None:
+                self.benchmark_report.set_property('ciphersuites',
+                                                   [hex(cs) for cs in self.CIPHERSUITES])
+
+        def respond_to_registration_refresh(self, serv, timeout_s=0.5):
+            # after a full handshake, the client may refresh its registration
+            try:
+                pkt = serv.recv(timeout_s=timeout_s)
+            except socket.timeout:
+                return
+
+            if isinstance(pkt, Lwm2mRegister):
+                serv.send(Lwm2mCreated.matching(pkt)(location=self.DEFAULT_REGISTER_ENDPOINT))
+            else:
+                self.assertMsgEqual(Lwm2mUpdate(self.DEFAULT_REGISTER_ENDPOINT, content=ANY), pkt)
+                serv.send(Lwm2mChanged.matching(pkt)())
+
+        def measure_reconnect(self, metric_name, resume):
+            """
+            Makes the client go offline and back online, and records the time
+            from exit-offline until the DTLS handshake is finished. If RESUME
+            is False, the server discards cached sessions, forcing a full
+            handshake.
+            """
+            metric = self.benchmark_metric(metric_name)
+            for _ in range(self.iterations):
+                self.communicate('enter-offline')
+                wait_until_offline(self)
+                if not resume:
+                    self.serv.reset_session_cache()
+                self.serv.reset()
+
+                with self.measure_demo_cpu_time(metric_name + '_demo_cpu_time'):
+                    start = time.perf_counter()
+                    self.communicate('exit-offline')
+                    self.serv.listen(timeout_s=5)
+                    metric.add(time.perf_counter() - start)
+
+                if not resume:
+                    self.respond_to_registration_refresh(self.serv)
+
+        def runTest(self):
+            self.measure_reconnect('full_handshake', resume=False)
+            self.measure_reconnect('resumed_handshake', resume=True)
+
+
+class PskCcm8HandshakeBenchmark(DtlsHandshake.Test, test_suite.Lwm2mDtlsSingleServerTest):
+    # TLS_PSK_WITH_AES_128_CCM_8
+    CIPHERSUITES = (0xC0A8,)
+
+
+class PskGcmHandshakeBenchmark(DtlsHandshake.Test, test_suite.Lwm2mDtlsSingleServerTest):
+    # TLS_PSK_WITH_AES_128_GCM_SHA256
+    CIPHERSUITES = (0x00A8,)
+
+
+class PskCcm8NativeIoHandshakeBenchmark(PskCcm8HandshakeBenchmark):
+    NATIVE_IO = True
+
+
+class EcdhePskHandshakeBenchmark(DtlsHandshake.Test, test_suite.Lwm2mDtlsSingleServerTest):
+    # TLS_ECDHE_PSK_WITH_AES_128_CBC_SHA256
+    CIPHERSUITES = (0xC037,)
+
+
+class CertCcm8HandshakeBenchmark(DtlsHandshake.Test, CertificatesTest.Test):
+    # TLS_ECDHE_ECDSA_WITH_AES_128_CCM_8
+    CIPHERSUITES = (0xC0AE,)
+
+    def setUp(self):
+        super().setUp(server_crt='server.crt', server_key='server.key')
+
+
+class CertGcmHandshakeBenchmark(DtlsHandshake.Test, CertificatesTest.Test):
+    # TLS_ECDHE_ECDSA_WITH_AES_128_GCM_SHA256
+    CIPHERSUITES = (0xC02B,)
+
+    def setUp(self):
+        super().setUp(server_crt='server.crt', server_key='server.key')
+
+
+class ConnectionIdRebindBenchmark(test_suite.BenchmarkTest,
+                                  test_suite.Lwm2mDtlsSingleServerTest):
+    """
+    Measures how long it takes for the server to accept an Update sent from
+    a new address after a NAT-style port rebind, recognized by the DTLS
+    Connection ID, compared to an Update sent from an already known address.
+    """
+    ITERATIONS = 20
+    CONNECTION_ID_VALUE = 'something'
+
+    def setUp(self):
+        import pymbedtls
+        if not pymbedtls.Context.supports_connection_id():
+            raise unittest.SkipTest('connection_id support is not enabled in pymbedtls')
+
+        from suites.default.connection_id import CoapServerWithProxy
+        server = Lwm2mServer(CoapServerWithProxy(psk_identity=self.PSK_IDENTITY,
+                                                 psk_key=self.PSK_KEY,
+                                                 connection_id=self.CONNECTION_ID_VALUE))
+        super().setUp(servers=[server], auto_register=False,
+                      extra_cmdline_args=['--use-connection-id'])
+        self.iterations = benchmark_iterations(self.ITERATIONS)
+        self.benchmark_report.set_property('iterations', self.iterations)
+
+    def tearDown(self):
+        super().tearDown(auto_deregister=False)
+
+    def runTest(self):
+        from suites.default.connection_id import _disconnect_socket
+
+        with self.serv.server_proxy():
+            self.assertDemoRegisters()
+
+        rebind = self.benchmark_metric('update_after_rebind')
+        known_address = self.benchmark_metric('update_from_known_address')
+        for _ in range(self.iterations):
+            # every server_proxy() uses a new source port, so this looks like
+            # the client's address changed
+            _disconnect_socket(self.serv.socket.py_socket)
+            with self.serv.server_proxy():
+                with rebind.measure():
+                    self.communicate('send-update')
+                    self.assertDemoUpdatesRegistration()
+                with known_address.measure():
+                    self.communicate('send-update')
+                    self.assertDemoUpdatesRegistration()
+
+        _disconnect_socket(self.serv.socket.py_socket)
+        with self.serv.server_proxy():
+            self.request_demo_shutdown()
+            self.assertDemoDeregisters(reset=False)
+
+
+class ReconnectStormBenchmark(test_suite.BenchmarkTest):
+    """
+    Measures how long it takes for the client to re-establish DTLS sessions
+    with several servers at once after going back online.
+    """
+    ITERATIONS = 10
+    SERVERS = 3
+    PSK_IDENTITY = b'test-identity'
+    PSK_KEY = b'test-key'
+    NATIVE_IO = False
+
+    def setUp(self):
+        super().setUp(servers=self.SERVERS, psk_identity=self.PSK_IDENTITY,
+                      psk_key=self.PSK_KEY, native_io=self.NATIVE_IO)
+        self.iterations = benchmark_iterations(self.ITERATIONS)
+        self.benchmark_report.set_property('iterations', self.iterations)
+        self.benchmark_report.set_property('servers', self.SERVERS)
+        self.benchmark_report.set_property('native_io', self.NATIVE_IO)
+
+    def runTest(self):
+        all_servers = self.benchmark_metric('all_servers_reconnected')
+        per_server = self.benchmark_metric('server_reconnected')
+
+        def listen(serv, start):
+            serv.listen(timeout_s=5)
+            per_server.add(time.perf_counter() - start)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.SERVERS) as executor:
+            for _ in range(self.iterations):
+                self.communicate('enter-offline')
+                wait_until_offline(self)
+                for serv in self.servers:
+                    serv.reset()
+
+                with self.measure_demo_cpu_time():
+                    start = time.perf_counter()
+                    self.communicate('exit-offline')
+                    # the client may connect to servers in any order
+                    for future in [executor.submit(listen, serv, start)
+                                   for serv in self.servers]:
+                        future.result()
+                    all_servers.add(time.perf_counter() - start)
+
+
+class ReconnectStormNativeIoBenchmark(ReconnectStormBenchmark):
+    """
+    Same as ReconnectStormBenchmark, but with servers handling handshakes
+    without holding the GIL, so that they may proceed in parallel.
+    """
+    NATIVE_IO = True
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import os
+import time
+
+from framework import firmware_origin, impairment_proxy
+from framework.benchmark_utils import benchmark_iterations
+from framework.firmware_origin import FirmwareOrigin
+from framework.impairment_proxy import UdpImpairmentProxy
+from framework.lwm2m_test import *
+
+FIRMWARE_PATH = '/firmware'
+
+
+class FirmwareDownload:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest):
+        """
+        Measures how long it takes for the demo to download an IMAGE_SIZE
+        bytes long image using the "download" command, i.e. anjay_download().
+        """
+        ITERATIONS = 5
+        IMAGE_SIZE = 16 * 1024 * 1024
+        THROTTLE = firmware_origin.UNTHROTTLED
+        DOWNLOAD_TIMEOUT_S = 120
+
+        def make_coap_server(self):
+            return None
+
+        def get_image_uri(self):
+            return self.firmware_origin.get_http_uri(FIRMWARE_PATH)
+
+        def get_download_args(self):
+            return ''
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(*args, **kwargs)
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+            self.benchmark_report.set_property('image_size', self.IMAGE_SIZE)
+            self.benchmark_report.set_property('throttle', self.THROTTLE._asdict())
+
+            self.image = tempfile.NamedTemporaryFile()
+            self.image.write(os.urandom(self.IMAGE_SIZE))
+            self.image.flush()
+            self.target = tempfile.NamedTemporaryFile()
+
+            self.firmware_origin = FirmwareOrigin(throttle=self.THROTTLE,
+                                                  coap_server=self.make_coap_server())
+            self.firmware_origin.set_resource(FIRMWARE_PATH, file_path=self.image.name)
+            self.firmware_origin.start()
+
+        def tearDown(self):
+            try:
+                super().tearDown()
+            finally:
+                self.firmware_origin.stop()
+                self.image.close()
+                self.target.close()
+
+        def runTest(self):
+            download_time = self.benchmark_metric('download_time')
+            throughput = self.benchmark_metric('throughput', 'B/s')
+            requests = self.benchmark_metric('requests', '')
+
+            for _ in range(self.iterations):
+                self.firmware_origin.reset_stats()
+                with self.measure_demo_cpu_time('download_demo_cpu_time'):
+                    start = time.perf_counter()
+                    result = self.communicate(
+                        ('download %s %s %s' % (self.get_image_uri(), self.target.name,
+                                                self.get_download_args())).strip(),
+                        timeout=self.DOWNLOAD_TIMEOUT_S,
+                        match_regex=r'download finished, result == (\d+)')
+                    elapsed = time.perf_counter() - start
+
+                self.assertIsNotNone(result, 'download not finished on time')
+                # ANJAY_DOWNLOAD_FINISHED
+                self.assertEqual('0', result.group(1))
+                self.assertEqual(self.IMAGE_SIZE, os.stat(self.target.name).st_size)
+
+                download_time.add(elapsed)
+                throughput.add(self.IMAGE_SIZE / elapsed)
+                requests.add(len(self.firmware_origin.stats))
+
+                if self.firmware_origin.coap_file_server is not None:
+                    self.firmware_origin.reset_coap_peer()
+
+
+class HttpDownloadBenchmark(FirmwareDownload.Test):
+    pass
+
+
+class HttpThrottledDownloadBenchmark(FirmwareDownload.Test):
+    ITERATIONS = 3
+    IMAGE_SIZE = 1024 * 1024
+    THROTTLE = firmware_origin.CELLULAR
+
+
+class CoapDownloadBenchmark(FirmwareDownload.Test):
+    # every 1024-byte block is a separate round trip
+    IMAGE_SIZE = 2 * 1024 * 1024
+
+    def make_coap_server(self):
+        return coap.Server()
+
+    def get_image_uri(self):
+        return self.firmware_origin.get_coap_uri(FIRMWARE_PATH)
+
+
+class CoapsDownloadBenchmark(CoapDownloadBenchmark):
+    PSK_IDENTITY = b'firmware-identity'
+    PSK_KEY = b'firmware-key'
+
+    def make_coap_server(self):
+        return coap.DtlsServer(psk_identity=self.PSK_IDENTITY, psk_key=self.PSK_KEY)
+
+    def get_download_args(self):
+        return '%s %s' % (self.PSK_IDENTITY.decode('ascii'), self.PSK_KEY.decode('ascii'))
+
+
+class LteMCoapDownloadBenchmark(CoapDownloadBenchmark):
+    """
+    Block-wise CoAP download of the image with every block exchanged over
+    a link with LTE-M-like latency, loss and bandwidth.
+    """
+    ITERATIONS = 3
+    IMAGE_SIZE = 64 * 1024
+    LINK_PROFILE = impairment_proxy.LTE_M
+
+    def setUp(self, *args, **kwargs):
+        super().setUp(*args, **kwargs)
+        self.download_proxy = UdpImpairmentProxy(
+            ('127.0.0.1', self.firmware_origin.coap_file_server._server.get_listen_port()),
+            self.LINK_PROFILE)
+        self.download_proxy.start()
+
+    def tearDown(self):
+        try:
+            super().tearDown()
+        finally:
+            self.download_proxy.stop()
+
+    def get_image_uri(self):
+        return 'coap://127.0.0.1:%d%s' % (self.download_proxy.get_listen_port(),
+                                          FIRMWARE_PATH)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import time
+
+from framework.benchmark_utils import benchmark_iterations
+from framework.lwm2m_test import *
+
+
+class Latency:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest,
+               test_suite.Lwm2mDmOperations):
+        ITERATIONS = 200
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(*args, **kwargs)
+            self.serv.set_timeout(timeout_s=5)
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+
+        def measure_request(self, metric_name, request, expected_response_cls):
+            """
+            Sends REQUEST self.iterations times (with a fresh msg_id/token each
+            time) and records the time until a matching response arrives.
+            """
+            metric = self.benchmark_metric(metric_name)
+            for _ in range(self.iterations):
+                request.msg_id = ANY
+                request.token = ANY
+                request.fill_placeholders()
+                with metric.measure():
+                    self.serv.send(request)
+                    res = self.serv.recv()
+                self.assertMsgEqual(expected_response_cls.matching(request)(), res)
+            return metric
+
+
+class RegisterLatencyTest(Latency.Test):
+    ITERATIONS = 30
+
+    def runTest(self):
+        startup = self.benchmark_metric('start_to_startup_finished')
+        register = self.benchmark_metric('start_to_register')
+
+        for _ in range(self.iterations):
+            self.request_demo_shutdown()
+            self.assertDemoDeregisters()
+            self._terminate_demo()
+
+            start = time.perf_counter()
+            self._start_demo(self.make_demo_args(DEMO_ENDPOINT_NAME, [self.serv],
+                                                 '1.0', '1.0', None))
+            startup.add(time.perf_counter() - start)
+            self.assertDemoRegisters(timeout_s=5)
+            register.add(time.perf_counter() - start)
+
+
+class UpdateLatencyTest(Latency.Test):
+    def runTest(self):
+        trigger_to_update = self.benchmark_metric('send_update_to_update')
+        round_trip = self.benchmark_metric('update_round_trip')
+
+        for _ in range(self.iterations):
+            start = time.perf_counter()
+            self.communicate('send-update')
+            pkt = self.serv.recv()
+            trigger_to_update.add(time.perf_counter() - start)
+            self.assertMsgEqual(Lwm2mUpdate(self.DEFAULT_REGISTER_ENDPOINT, content=b''), pkt)
+            self.serv.send(Lwm2mChanged.matching(pkt)())
+            # CoAP ping is answered only after the Changed response is processed
+            self.coap_ping()
+            round_trip.add(time.perf_counter() - start)
+
+
+class DeviceObjectLatencyTest(Latency.Test):
+    def runTest(self):
+        self.measure_request('read_object_tlv',
+                             Lwm2mRead('/%d' % (OID.Device,),
+                                       accept=coap.ContentFormat.APPLICATION_LWM2M_TLV),
+                             Lwm2mContent)
+        self.measure_request('read_instance_tlv',
+                             Lwm2mRead('/%d/0' % (OID.Device,),
+                                       accept=coap.ContentFormat.APPLICATION_LWM2M_TLV),
+                             Lwm2mContent)
+        self.measure_request('read_resource_text',
+                             Lwm2mRead(ResPath.Device.Manufacturer,
+                                       accept=coap.ContentFormat.TEXT_PLAIN),
+                             Lwm2mContent)
+        self.measure_request('write_resource_text',
+                             Lwm2mWrite(ResPath.Device.UTCOffset, b'+01:00'),
+                             Lwm2mChanged)
+
+
+class TestObjectLatencyTest(Latency.Test):
+    def setUp(self, *args, **kwargs):
+        super().setUp(*args, **kwargs)
+        self.create_instance(self.serv, oid=OID.Test, iid=0)
+
+    def runTest(self):
+        self.measure_request('read_instance_tlv',
+                             Lwm2mRead('/%d/0' % (OID.Test,),
+                                       accept=coap.ContentFormat.APPLICATION_LWM2M_TLV),
+                             Lwm2mContent)
+        self.measure_request('read_counter_text',
+                             Lwm2mRead(ResPath.Test[0].Counter,
+                                       accept=coap.ContentFormat.TEXT_PLAIN),
+                             Lwm2mContent)
+        self.measure_request('write_int_text',
+                             Lwm2mWrite(ResPath.Test[0].ResInt, b'42'),
+                             Lwm2mChanged)
+        self.measure_request('write_string_text',
+                             Lwm2mWrite(ResPath.Test[0].ResString, b'x' * 64),
+                             Lwm2mChanged)
+        self.measure_request('execute_increment_counter',
+                             Lwm2mExecute(ResPath.Test[0].IncrementCounter),
+                             Lwm2mChanged)
+
+
+class DiscoverLatencyTest(Latency.Test):
+    ITERATIONS = 100
+    TEST_INSTANCES = 32
+
+    def setUp(self, *args, **kwargs):
+        super().setUp(*args, **kwargs)
+        for iid in range(self.TEST_INSTANCES):
+            self.create_instance(self.serv, oid=OID.Test, iid=iid)
+        self.benchmark_report.set_property('test_instances', self.TEST_INSTANCES)
+
+    def measure_discover(self, metric_name, path):
+        """
+        Like measure_request(), but follows block-wise responses, which
+        Discover on many instances requires. The whole transfer is measured.
+        """
+        metric = self.benchmark_metric(metric_name)
+        blocks = self.benchmark_metric(metric_name + '_blocks', '')
+        for _ in range(self.iterations):
+            req = Lwm2mDiscover(path)
+            count = 0
+            with metric.measure():
+                while True:
+                    self.serv.send(req)
+                    res = self.serv.recv()
+                    self.assertMsgEqual(Lwm2mContent.matching(req)(), res)
+                    count += 1
+                    block2 = res.get_options(coap.Option.BLOCK2)
+                    if not block2 or not block2[0].has_more():
+                        break
+                    req = Lwm2mDiscover(path, options=[
+                        coap.Option.BLOCK2(seq_num=block2[0].seq_num() + 1, has_more=False,
+                                           block_size=block2[0].block_size())])
+            blocks.add(count)
+
+    def runTest(self):
+        # the Security Object is not accessible to LwM2M Servers
+        for oid in (OID.Server, OID.Device, OID.Test):
+            self.measure_discover('discover_%d' % (oid,), '/%d' % (oid,))
+
+        self.measure_discover('discover_%d_instance' % (OID.Test,), '/%d/0' % (OID.Test,))
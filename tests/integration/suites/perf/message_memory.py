@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import gc
+import tracemalloc
+
+from framework.benchmark_utils import benchmark_iterations
+from framework.lwm2m.tlv import TLV
+from framework.lwm2m_test import *
+
+
+def retained_bytes_per_item(count, make_item):
+    """
+    Returns the average number of bytes of Python heap retained by each of
+    COUNT objects created by calling MAKE_ITEM(index), as seen by tracemalloc.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        retained = [make_item(i) for i in range(count)]
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    del retained
+    return (after - before) / count
+
+
+class RetainedMessageMemoryTest(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest):
+    """
+    Measures how much memory the test framework needs to keep parsed messages
+    alive, like nsh-lwm2m history or CoapFileServer request logs do. Messages
+    are real datagrams exchanged with the demo client.
+    """
+    ITERATIONS = 5
+    MESSAGES_PER_ITERATION = 10000
+
+    def runTest(self):
+        iterations = benchmark_iterations(self.ITERATIONS)
+        self.benchmark_report.set_property('iterations', iterations)
+        self.benchmark_report.set_property('messages_per_iteration', self.MESSAGES_PER_ITERATION)
+
+        datagrams = []
+        payloads = []
+        for path, fmt in (('/3/0', coap.ContentFormat.APPLICATION_LWM2M_TLV),
+                          ('/1/1/1', coap.ContentFormat.TEXT_PLAIN)):
+            req = Lwm2mRead(path, accept=fmt)
+            req.fill_placeholders()
+            self.serv.send(req)
+            res = self.serv.recv()
+            self.assertMsgEqual(Lwm2mContent.matching(req)(format=fmt), res)
+            datagrams += [req.serialize(), res.serialize()]
+            payloads.append(res.content)
+
+        def parse_message(i):
+            return get_lwm2m_msg(coap.Packet.parse(datagrams[i % len(datagrams)]))
+
+        def parse_tlv(_):
+            return TLV.parse(payloads[0])
+
+        per_message = self.benchmark_metric('retained_bytes_per_message', unit='B')
+        per_tlv = self.benchmark_metric('retained_bytes_per_device_tlv', unit='B')
+        for _ in range(iterations):
+            per_message.add(retained_bytes_per_item(self.MESSAGES_PER_ITERATION, parse_message))
+            per_tlv.add(retained_bytes_per_item(self.MESSAGES_PER_ITERATION, parse_tlv))
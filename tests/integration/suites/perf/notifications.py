@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import socket
+import time
+
+from framework.benchmark_utils import benchmark_iterations
+from framework.lwm2m_test import *
+
+
+class NotificationBenchmark:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest,
+               test_suite.Lwm2mDmOperations):
+        CONFIRMABLE = False
+        FORMAT = coap.ContentFormat.APPLICATION_LWM2M_TLV
+        ITERATIONS = 50
+
+        def setUp(self, *args, **kwargs):
+            extra_cmdline_args = ['--confirmable-notifications'] if self.CONFIRMABLE else []
+            super().setUp(maximum_version='1.1', extra_cmdline_args=extra_cmdline_args,
+                          *args, **kwargs)
+            self.serv.set_timeout(timeout_s=5)
+            self.observations = []
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+            self.benchmark_report.set_property('confirmable', self.CONFIRMABLE)
+            self.benchmark_report.set_property('format',
+                                               coap.ContentFormat.to_str(self.FORMAT))
+
+        def tearDown(self, *args, **kwargs):
+            # IPSO sensors change their values spontaneously; make sure no
+            # notifications interfere with the shutdown sequence
+            try:
+                self.cancel_observations()
+            finally:
+                super().tearDown(*args, **kwargs)
+
+        def start_observation(self, path):
+            req = Lwm2mObserve(path, accept=self.FORMAT)
+            self.serv.send(req)
+            self.assertMsgEqual(Lwm2mContent.matching(req)(), self.serv.recv())
+            self.observations.append((path, False, req.token))
+            return req.token
+
+        def start_composite_observation(self, paths, **attributes):
+            req = Lwm2mObserveComposite(paths=paths, accept=self.FORMAT, **attributes)
+            self.serv.send(req)
+            self.assertMsgEqual(Lwm2mContent.matching(req)(), self.serv.recv())
+            self.observations.append((paths, True, req.token))
+            return req.token
+
+        def cancel_observations(self):
+            while self.observations:
+                paths, composite, token = self.observations.pop()
+                if composite:
+                    req = Lwm2mObserveComposite(paths=paths, observe=1, token=token)
+                else:
+                    req = Lwm2mObserve(paths, observe=1, token=token)
+                self.serv.send(req)
+
+                pkt = self.serv.recv()
+                while pkt.msg_id != req.msg_id:
+                    # a notification sent before the observation got cancelled
+                    self.handle_notification(pkt)
+                    pkt = self.serv.recv()
+                self.assertMsgEqual(Lwm2mContent.matching(req)(), pkt)
+
+        def handle_notification(self, pkt):
+            self.assertMsgEqual(Lwm2mNotify(token=ANY, confirmable=self.CONFIRMABLE), pkt)
+            if self.CONFIRMABLE:
+                self.serv.send(Lwm2mEmpty.matching(pkt)())
+            return pkt
+
+        def recv_notification(self):
+            pkt = self.handle_notification(self.serv.recv())
+            self.benchmark_metric('notification_size', unit='B').add(len(pkt.content))
+            return pkt
+
+        def add_push_buttons(self, count):
+            """
+            Makes sure that Push Button instances 0..COUNT-1 exist and returns
+            paths to their Digital Input State resources, which can be changed
+            locally with toggle_push_button().
+            """
+            # instance 0 is created by the demo itself
+            for iid in range(1, count):
+                self.communicate('push-button-add-instance %d benchmark' % (iid,))
+            # adding instances makes the demo update its registration, possibly
+            # more than once
+            while True:
+                try:
+                    pkt = self.serv.recv(timeout_s=1)
+                except socket.timeout:
+                    break
+                self.assertMsgEqual(Lwm2mUpdate(self.DEFAULT_REGISTER_ENDPOINT, content=ANY), pkt)
+                self.serv.send(Lwm2mChanged.matching(pkt)())
+
+            self.push_button_states = [False] * count
+            return ['/%d/%d/%d' % (OID.PushButton, iid, RID.PushButton.DigitalInputState)
+                    for iid in range(count)]
+
+        def toggle_push_button(self, iid):
+            # the demo does not notify about unchanged values, so a value that
+            # actually changes is needed to trigger a notification
+            self.push_button_states[iid] = not self.push_button_states[iid]
+            # do not wait for the prompt, so that triggers are not serialized
+            # with waiting for the notifications
+            self.communicate('push-button-%s %d' % ('press' if self.push_button_states[iid]
+                                                    else 'release', iid),
+                             match_regex=None)
+
+
+class NotificationThroughput:
+    class Test(NotificationBenchmark.Test):
+        # maximum number of Push Button instances supported by the demo
+        PUSH_BUTTONS = 16
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(*args, **kwargs)
+
+            self.observed_paths = self.add_push_buttons(self.PUSH_BUTTONS)
+            self.benchmark_report.set_property('observations', len(self.observed_paths))
+
+            for path in self.observed_paths:
+                req = Lwm2mWriteAttributes(path, pmin=0, pmax=3600)
+                self.serv.send(req)
+                self.assertMsgEqual(Lwm2mChanged.matching(req)(), self.serv.recv())
+                self.start_observation(path)
+
+        def runTest(self):
+            round_duration = self.benchmark_metric('round_duration')
+            received = 0
+
+            start = time.perf_counter()
+            with self.measure_demo_cpu_time():
+                for _ in range(self.iterations):
+                    with round_duration.measure():
+                        pending_tokens = set(token for _, _, token in self.observations)
+                        for iid in range(self.PUSH_BUTTONS):
+                            self.toggle_push_button(iid)
+                        while pending_tokens:
+                            pending_tokens.discard(self.recv_notification().token)
+                            received += 1
+            elapsed = time.perf_counter() - start
+
+            self.benchmark_report.set_property('notifications_per_second', received / elapsed)
+
+
+class NotificationThroughputNonTlv(NotificationThroughput.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_TLV
+
+
+class NotificationThroughputNonSenmlCbor(NotificationThroughput.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+
+
+class NotificationThroughputNonSenmlJson(NotificationThroughput.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON
+
+
+class NotificationThroughputConTlv(NotificationThroughput.Test):
+    CONFIRMABLE = True
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_TLV
+
+
+class NotificationThroughputConSenmlCbor(NotificationThroughput.Test):
+    CONFIRMABLE = True
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+
+
+class NotificationThroughputConSenmlJson(NotificationThroughput.Test):
+    CONFIRMABLE = True
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON
+
+
+class CompositeNotificationThroughput:
+    class Test(NotificationBenchmark.Test):
+        FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+        PUSH_BUTTONS = 16
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(*args, **kwargs)
+
+            paths = self.add_push_buttons(self.PUSH_BUTTONS)
+            self.benchmark_report.set_property('composite_paths', len(paths))
+
+            # attributes in the Observe-Composite request itself are not
+            # supported by the demo
+            for path in paths:
+                req = Lwm2mWriteAttributes(path, pmin=0, pmax=3600)
+                self.serv.send(req)
+                self.assertMsgEqual(Lwm2mChanged.matching(req)(), self.serv.recv())
+            self.start_composite_observation(paths)
+
+        def runTest(self):
+            round_duration = self.benchmark_metric('round_duration')
+
+            start = time.perf_counter()
+            with self.measure_demo_cpu_time():
+                for _ in range(self.iterations):
+                    with round_duration.measure():
+                        self.toggle_push_button(0)
+                        self.recv_notification()
+            elapsed = time.perf_counter() - start
+
+            self.benchmark_report.set_property('notifications_per_second',
+                                               self.iterations / elapsed)
+
+
+class CompositeNotificationThroughputNonSenmlCbor(CompositeNotificationThroughput.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+
+
+class CompositeNotificationThroughputNonSenmlJson(CompositeNotificationThroughput.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON
+
+
+class CompositeNotificationThroughputConSenmlCbor(CompositeNotificationThroughput.Test):
+    CONFIRMABLE = True
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+
+
+class CompositeNotificationThroughputConSenmlJson(CompositeNotificationThroughput.Test):
+    CONFIRMABLE = True
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON
+
+
+class NotificationTiming:
+    class Test(NotificationBenchmark.Test):
+        ITERATIONS = 20
+        PERIOD_S = 1
+        # maximum time for the demo to take a value change into account
+        CHANGE_TIMEOUT_S = 5
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(*args, **kwargs)
+            self.create_instance(self.serv, oid=OID.Test, iid=0)
+            self.benchmark_report.set_property('period_s', self.PERIOD_S)
+
+            self.write_attributes(self.serv, oid=OID.Test, iid=0, rid=RID.Test.Counter,
+                                  query=['pmin=%d' % (self.PERIOD_S,),
+                                         'pmax=%d' % (self.PERIOD_S,)])
+            self.start_observation(ResPath.Test[0].Counter)
+
+        def runTest(self):
+            with self.measure_demo_cpu_time():
+                self.measure_pmax_timing()
+                self.cancel_observations()
+                self.measure_pmin_timing()
+
+        def measure_pmax_timing(self):
+            # positive values mean that the notification arrived later than
+            # planned by the client
+            jitter = self.benchmark_metric('pmax_jitter')
+            interval = self.benchmark_metric('notification_interval')
+
+            planned = self.get_next_planned_pmax_notify_time()
+            last_arrival = None
+            for _ in range(self.iterations):
+                self.recv_notification()
+                arrival = time.time()
+                if planned is not None:
+                    jitter.add(arrival - planned)
+                if last_arrival is not None:
+                    interval.add(arrival - last_arrival)
+                last_arrival = arrival
+                planned = self.get_next_planned_pmax_notify_time()
+
+        def measure_pmin_timing(self):
+            """
+            Changes an observed value right after each notification, so that
+            the next one is held back until pmin passes, and compares its
+            arrival with the time planned by the client.
+            """
+            jitter = self.benchmark_metric('pmin_jitter')
+
+            path = self.add_push_buttons(1)[0]
+            self.write_attributes(self.serv, oid=OID.PushButton, iid=0,
+                                  rid=RID.PushButton.DigitalInputState,
+                                  query=['pmin=%d' % (self.PERIOD_S,), 'pmax=3600'])
+            self.start_observation(path)
+
+            for _ in range(self.iterations):
+                pmax_planned = self.get_next_planned_pmax_notify_time()
+                self.toggle_push_button(0)
+                # the change is processed asynchronously; until then, the
+                # pmax-driven notification is the next planned one
+                deadline = time.time() + self.CHANGE_TIMEOUT_S
+                planned = self.get_next_planned_notify_time()
+                while planned == pmax_planned:
+                    if time.time() >= deadline:
+                        self.fail('value change not processed by the demo within %d s'
+                                  % (self.CHANGE_TIMEOUT_S,))
+                    time.sleep(0.01)
+                    planned = self.get_next_planned_notify_time()
+                self.recv_notification()
+                if planned is not None:
+                    jitter.add(time.time() - planned)
+
+
+class NotificationTimingNonTlv(NotificationTiming.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_TLV
+
+
+class NotificationTimingNonSenmlCbor(NotificationTiming.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+
+
+class NotificationTimingNonSenmlJson(NotificationTiming.Test):
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON
+
+
+class NotificationTimingConTlv(NotificationTiming.Test):
+    CONFIRMABLE = True
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_TLV
+
+
+class NotificationTimingConSenmlCbor(NotificationTiming.Test):
+    CONFIRMABLE = True
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR
+
+
+class NotificationTimingConSenmlJson(NotificationTiming.Test):
+    CONFIRMABLE = True
+    FORMAT = coap.ContentFormat.APPLICATION_LWM2M_SENML_JSON
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import base64
+import json
+import statistics
+import time
+
+from framework.benchmark_utils import benchmark_iterations
+from framework.lwm2m.senml_cbor import SenmlLabel
+from framework.lwm2m_test import *
+
+# maximum number of paths accepted by the demo's "send" command
+MAX_SEND_RESOURCES = 32
+
+_SENML_JSON_LABELS = {
+    SenmlLabel.BASE_TIME: 'bt',
+    SenmlLabel.BASE_NAME: 'bn',
+    SenmlLabel.NAME: 'n',
+    SenmlLabel.VALUE: 'v',
+    SenmlLabel.STRING: 'vs',
+    SenmlLabel.BOOL: 'vb',
+    SenmlLabel.TIME: 't',
+    SenmlLabel.OPAQUE: 'vd',
+    SenmlLabel.OBJLNK: 'vlo',
+}
+
+
+def senml_json_size(cbor_payload):
+    """
+    Returns the size of a SenML JSON payload carrying the same records as
+    CBOR_PAYLOAD, encoded compactly.
+    """
+    records = []
+    for record in CBOR.parse(cbor_payload):
+        json_record = {}
+        for label, value in record.items():
+            if isinstance(value, bytes):
+                value = base64.urlsafe_b64encode(value).rstrip(b'=').decode('ascii')
+            json_record[_SENML_JSON_LABELS.get(label, str(label))] = value
+        records.append(json_record)
+    return len(json.dumps(records, separators=(',', ':')))
+
+
+class SendBatching:
+    class Test(test_suite.BenchmarkTest, test_suite.Lwm2mSingleServerTest,
+               test_suite.Lwm2mDmOperations):
+        """
+        Sends batches of BATCH_SIZES Test object ResBytes resources, each
+        RECORD_SIZE bytes long, using the demo's "send" command and measures
+        how the size of a batch affects throughput and encoding overhead.
+
+        Shell commands are only handled by the demo once its event loop wakes
+        up, which takes up to 100 ms, so send_latency_N is dominated by that
+        delay. The cost of the batch itself is measured with send_duration_N,
+        starting from the first Send packet, and with the latency increase
+        over single-record batches.
+        """
+        ITERATIONS = 20
+        BATCH_SIZES = (1, 2, 4, 8, 16, 32)
+        RECORD_SIZE = 16
+
+        def setUp(self, *args, **kwargs):
+            super().setUp(minimum_version='1.1', maximum_version='1.1', *args, **kwargs)
+            self.serv.set_timeout(timeout_s=5)
+            self.iterations = benchmark_iterations(self.ITERATIONS)
+            self.benchmark_report.set_property('iterations', self.iterations)
+            self.benchmark_report.set_property('record_size', self.RECORD_SIZE)
+
+            for iid in range(max(self.BATCH_SIZES)):
+                self.create_instance(self.serv, oid=OID.Test, iid=iid)
+                self.write_resource(self.serv, oid=OID.Test, iid=iid, rid=RID.Test.ResBytesSize,
+                                    content=str(self.RECORD_SIZE))
+
+        def recv_send(self):
+            """
+            Receives a complete, possibly block-wise Send request, answering
+            each block. Returns the list of received packets and the
+            time.perf_counter() value at which the first of them arrived.
+            """
+            packets = []
+            first_arrival = None
+            while True:
+                pkt = self.serv.recv()
+                if first_arrival is None:
+                    first_arrival = time.perf_counter()
+                block1 = pkt.get_options(coap.Option.BLOCK1)
+                self.assertMsgEqual(Lwm2mSend(options=block1), pkt)
+                packets.append(pkt)
+
+                if block1 and block1[0].has_more():
+                    self.serv.send(Lwm2mContinue.matching(pkt)(options=block1))
+                else:
+                    self.serv.send(Lwm2mChanged.matching(pkt)(options=block1))
+                    return packets, first_arrival
+
+        def runTest(self):
+            for batch_size in self.BATCH_SIZES:
+                self.assertLessEqual(batch_size, MAX_SEND_RESOURCES)
+                paths = ' '.join(ResPath.Test[iid].ResBytes for iid in range(batch_size))
+
+                latency = self.benchmark_metric('send_latency_%d' % (batch_size,))
+                duration = self.benchmark_metric('send_duration_%d' % (batch_size,))
+                blocks = self.benchmark_metric('blocks_%d' % (batch_size,), '')
+                bytes_per_record = self.benchmark_metric('bytes_per_record_%d' % (batch_size,),
+                                                         'B')
+                json_bytes_per_record = self.benchmark_metric(
+                    'senml_json_bytes_per_record_%d' % (batch_size,), 'B')
+                # bytes sent over the wire per byte of payload, including CoAP
+                # headers and options of every block
+                wire_overhead = self.benchmark_metric('wire_overhead_%d' % (batch_size,), '')
+
+                sends = []
+                with self.measure_demo_cpu_time('demo_cpu_time_%d' % (batch_size,)):
+                    for _ in range(self.iterations):
+                        start = time.perf_counter()
+                        self.communicate('send 1 %s' % (paths,))
+                        packets, first_arrival = self.recv_send()
+                        end = time.perf_counter()
+                        latency.add(end - start)
+                        duration.add(end - first_arrival)
+                        sends.append(packets)
+
+                # payloads are only analyzed after all of them are received,
+                # so that decoding them does not affect the timings
+                for packets in sends:
+                    payload = b''.join(pkt.content for pkt in packets)
+                    records = CBOR.parse(payload)
+                    self.assertEqual(batch_size, len(records))
+
+                    blocks.add(len(packets))
+                    bytes_per_record.add(len(payload) / batch_size)
+                    json_bytes_per_record.add(senml_json_size(payload) / batch_size)
+                    wire_overhead.add(sum(len(pkt.serialize()) for pkt in packets)
+                                      / len(payload))
+
+                self.benchmark_report.set_property(
+                    'content_format_%d' % (batch_size,),
+                    coap.ContentFormat.to_str(sends[0][0].get_content_format()))
+
+            self.report_per_record_cost()
+
+        def report_per_record_cost(self):
+            """
+            Subtracts the median latency of single-record batches, which
+            includes the delay of the demo handling the shell command and the
+            fixed cost of a Send request, from the median latency of larger
+            batches, to estimate the cost of each additional record.
+            """
+            def median_latency(batch_size):
+                return statistics.median(
+                    self.benchmark_report.metrics['send_latency_%d' % (batch_size,)].values)
+
+            baseline_size = min(self.BATCH_SIZES)
+            baseline = median_latency(baseline_size)
+            for batch_size in self.BATCH_SIZES:
+                if batch_size == baseline_size:
+                    continue
+                extra_latency = max(median_latency(batch_size) - baseline, 0.0)
+                extra_records = batch_size - baseline_size
+                self.benchmark_report.set_property(
+                    'latency_per_extra_record_%d' % (batch_size,),
+                    extra_latency / extra_records)
+                # not reported if the difference is lost in the noise
+                if extra_latency > 0:
+                    self.benchmark_report.set_property(
+                        'records_per_second_%d' % (batch_size,),
+                        extra_records / extra_latency)
+
+
+class SendBatchingSmallRecordsBenchmark(SendBatching.Test):
+    RECORD_SIZE = 16
+
+
+class SendBatchingLargeRecordsBenchmark(SendBatching.Test):
+    # larger batches are split into multiple blocks
+    RECORD_SIZE = 256
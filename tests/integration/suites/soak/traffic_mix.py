@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+import statistics
+import time
+
+from framework.lwm2m_test import *
+
+
+class TrafficMixSoakTest(test_suite.SoakTest, test_suite.Lwm2mSingleServerTest,
+                         test_suite.Lwm2mDmOperations):
+    """
+    Keeps the demo registered while cycling through Read, Write, Observe,
+    Send and Update operations, and checks that neither its resource usage
+    nor request latency grows over time.
+
+    The demo's clock is advanced so that TIME_ACCELERATION seconds pass for it
+    for every real one, which makes it send lifetime-driven Updates, too.
+    """
+    LIFETIME = 600
+    TIME_ACCELERATION = 60
+    # pause between consecutive rounds of operations
+    ROUND_INTERVAL_S = 0.5
+    # operations performed in each round, along with how often (in rounds)
+    # they are performed; explicit Updates postpone lifetime-driven ones, so
+    # they are rare
+    OPERATIONS = (('read', 1), ('write', 1), ('notify', 1), ('send', 1), ('update', 20))
+    EXTRA_COLUMNS = ('virtual_time', 'rounds', 'lifetime_updates', 'latency')
+    GROWTH_TOLERANCES = dict(test_suite.SoakTest.GROWTH_TOLERANCES,
+                             latency=(0.005, 1.0))
+
+    def setUp(self, *args, **kwargs):
+        super().setUp(minimum_version='1.1', maximum_version='1.1', lifetime=self.LIFETIME,
+                      *args, **kwargs)
+        self.serv.set_timeout(timeout_s=5)
+        self.benchmark_report.set_property('time_acceleration', self.TIME_ACCELERATION)
+        self.virtual_time = 0.0
+        self.lifetime_updates = 0
+
+        self.create_instance(self.serv, oid=OID.Test, iid=0)
+        self.observe_req = Lwm2mObserve(ResPath.Test[0].Counter)
+        self.request(self.observe_req, Lwm2mContent)
+
+    def recv_matching(self, predicate):
+        """
+        Receives packets until one matching PREDICATE arrives, answering
+        lifetime-driven Updates and unrelated notifications in the meantime.
+        """
+        while True:
+            pkt = self.serv.recv()
+            if predicate(pkt):
+                return pkt
+            if isinstance(pkt, Lwm2mUpdate):
+                self.lifetime_updates += 1
+                self.serv.send(Lwm2mChanged.matching(pkt)())
+            elif isinstance(pkt, Lwm2mNotify) and pkt.token == self.observe_req.token:
+                if pkt.type == coap.Type.CONFIRMABLE:
+                    self.serv.send(Lwm2mEmpty.matching(pkt)())
+            else:
+                self.fail('unexpected message during soak test: %r' % (pkt,))
+
+    def request(self, req, expected_response_cls):
+        req.fill_placeholders()
+        self.serv.send(req)
+        res = self.recv_matching(lambda pkt: (isinstance(pkt, Lwm2mResponse)
+                                              and pkt.token == req.token))
+        self.assertMsgEqual(expected_response_cls.matching(req)(), res)
+        return res
+
+    def perform(self, operation, round):
+        if operation == 'read':
+            self.request(Lwm2mRead(ResPath.Device.SerialNumber), Lwm2mContent)
+        elif operation == 'write':
+            self.request(Lwm2mWrite(ResPath.Test[0].ResInt, str(round)), Lwm2mChanged)
+        elif operation == 'notify':
+            self.request(Lwm2mExecute(ResPath.Test[0].IncrementCounter), Lwm2mChanged)
+            pkt = self.recv_matching(lambda pkt: isinstance(pkt, Lwm2mNotify)
+                                     and pkt.token == self.observe_req.token)
+            if pkt.type == coap.Type.CONFIRMABLE:
+                self.serv.send(Lwm2mEmpty.matching(pkt)())
+        elif operation == 'send':
+            self.communicate('send 1 %s' % (ResPath.Device.SerialNumber,))
+            pkt = self.recv_matching(lambda pkt: isinstance(pkt, Lwm2mSend))
+            self.serv.send(Lwm2mChanged.matching(pkt)())
+        elif operation == 'update':
+            self.communicate('send-update')
+            pkt = self.recv_matching(lambda pkt: isinstance(pkt, Lwm2mUpdate))
+            self.serv.send(Lwm2mChanged.matching(pkt)())
+
+    def advance_virtual_time(self, real_duration_s):
+        duration_s = real_duration_s * (self.TIME_ACCELERATION - 1)
+        self.advance_demo_time(duration_s)
+        self.virtual_time += duration_s
+
+    def runTest(self):
+        metrics = {operation: self.benchmark_metric(operation) for operation, _ in self.OPERATIONS}
+        latencies = []
+        rounds = 0
+        next_sample = 0.0
+        last_advance = time.monotonic()
+
+        while True:
+            elapsed = self.soak_elapsed()
+            if elapsed >= next_sample:
+                self.soak_sample(virtual_time=self.virtual_time, rounds=rounds,
+                                 lifetime_updates=self.lifetime_updates,
+                                 latency=statistics.median(latencies) if latencies else None)
+                latencies = []
+                next_sample += self.SAMPLE_INTERVAL_S
+            if elapsed >= self.soak_duration:
+                break
+
+            for operation, period in self.OPERATIONS:
+                if rounds % period:
+                    continue
+                start = time.perf_counter()
+                self.perform(operation, rounds)
+                latency = time.perf_counter() - start
+                metrics[operation].add(latency)
+                latencies.append(latency)
+            rounds += 1
+
+            time.sleep(self.ROUND_INTERVAL_S)
+            now = time.monotonic()
+            self.advance_virtual_time(now - last_advance)
+            last_advance = now
+
+        # answer the Update possibly triggered by the last time advance, so
+        # that it does not interfere with De-Register
+        self.request(Lwm2mRead(ResPath.Device.SerialNumber), Lwm2mContent)
+
+        self.benchmark_report.set_property('rounds', rounds)
+        self.benchmark_report.set_property('lifetime_updates', self.lifetime_updates)
+        self.check_growth()
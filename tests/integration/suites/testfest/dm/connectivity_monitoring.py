@@ -9,14 +9,12 @@
 
 from framework.lwm2m_test import *
 
+from .schema import object_schema
 from .utils import DataModel, ValueValidator as VV
 
 
 class Test701_ConnectivityMonitoring_QueryingTheReadableResourcesOfObject(DataModel.Test):
     def runTest(self):
-        integer_array = VV.multiple_resource(VV.from_raw_int())
-        string_array = VV.multiple_resource(VV.ascii_string())
-
         # 1. READ (CoAP GET) operation is performed by the Server on the
         #    Connectivity Monitoring Object Instance of the Client
         #
@@ -28,15 +26,8 @@ class Test701_ConnectivityMonitoring_QueryingTheReadableResourcesOfObject(DataMo
         #    Resources (ID:0, 1,2, 4) and the optional ones, are received by the
         #    Server with expected values in compliance with LwM2M technical
         #    specification TS 1.0.
-        self.test_read('/%d/0' % OID.ConnectivityMonitoring,
-                       VV.tlv_instance(
-                           resource_validators={
-                               RID.ConnectivityMonitoring.NetworkBearer:          VV.from_raw_int(),
-                               RID.ConnectivityMonitoring.AvailableNetworkBearer: integer_array,
-                               RID.ConnectivityMonitoring.RadioSignalStrength:    VV.from_raw_int(),
-                               RID.ConnectivityMonitoring.IPAddresses:            string_array,
-                           },
-                           ignore_extra=True))
+        self.test_read_validated('/%d/0' % OID.ConnectivityMonitoring,
+                                 object_schema(OID.ConnectivityMonitoring))
 
 
 class Test710_ConnectivityMonitoring_ObservationAndNotificationOfObservableResources(DataModel.Test):
@@ -11,6 +11,7 @@ import time
 
 from framework.lwm2m_test import *
 
+from .schema import object_schema
 from .utils import DataModel, ValueValidator as VV
 
 
@@ -53,16 +54,9 @@ class Test901_ConnectivityStatistics_QueryingADataCollectionFromConnectivityObje
         #    optional ones
         #
         # NOTE: listed Resources are from Connectivity Monitoring, not Statistics
-        self.test_read('/%d/0' % OID.ConnectivityStatistics,
-                       VV.tlv_instance(resource_validators={
-                           RID.ConnectivityStatistics.SMSTxCounter:       VV.from_raw_int(),
-                           RID.ConnectivityStatistics.SMSRxCounter:       VV.from_raw_int(),
-                           RID.ConnectivityStatistics.RxData:             VV.from_raw_int(),
-                           RID.ConnectivityStatistics.TxData:             VV.from_raw_int(),
-                           RID.ConnectivityStatistics.MaxMessageSize:     VV.from_raw_int(),
-                           RID.ConnectivityStatistics.AverageMessageSize: VV.from_raw_int(),
-                           RID.ConnectivityStatistics.CollectionPeriod:   VV.from_raw_int(),
-                        }, ignore_missing=True)) # all readable Resources are optional
+        # all readable Resources are optional
+        self.test_read_validated('/%d/0' % OID.ConnectivityStatistics,
+                                 object_schema(OID.ConnectivityStatistics))
 
 
 class Test905_ConnectivityStatistics_SettingTheWritableResources(DataModel.Test):
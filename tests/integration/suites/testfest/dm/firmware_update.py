@@ -8,14 +8,15 @@
 # See the attached LICENSE file for details.
 
 import contextlib
-import http
 import os
 import resource
-import socket
 import threading
 import time
 
+from framework import firmware_origin
+from framework.firmware_origin import FirmwareOrigin
 from framework.lwm2m_test import *
+from .schema import object_schema
 from .utils import DataModel, ValueValidator as VV
 
 
@@ -23,27 +24,22 @@ class FirmwareUpdate:
     class Test(DataModel.Test):
         def collect_values(self, path: Lwm2mPath, final_value, max_iterations=100, step_time=0.1):
             observed_values = []
-            orig_timeout = self.serv.get_timeout()
+
+            def is_final(value):
+                observed_values.append(value)
+                return value == final_value
+
             try:
-                deadline = time.time() + max_iterations * step_time
-                while True:
-                    timeout = max(deadline - time.time(), 0.0)
-                    self.serv.set_timeout(timeout)
-                    try:
-                        state = self.test_read(path)
-                    except socket.timeout:
-                        break
-                    observed_values.append(state)
-                    if state == final_value:
-                        break
-                    time.sleep(step_time)
-                return observed_values
-            finally:
-                self.serv.set_timeout(orig_timeout)
+                self.wait_for_resource(path, is_final, timeout_s=max_iterations * step_time,
+                                       server=self.serv, poll_interval_s=step_time)
+            except TimeoutError:
+                pass
+            return observed_values
 
-        def setUp(self, extra_cmdline_args=[]):
+        def setUp(self, extra_cmdline_args=[], **kwargs):
             self.ANJAY_MARKER_FILE = generate_temp_filename(dir='/tmp', prefix='anjay-fw-updated-')
-            super().setUp(fw_updated_marker_path=self.ANJAY_MARKER_FILE, extra_cmdline_args=extra_cmdline_args)
+            super().setUp(fw_updated_marker_path=self.ANJAY_MARKER_FILE, extra_cmdline_args=extra_cmdline_args,
+                          **kwargs)
 
         def tearDown(self):
             # reset the state machine
@@ -75,57 +71,44 @@ class FirmwareUpdate:
 class FirmwareUpdateWithHttpServer:
     class Test(FirmwareUpdate.Test):
         FIRMWARE_PATH = '/firmware'
-        HTTP_SERVER_CLASS = http.server.HTTPServer
+        # the package is sent a second after the response headers, to give the
+        # test some time to read "Downloading" state
+        THROTTLE = firmware_origin.ThrottleProfile(chunk_size=firmware_origin.UNTHROTTLED.chunk_size,
+                                                   delay_s=1.0)
+        EARLY_HEADERS = False
 
         def get_firmware_uri(self):
-            return 'http://127.0.0.1:%d%s' % (self.http_server.server_address[1], self.FIRMWARE_PATH)
+            return self.firmware_origin.get_http_uri(self.FIRMWARE_PATH)
 
-        def before_download(self):
-            pass
-
-        def during_download(self, request_handler):
-            pass
+        def get_firmware_resource(self, path):
+            """
+            Called for each HTTP request; returns the FirmwareResource to send,
+            or None to respond with 404 Not Found.
+            """
+            return FirmwareOrigin.get_resource(self.firmware_origin, path)
 
         def setUp(self, firmware_package):
             super().setUp()
 
             test_case = self
 
-            class FirmwareRequestHandler(http.server.BaseHTTPRequestHandler):
-                def do_GET(self):
-                    test_case.requests.append(self.path)
-                    test_case.before_download()
-
-                    self.send_response(http.HTTPStatus.OK)
-                    self.send_header('Content-type', 'application/octet-stream')
-                    self.send_header('Content-length', len(firmware_package))
-                    self.end_headers()
-
-                    # give the test some time to read "Downloading" state
-                    time.sleep(1)
-
-                    test_case.during_download(self)
-                    try:
-                        self.wfile.write(firmware_package)
-                    except BrokenPipeError:
-                        pass
-
-                def log_request(code='-', size='-'):
-                    # don't display logs on successful request
-                    pass
+            class TestfestFirmwareOrigin(FirmwareOrigin):
+                def get_resource(self, path):
+                    test_case.requests.append(path)
+                    return test_case.get_firmware_resource(path)
 
             self.requests = []
-            self.http_server = self.HTTP_SERVER_CLASS(('', 0), FirmwareRequestHandler)
-
-            self.server_thread = threading.Thread(target=lambda: self.http_server.serve_forever())
-            self.server_thread.start()
+            self.firmware_origin = TestfestFirmwareOrigin(throttle=self.THROTTLE,
+                                                          accept_ranges=False,
+                                                          early_headers=self.EARLY_HEADERS)
+            self.firmware_origin.set_resource(self.FIRMWARE_PATH, data=firmware_package, etag=b'')
+            self.firmware_origin.start()
 
         def tearDown(self):
             try:
                 super().tearDown()
             finally:
-                self.http_server.shutdown()
-                self.server_thread.join()
+                self.firmware_origin.stop()
 
             # there should be exactly one request
             self.assertEqual([self.FIRMWARE_PATH], self.requests)
@@ -145,15 +128,27 @@ class Test751_FirmwareUpdate_QueryingTheReadableResources(FirmwareUpdate.Test):
         #    Protocol Support (ID:8) & Firmware Update Delivery Method
         #    (ID:9) allow to determine the supported characteristics of the
         #    Client FW Update Capability.
-        self.test_read('/%d/0' % OID.FirmwareUpdate,
-                       VV.tlv_instance(
-                           resource_validators={
-                               RID.FirmwareUpdate.State:                         VV.from_raw_int(0),
-                               RID.FirmwareUpdate.UpdateResult:                  VV.from_raw_int(0),
-                               RID.FirmwareUpdate.FirmwareUpdateProtocolSupport: VV.multiple_resource(VV.from_values(b'\x00', b'\x01', b'\x02', b'\x03', b'\x04', b'\x05')),
-                               RID.FirmwareUpdate.FirmwareUpdateDeliveryMethod:  VV.from_raw_int(2),
-                           },
-                           ignore_extra=True))
+        values = self.test_read_validated('/%d/0' % OID.FirmwareUpdate,
+                                          object_schema(OID.FirmwareUpdate))[0]
+        self.assertEqual(0, values[RID.FirmwareUpdate.State])
+        self.assertEqual(0, values[RID.FirmwareUpdate.UpdateResult])
+        self.assertLessEqual(set(values[RID.FirmwareUpdate.FirmwareUpdateProtocolSupport].values()),
+                             set(range(6)))
+        self.assertEqual(2, values[RID.FirmwareUpdate.FirmwareUpdateDeliveryMethod])
+
+
+class FirmwareUpdate_QueryingTheReadableResources_SenmlCbor(FirmwareUpdate.Test):
+    def setUp(self):
+        super().setUp(minimum_version='1.1', maximum_version='1.1')
+
+    def runTest(self):
+        # Test 751, but with SenML CBOR; the values must not depend on the format
+        path = '/%d/0' % OID.FirmwareUpdate
+        values = self.test_read_validated(path, object_schema(OID.FirmwareUpdate),
+                                          format=coap.ContentFormat.APPLICATION_LWM2M_SENML_CBOR)
+        self.assertEqual(0, values[0][RID.FirmwareUpdate.State])
+        self.assertEqual(0, values[0][RID.FirmwareUpdate.UpdateResult])
+        self.assertEqual(self.test_read_validated(path, object_schema(OID.FirmwareUpdate)), values)
 
 
 class Test755_FirmwareUpdate_SettingTheWritableResourcePackage(FirmwareUpdate.Test):
@@ -412,8 +407,7 @@ class Test770_FirmwareUpdate_SuccessfulFirmwareUpdateViaCoAP(FirmwareUpdate.Test
 class Test771_FirmwareUpdate_SuccessfulFirmwareUpdateViaAlternateMechanism(FirmwareUpdateWithHttpServer.Test):
     def setUp(self):
         demo_executable = os.path.join(self.config.demo_path, self.config.demo_cmd)
-        with open(demo_executable, 'rb') as f:
-            pkg = make_firmware_package(f.read())
+        pkg = map_firmware_package(demo_executable)
 
         super().setUp(pkg)
 
@@ -759,8 +753,7 @@ class Test774_FirmwareUpdate_ErrorCase_OutOfMemory(FirmwareUpdate.Test):
 class FirmwareUpdate_ErrorCase_OutOfMemory_PackageURI(FirmwareUpdateWithHttpServer.Test):
     def setUp(self):
         demo_executable = os.path.join(self.config.demo_path, self.config.demo_cmd)
-        with open(demo_executable, 'rb') as f:
-            pkg = make_firmware_package(f.read(), force_error=FirmwareUpdateForcedError.OutOfMemory)
+        pkg = map_firmware_package(demo_executable, force_error=FirmwareUpdateForcedError.OutOfMemory)
 
         super().setUp(pkg)
 
@@ -776,34 +769,24 @@ class FirmwareUpdate_ErrorCase_OutOfMemory_PackageURI(FirmwareUpdateWithHttpServ
 
 
 class Test775_FirmwareUpdate_ErrorCase_ConnectionLostDuringDownloadPackageURI(FirmwareUpdateWithHttpServer.Test):
-    class NoShutdownHttpServer(http.server.HTTPServer):
-        def shutdown_request(self, request):
-            pass
+    # response headers are sent, but the package never is; the connection is
+    # kept open until the end of the test
+    EARLY_HEADERS = True
 
-        def close_request(self, request):
-            pass
-
-    HTTP_SERVER_CLASS = NoShutdownHttpServer
-
-    def during_download(self, req_handler):
-        self._dangling_http_socket = req_handler.request
-        # HACK to ignore any calls on .wfile afterwards
-        req_handler.wfile = ANY
+    def get_firmware_resource(self, path):
+        self._connection_released.wait()
+        return None
 
     def setUp(self):
-        self._dangling_http_socket = None
+        self._connection_released = threading.Event()
         demo_executable = os.path.join(self.config.demo_path, self.config.demo_cmd)
-        with open(demo_executable, 'rb') as f:
-            pkg = make_firmware_package(f.read(), force_error=FirmwareUpdateForcedError.OutOfMemory)
+        pkg = map_firmware_package(demo_executable, force_error=FirmwareUpdateForcedError.OutOfMemory)
 
         super().setUp(pkg)
 
     def tearDown(self):
-        try:
-            if self._dangling_http_socket is not None:
-                self._dangling_http_socket.close()
-        finally:
-            super().tearDown()
+        self._connection_released.set()
+        super().tearDown()
 
     def runTest(self):
         # 1. The Server verifies through a READ (CoAP GET) command on
@@ -852,8 +835,7 @@ class Test775_FirmwareUpdate_ErrorCase_ConnectionLostDuringDownloadPackageURI(Fi
 class Test775_FirmwareUpdate_ErrorCase_ConnectionLostDuringDownloadPackageURI_CoAP(FirmwareUpdate.TestWithCoapServer):
     def setUp(self):
         demo_executable = os.path.join(self.config.demo_path, self.config.demo_cmd)
-        with open(demo_executable, 'rb') as f:
-            pkg = make_firmware_package(f.read(), force_error=FirmwareUpdateForcedError.OutOfMemory)
+        pkg = map_firmware_package(demo_executable, force_error=FirmwareUpdateForcedError.OutOfMemory)
 
         class MuteServer(coap.Server):
             def send(self, *args, **kwargs):
@@ -962,8 +944,7 @@ class Test776_FirmwareUpdate_ErrorCase_CRCCheckFail(FirmwareUpdate.Test):
 class FirmwareUpdate_ErrorCase_CRCCheckFail_PackageURI(FirmwareUpdateWithHttpServer.Test):
     def setUp(self):
         demo_executable = os.path.join(self.config.demo_path, self.config.demo_cmd)
-        with open(demo_executable, 'rb') as f:
-            pkg = make_firmware_package(f.read(), crc=0)
+        pkg = map_firmware_package(demo_executable, crc=0)
 
         super().setUp(pkg)
 
@@ -1195,8 +1176,7 @@ class Test779_FirmwareUpdate_ErrorCase_UnsuccessfulFirmwareUpdate(FirmwareUpdate
 class FirmwareUpdate_ErrorCase_UnsuccessfulFirmwareUpdate_PackageURI(FirmwareUpdateWithHttpServer.Test):
     def setUp(self):
         demo_executable = os.path.join(self.config.demo_path, self.config.demo_cmd)
-        with open(demo_executable, 'rb') as f:
-            pkg = make_firmware_package(f.read(), force_error=FirmwareUpdateForcedError.FailedUpdate)
+        pkg = map_firmware_package(demo_executable, force_error=FirmwareUpdateForcedError.FailedUpdate)
 
         super().setUp(pkg)
 
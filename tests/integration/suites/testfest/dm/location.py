@@ -9,6 +9,7 @@
 
 from framework.lwm2m_test import *
 
+from .schema import object_schema
 from .utils import DataModel, ValueValidator as VV
 
 
@@ -25,12 +26,7 @@ class Test801_Location_QueryingTheResourcesOfObject(DataModel.Test):
         #    Resources (Latitude, Longitude, Timestamp) and optional ones, are
         #    received by the Server with expected values in compliance with
         #    LwM2M technical specification 1.0
-        self.test_read('/%d/0' % OID.Location,
-                       VV.tlv_instance(resource_validators={
-                            RID.Location.Latitude: VV.float(),
-                            RID.Location.Longitude: VV.float(),
-                            RID.Location.Timestamp: VV.from_raw_int(),
-                           }, ignore_extra=True))
+        self.test_read_validated('/%d/0' % OID.Location, object_schema(OID.Location))
 
 
 class Test810_Location_ObservationAndNotificationOfObservableResources(DataModel.Test):
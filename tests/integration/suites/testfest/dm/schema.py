@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+Object schemas used to validate whole-object and whole-instance Read
+responses in a single pass.
+
+An ObjectSchema is compiled once from an object definition: either an
+ObjectDef parsed by tools/anjay_codegen.py or an OMA object XML file, e.g. one
+of the standard objects fetched from the LwM2M Registry. It may then be reused
+to validate any number of TLV, SenML JSON or SenML CBOR payloads.
+"""
+
+import base64
+import functools
+import io
+import json
+import os
+import struct
+import sys
+from typing import Iterable, NamedTuple, Optional
+from xml.etree import ElementTree
+
+from framework.lwm2m.coap.content_format import ContentFormat
+from framework.lwm2m.senml_cbor import SenmlLabel
+from framework.lwm2m.tlv import TLV, TLVType
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', '..', '..', '..', 'tools'))
+import lwm2m_object_registry
+
+ResourceSchema = NamedTuple('ResourceSchema', [('rid', int),
+                                               ('name', str),
+                                               ('operations', str),
+                                               ('multiple', bool),
+                                               ('mandatory', bool),
+                                               ('type', str)])
+ResourceSchema.__doc__ = """
+Subset of anjay_codegen.ResourceDef needed for validation. OPERATIONS and TYPE
+use the same spelling as in OMA object XML files, e.g. 'RW' and 'integer'.
+"""
+
+
+def _tlv_integer(data):
+    if len(data) not in (1, 2, 4, 8):
+        raise ValueError('invalid TLV integer length: %d' % (len(data),))
+    return int.from_bytes(data, 'big', signed=True)
+
+
+def _tlv_unsigned(data):
+    if len(data) not in (1, 2, 4, 8):
+        raise ValueError('invalid TLV unsigned integer length: %d' % (len(data),))
+    return int.from_bytes(data, 'big', signed=False)
+
+
+def _tlv_float(data):
+    if len(data) == 4:
+        return struct.unpack('>f', data)[0]
+    elif len(data) == 8:
+        return struct.unpack('>d', data)[0]
+    raise ValueError('invalid TLV float length: %d' % (len(data),))
+
+
+def _tlv_boolean(data):
+    if data not in (b'\x00', b'\x01'):
+        raise ValueError('invalid TLV boolean: %r' % (data,))
+    return data == b'\x01'
+
+
+def _tlv_objlnk(data):
+    if len(data) != 4:
+        raise ValueError('invalid TLV objlnk length: %d' % (len(data),))
+    return struct.unpack('>HH', data)
+
+
+def _tlv_string(data):
+    return data.decode('utf-8')
+
+
+def _parse_objlnk(text):
+    try:
+        oid, iid = (int(x) for x in text.split(':'))
+    except ValueError as e:
+        raise ValueError('invalid objlnk: %r' % (text,)) from e
+    if not (0 <= oid <= 65535 and 0 <= iid <= 65535):
+        raise ValueError('invalid objlnk: %r' % (text,))
+    return oid, iid
+
+
+def _senml_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError('number expected, got %r' % (value,))
+    return value
+
+
+def _senml_integer(value):
+    value = _senml_number(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError('integer expected, got %r' % (value,))
+        value = int(value)
+    return value
+
+
+def _senml_boolean(value):
+    if not isinstance(value, bool):
+        raise ValueError('boolean expected, got %r' % (value,))
+    return value
+
+
+def _senml_string(value):
+    if not isinstance(value, str):
+        raise ValueError('string expected, got %r' % (value,))
+    return value
+
+
+def _senml_json_opaque(value):
+    value = _senml_string(value)
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+
+def _senml_cbor_opaque(value):
+    if not isinstance(value, bytes):
+        raise ValueError('byte string expected, got %r' % (value,))
+    return value
+
+
+# type -> (TLV decoder, SenML value label, SenML JSON decoder, SenML CBOR decoder)
+_TYPE_CODECS = {
+    'integer': (_tlv_integer, 'v', _senml_integer, _senml_integer),
+    'unsigned integer': (_tlv_unsigned, 'v', _senml_integer, _senml_integer),
+    'time': (_tlv_integer, 'v', _senml_integer, _senml_integer),
+    'float': (_tlv_float, 'v', _senml_number, _senml_number),
+    'boolean': (_tlv_boolean, 'vb', _senml_boolean, _senml_boolean),
+    'string': (_tlv_string, 'vs', _senml_string, _senml_string),
+    'corelnk': (_tlv_string, 'vs', _senml_string, _senml_string),
+    'opaque': (bytes, 'vd', _senml_json_opaque, _senml_cbor_opaque),
+    'objlnk': (_tlv_objlnk, 'vlo',
+               lambda value: _parse_objlnk(_senml_string(value)),
+               lambda value: _parse_objlnk(_senml_string(value))),
+}
+
+_TYPE_ALIASES = {
+    'int': 'integer',
+    'unsigned int': 'unsigned integer',
+    'unsigned': 'unsigned integer',
+    'bool': 'boolean',
+    'str': 'string',
+}
+
+_SENML_CBOR_LABELS = {
+    SenmlLabel.VALUE.value: 'v',
+    SenmlLabel.STRING.value: 'vs',
+    SenmlLabel.BOOL.value: 'vb',
+    SenmlLabel.OPAQUE.value: 'vd',
+    SenmlLabel.OBJLNK.value: 'vlo',
+    SenmlLabel.BASE_NAME.value: 'bn',
+    SenmlLabel.NAME.value: 'n',
+    SenmlLabel.BASE_TIME.value: 'bt',
+    SenmlLabel.TIME.value: 't',
+}
+
+_SENML_VALUE_LABELS = ('v', 'vs', 'vb', 'vd', 'vlo')
+
+
+class _CompiledResource:
+    __slots__ = ('schema', 'readable', 'decode_tlv', 'senml_label', 'decode_senml')
+
+    def __init__(self, schema: ResourceSchema):
+        self.schema = schema
+        self.readable = 'R' in schema.operations
+        type_name = _TYPE_ALIASES.get(schema.type, schema.type)
+        codecs = _TYPE_CODECS.get(type_name)
+        if codecs is None:
+            # executable resources have no type; unknown types are accepted
+            # as-is, so that vendor extensions do not break validation
+            codecs = (bytes, None, lambda value: value, lambda value: value)
+        self.decode_tlv, self.senml_label, json_decoder, cbor_decoder = codecs
+        self.decode_senml = {ContentFormat.APPLICATION_LWM2M_SENML_JSON: json_decoder,
+                             ContentFormat.APPLICATION_LWM2M_SENML_CBOR: cbor_decoder}
+
+
+class ObjectSchema:
+    """
+    Validator of Read responses for a single object, compiled once from
+    a list of ResourceSchema-like definitions.
+    """
+
+    def __init__(self, oid: int, resources: Iterable, name: str = '', multiple: bool = True):
+        self.oid = oid
+        self.name = name
+        self.multiple = multiple
+        self._resources = {}
+        for res in resources:
+            res = ResourceSchema(rid=res.rid, name=res.name, operations=res.operations,
+                                 multiple=res.multiple, mandatory=res.mandatory,
+                                 type=res.type.lower())
+            self._resources[res.rid] = _CompiledResource(res)
+        self._mandatory_readable = frozenset(
+            rid for rid, res in self._resources.items()
+            if res.readable and res.schema.mandatory)
+
+    @classmethod
+    def from_object_def(cls, obj_def) -> 'ObjectSchema':
+        """
+        Compiles a schema from an anjay_codegen.ObjectDef.
+        """
+        return cls(oid=obj_def.oid, resources=obj_def.resources, name=obj_def.name,
+                   multiple=obj_def.multiple)
+
+    @classmethod
+    def from_xml(cls, xml_file) -> 'ObjectSchema':
+        """
+        Compiles a schema from an OMA object XML file (a path or a file object),
+        interpreting it the same way as tools/anjay_codegen.py does.
+        """
+        def text(node):
+            return (node.text if (node is not None and node.text is not None) else '').strip()
+
+        obj = ElementTree.parse(xml_file).getroot().find('Object')
+        resources = [ResourceSchema(rid=int(item.get('ID')),
+                                    name=text(item.find('Name')),
+                                    # no operations = resource modifiable by Bootstrap Server
+                                    operations=text(item.find('Operations')).upper() or 'BS_RW',
+                                    multiple=text(item.find('MultipleInstances')) == 'Multiple',
+                                    mandatory=text(item.find('Mandatory')) == 'Mandatory',
+                                    type=text(item.find('Type')).lower() or 'N/A')
+                     for item in obj.find('Resources').findall('Item')]
+        return cls(oid=int(text(obj.find('ObjectID'))), resources=resources,
+                   name=text(obj.find('Name')),
+                   multiple=text(obj.find('MultipleInstances')) == 'Multiple')
+
+    def resource(self, rid: int) -> Optional[ResourceSchema]:
+        res = self._resources.get(rid)
+        return res.schema if res is not None else None
+
+    def validate(self,
+                 payload: bytes,
+                 format: int,
+                 path: str,
+                 ignore_missing: bool = False,
+                 ignore_extra: bool = False):
+        """
+        Validates PAYLOAD of a Read response for PATH (an Object or an Object
+        Instance) encoded in FORMAT. Raises ValueError if any value does not
+        match the schema, if a non-readable resource is present, or if
+        a mandatory readable resource is missing from any instance.
+
+        Returns decoded values as a {iid: {rid: value}} dict, where values of
+        Multiple-Instance Resources are {riid: value} dicts.
+        """
+        segments = [int(x) for x in path.strip('/').split('/')]
+        if segments[0] != self.oid or len(segments) > 2:
+            raise ValueError('%s is not a path to object %d or its instance' % (path, self.oid))
+
+        if format in (ContentFormat.APPLICATION_LWM2M_TLV,
+                      ContentFormat.APPLICATION_LWM2M_TLV_LEGACY):
+            entries = self._tlv_entries(payload, segments)
+        elif format == ContentFormat.APPLICATION_LWM2M_SENML_JSON:
+            entries = self._senml_entries(json.loads(payload.decode('utf-8')), format)
+        elif format == ContentFormat.APPLICATION_LWM2M_SENML_CBOR:
+            import cbor2
+            records = [{_SENML_CBOR_LABELS.get(k, k): v for k, v in record.items()}
+                       for record in cbor2.loads(payload)]
+            entries = self._senml_entries(records, format)
+        else:
+            raise ValueError('unsupported content format: %r' % (format,))
+
+        values = {}
+        if len(segments) == 2:
+            values[segments[1]] = {}
+        for entry_path, value in entries:
+            if entry_path[0] != self.oid or len(entry_path) not in (3, 4) \
+                    or entry_path[:len(segments)] != tuple(segments):
+                raise ValueError('unexpected path in response for %s: /%s'
+                                 % (path, '/'.join(map(str, entry_path))))
+            iid, rid = entry_path[1:3]
+            res = self._resources.get(rid)
+            instance = values.setdefault(iid, {})
+            if res is None:
+                if not ignore_extra:
+                    raise ValueError('unexpected Resource /%d/%d/%d' % (self.oid, iid, rid))
+                instance[rid] = value
+                continue
+
+            if not res.readable:
+                raise ValueError('non-readable Resource /%d/%d/%d present in response'
+                                 % (self.oid, iid, rid))
+            if res.schema.multiple != (len(entry_path) == 4):
+                raise ValueError('Resource /%d/%d/%d is %s-instance'
+                                 % (self.oid, iid, rid,
+                                    'multiple' if res.schema.multiple else 'single'))
+            try:
+                value = value(res)
+            except (ValueError, struct.error) as e:
+                raise ValueError('invalid value of Resource /%d/%d/%d (%s): %s'
+                                 % (self.oid, iid, rid, res.schema.name, e)) from e
+
+            if res.schema.multiple:
+                riid = entry_path[3]
+                if riid in instance.setdefault(rid, {}):
+                    raise ValueError('duplicate Resource Instance /%d/%d/%d/%d'
+                                     % (self.oid, iid, rid, riid))
+                instance[rid][riid] = value
+            else:
+                if rid in instance:
+                    raise ValueError('duplicate Resource /%d/%d/%d' % (self.oid, iid, rid))
+                instance[rid] = value
+
+        if not ignore_missing:
+            for iid, instance in values.items():
+                missing = self._mandatory_readable - set(instance)
+                if missing:
+                    raise ValueError('mandatory Resources missing from /%d/%d: %s'
+                                     % (self.oid, iid, ', '.join(map(str, sorted(missing)))))
+        return values
+
+    @staticmethod
+    def _tlv_entries(payload, segments):
+        """
+        Yields (path, decode) pairs, where DECODE is a function that takes
+        a _CompiledResource and returns the decoded value.
+        """
+        def resource_entries(iid, tlv_list):
+            for tlv in tlv_list:
+                if tlv.tlv_type == TLVType.RESOURCE:
+                    yield ((segments[0], iid, tlv.identifier),
+                           lambda res, data=tlv.value: res.decode_tlv(data))
+                elif tlv.tlv_type == TLVType.MULTIPLE_RESOURCE:
+                    for inst in tlv.value:
+                        if inst.tlv_type != TLVType.RESOURCE_INSTANCE:
+                            raise ValueError('unexpected %s in Multiple Resource' % (inst.tlv_type,))
+                        yield ((segments[0], iid, tlv.identifier, inst.identifier),
+                               lambda res, data=inst.value: res.decode_tlv(data))
+                else:
+                    raise ValueError('unexpected %s on resource level' % (tlv.tlv_type,))
+
+        tlv_list = TLV.parse(payload)
+        if len(segments) == 2 and not any(tlv.tlv_type == TLVType.INSTANCE for tlv in tlv_list):
+            # the instance level may be omitted when reading a single instance
+            yield from resource_entries(segments[1], tlv_list)
+            return
+
+        for tlv in tlv_list:
+            if tlv.tlv_type != TLVType.INSTANCE:
+                raise ValueError('unexpected %s on instance level' % (tlv.tlv_type,))
+            yield from resource_entries(tlv.identifier, tlv.value)
+
+    @staticmethod
+    def _senml_entries(records, format):
+        base_name = ''
+        for record in records:
+            if not isinstance(record, dict):
+                raise ValueError('SenML record expected, got %r' % (record,))
+            base_name = record.get('bn', base_name)
+            name = base_name + record.get('n', '')
+            try:
+                path = tuple(int(x) for x in name.strip('/').split('/'))
+            except ValueError as e:
+                raise ValueError('invalid SenML name: %r' % (name,)) from e
+
+            labels = [label for label in _SENML_VALUE_LABELS if label in record]
+            if len(labels) != 1:
+                raise ValueError('expected exactly one value in SenML record for %s, got %d'
+                                 % (name, len(labels)))
+
+            def decode(res, label=labels[0], value=record[labels[0]]):
+                if res.senml_label is not None and label != res.senml_label:
+                    raise ValueError('value expected in "%s" field, got "%s"'
+                                     % (res.senml_label, label))
+                return res.decode_senml[format](value)
+
+            yield path, decode
+
+
+# Standard objects are compiled from their definitions in the OMA LwM2M
+# Registry, downloaded on first use and cached by tools/lwm2m_object_registry.py
+# (see LWM2M_REGISTRY_CACHE), so that they cannot drift from the registry.
+@functools.lru_cache(maxsize=None)
+def _object_registry():
+    return lwm2m_object_registry.Lwm2mObjectRegistry()
+
+
+@functools.lru_cache(maxsize=None)
+def object_schema(oid: int) -> ObjectSchema:
+    """
+    Returns the compiled schema of the latest version of a standard object,
+    shared by all tests.
+    """
+    return ObjectSchema.from_xml(io.StringIO(_object_registry().get_object_definition(oid)))
+
+
+@functools.lru_cache(maxsize=None)
+def object_schema_from_xml(xml_path: str) -> ObjectSchema:
+    return ObjectSchema.from_xml(xml_path)
@@ -15,6 +15,8 @@ from typing import List, Optional, Mapping, Tuple
 from framework.lwm2m.tlv import *
 from framework.lwm2m_test import *
 
+from .schema import ObjectSchema
+
 
 class ValueValidator:
     def validate(self, value):
@@ -341,6 +343,26 @@ class DataModel:
 
             return res.content
 
+        def test_read_validated(self,
+                                path: Lwm2mPath,
+                                schema: ObjectSchema,
+                                format: int = coap.ContentFormat.APPLICATION_LWM2M_TLV,
+                                server: Optional[Lwm2mServer] = None,
+                                ignore_missing: bool = False,
+                                ignore_extra: bool = False):
+            """
+            Reads an Object or an Object Instance and validates all values in
+            the response against SCHEMA in a single pass. Returns the decoded
+            values as a {iid: {rid: value}} dict.
+            """
+            content = self.test_read(path, format=format, server=server)
+            try:
+                return schema.validate(content, format, str(path),
+                                       ignore_missing=ignore_missing,
+                                       ignore_extra=ignore_extra)
+            except ValueError as e:
+                raise ValueError('invalid Read response for %s: %s' % (path, content)) from e
+
         def test_write(self,
                        path: Lwm2mPath,
                        value: str,
@@ -13,6 +13,7 @@ import argparse
 import collections
 import textwrap
 import operator
+import os
 import sys
 import re
 from xml.etree import ElementTree
@@ -31,10 +32,14 @@ C_DYNAMIC_INST_TEMPLATE = """\
  */
 #include <assert.h>
 #include <stdbool.h>
+{% if obj.multiple and instance_pool %}
+#include <stdint.h>
+#include <string.h>
+{% endif %}
 
 #include <anjay/anjay.h>
 #include <avsystem/commons/avs_defs.h>
-{% if obj.multiple %}
+{% if obj.multiple and not instance_pool %}
 #include <avsystem/commons/avs_list.h>
 {% endif %}
 #include <avsystem/commons/avs_memory.h>
@@ -57,10 +62,26 @@ typedef struct {{ obj_inst_tag }} {
     // TODO: instance state
 } {{ obj_inst_type }};
 
+{% endif %}
+{% if obj.multiple and instance_pool %}
+#define INSTANCE_POOL_SIZE {{ instance_pool }}
+
+typedef struct {
+    anjay_iid_t iid;
+    uint16_t slot;
+} instance_index_entry_t;
+
 {% endif %}
 typedef struct {{ obj_repr_tag }} {
     const anjay_dm_object_def_t *def;
-{% if obj.multiple %}
+{% if obj.multiple and instance_pool %}
+    // Instance storage; bits set in used_slots mark occupied entries
+    {{ obj_inst_type }} instance_pool[INSTANCE_POOL_SIZE];
+    uint32_t used_slots[(INSTANCE_POOL_SIZE + 31) / 32];
+    // iids of existing instances and their slots, sorted by iid
+    instance_index_entry_t index[INSTANCE_POOL_SIZE];
+    size_t instance_count;
+{% elif obj.multiple %}
     AVS_LIST({{ obj_name_snake }}_instance_t) instances;
 {% endif %}
 
@@ -73,7 +94,136 @@ get_obj(const anjay_dm_object_def_t *const *obj_ptr) {
     return AVS_CONTAINER_OF(obj_ptr, {{ obj_repr_type }}, def);
 }
 
-{% if obj.multiple %}
+{% if obj.multiple and instance_pool %}
+static size_t index_lower_bound(const {{ obj_repr_type }} *obj,
+                                anjay_iid_t iid) {
+    size_t begin = 0;
+    size_t end = obj->instance_count;
+    while (begin < end) {
+        size_t mid = begin + (end - begin) / 2;
+        if (obj->index[mid].iid < iid) {
+            begin = mid + 1;
+        } else {
+            end = mid;
+        }
+    }
+    return begin;
+}
+
+static {{ obj_inst_type }} *find_instance({{ obj_repr_type }} *obj,
+{{ " " * (obj_inst_type|length + 22) }} anjay_iid_t iid) {
+    size_t pos = index_lower_bound(obj, iid);
+    if (pos < obj->instance_count && obj->index[pos].iid == iid) {
+        return &obj->instance_pool[obj->index[pos].slot];
+    }
+
+    return NULL;
+}
+
+static int list_instances(anjay_t *anjay,
+                          const anjay_dm_object_def_t *const *obj_ptr,
+                          anjay_dm_list_ctx_t *ctx) {
+    (void) anjay;
+
+    const {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    for (size_t i = 0; i < obj->instance_count; ++i) {
+        anjay_dm_emit(ctx, obj->index[i].iid);
+    }
+
+    return 0;
+}
+
+static int init_instance({{ obj_inst_type }} *inst, anjay_iid_t iid) {
+    assert(iid != ANJAY_ID_INVALID);
+
+    inst->iid = iid;
+    // TODO: instance init
+
+    // TODO: return 0 on success, negative value on failure
+    return 0;
+}
+
+static void release_instance({{ obj_inst_type }} *inst) {
+    // TODO: instance cleanup
+    (void) inst;
+}
+
+static size_t find_free_slot(const {{ obj_repr_type }} *obj) {
+    assert(obj->instance_count < INSTANCE_POOL_SIZE);
+
+    // the lowest free slot is always below INSTANCE_POOL_SIZE, as long as
+    // there is at least one free slot
+    size_t word = 0;
+    while (obj->used_slots[word] == UINT32_MAX) {
+        ++word;
+    }
+    size_t bit = 0;
+    while (obj->used_slots[word] & ((uint32_t) 1 << bit)) {
+        ++bit;
+    }
+    return word * 32 + bit;
+}
+
+static {{ obj_inst_type }} *
+add_instance({{ obj_repr_type }} *obj, anjay_iid_t iid) {
+    assert(find_instance(obj, iid) == NULL);
+
+    if (obj->instance_count >= INSTANCE_POOL_SIZE) {
+        return NULL;
+    }
+
+    size_t slot = find_free_slot(obj);
+    {{ obj_inst_type }} *created = &obj->instance_pool[slot];
+    memset(created, 0, sizeof(*created));
+
+    int result = init_instance(created, iid);
+    if (result) {
+        return NULL;
+    }
+
+    size_t pos = index_lower_bound(obj, iid);
+    memmove(&obj->index[pos + 1], &obj->index[pos],
+            (obj->instance_count - pos) * sizeof(obj->index[0]));
+    obj->index[pos].iid = iid;
+    obj->index[pos].slot = (uint16_t) slot;
+    ++obj->instance_count;
+    obj->used_slots[slot / 32] |= (uint32_t) 1 << (slot % 32);
+    return created;
+}
+
+static int instance_create(anjay_t *anjay,
+                           const anjay_dm_object_def_t *const *obj_ptr,
+                           anjay_iid_t iid) {
+    (void) anjay;
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
+
+    return add_instance(obj, iid) ? 0 : ANJAY_ERR_INTERNAL;
+}
+
+static int instance_remove(anjay_t *anjay,
+                           const anjay_dm_object_def_t *const *obj_ptr,
+                           anjay_iid_t iid) {
+    (void) anjay;
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
+
+    size_t pos = index_lower_bound(obj, iid);
+    if (pos >= obj->instance_count || obj->index[pos].iid != iid) {
+        assert(0);
+        return ANJAY_ERR_NOT_FOUND;
+    }
+
+    size_t slot = obj->index[pos].slot;
+    release_instance(&obj->instance_pool[slot]);
+    obj->used_slots[slot / 32] &= ~((uint32_t) 1 << (slot % 32));
+    --obj->instance_count;
+    memmove(&obj->index[pos], &obj->index[pos + 1],
+            (obj->instance_count - pos) * sizeof(obj->index[0]));
+    return 0;
+}
+
+{% elif obj.multiple %}
 static {{ obj_inst_type }} *find_instance(const {{ obj_repr_type }} *obj,
 {{ " " * (obj_inst_type|length + 22) }} anjay_iid_t iid) {
     AVS_LIST({{ obj_inst_type }}) it;
@@ -416,7 +566,11 @@ const anjay_dm_object_def_t **{{ obj_name_snake }}_object_create(void) {
 void {{ obj_name_snake }}_object_release(const anjay_dm_object_def_t **def) {
     if (def) {
         {{ obj_repr_type }} *obj = get_obj(def);
-{% if obj.multiple %}
+{% if obj.multiple and instance_pool %}
+        for (size_t i = 0; i < obj->instance_count; ++i) {
+            release_instance(&obj->instance_pool[obj->index[i].slot]);
+        }
+{% elif obj.multiple %}
         AVS_LIST_CLEAR(&obj->instances) {
             release_instance(obj->instances);
         }
@@ -429,6 +583,158 @@ void {{ obj_name_snake }}_object_release(const anjay_dm_object_def_t **def) {
 }
 """
 
+C_INSTANCE_POOL_STRESS_TEMPLATE = """\
+/**
+ * Generated by anjay_codegen.py --instance-pool on {{ date_time }}
+ *
+ * Stress test of the fixed-capacity instance pool of
+ * LwM2M Object: {{ obj.name }} (ID: {{ obj.oid }}, {{ instance_pool }} instance slots)
+ *
+ * Repeatedly fills the pool with instances of random iids, looks them up,
+ * removes them in random order and re-creates them, verifying consistency of
+ * the sorted index and the free slot bitmap after each step.
+ *
+ * Build by linking against Anjay, e.g.:
+ *
+ *     cc -O2 {{ stress_test_file }} -o {{ obj_name_snake }}_stress_test -lanjay ...
+ */
+#define _POSIX_C_SOURCE 200809L
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+#include "{{ object_file }}"
+
+#define CHECK(Cond)                                                       \\
+    do {                                                                  \\
+        if (!(Cond)) {                                                    \\
+            fprintf(stderr, "%s:%d: check failed: %s\\n", __FILE__,       \\
+                    __LINE__, #Cond);                                     \\
+            exit(1);                                                      \\
+        }                                                                 \\
+    } while (0)
+
+static uint32_t random_state = 0x12345678;
+
+static uint32_t random_next(void) {
+    // xorshift32
+    random_state ^= random_state << 13;
+    random_state ^= random_state >> 17;
+    random_state ^= random_state << 5;
+    return random_state;
+}
+
+static void shuffle(anjay_iid_t *iids, size_t count, size_t prefix) {
+    for (size_t i = 0; i < prefix; ++i) {
+        size_t j = i + random_next() % (count - i);
+        anjay_iid_t tmp = iids[i];
+        iids[i] = iids[j];
+        iids[j] = tmp;
+    }
+}
+
+static double now_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (double) ts.tv_sec * 1e9 + (double) ts.tv_nsec;
+}
+
+static void verify_pool(const {{ obj_repr_type }} *obj) {
+    size_t used = 0;
+    for (size_t i = 0; i < AVS_ARRAY_SIZE(obj->used_slots); ++i) {
+        for (uint32_t word = obj->used_slots[i]; word; word &= word - 1) {
+            ++used;
+        }
+    }
+    CHECK(used == obj->instance_count);
+
+    for (size_t i = 0; i < obj->instance_count; ++i) {
+        size_t slot = obj->index[i].slot;
+        CHECK(i == 0 || obj->index[i - 1].iid < obj->index[i].iid);
+        CHECK(slot < INSTANCE_POOL_SIZE);
+        CHECK(obj->used_slots[slot / 32] & ((uint32_t) 1 << (slot % 32)));
+        CHECK(obj->instance_pool[slot].iid == obj->index[i].iid);
+    }
+}
+
+static anjay_iid_t iids[ANJAY_ID_INVALID];
+
+int main(int argc, char *argv[]) {
+    const long rounds = argc > 1 ? atol(argv[1]) : 10L;
+    const size_t count = INSTANCE_POOL_SIZE;
+    const size_t half = count / 2;
+    double create_ns = 0.0;
+    double lookup_ns = 0.0;
+    double remove_ns = 0.0;
+
+    const anjay_dm_object_def_t **def = {{ obj_name_snake }}_object_create();
+    CHECK(def);
+    {{ obj_repr_type }} *obj = get_obj(def);
+
+    for (size_t i = 0; i < AVS_ARRAY_SIZE(iids); ++i) {
+        iids[i] = (anjay_iid_t) i;
+    }
+
+    for (long r = 0; r < rounds; ++r) {
+        shuffle(iids, AVS_ARRAY_SIZE(iids), count + 1);
+
+        double start = now_ns();
+        for (size_t i = 0; i < count; ++i) {
+            CHECK(!instance_create(NULL, def, iids[i]));
+        }
+        create_ns += now_ns() - start;
+        CHECK(obj->instance_count == count);
+        // the pool is full
+        CHECK(instance_create(NULL, def, iids[count]));
+        verify_pool(obj);
+
+        start = now_ns();
+        for (size_t i = 0; i < count; ++i) {
+            CHECK(find_instance(obj, iids[i]));
+        }
+        lookup_ns += now_ns() - start;
+        CHECK(!find_instance(obj, iids[count]));
+
+        // remove half of the instances, then create them again, so that
+        // freed slots are reused in a different order
+        shuffle(iids, count, count);
+        for (size_t i = 0; i < half; ++i) {
+            CHECK(!instance_remove(NULL, def, iids[i]));
+        }
+        verify_pool(obj);
+        for (size_t i = 0; i < count; ++i) {
+            CHECK((find_instance(obj, iids[i]) == NULL) == (i < half));
+        }
+        shuffle(iids, half, half);
+        for (size_t i = 0; i < half; ++i) {
+            CHECK(!instance_create(NULL, def, iids[i]));
+        }
+        verify_pool(obj);
+
+        shuffle(iids, count, count);
+        start = now_ns();
+        for (size_t i = 0; i < count; ++i) {
+            CHECK(!instance_remove(NULL, def, iids[i]));
+        }
+        remove_ns += now_ns() - start;
+        CHECK(obj->instance_count == 0);
+        verify_pool(obj);
+    }
+
+    {{ obj_name_snake }}_object_release(def);
+
+    const double ops = (double) rounds * (double) count;
+    printf("object: {{ obj.name }} (/{{ obj.oid }}), %u instance slots, "
+           "%ld rounds\\n",
+           (unsigned) count, rounds);
+    printf("create:  %8.2f ns/op\\n", create_ns / ops);
+    printf("lookup:  %8.2f ns/op\\n", lookup_ns / ops);
+    printf("remove:  %8.2f ns/op\\n", remove_ns / ops);
+    return 0;
+}
+"""
+
 C_STATIC_INST_TEMPLATE = """\
 /**
  * Generated by anjay_codegen.py on {{ date_time }}
@@ -445,39 +751,558 @@ C_STATIC_INST_TEMPLATE = """\
 #include <avsystem/commons/avs_defs.h>
 #include <avsystem/commons/avs_memory.h>
 
-{% for res in obj.resources %}
-/**
- * {{ res.name }}: {{ res.operations }}, {{ res.multiple_str }}, {{ res.mandatory_str }}
- * type: {{ res.type }}, range: {{ res.range_enumeration }}, unit: {{ res.units }}
-{% if res.description %}
- * {{ res.description }}
-{% endif %}
- */
-#define {{ res.name_upper }} {{ res.rid }}
+{% for res in obj.resources %}
+/**
+ * {{ res.name }}: {{ res.operations }}, {{ res.multiple_str }}, {{ res.mandatory_str }}
+ * type: {{ res.type }}, range: {{ res.range_enumeration }}, unit: {{ res.units }}
+{% if res.description %}
+ * {{ res.description }}
+{% endif %}
+ */
+#define {{ res.name_upper }} {{ res.rid }}
+
+{% endfor %}
+{% if obj.multiple %}
+typedef struct {{ obj_inst_tag }} {
+    // TODO: instance state
+} {{ obj_inst_type }};
+
+{% endif %}
+typedef struct {{ obj_repr_tag }} {
+    const anjay_dm_object_def_t *def;
+{% if obj.multiple %}
+    {{ obj_inst_type }} instances[{{ instances_number }}];
+{% endif %}
+
+    // TODO: object state
+} {{ obj_repr_type }};
+
+static inline {{ obj_repr_type }} *
+get_obj(const anjay_dm_object_def_t *const *obj_ptr) {
+    assert(obj_ptr);
+    return AVS_CONTAINER_OF(obj_ptr, {{ obj_repr_type }}, def);
+}
+
+{% if obj.multiple %}
+static int list_instances(anjay_t *anjay,
+                          const anjay_dm_object_def_t *const *obj_ptr,
+                          anjay_dm_list_ctx_t *ctx) {
+    (void) anjay;
+
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    for (anjay_iid_t iid = 0; iid < AVS_ARRAY_SIZE(obj->instances); iid++) {
+        anjay_dm_emit(ctx, iid);
+    }
+
+    return 0;
+}
+
+{% endif %}
+{% if obj.needs_instance_reset_handler %}
+static int instance_reset(anjay_t *anjay,
+                          const anjay_dm_object_def_t *const *obj_ptr,
+                          anjay_iid_t iid) {
+    (void) anjay;
+{% if not obj.multiple %}
+    (void) iid;
+{% endif %}
+
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
+{% if obj.multiple %}
+    assert(iid < AVS_ARRAY_SIZE(obj->instances));
+    {{ obj_inst_type }} *inst = &obj->instances[iid];
+{% else %}
+    assert(iid == 0);
+{% endif %}
+
+    // TODO: instance reset
+
+    // TODO: return 0 on success, negative value on failure
+    return 0;
+}
+
+{% endif %}
+static int list_resources(anjay_t *anjay,
+                          const anjay_dm_object_def_t *const *obj_ptr,
+                          anjay_iid_t iid,
+                          anjay_dm_resource_list_ctx_t *ctx) {
+    (void) anjay;
+    (void) obj_ptr;
+    (void) iid;
+
+{% for res in obj.resources %}
+    anjay_dm_emit_res(ctx, {{ res.name_upper }},
+                      {{ res.kind_enum }}, ANJAY_DM_RES_PRESENT);
+{% endfor %}
+    return 0;
+}
+
+{% if obj.has_any_readable_resources %}
+static int resource_read(anjay_t *anjay,
+                         const anjay_dm_object_def_t *const *obj_ptr,
+                         anjay_iid_t iid,
+                         anjay_rid_t rid,
+                         anjay_riid_t riid,
+                         anjay_output_ctx_t *ctx) {
+    (void) anjay;
+{% if not obj.multiple %}
+    (void) iid;
+{% endif %}
+
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
+{% if obj.multiple %}
+    assert(iid < AVS_ARRAY_SIZE(obj->instances));
+    {{ obj_inst_type }} *inst = &obj->instances[iid];
+{% else %}
+    assert(iid == 0);
+{% endif %}
+
+    switch (rid) {
+{% for res in obj.resources %}
+{% if 'R' in res.operations %}
+    case {{ res.name_upper }}:{{ res.read_handler|indent(4) }}
+
+{% endif %}
+{% endfor %}
+    default:
+        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+    }
+}
+
+{% endif %}
+{% if obj.has_any_writable_resources %}
+static int resource_write(anjay_t *anjay,
+                          const anjay_dm_object_def_t *const *obj_ptr,
+                          anjay_iid_t iid,
+                          anjay_rid_t rid,
+                          anjay_riid_t riid,
+                          anjay_input_ctx_t *ctx) {
+    (void) anjay;
+{% if not obj.multiple %}
+    (void) iid;
+{% endif %}
+
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
+{% if obj.multiple %}
+    assert(iid < AVS_ARRAY_SIZE(obj->instances));
+    {{ obj_inst_type }} *inst = &obj->instances[iid];
+{% else %}
+    assert(iid == 0);
+{% endif %}
+
+    switch (rid) {
+{% for res in obj.resources %}
+{% if 'W' in res.operations %}
+    case {{ res.name_upper }}:{{ res.write_handler|indent(4) }}
+
+{% endif %}
+{% endfor %}
+    default:
+        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+    }
+}
+
+{% endif %}
+{% if obj.has_any_executable_resources %}
+static int resource_execute(anjay_t *anjay,
+                            const anjay_dm_object_def_t *const *obj_ptr,
+                            anjay_iid_t iid,
+                            anjay_rid_t rid,
+                            anjay_execute_ctx_t *arg_ctx) {
+    (void) anjay;
+{% if not obj.multiple %}
+    (void) iid;
+{% endif %}
+    (void) arg_ctx;
+
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
+{% if obj.multiple %}
+    assert(iid < AVS_ARRAY_SIZE(obj->instances));
+    {{ obj_inst_type }} *inst = &obj->instances[iid];
+{% else %}
+    assert(iid == 0);
+{% endif %}
+
+    switch (rid) {
+{% for res in obj.resources %}
+{% if 'E' in res.operations %}
+    case {{ res.name_upper }}:
+        return ANJAY_ERR_NOT_IMPLEMENTED; // TODO
+
+{% endif %}
+{% endfor %}
+    default:
+        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+    }
+}
+
+{% endif %}
+{% if obj.has_any_multiple_writable_resources %}
+static int resource_reset(anjay_t *anjay,
+                          const anjay_dm_object_def_t *const *obj_ptr,
+                          anjay_iid_t iid,
+                          anjay_rid_t rid) {
+    (void) anjay;
+{% if not obj.multiple %}
+    (void) iid;
+{% endif %}
+
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
+{% if obj.multiple %}
+    assert(iid < AVS_ARRAY_SIZE(obj->instances));
+    {{ obj_inst_type }} *inst = &obj->instances[iid];
+{% else %}
+    assert(iid == 0);
+{% endif %}
+
+    switch (rid) {
+{% for res in obj.resources %}
+{% if res.multiple and 'W' in res.operations %}
+    case {{ res.name_upper }}:
+        return ANJAY_ERR_NOT_IMPLEMENTED; // TODO: remove all Resource Instances
+
+{% endif %}
+{% endfor %}
+    default:
+        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+    }
+}
+
+{% endif %}
+{% if obj.has_any_multiple_resources %}
+static int list_resource_instances(anjay_t *anjay,
+                                   const anjay_dm_object_def_t *const *obj_ptr,
+                                   anjay_iid_t iid,
+                                   anjay_rid_t rid,
+                                   anjay_dm_list_ctx_t *ctx) {
+    (void) anjay;
+{% if not obj.multiple %}
+    (void) iid;
+{% endif %}
+
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
+{% if obj.multiple %}
+    assert(iid < AVS_ARRAY_SIZE(obj->instances));
+    {{ obj_inst_type }} *inst = &obj->instances[iid];
+{% else %}
+    assert(iid == 0);
+{% endif %}
+
+    switch (rid) {
+{% for res in obj.resources %}
+{% if res.multiple %}
+    case {{ res.name_upper }}:
+        // anjay_dm_emit(ctx, ...); // TODO
+        return 0;
+
+{% endif %}
+{% endfor %}
+    default:
+        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+    }
+}
+
+{% endif %}
+static const anjay_dm_object_def_t OBJ_DEF = {
+    .oid = {{ obj.oid }},
+{% if obj.version not in ['', '1.0'] %}
+    .version = "{{ obj.version }}",
+{% endif %}
+    .handlers = {
+{% for handler in handlers %}
+{% if handler is string %}
+{{ '' if handler == '' else '        ' + handler }}
+{% else %}
+        {{ '.%s = %s' % handler }}{{ "" if loop.last else "," }}
+{% endif %}
+{% endfor %}
+    }
+};
+
+const anjay_dm_object_def_t **{{ obj_name_snake }}_object_create(void) {
+    {{ obj_repr_type }} *obj = ({{ obj_repr_type }} *) avs_calloc(1, sizeof({{ obj_repr_type }}));
+    if (!obj) {
+        return NULL;
+    }
+    obj->def = &OBJ_DEF;
+
+    // TODO: object init
+
+    return &obj->def;
+}
+
+void {{ obj_name_snake }}_object_release(const anjay_dm_object_def_t **def) {
+    if (def) {
+        {{ obj_repr_type }} *obj = get_obj(def);
+
+        // TODO: object cleanup
+
+        avs_free(obj);
+    }
+}
+"""
+
+C_TABLE_DRIVEN_TEMPLATE = """\
+/**
+ * Generated by anjay_codegen.py --table-driven on {{ date_time }}
+ *
+ * LwM2M Object: {{ obj.name }}
+ * ID: {{ obj.oid }}, URN: {{ obj.urn }}, {{ obj.mandatory_str }}, {{ obj.multiple_str }}
+ *
+ * {{ obj.description }}
+ */
+#include <assert.h>
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+#include <string.h>
+
+#include <anjay/anjay.h>
+#include <avsystem/commons/avs_defs.h>
+{% if obj.multiple and not instances_number %}
+#include <avsystem/commons/avs_list.h>
+{% endif %}
+#include <avsystem/commons/avs_memory.h>
+
+{% for res in obj.resources %}
+/**
+ * {{ res.name }}: {{ res.operations }}, {{ res.multiple_str }}, {{ res.mandatory_str }}
+ * type: {{ res.type }}, range: {{ res.range_enumeration }}, unit: {{ res.units }}
+{% if res.description %}
+ * {{ res.description }}
+{% endif %}
+ */
+#define {{ res.name_upper }} {{ res.rid }}
+
+{% endfor %}
+typedef enum {
+    RES_TYPE_NONE, // executable or multiple-instance; handled manually
+    RES_TYPE_BOOL,
+    RES_TYPE_I32,
+    RES_TYPE_U32,
+    RES_TYPE_I64,
+    RES_TYPE_DOUBLE,
+    RES_TYPE_STRING,
+    RES_TYPE_BYTES,
+    RES_TYPE_OBJLNK
+} resource_type_t;
+
+typedef struct {
+    size_t size;
+    uint8_t data[256];
+} resource_bytes_t;
+
+typedef struct {
+    anjay_oid_t oid;
+    anjay_iid_t iid;
+} resource_objlnk_t;
+
+/**
+ * Values of all Single-Instance, non-executable Resources of an Instance.
+ * Accessed by the generic handlers through RESOURCES[].offset.
+ */
+typedef struct {{ obj_values_tag }} {
+{% for res in obj.resources if res.table_type != 'NONE' %}
+    {{ res.field_declaration }};
+{% else %}
+    char reserved; // no Resources with a value stored in the Instance
+{% endfor %}
+} {{ obj_values_type }};
+
+typedef struct {
+    anjay_rid_t rid;
+    anjay_dm_resource_kind_t kind;
+    anjay_dm_resource_presence_t presence;
+    resource_type_t type;
+    size_t offset;
+    size_t size;
+} resource_def_t;
+
+#define RESOURCE_DEF(Rid, Kind, Type, Field) \\
+    { \\
+        .rid = (Rid), \\
+        .kind = (Kind), \\
+        .presence = ANJAY_DM_RES_PRESENT, \\
+        .type = (Type), \\
+        .offset = offsetof({{ obj_values_type }}, Field), \\
+        .size = sizeof(((const {{ obj_values_type }} *) NULL)->Field) \\
+    }
+
+#define RESOURCE_DEF_NONE(Rid, Kind) \\
+    { \\
+        .rid = (Rid), \\
+        .kind = (Kind), \\
+        .presence = ANJAY_DM_RES_PRESENT, \\
+        .type = RES_TYPE_NONE \\
+    }
+
+// sorted by rid, as required by find_resource()
+static const resource_def_t RESOURCES[] = {
+{% for res in obj.resources %}
+{% if res.table_type == 'NONE' %}
+    RESOURCE_DEF_NONE({{ res.name_upper }}, {{ res.kind_enum }}){{ "" if loop.last else "," }}
+{% else %}
+    RESOURCE_DEF({{ res.name_upper }}, {{ res.kind_enum }}, RES_TYPE_{{ res.table_type }},
+                 {{ res.field_name }}){{ "" if loop.last else "," }}
+{% endif %}
+{% endfor %}
+};
+
+{% if obj.has_resource_lookup %}
+static const resource_def_t *find_resource(anjay_rid_t rid) {
+    size_t lo = 0;
+    size_t hi = AVS_ARRAY_SIZE(RESOURCES);
+    while (lo < hi) {
+        size_t mid = lo + (hi - lo) / 2;
+        if (RESOURCES[mid].rid < rid) {
+            lo = mid + 1;
+        } else if (RESOURCES[mid].rid > rid) {
+            hi = mid;
+        } else {
+            return &RESOURCES[mid];
+        }
+    }
+    return NULL;
+}
+
+{% endif %}
+typedef struct {{ obj_inst_tag }} {
+{% if obj.multiple and not instances_number %}
+    anjay_iid_t iid;
+{% endif %}
+    {{ obj_values_type }} values;
+
+    // TODO: instance state
+} {{ obj_inst_type }};
+
+typedef struct {{ obj_repr_tag }} {
+    const anjay_dm_object_def_t *def;
+{% if not obj.multiple %}
+    {{ obj_inst_type }} instance;
+{% elif instances_number %}
+    {{ obj_inst_type }} instances[{{ instances_number }}];
+{% else %}
+    AVS_LIST({{ obj_inst_type }}) instances;
+{% endif %}
+
+    // TODO: object state
+} {{ obj_repr_type }};
+
+static inline {{ obj_repr_type }} *
+get_obj(const anjay_dm_object_def_t *const *obj_ptr) {
+    assert(obj_ptr);
+    return AVS_CONTAINER_OF(obj_ptr, {{ obj_repr_type }}, def);
+}
+
+{% if obj.multiple and not instances_number %}
+static {{ obj_inst_type }} *find_instance(const {{ obj_repr_type }} *obj,
+{{ " " * (obj_inst_type|length + 22) }} anjay_iid_t iid) {
+    AVS_LIST({{ obj_inst_type }}) it;
+    AVS_LIST_FOREACH(it, obj->instances) {
+        if (it->iid == iid) {
+            return it;
+        } else if (it->iid > iid) {
+            break;
+        }
+    }
+
+    return NULL;
+}
+
+static int list_instances(anjay_t *anjay,
+                          const anjay_dm_object_def_t *const *obj_ptr,
+                          anjay_dm_list_ctx_t *ctx) {
+    (void) anjay;
+
+    AVS_LIST({{ obj_inst_type }}) it;
+    AVS_LIST_FOREACH(it, get_obj(obj_ptr)->instances) {
+        anjay_dm_emit(ctx, it->iid);
+    }
+
+    return 0;
+}
+
+static int init_instance({{ obj_inst_type }} *inst, anjay_iid_t iid) {
+    assert(iid != ANJAY_ID_INVALID);
+
+    inst->iid = iid;
+    // TODO: instance init
+
+    // TODO: return 0 on success, negative value on failure
+    return 0;
+}
+
+static void release_instance({{ obj_inst_type }} *inst) {
+    // TODO: instance cleanup
+    (void) inst;
+}
+
+static {{ obj_inst_type }} *
+add_instance({{ obj_repr_type }} *obj, anjay_iid_t iid) {
+    assert(find_instance(obj, iid) == NULL);
+
+    AVS_LIST({{ obj_inst_type }}) created =
+            AVS_LIST_NEW_ELEMENT({{ obj_inst_type }});
+    if (!created) {
+        return NULL;
+    }
+
+    int result = init_instance(created, iid);
+    if (result) {
+        AVS_LIST_CLEAR(&created);
+        return NULL;
+    }
+
+    AVS_LIST({{ obj_inst_type }}) *ptr;
+    AVS_LIST_FOREACH_PTR(ptr, &obj->instances) {
+        if ((*ptr)->iid > created->iid) {
+            break;
+        }
+    }
+
+    AVS_LIST_INSERT(ptr, created);
+    return created;
+}
+
+static int instance_create(anjay_t *anjay,
+                           const anjay_dm_object_def_t *const *obj_ptr,
+                           anjay_iid_t iid) {
+    (void) anjay;
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
 
-{% endfor %}
-{% if obj.multiple %}
-typedef struct {{ obj_inst_tag }} {
-    // TODO: instance state
-} {{ obj_inst_type }};
+    return add_instance(obj, iid) ? 0 : ANJAY_ERR_INTERNAL;
+}
 
-{% endif %}
-typedef struct {{ obj_repr_tag }} {
-    const anjay_dm_object_def_t *def;
-{% if obj.multiple %}
-    {{ obj_inst_type }} instances[{{ instances_number }}];
-{% endif %}
+static int instance_remove(anjay_t *anjay,
+                           const anjay_dm_object_def_t *const *obj_ptr,
+                           anjay_iid_t iid) {
+    (void) anjay;
+    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
+    assert(obj);
 
-    // TODO: object state
-} {{ obj_repr_type }};
+    AVS_LIST({{ obj_inst_type }}) *it;
+    AVS_LIST_FOREACH_PTR(it, &obj->instances) {
+        if ((*it)->iid == iid) {
+            release_instance(*it);
+            AVS_LIST_DELETE(it);
+            return 0;
+        } else if ((*it)->iid > iid) {
+            break;
+        }
+    }
 
-static inline {{ obj_repr_type }} *
-get_obj(const anjay_dm_object_def_t *const *obj_ptr) {
-    assert(obj_ptr);
-    return AVS_CONTAINER_OF(obj_ptr, {{ obj_repr_type }}, def);
+    assert(0);
+    return ANJAY_ERR_NOT_FOUND;
 }
 
-{% if obj.multiple %}
+{% elif obj.multiple %}
 static int list_instances(anjay_t *anjay,
                           const anjay_dm_object_def_t *const *obj_ptr,
                           anjay_dm_list_ctx_t *ctx) {
@@ -492,27 +1317,32 @@ static int list_instances(anjay_t *anjay,
 }
 
 {% endif %}
+static {{ obj_inst_type }} *get_instance({{ obj_repr_type }} *obj,
+{{ " " * (obj_inst_type|length + 21) }} anjay_iid_t iid) {
+{% if not obj.multiple %}
+    assert(iid == 0);
+    (void) iid;
+    return &obj->instance;
+{% elif instances_number %}
+    assert(iid < AVS_ARRAY_SIZE(obj->instances));
+    return &obj->instances[iid];
+{% else %}
+    {{ obj_inst_type }} *inst = find_instance(obj, iid);
+    assert(inst);
+    return inst;
+{% endif %}
+}
+
 {% if obj.needs_instance_reset_handler %}
 static int instance_reset(anjay_t *anjay,
                           const anjay_dm_object_def_t *const *obj_ptr,
                           anjay_iid_t iid) {
     (void) anjay;
-{% if not obj.multiple %}
-    (void) iid;
-{% endif %}
 
-    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
-    assert(obj);
-{% if obj.multiple %}
-    assert(iid < AVS_ARRAY_SIZE(obj->instances));
-    {{ obj_inst_type }} *inst = &obj->instances[iid];
-{% else %}
-    assert(iid == 0);
-{% endif %}
+    {{ obj_inst_type }} *inst = get_instance(get_obj(obj_ptr), iid);
+    memset(&inst->values, 0, sizeof(inst->values));
 
     // TODO: instance reset
-
-    // TODO: return 0 on success, negative value on failure
     return 0;
 }
 
@@ -525,10 +1355,10 @@ static int list_resources(anjay_t *anjay,
     (void) obj_ptr;
     (void) iid;
 
-{% for res in obj.resources %}
-    anjay_dm_emit_res(ctx, {{ res.name_upper }},
-                      {{ res.kind_enum }}, ANJAY_DM_RES_PRESENT);
-{% endfor %}
+    for (size_t i = 0; i < AVS_ARRAY_SIZE(RESOURCES); ++i) {
+        anjay_dm_emit_res(ctx, RESOURCES[i].rid, RESOURCES[i].kind,
+                          RESOURCES[i].presence);
+    }
     return 0;
 }
 
@@ -540,28 +1370,45 @@ static int resource_read(anjay_t *anjay,
                          anjay_riid_t riid,
                          anjay_output_ctx_t *ctx) {
     (void) anjay;
-{% if not obj.multiple %}
-    (void) iid;
-{% endif %}
-
-    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
-    assert(obj);
-{% if obj.multiple %}
-    assert(iid < AVS_ARRAY_SIZE(obj->instances));
-    {{ obj_inst_type }} *inst = &obj->instances[iid];
-{% else %}
-    assert(iid == 0);
-{% endif %}
 
-    switch (rid) {
-{% for res in obj.resources %}
-{% if 'R' in res.operations %}
-    case {{ res.name_upper }}:{{ res.read_handler|indent(4) }}
+    const resource_def_t *res = find_resource(rid);
+    if (!res) {
+        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+    }
+    if (res->type == RES_TYPE_NONE) {
+        // TODO: multiple-instance Resources
+        return ANJAY_ERR_NOT_IMPLEMENTED;
+    }
 
-{% endif %}
-{% endfor %}
+    assert(riid == ANJAY_ID_INVALID);
+    (void) riid;
+    const void *value =
+            (const char *) &get_instance(get_obj(obj_ptr), iid)->values
+            + res->offset;
+
+    switch (res->type) {
+    case RES_TYPE_BOOL:
+        return anjay_ret_bool(ctx, *(const bool *) value);
+    case RES_TYPE_I32:
+        return anjay_ret_i32(ctx, *(const int32_t *) value);
+    case RES_TYPE_U32:
+        return anjay_ret_u32(ctx, *(const uint32_t *) value);
+    case RES_TYPE_I64:
+        return anjay_ret_i64(ctx, *(const int64_t *) value);
+    case RES_TYPE_DOUBLE:
+        return anjay_ret_double(ctx, *(const double *) value);
+    case RES_TYPE_STRING:
+        return anjay_ret_string(ctx, (const char *) value);
+    case RES_TYPE_BYTES: {
+        const resource_bytes_t *bytes = (const resource_bytes_t *) value;
+        return anjay_ret_bytes(ctx, bytes->data, bytes->size);
+    }
+    case RES_TYPE_OBJLNK: {
+        const resource_objlnk_t *objlnk = (const resource_objlnk_t *) value;
+        return anjay_ret_objlnk(ctx, objlnk->oid, objlnk->iid);
+    }
     default:
-        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+        return ANJAY_ERR_INTERNAL;
     }
 }
 
@@ -574,28 +1421,55 @@ static int resource_write(anjay_t *anjay,
                           anjay_riid_t riid,
                           anjay_input_ctx_t *ctx) {
     (void) anjay;
-{% if not obj.multiple %}
-    (void) iid;
-{% endif %}
-
-    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
-    assert(obj);
-{% if obj.multiple %}
-    assert(iid < AVS_ARRAY_SIZE(obj->instances));
-    {{ obj_inst_type }} *inst = &obj->instances[iid];
-{% else %}
-    assert(iid == 0);
-{% endif %}
 
-    switch (rid) {
-{% for res in obj.resources %}
-{% if 'W' in res.operations %}
-    case {{ res.name_upper }}:{{ res.write_handler|indent(4) }}
+    const resource_def_t *res = find_resource(rid);
+    if (!res) {
+        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+    }
+    if (res->type == RES_TYPE_NONE) {
+        // TODO: multiple-instance Resources
+        return ANJAY_ERR_NOT_IMPLEMENTED;
+    }
 
-{% endif %}
-{% endfor %}
+    assert(riid == ANJAY_ID_INVALID);
+    (void) riid;
+    // TODO: implement transactions if the previous value needs to be
+    // restored when writing other Resources fails
+    void *value =
+            (char *) &get_instance(get_obj(obj_ptr), iid)->values + res->offset;
+
+    switch (res->type) {
+    case RES_TYPE_BOOL:
+        return anjay_get_bool(ctx, (bool *) value);
+    case RES_TYPE_I32:
+        return anjay_get_i32(ctx, (int32_t *) value);
+    case RES_TYPE_U32:
+        return anjay_get_u32(ctx, (uint32_t *) value);
+    case RES_TYPE_I64:
+        return anjay_get_i64(ctx, (int64_t *) value);
+    case RES_TYPE_DOUBLE:
+        return anjay_get_double(ctx, (double *) value);
+    case RES_TYPE_STRING: {
+        int result = anjay_get_string(ctx, (char *) value, res->size);
+        return result == ANJAY_BUFFER_TOO_SHORT ? ANJAY_ERR_BAD_REQUEST
+                                                : result;
+    }
+    case RES_TYPE_BYTES: {
+        resource_bytes_t *bytes = (resource_bytes_t *) value;
+        bool finished;
+        int result = anjay_get_bytes(ctx, &bytes->size, &finished, bytes->data,
+                                     sizeof(bytes->data));
+        if (result) {
+            return result;
+        }
+        return finished ? 0 : ANJAY_ERR_BAD_REQUEST;
+    }
+    case RES_TYPE_OBJLNK: {
+        resource_objlnk_t *objlnk = (resource_objlnk_t *) value;
+        return anjay_get_objlnk(ctx, &objlnk->oid, &objlnk->iid);
+    }
     default:
-        return ANJAY_ERR_METHOD_NOT_ALLOWED;
+        return ANJAY_ERR_INTERNAL;
     }
 }
 
@@ -607,19 +1481,10 @@ static int resource_execute(anjay_t *anjay,
                             anjay_rid_t rid,
                             anjay_execute_ctx_t *arg_ctx) {
     (void) anjay;
-{% if not obj.multiple %}
-    (void) iid;
-{% endif %}
     (void) arg_ctx;
 
-    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
-    assert(obj);
-{% if obj.multiple %}
-    assert(iid < AVS_ARRAY_SIZE(obj->instances));
-    {{ obj_inst_type }} *inst = &obj->instances[iid];
-{% else %}
-    assert(iid == 0);
-{% endif %}
+    {{ obj_inst_type }} *inst = get_instance(get_obj(obj_ptr), iid);
+    (void) inst;
 
     switch (rid) {
 {% for res in obj.resources %}
@@ -641,18 +1506,9 @@ static int resource_reset(anjay_t *anjay,
                           anjay_iid_t iid,
                           anjay_rid_t rid) {
     (void) anjay;
-{% if not obj.multiple %}
-    (void) iid;
-{% endif %}
 
-    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
-    assert(obj);
-{% if obj.multiple %}
-    assert(iid < AVS_ARRAY_SIZE(obj->instances));
-    {{ obj_inst_type }} *inst = &obj->instances[iid];
-{% else %}
-    assert(iid == 0);
-{% endif %}
+    {{ obj_inst_type }} *inst = get_instance(get_obj(obj_ptr), iid);
+    (void) inst;
 
     switch (rid) {
 {% for res in obj.resources %}
@@ -675,18 +1531,9 @@ static int list_resource_instances(anjay_t *anjay,
                                    anjay_rid_t rid,
                                    anjay_dm_list_ctx_t *ctx) {
     (void) anjay;
-{% if not obj.multiple %}
-    (void) iid;
-{% endif %}
 
-    {{ obj_repr_type }} *obj = get_obj(obj_ptr);
-    assert(obj);
-{% if obj.multiple %}
-    assert(iid < AVS_ARRAY_SIZE(obj->instances));
-    {{ obj_inst_type }} *inst = &obj->instances[iid];
-{% else %}
-    assert(iid == 0);
-{% endif %}
+    {{ obj_inst_type }} *inst = get_instance(get_obj(obj_ptr), iid);
+    (void) inst;
 
     switch (rid) {
 {% for res in obj.resources %}
@@ -734,6 +1581,11 @@ const anjay_dm_object_def_t **{{ obj_name_snake }}_object_create(void) {
 void {{ obj_name_snake }}_object_release(const anjay_dm_object_def_t **def) {
     if (def) {
         {{ obj_repr_type }} *obj = get_obj(def);
+{% if obj.multiple and not instances_number %}
+        AVS_LIST_CLEAR(&obj->instances) {
+            release_instance(obj->instances);
+        }
+{% endif %}
 
         // TODO: object cleanup
 
@@ -742,6 +1594,103 @@ void {{ obj_name_snake }}_object_release(const anjay_dm_object_def_t **def) {
 }
 """
 
+C_TABLE_DRIVEN_BENCHMARK_TEMPLATE = """\
+/**
+ * Generated by anjay_codegen.py --table-driven on {{ date_time }}
+ *
+ * Microbenchmark of Resource dispatch in the table-driven implementation of
+ * LwM2M Object: {{ obj.name }} (ID: {{ obj.oid }}, {{ obj.resources|length }} Resources)
+ *
+ * Compares looking up Resources in the RESOURCES[] descriptor table with
+ * a switch-based lookup, as performed by the default code generator mode, and
+ * measures iterating over the table as done by list_resources.
+ *
+ * Build by linking against Anjay, e.g.:
+ *
+ *     cc -O2 {{ benchmark_file }} -o {{ obj_name_snake }}_benchmark -lanjay ...
+ */
+#define _POSIX_C_SOURCE 200809L
+
+#include <inttypes.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <time.h>
+
+#include "{{ object_file }}"
+
+static int switch_lookup(anjay_rid_t rid) {
+    switch (rid) {
+{% for res in obj.resources %}
+    case {{ res.name_upper }}:
+        return {{ loop.index0 }};
+{% endfor %}
+    default:
+        return -1;
+    }
+}
+
+static double now_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (double) ts.tv_sec * 1e9 + (double) ts.tv_nsec;
+}
+
+// prevents the compiler from optimizing the benchmarked code away
+static volatile uintptr_t sink;
+
+int main(int argc, char *argv[]) {
+    const long iterations = argc > 1 ? atol(argv[1]) : 1000000L;
+    const size_t count = AVS_ARRAY_SIZE(RESOURCES);
+
+    printf("object: {{ obj.name }} (/{{ obj.oid }}), %u resources\\n",
+           (unsigned) count);
+    printf("descriptor table: %u B, instance values: %u B\\n",
+           (unsigned) sizeof(RESOURCES), (unsigned) sizeof({{ obj_values_type }}));
+
+    double start;
+{% if obj.has_resource_lookup %}
+    start = now_ns();
+    for (long i = 0; i < iterations; ++i) {
+        sink += (uintptr_t) find_resource(RESOURCES[(size_t) i % count].rid);
+    }
+    printf("table lookup:      %8.2f ns/op\\n",
+           (now_ns() - start) / (double) iterations);
+{% else %}
+    // no readable or writable Resources, so there is no find_resource()
+    printf("table lookup:           n/a\\n");
+{% endif %}
+
+    start = now_ns();
+    for (long i = 0; i < iterations; ++i) {
+        sink += (uintptr_t) switch_lookup(RESOURCES[(size_t) i % count].rid);
+    }
+    printf("switch lookup:     %8.2f ns/op\\n",
+           (now_ns() - start) / (double) iterations);
+
+{% if obj.has_resource_lookup %}
+    start = now_ns();
+    for (long i = 0; i < iterations; ++i) {
+        // invalid RID: worst case for the binary search
+        sink += (uintptr_t) find_resource(ANJAY_ID_INVALID);
+    }
+    printf("table miss:        %8.2f ns/op\\n",
+           (now_ns() - start) / (double) iterations);
+{% endif %}
+
+    start = now_ns();
+    for (long i = 0; i < iterations; ++i) {
+        for (size_t j = 0; j < count; ++j) {
+            sink += RESOURCES[j].rid + (uintptr_t) RESOURCES[j].kind
+                    + (uintptr_t) RESOURCES[j].presence;
+        }
+    }
+    printf("list iteration:    %8.2f ns/op\\n",
+           (now_ns() - start) / (double) iterations);
+
+    return 0;
+}
+"""
+
 CXX_DYNAMIC_INST_TEMPLATE = """\
 /**
  * Generated by anjay_codegen.py on {{ date_time }}
@@ -1464,6 +2413,29 @@ def _sanitize_identifier(n: str) -> str:
     return DIGIT_SPELLINGS.get(identifier[0], identifier[0]) + identifier[1:]
 
 
+C_KEYWORDS = {
+    'auto', 'bool', 'break', 'case', 'char', 'const', 'continue', 'default', 'do', 'double', 'else', 'enum',
+    'extern', 'float', 'for', 'goto', 'if', 'inline', 'int', 'long', 'register', 'restrict', 'return', 'short',
+    'signed', 'sizeof', 'static', 'struct', 'switch', 'typedef', 'union', 'unsigned', 'void', 'volatile', 'while'
+}
+
+# Resource type -> (RES_TYPE_* suffix, C type of the field storing the value,
+# array size suffix) used by the --table-driven mode
+TABLE_DRIVEN_TYPES = [
+    (('boolean', 'bool'), 'BOOL',   'bool',              ''),
+    (('integer', 'int'),  'I32',    'int32_t',           ''),
+    (('float',),          'DOUBLE', 'double',            ''),
+    (('corelnk', # TODO T2033
+      'string', 'str'),   'STRING', 'char',              '[256]'),
+    (('opaque',),         'BYTES',  'resource_bytes_t',  ''),
+    (('time',),           'I64',    'int64_t',           ''),
+    (('objlnk',),         'OBJLNK', 'resource_objlnk_t', ''),
+    (('unsigned integer',
+      'unsigned int',
+      'unsigned'),        'U32',    'uint32_t',          '')
+]
+
+
 class ResourceDef(collections.namedtuple('ResourceDef', ['rid', 'name', 'operations', 'multiple', 'mandatory', 'type',
                                                          'range_enumeration', 'units', 'description'])):
     @property
@@ -1577,6 +2549,30 @@ class ResourceDef(collections.namedtuple('ResourceDef', ['rid', 'name', 'operati
                         return %s; // TODO
                     }""") % (local_def, get_func)
 
+    @property
+    def field_name(self) -> str:
+        name = _sanitize_identifier(self.name).lower()
+        return name + '_' if name in C_KEYWORDS else name
+
+    def _table_driven_type(self) -> Optional[Tuple[str, str, str]]:
+        if self.multiple or 'E' in self.operations:
+            return None
+        for match_types, enum_suffix, c_type, array_suffix in TABLE_DRIVEN_TYPES:
+            if self.type in match_types:
+                return enum_suffix, c_type, array_suffix
+        else:
+            raise AssertionError('unexpected type: ' + self.type)
+
+    @property
+    def table_type(self) -> str:
+        table_type = self._table_driven_type()
+        return table_type[0] if table_type else 'NONE'
+
+    @property
+    def field_declaration(self) -> str:
+        _, c_type, array_suffix = self._table_driven_type()
+        return '%s %s%s' % (c_type, self.field_name, array_suffix)
+
     @classmethod
     def from_etree(cls, res: Element) -> 'ResourceDef':
         return cls(rid=int(res.get('ID')),
@@ -1617,6 +2613,11 @@ class ObjectDef(collections.namedtuple('ObjectDef',
     def has_any_writable_resources(self) -> bool:
         return any('W' in res.operations for res in self.resources)
 
+    @property
+    def has_resource_lookup(self) -> bool:
+        # find_resource() is only used by the table-driven read/write handlers
+        return self.has_any_readable_resources or self.has_any_writable_resources
+
     @property
     def has_any_executable_resources(self) -> bool:
         return any('E' in res.operations for res in self.resources)
@@ -1654,8 +2655,28 @@ class ObjectDef(collections.namedtuple('ObjectDef',
                    resources=resources)
 
 
-def generate_object_boilerplate(obj_tree: ElementTree, cxx: bool, instances_number: int, resources_subset: set = None):
+def _make_template_args(obj: ObjectDef, **kwargs):
+    return dict(
+        obj=obj,
+        date_time=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        obj_name_snake=obj.name_snake,
+        obj_repr_tag=obj.name_snake + '_object_struct',
+        obj_repr_type=obj.name_snake + '_object_t',
+        obj_inst_tag=obj.name_snake + '_instance_struct',
+        obj_inst_type=obj.name_snake + '_instance_t',
+        obj_values_tag=obj.name_snake + '_values_struct',
+        obj_values_type=obj.name_snake + '_values_t',
+        obj_cxx_type=obj.name_pascal + 'Object',
+        obj_inst_cxx_type=obj.name_pascal + 'Instance',
+        **kwargs
+    )
+
+
+def generate_object_boilerplate(obj_tree: ElementTree, cxx: bool, instances_number: int, resources_subset: set = None,
+                                table_driven: bool = False, instance_pool: int = None):
     obj = ObjectDef.from_etree(obj_tree, resources_subset)
+    if table_driven and not obj.resources:
+        raise AssertionError('table-driven objects need at least one resource')
 
     jinja_env = Environment(trim_blocks=True)
 
@@ -1691,26 +2712,45 @@ def generate_object_boilerplate(obj_tree: ElementTree, cxx: bool, instances_numb
     handlers.append(('transaction_commit', 'anjay_dm_transaction_NOOP'))
     handlers.append(('transaction_rollback', 'anjay_dm_transaction_NOOP'))
 
-    template_args = dict(
-        obj=obj,
-        handlers=handlers,
-        date_time=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        obj_name_snake=obj.name_snake,
-        obj_repr_tag=obj.name_snake + '_object_struct',
-        obj_repr_type=obj.name_snake + '_object_t',
-        obj_inst_tag=obj.name_snake + '_instance_struct',
-        obj_inst_type=obj.name_snake + '_instance_t',
-        obj_cxx_type=obj.name_pascal + 'Object',
-        obj_inst_cxx_type=obj.name_pascal + 'Instance'
-    )
+    template_args = _make_template_args(obj, handlers=handlers)
 
-    if instances_number:
+    if table_driven:
+        return (jinja_env.from_string(C_TABLE_DRIVEN_TEMPLATE)
+                .render(**template_args,
+                        instances_number=instances_number))
+    elif instances_number:
         return (jinja_env.from_string(CXX_STATIC_INST_TEMPLATE if cxx else C_STATIC_INST_TEMPLATE)
                 .render(**template_args,
                         instances_number=instances_number))
     else:
         return (jinja_env.from_string(CXX_DYNAMIC_INST_TEMPLATE if cxx else C_DYNAMIC_INST_TEMPLATE)
-                    .render(**template_args))
+                    .render(**template_args,
+                            instance_pool=instance_pool))
+
+
+def generate_table_driven_benchmark(obj_tree: ElementTree, object_file: str, benchmark_file: str,
+                                    resources_subset: set = None):
+    obj = ObjectDef.from_etree(obj_tree, resources_subset)
+
+    jinja_env = Environment(trim_blocks=True)
+    return (jinja_env.from_string(C_TABLE_DRIVEN_BENCHMARK_TEMPLATE)
+            .render(**_make_template_args(obj,
+                                          object_file=object_file,
+                                          benchmark_file=benchmark_file)))
+
+
+def generate_instance_pool_stress_test(obj_tree: ElementTree, object_file: str, stress_test_file: str,
+                                       instance_pool: int, resources_subset: set = None):
+    obj = ObjectDef.from_etree(obj_tree, resources_subset)
+    if not obj.multiple:
+        raise AssertionError('instance pool stress test requires a multiple-instance object')
+
+    jinja_env = Environment(trim_blocks=True)
+    return (jinja_env.from_string(C_INSTANCE_POOL_STRESS_TEMPLATE)
+            .render(**_make_template_args(obj,
+                                          object_file=object_file,
+                                          stress_test_file=stress_test_file,
+                                          instance_pool=instance_pool)))
 
 
 if __name__ == '__main__':
@@ -1723,6 +2763,20 @@ if __name__ == '__main__':
     parser.add_argument('-n', '--instances-number', metavar='{1,2,...,65534}', dest='instances_number', type=int,
                         help='Number of instances of the generated object. It forces using the template with statically allocated instances. '
                         'If the object is single instance it is silently ignored.')
+    parser.add_argument('-t', '--table-driven', action='store_true',
+                        help='Generate a static descriptor table of resources with generic read/write handlers '
+                        'dispatching through it, instead of per-resource switch statements. Values of single-instance '
+                        'resources are stored in the generated instance structure. C only.')
+    parser.add_argument('-b', '--benchmark-harness', metavar='FILE',
+                        help='With --table-driven, also generate a microbenchmark of resource dispatch to FILE. '
+                        'The harness #includes the generated object, so --output must be a regular file.')
+    parser.add_argument('-p', '--instance-pool', metavar='{1,2,...,65534}', dest='instance_pool', type=int,
+                        help='Store instances of a multiple-instance object in a fixed-capacity pool of the given size, '
+                        'with a free slot bitmap and an index sorted by iid, instead of a dynamically allocated list. '
+                        'Instance lookup is a binary search and creating or removing instances does not allocate. C only.')
+    parser.add_argument('-s', '--stress-test', metavar='FILE',
+                        help='With --instance-pool, also generate a stress test of the instance pool to FILE. '
+                        'The test #includes the generated object, so --output must be a regular file.')
 
     args = parser.parse_args()
     if args.input == '-':
@@ -1733,6 +2787,17 @@ if __name__ == '__main__':
     if args.input is None or (args.instances_number is not None and args.instances_number not in range(1, 65535)):
         parser.print_usage()
         sys.exit(1)
+    if args.table_driven and args.cxx:
+        parser.error('--table-driven is not supported for C++ code')
+    if args.benchmark_harness and (not args.table_driven or args.output.startswith('/dev/')):
+        parser.error('--benchmark-harness requires --table-driven and --output set to a regular file')
+    if args.instance_pool is not None:
+        if args.instance_pool not in range(1, 65535):
+            parser.error('--instance-pool must be in range 1..65534')
+        if args.cxx or args.table_driven or args.instances_number is not None:
+            parser.error('--instance-pool cannot be used with --c++, --table-driven or --instances-number')
+    if args.stress_test and (args.instance_pool is None or args.output.startswith('/dev/')):
+        parser.error('--stress-test requires --instance-pool and --output set to a regular file')
 
     with open(args.input) as f:
         tree = ElementTree.fromstring(f.read())
@@ -1742,7 +2807,25 @@ if __name__ == '__main__':
                 print(r.rid, r.name, '(mandatory)' if r.mandatory else '')
             sys.exit(0)
 
-        boilerplate = generate_object_boilerplate(obj, args.cxx, args.instances_number, args.resources)
+        boilerplate = generate_object_boilerplate(obj, args.cxx, args.instances_number, args.resources,
+                                                  table_driven=args.table_driven,
+                                                  instance_pool=args.instance_pool)
+        if args.benchmark_harness:
+            benchmark = generate_table_driven_benchmark(
+                    obj, os.path.relpath(args.output, os.path.dirname(os.path.abspath(args.benchmark_harness))),
+                    os.path.basename(args.benchmark_harness), args.resources)
+        if args.stress_test:
+            if not ObjectDef.from_etree(obj, args.resources).multiple:
+                parser.error('--stress-test requires a multiple-instance object')
+            stress_test = generate_instance_pool_stress_test(
+                    obj, os.path.relpath(args.output, os.path.dirname(os.path.abspath(args.stress_test))),
+                    os.path.basename(args.stress_test), args.instance_pool, args.resources)
 
     with open(args.output, 'w') as f:
         print(boilerplate, file=f)
+    if args.benchmark_harness:
+        with open(args.benchmark_harness, 'w') as f:
+            print(benchmark, file=f)
+    if args.stress_test:
+        with open(args.stress_test, 'w') as f:
+            print(stress_test, file=f)
@@ -9,9 +9,14 @@
 # See the attached LICENSE file for details.
 
 
+import urllib.error
+import urllib.parse
 import urllib.request
 import argparse
 import collections
+import concurrent.futures
+import hashlib
+import json
 import logging
 import sys
 import os
@@ -19,84 +24,323 @@ from xml.etree import ElementTree
 from itertools import groupby
 from operator import attrgetter
 
+DEFAULT_REPO_URL = 'https://raw.githubusercontent.com/OpenMobileAlliance/lwm2m-registry/prod'
+
+# Version of the index file format; bump whenever INDEX_FIELDS change
+INDEX_VERSION = 1
+INDEX_FIELDS = ('ObjectID', 'Ver', 'Name', 'URN', 'DDF')
+
+
+def _user_cache_root():
+    return os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+
+def default_cache_dir():
+    if os.environ.get('LWM2M_REGISTRY_CACHE'):
+        return os.environ['LWM2M_REGISTRY_CACHE']
+    return os.path.join(_user_cache_root(), 'anjay', 'lwm2m_object_registry')
+
+
+def index_path_for(cache_dir):
+    """
+    Returns the path of the parsed DDF.xml index for files in CACHE_DIR. It is
+    kept in the user's cache directory rather than in CACHE_DIR itself, which
+    may be a checkout of the registry repository.
+    """
+    key = hashlib.sha1(os.path.abspath(cache_dir).encode()).hexdigest()
+    return os.path.join(_user_cache_root(), 'anjay', 'lwm2m_object_registry_index',
+                        '%s.json' % (key,))
+
+
 class Lwm2mObjectEntry:
     """
     LwM2M Object Registry entry.
 
     Available attributes are the same as tag names in the DDF XML structure.
+    Attributes listed in INDEX_FIELDS are available without parsing the DDF;
+    other ones are looked up in the DDF XML (parsed on first use) and memoized.
     """
 
-    def __init__(self, tree):
+    def __init__(self, tree=None, fields=None, tree_loader=None):
         self._tree = tree
+        self._fields = dict(fields or {})
+        self._tree_loader = tree_loader
 
     def __getattr__(self, name):
-        node = self._tree.find(name)
-        if node is not None and node.text is not None:
-            return node.text.strip()
-        return self._tree.get(name)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._fields[name]
+        except KeyError:
+            pass
+
+        if self._tree is None and self._tree_loader is not None:
+            self._tree = self._tree_loader(self._fields['ObjectID'], self._fields['Ver'])
+        if self._tree is None:
+            value = None
+        else:
+            node = self._tree.find(name)
+            if node is not None and node.text is not None:
+                value = node.text.strip()
+            else:
+                value = self._tree.get(name)
+        self._fields[name] = value
+        return value
+
+    def index_fields(self):
+        return [getattr(self, field) for field in INDEX_FIELDS]
 
     def __lt__(self, other):
         return (self.ObjectID, self.Ver) < (other.ObjectID, other.Ver)
 
 
-def _read_url(url: str) -> bytes:
+def _read_url(url: str, headers=None):
+    """
+    Returns a (content, response headers) tuple, or (None, None) if HEADERS
+    contained conditional request headers and the resource was not modified.
+    """
     # we need to change the User-Agent - default one causes the server
     # to respond with 403 Forbidden
-    req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-    with urllib.request.urlopen(req) as f:
-        return f.read()
+    req = urllib.request.Request(url, headers=dict(headers or {}, **{'User-Agent': 'Mozilla/5.0'}))
+    try:
+        with urllib.request.urlopen(req) as f:
+            return f.read(), f.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, None
+        raise
+
+
+class Lwm2mRegistryCache:
+    """
+    On-disk cache of files downloaded from the LwM2M registry repository.
+
+    The cache directory layout mirrors the repository: DDF.xml is stored in the
+    root directory, and object definitions under their path relative to
+    REPO_URL. Definitions hosted elsewhere are stored in the "external"
+    subdirectory. Thanks to that, a local checkout of the registry repository
+    may be used as the cache directory in offline mode.
+
+    Cached files are never revalidated unless requested with refresh=True, in
+    which case a conditional request (using ETag/Last-Modified) is sent.
+    """
+
+    def __init__(self, repo_url=DEFAULT_REPO_URL, cache_dir=None, offline=False):
+        self.repo_url = repo_url.rstrip('/')
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.offline = offline
+
+    def url_for(self, path_or_url):
+        if path_or_url.startswith(('http://', 'https://')):
+            return path_or_url
+        return self.repo_url + '/' + path_or_url
+
+    def local_path(self, path_or_url):
+        url = self.url_for(path_or_url)
+        if url.startswith(self.repo_url + '/'):
+            rel_path = url[len(self.repo_url) + 1:]
+        else:
+            parsed = urllib.parse.urlparse(url)
+            rel_path = os.path.join('external', parsed.netloc, parsed.path.lstrip('/'))
+        rel_path = os.path.normpath(rel_path)
+        if rel_path.startswith('..') or os.path.isabs(rel_path):
+            raise ValueError('invalid registry path: %s' % (path_or_url,))
+        return os.path.join(self.cache_dir, rel_path)
+
+    @staticmethod
+    def _meta_path(local_path):
+        return local_path + '.meta.json'
+
+    def _load_meta(self, local_path):
+        try:
+            with open(self._meta_path(local_path)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _store(self, local_path, content, headers):
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = '%s.tmp.%d' % (local_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, local_path)
+
+        meta = {name: headers[name] for name in ('ETag', 'Last-Modified') if headers.get(name)}
+        with open(self._meta_path(local_path), 'w') as f:
+            json.dump(meta, f)
+
+    def fetch(self, path_or_url, refresh=False):
+        """
+        Returns a (local path, changed) tuple. CHANGED is True if the file was
+        downloaded or updated by this call.
+        """
+        local_path = self.local_path(path_or_url)
+        cached = os.path.exists(local_path)
+        if self.offline:
+            if not cached:
+                raise ValueError('%s is not available in offline mode (not found in %s)'
+                                 % (path_or_url, self.cache_dir))
+            return local_path, False
+        if cached and not refresh:
+            return local_path, False
+
+        headers = {}
+        if cached:
+            meta = self._load_meta(local_path)
+            if meta.get('ETag'):
+                headers['If-None-Match'] = meta['ETag']
+            if meta.get('Last-Modified'):
+                headers['If-Modified-Since'] = meta['Last-Modified']
+
+        url = self.url_for(path_or_url)
+        logging.debug('fetching %s%s', url, ' (revalidating)' if headers else '')
+        content, response_headers = _read_url(url, headers)
+        if content is None:
+            return local_path, False
+        self._store(local_path, content, response_headers)
+        return local_path, True
+
+    def read(self, path_or_url, refresh=False):
+        local_path, _ = self.fetch(path_or_url, refresh)
+        with open(local_path, 'rb') as f:
+            return f.read()
 
 
 class Lwm2mObjectRegistry:
-    def __init__(self, repo_url='https://raw.githubusercontent.com/OpenMobileAlliance/lwm2m-registry/prod'):
-        self.repo_url = repo_url
-        ddf_url = repo_url + '/DDF.xml'
-        root = ElementTree.fromstring(_read_url(ddf_url))
-        entries = (Lwm2mObjectEntry(obj) for obj in root.findall('Item'))
+    def __init__(self, repo_url=DEFAULT_REPO_URL, cache_dir=None, offline=False, refresh=False):
+        self.cache = Lwm2mRegistryCache(repo_url, cache_dir, offline)
+        self.repo_url = self.cache.repo_url
+        self._ddf_tree = None
+
+        ddf_path, changed = self.cache.fetch('DDF.xml', refresh)
+        index_path = index_path_for(self.cache.cache_dir)
+
+        entries = None if changed else self._load_index(index_path, ddf_path)
+        if entries is None:
+            entries = [Lwm2mObjectEntry(obj) for obj in self._parse_ddf().findall('Item')]
+            self._store_index(index_path, entries)
 
         grouped = ((int(key), list(group)) for key, group in groupby(entries, attrgetter('ObjectID')))
         self.objects = collections.OrderedDict(grouped)
 
+    def _parse_ddf(self):
+        if self._ddf_tree is None:
+            self._ddf_tree = ElementTree.fromstring(self.cache.read('DDF.xml'))
+        return self._ddf_tree
 
-def _print_object_list():
-    for oid, objs in Lwm2mObjectRegistry().objects.items():
-        for obj in objs:
-            print('%d\t%s\t%s' % (oid, obj.Ver, obj.Name))
+    def _find_ddf_item(self, oid, ver):
+        for item in self._parse_ddf().findall('Item'):
+            entry = Lwm2mObjectEntry(item)
+            if entry.ObjectID == oid and entry.Ver == ver:
+                return item
+        return None
 
+    def _load_index(self, index_path, ddf_path):
+        try:
+            if os.path.getmtime(index_path) < os.path.getmtime(ddf_path):
+                return None
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get('version') != INDEX_VERSION:
+            return None
+        return [Lwm2mObjectEntry(fields=dict(zip(INDEX_FIELDS, row)), tree_loader=self._find_ddf_item)
+                for row in index['objects']]
 
-def get_object_definition(urn_or_oid, version):
-    urn = urn_or_oid.strip()
-    if urn.startswith('urn:oma:lwm2m:'):
-        oid = int(urn.split(':')[-1])
-    else:
-        oid = int(urn)
+    def _store_index(self, index_path, entries):
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            tmp_path = '%s.tmp.%d' % (index_path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': INDEX_VERSION,
+                           'objects': [entry.index_fields() for entry in entries]},
+                          f, separators=(',', ':'))
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logging.warning('could not store registry index: %s', e)
+
+    def find_object(self, oid, version=None):
+        """
+        Returns the Lwm2mObjectEntry for object OID in given VERSION, or the
+        latest version if VERSION is None.
+        """
+        try:
+            objects = self.objects[oid]
+        except KeyError:
+            raise ValueError('Object with ID = %d not found' % oid)
 
-    try:
-        registry = Lwm2mObjectRegistry() 
-        objects = registry.objects[oid]
         available_versions_message = 'Available versions for object with ID %d: %s' % (
             oid, ', '.join(str(obj.Ver) for obj in objects))
-
         if version is None:
             if (len(objects) > 1):
                 logging.info('%s; defaulting to maximum available version: %s' % (
                     available_versions_message, max(objects).Ver))
-            object_ddf_url = max(objects).DDF
-        else:
-            object_ddf_url = next(obj for obj in objects if obj.Ver == version).DDF
-        if not object_ddf_url:
+            return max(objects)
+        try:
+            return next(obj for obj in objects if obj.Ver == version)
+        except StopIteration:
+            raise ValueError(available_versions_message)
+
+    def get_object_definition(self, oid, version=None, refresh=False):
+        obj = self.find_object(oid, version)
+        if not obj.DDF:
             raise ValueError("Object with ID = %d doesn't have attached XML definition" % oid)
-        if not object_ddf_url.startswith('http'):
-            object_ddf_url = registry.repo_url + '/' + object_ddf_url
-        return _read_url(object_ddf_url).decode('utf-8-sig')
-    except KeyError:
-        raise ValueError('Object with ID = %d not found' % oid)
-    except StopIteration:
-        raise ValueError(available_versions_message)
+        return self.cache.read(obj.DDF, refresh).decode('utf-8-sig')
+
+    def prefetch(self, oids=None, all_versions=True, refresh=False, jobs=8):
+        """
+        Downloads object definitions for all OIDS (or all registered objects
+        if OIDS is None) into the cache, using up to JOBS parallel downloads.
+        Returns a list of (oid, version, error) tuples for failed downloads.
+        """
+        if oids is None:
+            oids = list(self.objects)
+
+        entries = []
+        for oid in oids:
+            if all_versions:
+                entries += [obj for obj in self.objects.get(oid, []) if obj.DDF]
+            else:
+                obj = self.find_object(oid)
+                if obj.DDF:
+                    entries.append(obj)
+
+        def fetch(obj):
+            self.cache.fetch(obj.DDF, refresh)
+
+        errors = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {executor.submit(fetch, obj): obj for obj in entries}
+            for future in concurrent.futures.as_completed(futures):
+                obj = futures[future]
+                if future.exception() is not None:
+                    errors.append((int(obj.ObjectID), obj.Ver, future.exception()))
+        logging.info('prefetched %d of %d object definitions into %s',
+                     len(entries) - len(errors), len(entries), self.cache.cache_dir)
+        return errors
+
+
+def _parse_oid(urn_or_oid):
+    urn = urn_or_oid.strip()
+    if urn.startswith('urn:oma:lwm2m:'):
+        return int(urn.split(':')[-1])
+    return int(urn)
+
+
+def _print_object_list(registry):
+    for oid, objs in registry.objects.items():
+        for obj in objs:
+            print('%d\t%s\t%s' % (oid, obj.Ver, obj.Name))
+
+
+def get_object_definition(urn_or_oid, version, registry=None):
+    registry = registry or Lwm2mObjectRegistry()
+    return registry.get_object_definition(_parse_oid(urn_or_oid), version)
 
 
-def _print_object_definition(urn_or_oid, version):
-    print(get_object_definition(urn_or_oid, version))
+def _print_object_definition(urn_or_oid, version, registry):
+    print(get_object_definition(urn_or_oid, version, registry))
 
 
 if __name__ == '__main__':
@@ -108,21 +352,48 @@ if __name__ == '__main__':
     parser.add_argument("-v", "--object-version", metavar='ver', type=str, help=
         "Explicitly choose version of an object if there exists more than one with the same ObjectID. Applicable only "
         "with --get-xml argument. Without --object-version specified, most up to date version is chosen.")
+    parser.add_argument("-p", "--prefetch", nargs='*', type=str, metavar='urn_or_oid', help=
+        "Download definitions of all versions of given Objects (or all registered Objects, if none are given) into "
+        "the cache, so that they are available in --offline mode.")
+    parser.add_argument("-j", "--jobs", type=int, default=8, help=
+        "Number of parallel downloads used by --prefetch (default: %(default)s)")
+    parser.add_argument("-c", "--cache-dir", type=str, default=default_cache_dir(), help=
+        "Directory in which downloaded registry files are cached. A local checkout of the registry repository may be "
+        "used as well. Can also be set with the LWM2M_REGISTRY_CACHE environment variable (default: %(default)s)")
+    parser.add_argument("-o", "--offline", action='store_true', help=
+        "Do not access the network; use only files available in --cache-dir")
+    parser.add_argument("-r", "--refresh", action='store_true', help=
+        "Revalidate cached files with the registry server, downloading them again only if they changed")
 
     args = parser.parse_args()
 
-    if args.list and args.get_xml is not None:
-        print('conflicting options: --list, --get-xml', file=sys.stderr)
+    if sum((args.list, args.get_xml is not None, args.prefetch is not None)) > 1:
+        print('conflicting options: --list, --get-xml, --prefetch', file=sys.stderr)
         sys.exit(1)
 
     if args.object_version is not None and args.get_xml is None:
         print('--object-version option is applicable only with --get-xml', file=sys.stderr)
         sys.exit(1)
 
+    if args.offline and args.refresh:
+        print('conflicting options: --offline, --refresh', file=sys.stderr)
+        sys.exit(1)
+
+    if not (args.list or args.get_xml is not None or args.prefetch is not None):
+        parser.print_usage()
+        sys.exit(1)
+
+    registry = Lwm2mObjectRegistry(cache_dir=args.cache_dir, offline=args.offline, refresh=args.refresh)
+
     if args.list:
-        _print_object_list()
+        _print_object_list(registry)
     elif args.get_xml is not None:
-        _print_object_definition(args.get_xml, args.object_version)
+        oid = _parse_oid(args.get_xml)
+        print(registry.get_object_definition(oid, args.object_version, refresh=args.refresh))
     else:
-        parser.print_usage()
-        sys.exit(1)
+        oids = [_parse_oid(oid) for oid in args.prefetch] or None
+        errors = registry.prefetch(oids, refresh=args.refresh, jobs=args.jobs)
+        for oid, ver, error in errors:
+            print('could not fetch object %d version %s: %s' % (oid, ver, error), file=sys.stderr)
+        if errors:
+            sys.exit(1)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright 2017-2023 AVSystem <avsystem@avsystem.com>
+# AVSystem Anjay LwM2M SDK
+# All rights reserved.
+#
+# Licensed under the AVSystem-5-clause License.
+# See the attached LICENSE file for details.
+
+"""
+Batch factory provisioning of many endpoints at once.
+
+The manifest is a JSON file of the following form:
+
+    {
+        "defaults": {
+            "endpoint_cfg": "configs/endpoint_cfg",
+            "scert": "server_cert.der",
+            "cert": "configs/cert_info.json"
+        },
+        "endpoints": [
+            {"URN": "urn:dev:os:0001"},
+            {"URN": "urn:dev:os:0002", "endpoint_cfg": "configs/other_cfg"},
+            ...
+        ]
+    }
+
+Each endpoint entry may contain the same keys as "defaults", which correspond
+to ptool.py command line options: "endpoint_cfg", "URN", "cert", "pkey",
+"pcert" and "scert". Relative paths are resolved against the directory
+containing the manifest.
+"""
+
+import collections
+import concurrent.futures
+import json
+import os
+import re
+import statistics
+import time
+
+import requests
+from factory_prov import factory_prov as fp
+
+MANIFEST_PATH_KEYS = ('endpoint_cfg', 'cert', 'pkey', 'pcert', 'scert')
+
+_UNSAFE_PATH_CHARS_REGEX = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path, 'r') as file:
+        manifest = json.load(file)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    defaults = manifest.get('defaults', {})
+
+    jobs = []
+    for index, entry in enumerate(manifest.get('endpoints', [])):
+        job = {**defaults, **entry}
+        for key in MANIFEST_PATH_KEYS:
+            if job.get(key) is not None:
+                job[key] = os.path.join(base_dir, job[key])
+        if job.get('endpoint_cfg') is None:
+            raise ValueError('Missing endpoint_cfg for endpoint #%d in manifest' % index)
+        job['index'] = index
+        jobs.append(job)
+    return jobs
+
+
+def endpoint_dir_name(job):
+    name = job.get('URN') or 'endpoint'
+    return '%05d_%s' % (job['index'], _UNSAFE_PATH_CHARS_REGEX.sub('_', name).strip('_'))
+
+
+def provision_endpoint(job, output_dir, server, token, compact=False):
+    """
+    Provisions a single endpoint described by JOB. Executed in worker
+    processes, so it must not rely on any state of the parent process.
+
+    Returns a dict describing the result, including time spent in each stage.
+    """
+    timings = collections.OrderedDict()
+    result = {
+        'index': job['index'],
+        'URN': job.get('URN'),
+        'ok': False,
+        'timings': timings,
+    }
+    endpoint_dir = os.path.join(output_dir, endpoint_dir_name(job))
+
+    def stage(name, fun, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fun(*args, **kwargs)
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    try:
+        fcty = stage('load_config', fp.FactoryProvisioning, job['endpoint_cfg'], job.get('URN'),
+                     server, token, job.get('cert'), verbose=False, compact=compact)
+        os.makedirs(endpoint_dir, exist_ok=True)
+
+        if fcty.get_sec_mode() == 'cert':
+            if job.get('scert') is not None:
+                fcty.set_server_cert(job['scert'])
+
+            if job.get('cert') is not None:
+                stage('generate_cert', fcty.generate_self_signed_cert,
+                      os.path.join(endpoint_dir, 'cert'))
+            elif job.get('pkey') is not None and job.get('pcert') is not None:
+                fcty.set_endpoint_cert_and_key(job['pcert'], job['pkey'])
+
+        output_path = os.path.join(endpoint_dir, 'SenMLCBOR')
+        blob = stage('serialize', fcty.provision_device, output_path)
+        result['output'] = os.path.relpath(output_path, output_dir)
+        result['size'] = len(blob)
+        if compact:
+            result['plain_size'] = fcty.serialized_sizes()[0]
+
+        if server is not None and token is not None and job.get('URN') is not None:
+            # performed in the parent process, using a shared HTTP session
+            result['registration_info'] = fcty.registration_info()
+
+        result['ok'] = True
+    except Exception as err:
+        # any failure only affects this endpoint; it must not abort the whole
+        # pool, so that the index is still written for all the other ones
+        result['error'] = '%s: %s' % (type(err).__name__, err)
+    return result
+
+
+def register_endpoints(results, concurrency):
+    """
+    Registers all successfully provisioned endpoints in Coiote DM, with at most
+    CONCURRENCY requests in flight, reusing connections between requests.
+    """
+    to_register = [r for r in results if r['ok'] and 'registration_info' in r]
+    if not to_register:
+        return
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def register(result):
+        start = time.perf_counter()
+        try:
+            fp.CoioteRegistration(result.pop('registration_info')).register(session, verbose=False)
+            result['registered'] = True
+        except Exception as err:
+            result['ok'] = False
+            result['registered'] = False
+            result['error'] = '%s: %s' % (type(err).__name__, err)
+        finally:
+            result['timings']['register'] = time.perf_counter() - start
+
+    with session, concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(register, to_register))
+
+
+def _stage_summary(results):
+    samples = collections.OrderedDict()
+    for result in results:
+        for stage, duration in result['timings'].items():
+            samples.setdefault(stage, []).append(duration)
+
+    summary = collections.OrderedDict()
+    for stage, durations in samples.items():
+        durations.sort()
+        summary[stage] = collections.OrderedDict([
+            ('count', len(durations)),
+            ('total_s', sum(durations)),
+            ('mean_s', statistics.mean(durations)),
+            ('median_s', statistics.median(durations)),
+            ('max_s', durations[-1]),
+        ])
+    return summary
+
+
+def provision_batch(manifest_path, output_dir, server=None, token=None, jobs=None,
+                    registration_concurrency=8, compact=False):
+    """
+    Provisions all endpoints listed in the manifest using a pool of JOBS
+    worker processes (number of CPUs by default), and writes index.json with
+    per-endpoint results and timing statistics to OUTPUT_DIR. If COMPACT is
+    True, blobs are encoded using SenML Base Names.
+
+    Returns the index dict.
+    """
+    endpoints = load_manifest(manifest_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(provision_endpoint, job, output_dir, server, token, compact)
+                   for job in endpoints]
+        results = [future.result() for future in futures]
+    provisioning_time = time.perf_counter() - start
+
+    register_endpoints(results, registration_concurrency)
+    for result in results:
+        # may contain secrets; never written to the index
+        result.pop('registration_info', None)
+    total_time = time.perf_counter() - start
+
+    succeeded = sum(1 for r in results if r['ok'])
+    total_size = sum(r['size'] for r in results if r['ok'])
+    total_plain_size = (sum(r['plain_size'] for r in results if r['ok']) if compact
+                        else total_size)
+    index = collections.OrderedDict([
+        ('manifest', os.path.abspath(manifest_path)),
+        ('endpoints', len(results)),
+        ('succeeded', succeeded),
+        ('failed', len(results) - succeeded),
+        ('provisioning_time_s', provisioning_time),
+        ('total_time_s', total_time),
+        ('compact', compact),
+        ('total_size_B', total_size),
+        ('total_plain_size_B', total_plain_size),
+        ('endpoints_per_second', len(results) / total_time if total_time > 0 else None),
+        ('stages', _stage_summary(results)),
+        ('results', results),
+    ])
+
+    with open(os.path.join(output_dir, 'index.json'), 'w') as file:
+        json.dump(index, file, indent=2)
+        file.write('\n')
+    return index
+
+
+def format_summary(index):
+    lines = ['Provisioned %d/%d endpoints in %.2f s (%.1f endpoints/s)'
+             % (index['succeeded'], index['endpoints'], index['total_time_s'],
+                index['endpoints_per_second'] or 0.0)]
+    if index['compact'] and index['total_plain_size_B']:
+        saved = index['total_plain_size_B'] - index['total_size_B']
+        lines.append('  Base Name encoding saved %d B (%.1f%%) in total'
+                     % (saved, 100.0 * saved / index['total_plain_size_B']))
+    for stage, stats in index['stages'].items():
+        lines.append('  %-14s n=%-6d mean=%8.2f ms  median=%8.2f ms  max=%8.2f ms  total=%8.2f s'
+                     % (stage, stats['count'], stats['mean_s'] * 1000, stats['median_s'] * 1000,
+                        stats['max_s'] * 1000, stats['total_s']))
+    for result in index['results']:
+        if not result['ok']:
+            lines.append('  FAILED #%d (%s): %s' % (result['index'], result['URN'], result['error']))
+    return '\n'.join(lines)
@@ -46,7 +46,11 @@ class CoioteRegistration:
         self.pk_id = srv_info.get('pk_identity', None)
         self.pkey = srv_info.get('pkey', None)
 
-    def register(self):
+    def register(self, session=None, verbose=True):
+        """
+        Registers the device in Coiote DM. SESSION may be a requests.Session
+        object, so that connections are reused when registering many devices.
+        """
         API = '/api/coiotedm/v3/devices'
         hex_psk = None
         if self.pkey is not None:
@@ -68,10 +72,11 @@ class CoioteRegistration:
             'dtlsPsk': hex_psk
         }
 
-        resp = requests.post(url=self.addr + API,
-                             headers=headers, json=request)
+        resp = (session or requests).post(url=self.addr + API,
+                                          headers=headers, json=request)
         if resp.ok:
-            print('Device "%s" successfully registered' % self.endpoint_name)
+            if verbose:
+                print('Device "%s" successfully registered' % self.endpoint_name)
         elif resp.status_code in [400, 403, 404, 409, 429, 503]:
             raise ConnectionError(
                 f'{resp.status_code} ' + resp.json().get('error', 'No error message'))
@@ -87,7 +92,11 @@ class FactoryProvisioning:
                  endpoint_name,
                  server_info,
                  token,
-                 cert_info):
+                 cert_info,
+                 verbose=True,
+                 compact=False):
+        self.verbose = verbose
+        self.compact = compact
         if server_info is not None:
             with open(server_info, 'r') as file:
                 self.srv_info = json.load(file)
@@ -157,8 +166,19 @@ class FactoryProvisioning:
             raise ValueError(
                 'Security Object Private Key ID resource is empty')
 
+    def __log(self, *args):
+        if self.verbose:
+            print(*args)
+
     def __serialize_config(self):
-        return ssc.serialize_config(str(self.cfg_dict))
+        return ssc.serialize_config(str(self.cfg_dict), compact=self.compact)
+
+    def serialized_sizes(self):
+        """
+        Returns a (plain_size, compact_size) tuple of SenML CBOR blob sizes
+        with and without SenML Base Names, for the current configuration.
+        """
+        return ssc.compare_serialized_size(str(self.cfg_dict))
 
     def get_sec_mode(self):
         return str(SecurityMode(self.sec_mode))
@@ -176,16 +196,13 @@ class FactoryProvisioning:
         else:
             raise OSError('Missing endpoint cert/key')
 
-    def generate_self_signed_cert(self):
+    def generate_self_signed_cert(self, cert_dir='cert'):
         if self.cert_info is None:
             raise ValueError('Missing information for certificate generation')
 
-        print('Generating device certificates...')
-        try:
-            os.mkdir('cert')
-        except FileExistsError:
-            pass
-        cert_dir = os.path.realpath('cert')
+        self.__log('Generating device certificates...')
+        os.makedirs(cert_dir, exist_ok=True)
+        cert_dir = os.path.realpath(cert_dir)
         key_filename = os.path.join(cert_dir, 'client_key')
         cert_filename = os.path.join(cert_dir, 'client_cert')
 
@@ -197,12 +214,12 @@ class FactoryProvisioning:
         gen_cert_and_key(cert_info, key_filename, cert_filename)
         try:
             self.set_endpoint_cert_and_key(cert_filename + '.der', key_filename + '.der')
-            print('Certificates generated')
+            self.__log('Certificates generated')
         except:
             raise RuntimeError('Failed to generate certificate')
 
-    def provision_device(self):
-        print(f'Security Mode set to "{SecurityMode(self.sec_mode)}"')
+    def provision_device(self, output_path='SenMLCBOR'):
+        self.__log(f'Security Mode set to "{SecurityMode(self.sec_mode)}"')
 
         if self.sec_mode == SecurityMode.Certificate.value:
             list_of_sec_inst = list(self.cfg_dict[0].values())
@@ -213,40 +230,50 @@ class FactoryProvisioning:
             sec_inst = list_of_sec_inst[0]
 
             if self.server_cert is not None:
-                print(f'Load server cert: {self.server_cert}')
+                self.__log(f'Load server cert: {self.server_cert}')
                 with open(self.server_cert, 'rb') as cert:
                     sec_inst[RID.Security.ServerPKOrIdentity] = cert.read()
             else:
                 raise ValueError('Missing server cert')
 
             if self.endpoint_cert is not None:
-                print(f'Load endpoint cert: {self.endpoint_cert}')
+                self.__log(f'Load endpoint cert: {self.endpoint_cert}')
                 with open(self.endpoint_cert, 'rb') as cert:
                     sec_inst[RID.Security.PKOrIdentity] = cert.read()
             else:
                 raise ValueError('Missing endpoint cert')
 
             if self.endpoint_key is not None:
-                print(f'Load endpoint key: {self.endpoint_key}')
+                self.__log(f'Load endpoint key: {self.endpoint_key}')
                 with open(self.endpoint_key, 'rb') as cert:
                     sec_inst[RID.Security.SecretKey] = cert.read()
             else:
                 raise ValueError('Missing endpoint key')
 
-        print('Serializing endpoint configuration...')
+        self.__log('Serializing endpoint configuration...')
         cbor_blob = self.__serialize_config()
         if len(cbor_blob) > 0:
-            print('SenML CBOR blob created')
+            self.__log(f'SenML CBOR blob created ({len(cbor_blob)} B)')
+            if self.compact and self.verbose:
+                plain_size, compact_size = self.serialized_sizes()
+                self.__log(f'Base Name encoding saved {plain_size - compact_size} B '
+                           f'({100.0 * (plain_size - compact_size) / plain_size:.1f}%) '
+                           f'compared to {plain_size} B of absolute paths')
         else:
             raise RuntimeError('Failed to serialized endpoint configuration')
 
         # TODO: open device and send blob/certs to the device, for now dump blob to file
-        with open('SenMLCBOR', 'wb') as file:
+        with open(output_path, 'wb') as file:
             file.write(cbor_blob)
 
-        print('Load endpoint configuration: SenMLCBOR')
+        self.__log(f'Load endpoint configuration: {output_path}')
+        return cbor_blob
 
-    def register(self):
+    def registration_info(self):
+        """
+        Returns server information dict that may be passed to
+        CoioteRegistration to register this device.
+        """
         if self.srv_info is None:
             raise ValueError(
                 'Missing Coiote server information for registration operation')
@@ -265,6 +292,10 @@ class FactoryProvisioning:
         if self.sec_mode == SecurityMode.PreSharedKey.value:
             self.srv_info['pk_identity'] = self.pk_id.decode()
             self.srv_info['pkey'] = self.pkey
-        print('Register endpoint to Coiote...')
-        CoioteServer = CoioteRegistration(self.srv_info)
-        CoioteServer.register()
+        return self.srv_info
+
+    def register(self, session=None):
+        srv_info = self.registration_info()
+        self.__log('Register endpoint to Coiote...')
+        CoioteServer = CoioteRegistration(srv_info)
+        CoioteServer.register(session)
@@ -11,14 +11,16 @@ import argparse
 import requests
 import sys
 from factory_prov import factory_prov as fp
+from factory_prov import batch
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Factory provisioning tool')
     parser.add_argument('-c', '--endpoint_cfg', type=str,
-                        help='Configuration file containing device information to be loaded on the device',
-                        required=True)
+                        help='Configuration file containing device information to be loaded on the device, '
+                             'required unless BATCH is set',
+                        required=False)
     parser.add_argument('-e', '--URN', type=str,
                         help='Endpoint name to use during registration',
                         required=False)
@@ -41,28 +43,60 @@ if __name__ == '__main__':
                         help='Server public cert in DER format',
                         required=False)
 
+    parser.add_argument('-z', '--compact', action='store_true',
+                        help='Encode the SenML CBOR blob using SenML Base Names and relative resource '
+                             'paths, which makes it smaller',
+                        required=False)
+
+    parser.add_argument('-b', '--batch', type=str,
+                        help='JSON manifest listing many endpoints to provision in parallel; see '
+                             'factory_prov/batch.py for the format. ENDPOINT_CFG, URN, CERT, PKEY, PCERT '
+                             'and SCERT are ignored in this mode',
+                        required=False)
+    parser.add_argument('-o', '--output_dir', type=str, default='provisioned',
+                        help='Directory for per-endpoint output and index.json in BATCH mode '
+                             '(default: %(default)s)',
+                        required=False)
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='Number of worker processes in BATCH mode (default: number of CPUs)',
+                        required=False)
+    parser.add_argument('--registration_concurrency', type=int, default=8,
+                        help='Maximum number of concurrent Coiote registration requests in BATCH mode '
+                             '(default: %(default)s)',
+                        required=False)
+
     args = parser.parse_args()
+    if args.batch is None and args.endpoint_cfg is None:
+        parser.error('the following arguments are required: -c/--endpoint_cfg')
 
     ret_val = 1
 
     try:
-        fcty = fp.FactoryProvisioning(args.endpoint_cfg, args.URN, args.server,
-                                      args.token, args.cert)
-        if fcty.get_sec_mode() == 'cert':
-            if args.scert is not None:
-                fcty.set_server_cert(args.scert)
+        if args.batch is not None:
+            index = batch.provision_batch(args.batch, args.output_dir, args.server, args.token,
+                                          jobs=args.jobs,
+                                          registration_concurrency=args.registration_concurrency,
+                                          compact=args.compact)
+            print(batch.format_summary(index))
+            ret_val = 0 if index['failed'] == 0 else 1
+        else:
+            fcty = fp.FactoryProvisioning(args.endpoint_cfg, args.URN, args.server,
+                                          args.token, args.cert, compact=args.compact)
+            if fcty.get_sec_mode() == 'cert':
+                if args.scert is not None:
+                    fcty.set_server_cert(args.scert)
 
-            if args.cert is not None:
-                fcty.generate_self_signed_cert()
-            elif args.pkey is not None and args.pcert is not None:
-                fcty.set_endpoint_cert_and_key(args.pcert, args.pkey)
+                if args.cert is not None:
+                    fcty.generate_self_signed_cert()
+                elif args.pkey is not None and args.pcert is not None:
+                    fcty.set_endpoint_cert_and_key(args.pcert, args.pkey)
 
-        fcty.provision_device()
+            fcty.provision_device()
 
-        if args.server is not None and args.token is not None and args.URN is not None:
-            fcty.register()
+            if args.server is not None and args.token is not None and args.URN is not None:
+                fcty.register()
 
-        ret_val = 0
+            ret_val = 0
     except ValueError as err:
         print('Incorrect configuration:', err)
     except ConnectionError as err: